@@ -0,0 +1,91 @@
+# Control socket load generator
+#
+# Sends the matrix's control socket (see scripts/ControlSocket.py) random
+# cell launches, stops and volume changes, in bundles of burstSize messages
+# like a sequencer would each tick, at a rate of about msgsPerSec. Every
+# bundle ends with a ping, which the matrix answers once the frame that
+# handled the bundle has posted its commands, so the round trip is the
+# latency from sending a burst to the clip launcher having it. Prints the
+# throughput and the latency percentiles at the end
+#
+# Usage: python ControlLoad.py [port] [msgsPerSec] [seconds] [burstSize] [numRows] [numCols]
+
+import os
+import sys
+import time
+import random
+import socket
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from OSC import EncodeMessage, EncodeBundle, DecodePacket
+
+def MakeRandomMessage(nRows, nCols):
+    nRow, nCol, f = random.randrange(nRows), random.randrange(nCols), random.random()
+    if f < .4:
+        return EncodeMessage('/cell/launch', nRow, nCol)
+    if f < .8:
+        return EncodeMessage('/cell/stop', nRow, nCol)
+    return EncodeMessage('/cell/volume', nRow, nCol, random.uniform(.2, .8))
+
+def Main(liArgs):
+    liDefaults = [9000, 2000, 10, 16, 8, 8]
+    nPort, nRate, nSeconds, nBurst, nRows, nCols = [int(a) for a in liArgs] + liDefaults[len(liArgs):]
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.setblocking(False)
+    addr = ('127.0.0.1', nPort)
+
+    # Send time of each ping, and the round trip of those answered
+    diSent, liRoundTripMS = {}, []
+    def fnReceive():
+        while True:
+            try:
+                data = sock.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            for strAddress, liPongArgs in DecodePacket(data):
+                if strAddress == '/pong' and liPongArgs and liPongArgs[0] in diSent:
+                    liRoundTripMS.append(1000. * (time.perf_counter() - diSent.pop(liPongArgs[0])))
+
+    fInterval = nBurst / float(nRate)
+    nSent, nSeq = 0, 0
+    fStart = time.perf_counter()
+    fNext = fStart
+    while time.perf_counter() - fStart < nSeconds:
+        liMessages = [MakeRandomMessage(nRows, nCols) for _ in range(nBurst)]
+        liMessages.append(EncodeMessage('/ping', nSeq))
+        diSent[nSeq] = time.perf_counter()
+        try:
+            sock.sendto(EncodeBundle(liMessages), addr)
+            nSent += nBurst
+        except OSError as e:
+            print('Error sending:', e)
+            return 1
+        nSeq += 1
+
+        # Keep to the rate, picking up pongs while we wait
+        fNext += fInterval
+        while time.perf_counter() < fNext:
+            fnReceive()
+            time.sleep(min(.001, max(0., fNext - time.perf_counter())))
+        fnReceive()
+    fElapsed = time.perf_counter() - fStart
+
+    # Give the last frames a chance to answer
+    fDeadline = time.perf_counter() + 1.
+    while len(diSent) and time.perf_counter() < fDeadline:
+        fnReceive()
+        time.sleep(.005)
+
+    print('{} messages in {} bundles over {:.2f} s ({:.1f} messages / s)'.format(nSent, nSeq, fElapsed, nSent / fElapsed))
+    print('{} of {} pings answered'.format(len(liRoundTripMS), nSeq))
+    if len(liRoundTripMS):
+        liRoundTripMS.sort()
+        fnPct = lambda p: liRoundTripMS[min(len(liRoundTripMS) - 1, int(p * len(liRoundTripMS)))]
+        print('Round trip: mean {:.3f} ms, p50 {:.3f} ms, p95 {:.3f} ms, p99 {:.3f} ms, max {:.3f} ms'.format(
+            sum(liRoundTripMS) / len(liRoundTripMS), fnPct(.5), fnPct(.95), fnPct(.99), liRoundTripMS[-1]))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(Main(sys.argv[1:]))
@@ -0,0 +1,188 @@
+// Fade envelope benchmark
+//
+// Loops many short clips (where the fades are a big part of every
+// buffer) and times, per buffer, mixing just their faded samples two
+// ways: computing each sample's fade gain the way voices used to, and
+// looking it up in the clip's precomputed envelopes the way they do now.
+// Then it renders the same voices with Voice::RenderData for reference
+//
+// Usage: FadeEnvelopeBench [numVoices] [numBuffers] [bufferSize]
+
+#include "Clip.h"
+#include "Voice.h"
+#include "Util.h"
+
+#include <algorithm>
+#include <iostream>
+#include <iomanip>
+#include <chrono>
+#include <cmath>
+#include <cstdlib>
+#include <list>
+#include <vector>
+#include <memory>
+#include <string>
+
+// Must match what we render at
+static const size_t g_uSampleRate = 44100;
+
+// Make short clips, 50 to 200 ms long with 5 to 20 ms fades, of noise
+std::vector<std::unique_ptr<Clip>> makeClips( size_t uNumClips )
+{
+	std::vector<std::unique_ptr<Clip>> vClips;
+
+	srand( 1 );
+	for ( size_t uClipIdx = 0; uClipIdx < uNumClips; uClipIdx++ )
+	{
+		const size_t uHeadSamples = g_uSampleRate * ( 50 + 150 * uClipIdx / uNumClips ) / 1000;
+		const size_t uTailSamples = uHeadSamples / 2;
+		const size_t uFadeSamples = g_uSampleRate * ( 5 + uClipIdx % 16 ) / 1000;
+
+		std::vector<float> vHead( uHeadSamples ), vTail( uTailSamples );
+		for ( float& fSample : vHead )
+			fSample = rand() / (float) RAND_MAX - 0.5f;
+		for ( float& fSample : vTail )
+			fSample = 0.5f * ( rand() / (float) RAND_MAX - 0.5f );
+
+		vClips.emplace_back( new Clip( "clip" + std::to_string( uClipIdx ), vHead.data(), uHeadSamples, vTail.data(), uTailSamples, uFadeSamples ) );
+	}
+
+	return vClips;
+}
+
+// Mix the faded samples of a looping clip between uFirstPos and uFirstPos + uNumSamples,
+// either computing the fade gains or using the clip's envelopes
+template <bool bUseEnvelopes>
+void mixFades( const Clip * pClip, float fVolume, size_t uFirstPos, size_t uNumSamples, float * const pMixBuffer )
+{
+	const size_t uTotalSampleCount = pClip->GetNumSamples( true );
+	const size_t uSamplesInHead = pClip->GetNumSamples( false );
+	const size_t uFadeBegin = uSamplesInHead - pClip->GetNumFadeSamples();
+	const size_t uTailFadeBegin = pClip->GetTailFadeBegin();
+	const float * const pAudioData = pClip->GetAudioData();
+	const float * const pFadeOut = pClip->GetFadeOutSamples();
+	const float * const pFadeRamp = pClip->GetFadeRamp();
+	const float * const pTailFadeOut = pClip->GetTailFadeSamples();
+
+	// Loop seams fade to (head+tail)[0]
+	float fTargetVal = pAudioData[0];
+	if ( uTotalSampleCount > uSamplesInHead )
+		fTargetVal += pAudioData[uSamplesInHead];
+
+	// Walk through the buffer a loop at a time, mixing the spans that are fading
+	for ( size_t uSamplesAdded = 0; uSamplesAdded < uNumSamples; )
+	{
+		const size_t uFirstHeadSample = ( uFirstPos + uSamplesAdded ) % uSamplesInHead;
+		const size_t uLastHeadSample = std::min( uFirstHeadSample + uNumSamples - uSamplesAdded, uSamplesInHead );
+		float * const pMixSpan = &pMixBuffer[uSamplesAdded] - uFirstHeadSample;
+
+		// The loop seam fade at the end of the head
+		for ( size_t uHeadIdx = std::max( uFirstHeadSample, uFadeBegin ); uHeadIdx < uLastHeadSample; uHeadIdx++ )
+		{
+			if ( bUseEnvelopes )
+				pMixSpan[uHeadIdx] += fVolume * pFadeOut[uHeadIdx - uFadeBegin] + fTargetVal * pFadeRamp[uHeadIdx - uFadeBegin];
+			else
+				pMixSpan[uHeadIdx] += remap( (float) uHeadIdx, (float) uFadeBegin, (float) uSamplesInHead, fVolume * pAudioData[uHeadIdx], fTargetVal );
+		}
+
+		// The tail's fade to zero, which is mixed on top of the head
+		const size_t uLastTailSample = std::min( uSamplesInHead + uLastHeadSample, uTotalSampleCount );
+		for ( size_t uTailIdx = std::max( uSamplesInHead + uFirstHeadSample, uTailFadeBegin ); uTailIdx < uLastTailSample; uTailIdx++ )
+		{
+			if ( bUseEnvelopes )
+				pMixSpan[uTailIdx - uSamplesInHead] += fVolume * pTailFadeOut[uTailIdx - uTailFadeBegin];
+			else
+				pMixSpan[uTailIdx - uSamplesInHead] += remap( (float) uTailIdx, (float) uTailFadeBegin, (float) uTotalSampleCount, fVolume * pAudioData[uTailIdx], 0.f );
+		}
+
+		uSamplesAdded += uLastHeadSample - uFirstHeadSample;
+	}
+}
+
+// Mix every voice's fades for uNumBuffers, returns the
+// average microseconds per buffer and leaves the last buffer in vOut
+template <bool bUseEnvelopes>
+double runFades( const std::vector<std::unique_ptr<Clip>>& vClips, size_t uNumVoices, size_t uNumBuffers, size_t uBufferSize, std::vector<float>& vOut )
+{
+	std::vector<float> vMix( uBufferSize );
+	double dTotalUS = 0;
+	for ( size_t uBufIdx = 0; uBufIdx < uNumBuffers; uBufIdx++ )
+	{
+		std::fill( vMix.begin(), vMix.end(), 0.f );
+
+		auto tStart = std::chrono::high_resolution_clock::now();
+		for ( size_t uVoiceIdx = 0; uVoiceIdx < uNumVoices; uVoiceIdx++ )
+			mixFades<bUseEnvelopes>( vClips[uVoiceIdx % vClips.size()].get(), 1.f / uNumVoices, uBufIdx * uBufferSize, uBufferSize, vMix.data() );
+		auto tEnd = std::chrono::high_resolution_clock::now();
+		dTotalUS += std::chrono::duration<double, std::micro>( tEnd - tStart ).count();
+	}
+
+	vOut = vMix;
+	return dTotalUS / uNumBuffers;
+}
+
+// Render the voices as the audio callback would, returns the average microseconds per buffer
+double runVoices( const std::vector<std::unique_ptr<Clip>>& vClips, size_t uNumVoices, size_t uNumBuffers, size_t uBufferSize )
+{
+	// Every voice loops one of the clips, and starts on its first buffer
+	std::list<Voice> liVoices;
+	for ( size_t uVoiceIdx = 0; uVoiceIdx < uNumVoices; uVoiceIdx++ )
+	{
+		const Clip * pClip = vClips[uVoiceIdx % vClips.size()].get();
+		liVoices.emplace_back( pClip, (int) uVoiceIdx, pClip->GetNumSamples(), 1.f / uNumVoices, true );
+	}
+
+	std::vector<float> vMix( uBufferSize );
+	size_t uSamplePos = 0;
+	double dTotalUS = 0;
+	for ( size_t uBufIdx = 0; uBufIdx < uNumBuffers; uBufIdx++ )
+	{
+		std::fill( vMix.begin(), vMix.end(), 0.f );
+
+		auto tStart = std::chrono::high_resolution_clock::now();
+		for ( Voice& v : liVoices )
+			v.RenderData( vMix.data(), uBufferSize, uSamplePos );
+		auto tEnd = std::chrono::high_resolution_clock::now();
+		dTotalUS += std::chrono::duration<double, std::micro>( tEnd - tStart ).count();
+
+		uSamplePos += uBufferSize;
+	}
+
+	return dTotalUS / uNumBuffers;
+}
+
+int main( int argc, char ** argv )
+{
+	const size_t uNumVoices = argc > 1 ? std::stoul( argv[1] ) : 256;
+	const size_t uNumBuffers = argc > 2 ? std::stoul( argv[2] ) : 400;
+	const size_t uBufferSize = argc > 3 ? std::stoul( argv[3] ) : 1024;
+
+	const std::vector<std::unique_ptr<Clip>> vClips = makeClips( 32 );
+	const double dDeadlineUS = 1e6 * uBufferSize / g_uSampleRate;
+
+	std::cout << uNumVoices << " short loops, " << uNumBuffers << " buffers of " << uBufferSize << " samples ";
+	std::cout << "(deadline " << std::fixed << std::setprecision( 0 ) << dDeadlineUS << " us)" << std::endl;
+
+	std::vector<float> vComputed, vEnvelopes;
+	const double dComputedUS = runFades<false>( vClips, uNumVoices, uNumBuffers, uBufferSize, vComputed );
+	const double dEnvelopesUS = runFades<true>( vClips, uNumVoices, uNumBuffers, uBufferSize, vEnvelopes );
+
+	// The gains are rounded differently, so allow for that
+	float fMaxDiff = 0.f;
+	for ( size_t i = 0; i < uBufferSize; i++ )
+		fMaxDiff = std::max( fMaxDiff, std::fabs( vComputed[i] - vEnvelopes[i] ) );
+
+	std::cout << std::setw( 24 ) << "fades" << std::setw( 14 ) << "us / buffer" << std::setw( 12 ) << "% deadline" << std::endl;
+	std::cout << std::setw( 24 ) << "computed per sample" << std::setw( 14 ) << std::setprecision( 1 ) << dComputedUS;
+	std::cout << std::setw( 12 ) << 100. * dComputedUS / dDeadlineUS << std::endl;
+	std::cout << std::setw( 24 ) << "precomputed envelopes" << std::setw( 14 ) << dEnvelopesUS;
+	std::cout << std::setw( 12 ) << 100. * dEnvelopesUS / dDeadlineUS << std::endl;
+	std::cout << "saving " << dComputedUS - dEnvelopesUS << " us / buffer (" << std::setprecision( 2 ) << dComputedUS / dEnvelopesUS << "x), ";
+	std::cout << "max |diff| " << std::scientific << std::setprecision( 1 ) << fMaxDiff << std::fixed << std::endl;
+
+	const double dVoicesUS = runVoices( vClips, uNumVoices, uNumBuffers, uBufferSize );
+	std::cout << "Voice::RenderData " << std::setprecision( 1 ) << dVoicesUS << " us / buffer (";
+	std::cout << 100. * dVoicesUS / dDeadlineUS << "% deadline)" << std::endl;
+
+	return 0;
+}
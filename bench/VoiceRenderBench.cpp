@@ -0,0 +1,164 @@
+// Voice rendering benchmark
+//
+// Renders a dense session of looping voices (with tails) the way the
+// audio callback does, once serially and then with a VoiceRenderPool
+// of 2 to N threads, and prints the time per buffer of each along with
+// how much of the buffer's deadline that uses. Then it renders serially
+// with a LevelMeter measuring every voice, and rows of 4 voices
+//
+// Usage: VoiceRenderBench [numVoices] [numBuffers] [bufferSize] [maxThreads]
+
+#include "Clip.h"
+#include "Voice.h"
+#include "VoiceRenderPool.h"
+#include "LevelMeter.h"
+
+#include <iostream>
+#include <iomanip>
+#include <chrono>
+#include <cmath>
+#include <cstdlib>
+#include <list>
+#include <vector>
+#include <memory>
+#include <thread>
+#include <string>
+
+// Must match what we render at
+static const size_t g_uSampleRate = 44100;
+
+// Make some clips with noisy sines for heads and tails,
+// of a few different lengths so the voices don't line up
+std::vector<std::unique_ptr<Clip>> makeClips( size_t uNumClips )
+{
+	std::vector<std::unique_ptr<Clip>> vClips;
+	vClips.reserve( uNumClips );
+
+	srand( 1 );
+	for ( size_t uClipIdx = 0; uClipIdx < uNumClips; uClipIdx++ )
+	{
+		const size_t uHeadSamples = g_uSampleRate * ( 1 + uClipIdx % 4 );
+		const size_t uTailSamples = g_uSampleRate / 2;
+		const size_t uFadeSamples = g_uSampleRate / 200;
+		const float fFreq = 110.f * ( 1 + uClipIdx );
+
+		std::vector<float> vHead( uHeadSamples ), vTail( uTailSamples );
+		for ( size_t i = 0; i < uHeadSamples; i++ )
+			vHead[i] = 0.5f * sinf( 6.2831853f * fFreq * i / g_uSampleRate ) + 0.01f * ( rand() / (float) RAND_MAX );
+		for ( size_t i = 0; i < uTailSamples; i++ )
+			vTail[i] = 0.25f * sinf( 6.2831853f * fFreq * i / g_uSampleRate );
+
+		vClips.emplace_back( new Clip( "clip" + std::to_string( uClipIdx ), vHead.data(), uHeadSamples, vTail.data(), uTailSamples, uFadeSamples ) );
+	}
+
+	return vClips;
+}
+
+// How many voices the metered session puts on each meter
+static const size_t g_uVoicesPerMeter = 4;
+
+// Run uNumBuffers through uNumThreads (1 means serial) or through a level meter,
+// returns the average microseconds per buffer and leaves the last buffer in vOut
+double runSession( const std::vector<std::unique_ptr<Clip>>& vClips, size_t uNumVoices, size_t uNumBuffers, size_t uBufferSize, size_t uNumThreads, bool bMetered, std::vector<float>& vOut )
+{
+	// Every voice loops one of the clips, and starts on its first buffer
+	std::list<Voice> liVoices;
+	for ( size_t uVoiceIdx = 0; uVoiceIdx < uNumVoices; uVoiceIdx++ )
+	{
+		const Clip * pClip = vClips[uVoiceIdx % vClips.size()].get();
+		liVoices.emplace_back( pClip, (int) uVoiceIdx, pClip->GetNumSamples(), 1.f / uNumVoices, true );
+	}
+
+	std::unique_ptr<VoiceRenderPool> pPool;
+	if ( uNumThreads > 1 )
+		pPool.reset( new VoiceRenderPool( uNumThreads, uBufferSize ) );
+
+	std::unique_ptr<LevelMeter> pMeter;
+	if ( bMetered )
+	{
+		pMeter.reset( new LevelMeter( uBufferSize, uNumVoices ) );
+		for ( size_t uVoiceIdx = 0; uVoiceIdx < uNumVoices; uVoiceIdx++ )
+			pMeter->SetVoiceMeter( (int) uVoiceIdx, (int) ( uVoiceIdx / g_uVoicesPerMeter ) );
+	}
+
+	// Halfway through, stop every other voice so tails get rendered too
+	std::vector<float> vMix( uBufferSize );
+	size_t uSamplePos = 0;
+	double dTotalUS = 0;
+	for ( size_t uBufIdx = 0; uBufIdx < uNumBuffers; uBufIdx++ )
+	{
+		if ( uBufIdx == uNumBuffers / 2 )
+		{
+			size_t uVoiceIdx = 0;
+			for ( Voice& v : liVoices )
+				if ( uVoiceIdx++ % 2 )
+					v.SetStopping( uBufferSize );
+		}
+
+		std::fill( vMix.begin(), vMix.end(), 0.f );
+
+		auto tStart = std::chrono::high_resolution_clock::now();
+		if ( pMeter != nullptr )
+			pMeter->RenderVoices( liVoices, vMix.data(), uBufferSize, uSamplePos );
+		else if ( pPool == nullptr || pPool->RenderVoices( liVoices, vMix.data(), uBufferSize, uSamplePos ) == false )
+		{
+			for ( Voice& v : liVoices )
+				v.RenderData( vMix.data(), uBufferSize, uSamplePos );
+		}
+		auto tEnd = std::chrono::high_resolution_clock::now();
+		dTotalUS += std::chrono::duration<double, std::micro>( tEnd - tStart ).count();
+
+		uSamplePos += uBufferSize;
+	}
+
+	vOut = vMix;
+	return dTotalUS / uNumBuffers;
+}
+
+int main( int argc, char ** argv )
+{
+	const size_t uNumVoices = argc > 1 ? std::stoul( argv[1] ) : 128;
+	const size_t uNumBuffers = argc > 2 ? std::stoul( argv[2] ) : 200;
+	const size_t uBufferSize = argc > 3 ? std::stoul( argv[3] ) : 4096;
+	size_t uMaxThreads = argc > 4 ? std::stoul( argv[4] ) : std::thread::hardware_concurrency();
+	if ( uMaxThreads == 0 )
+		uMaxThreads = 1;
+
+	const std::vector<std::unique_ptr<Clip>> vClips = makeClips( 16 );
+	const double dDeadlineUS = 1e6 * uBufferSize / g_uSampleRate;
+
+	std::cout << uNumVoices << " voices, " << uNumBuffers << " buffers of " << uBufferSize << " samples ";
+	std::cout << "(deadline " << std::fixed << std::setprecision( 0 ) << dDeadlineUS << " us)" << std::endl;
+	std::cout << std::setw( 8 ) << "threads" << std::setw( 14 ) << "us / buffer" << std::setw( 10 ) << "speedup";
+	std::cout << std::setw( 12 ) << "% deadline" << std::setw( 14 ) << "max |diff|" << std::endl;
+
+	// The last run is metered (on one thread)
+	std::vector<float> vSerial, vParallel;
+	double dSerialUS = 0;
+	for ( size_t uNumThreads = 1; uNumThreads <= uMaxThreads + 1; uNumThreads++ )
+	{
+		const bool bMetered = uNumThreads > uMaxThreads;
+		const double dUS = runSession( vClips, uNumVoices, uNumBuffers, uBufferSize, bMetered ? 1 : uNumThreads, bMetered, uNumThreads == 1 ? vSerial : vParallel );
+		if ( uNumThreads == 1 )
+		{
+			dSerialUS = dUS;
+			vParallel = vSerial;
+		}
+
+		// The sum happens in a different order, so allow for rounding
+		float fMaxDiff = 0.f;
+		for ( size_t i = 0; i < uBufferSize; i++ )
+			fMaxDiff = std::max( fMaxDiff, std::fabs( vSerial[i] - vParallel[i] ) );
+
+		if ( bMetered )
+			std::cout << std::setw( 8 ) << "metered";
+		else
+			std::cout << std::setw( 8 ) << uNumThreads;
+		std::cout << std::setw( 14 ) << std::setprecision( 1 ) << dUS;
+		std::cout << std::setw( 10 ) << std::setprecision( 2 ) << dSerialUS / dUS;
+		std::cout << std::setw( 12 ) << std::setprecision( 1 ) << 100. * dUS / dDeadlineUS;
+		std::cout << std::setw( 14 ) << std::scientific << std::setprecision( 1 ) << fMaxDiff << std::fixed << std::endl;
+	}
+
+	return 0;
+}
@@ -2,15 +2,33 @@
 
 #include <vector>
 #include <string>
+#include <atomic>
+#include <memory>
+
+// Forward for the peak pyramid
+class WaveformPeaks;
 
 /***********************************************
 Clip class - stores a buffer of audio
 
 The clip class is really just a container/wrapper
-for audio data that can be rendered by voices
+for audio data that can be rendered by voices. The
+samples (the head followed by the tail) are kept in
+an immutable buffer that clips with the same audio
+share, whatever their fade settings. Each clip
+builds its own (short) faded copies of the spans
+around its fades when it's constructed, so voices
+never compute fade gains while they render
+
+A clip can also hold a min/max peak pyramid of its
+samples (see WaveformPeaks), which clips sharing
+the samples share as well, so it can be drawn
+without touching the samples
 
 Each voice owns a pointer to a clip from which
-it draws its audio data. 
+it draws its audio data. The clip counts the voices
+(and queued commands) using it, so the ClipLauncher
+knows when a replaced clip can be freed
 ***********************************************/
 
 class Clip
@@ -19,7 +37,11 @@ public:
 	// Default constructor sets int members to zero
 	Clip();
 
-	// Data constructor does all the hard work
+	// The buffer of samples clips share
+	using SampleBuffer = std::vector<float>;
+	using SampleBufferPtr = std::shared_ptr<const SampleBuffer>;
+
+	// Data constructor copies the head and tail into a buffer of its own
 	Clip( const std::string strName,			// The friendly name of the clip
 		  const float * const pHeadBuffer,		// The head buffer
 		  const size_t uSamplesInHeadBuffer,	// and its sample count
@@ -27,15 +49,53 @@ public:
 		  const size_t uSamplesInTailBuffer,	// and its sample count
 		  const size_t m_uFadeSamples );		// The # of fade samples
 
+	// Construct with a (possibly shared) buffer of the head samples followed by the tail
+	Clip( const std::string strName, SampleBufferPtr pSamples, const size_t uSamplesInHead, const size_t uFadeSamples );
+
 	// Various gets
 	std::string GetName() const;
 	size_t GetNumSamples( bool bIncludeTail = false ) const;
 	size_t GetNumFadeSamples() const;
 	float const * GetAudioData() const;
+	SampleBufferPtr GetSampleBuffer() const;
+
+	// The peak pyramid of our samples (head and tail), null if none was made
+	using PeaksPtr = std::shared_ptr<const WaveformPeaks>;
+	PeaksPtr GetPeaks() const;
+	void SetPeaks( PeaksPtr pPeaks );
+
+	// Where the tail's fade to zero begins, as an index into the
+	// audio data (the fade ends at GetNumSamples( true ))
+	size_t GetTailFadeBegin() const;
+
+	// Precomputed fade envelopes, each GetNumFadeSamples() long (the tail fade
+	// is as long as the tail's fade). Voices mix these in place of the audio data
+	float const * GetFadeInSamples() const;		// The head's first samples, faded up from zero
+	float const * GetFadeOutSamples() const;	// The head's last samples, faded out to zero
+	float const * GetFadeRamp() const;			// The gain a loop seam's fade target is mixed in at
+	float const * GetTailFadeSamples() const;	// The tail's samples from GetTailFadeBegin(), faded out to zero
+
+	// Reference counting, done by the ClipLauncher (these are
+	// const because voices only hold const pointers to clips)
+	void AddRef() const;
+	void Release() const;
+	int GetRefCount() const;
+
+	// The count makes clips non-copyable, construct them in place
+	Clip( const Clip& ) = delete;
+	Clip& operator=( const Clip& ) = delete;
 
 private:
 	size_t m_uSamplesInHead;					// The number of samples in the head
+	size_t m_uSamplesInTail;					// The number of tail samples we use (the tail must end before the fade-out starts)
 	size_t m_uFadeSamples;						// The fade duration for starting/stopping/looping, in samples
+	size_t m_uTailFadeBegin;					// Where the tail starts fading to zero
 	std::string m_strName;						// The name of the loop (this is never touched by audio thread)
-	std::vector<float> m_vAudioBuffer;			// The vector storing the entire head and tail (with fades baked?)
+	SampleBufferPtr m_pSamples;					// The head and tail samples, maybe shared with other clips
+	PeaksPtr m_pPeaks;							// The peaks of those samples, shared along with them
+	std::vector<float> m_vFadeRamp;				// Gains going from 0 to 1 over the fade
+	std::vector<float> m_vFadeIn;				// The head's fade in, prefaded by the ramp
+	std::vector<float> m_vFadeOut;				// The head's fade out, prefaded by the inverse ramp
+	std::vector<float> m_vTailFadeOut;			// The tail's fade to zero, prefaded
+	mutable std::atomic<int> m_iRefCount;		// How many voices and queued commands are using us
 };
\ No newline at end of file
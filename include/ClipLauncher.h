@@ -3,13 +3,21 @@
 #include <string>
 #include <map>
 #include <list>
+#include <vector>
+#include <unordered_set>
+#include <unordered_map>
 #include <mutex>
+#include <atomic>
+#include <chrono>
 #include <memory>
 #include <stdint.h>
 
-// Forwards for clip, voice
+// Forwards for clip, voice, render pool, level meter, peaks
 class Clip;
 class Voice;
+class VoiceRenderPool;
+class LevelMeter;
+class WaveformPeaks;
 
 // Forward for SDL audio spec
 struct SDL_AudioSpec;
@@ -34,6 +42,37 @@ locks data that could be used by both threads.
 For example, the commands that control playback
 are stored in a queue, and this queue is accessed
 by both clients and the audio thread. 
+
+Clips can be registered, replaced and unregistered
+while playing. The audio thread never looks clips
+up by name, it only sees the clip pointers in the
+commands it's given; every command and voice holds
+a reference to its clip, and a clip that's been
+replaced or unregistered is retired and then freed
+(on the client thread, in Update) once unreferenced.
+
+Clips with the same audio (i.e the same files loaded
+under different names) share one buffer of samples,
+found by hashing the samples as they're loaded.
+Each buffer gets a min/max peak pyramid for drawing
+waveforms (see WaveformPeaks), built when it's
+loaded or read from a cache keyed by that hash.
+
+While metering is on, the audio thread measures
+the level of every voice, and of every group of
+voices sharing a meter (i.e a row), as it renders
+them (see LevelMeter). Clients read the latest
+levels without locking the audio mutex.
+
+Each instance plays on its own SDL audio device
+(and so its own audio thread). Big sessions can
+spread their voices over several instances - the
+first is the primary, and the rest are shards it
+owns (see AddShard). Shards play the primary's
+clips, and start and stop with it; a starting
+shard takes the primary's sample pos, so they
+all trigger on the same clock. Clients decide
+which voices each instance plays.
 ***********************************************/
 
 class ClipLauncher
@@ -42,17 +81,19 @@ public:
 	// Default Constructor initializes variables
 	ClipLauncher();
 
-	// Init function actually starts SDL audio
-	// using provided audio spec (if valid)
-	bool Init( SDL_AudioSpec * pAudioSpec );
+	// Init function actually opens an SDL audio device using
+	// provided audio spec (if valid), the default if unnamed
+	bool Init( SDL_AudioSpec * pAudioSpec, std::string strDeviceName );
 
 	// Destructor tears down SDL Audio if it was started
 	~ClipLauncher();
 
 	// Called periodically to pick up messages posted by aud thread
+	// (the primary does this for its shards, and stops them all
+	// once none of them have any voices)
 	void Update();
 
-	// Play / Pause the audio device
+	// Play / Pause the audio device (and those of any shards)
 	bool GetPlayPause() const;
 	void SetPlayPause( bool bPlayPause );
 
@@ -65,9 +106,54 @@ public:
 	SDL_AudioSpec * GetAudioSpecPtr() const;
 	Clip * GetClip( std::string strClipName ) const;
 
-	// Add a clip to storage, can be recalled later as a Voice
+	// Add a clip to storage, can be recalled later as a Voice. While
+	// playing, a clip can't be longer than the max sample count. Registering
+	// a name again is fine if it's with the same files, but is an error if not
 	bool RegisterClip( std::string strClipName, std::string strHeadFile, std::string strTailFile, size_t uFadeDurationMS );
 
+	// Load new audio for a clip (or register it, if it isn't). Voices playing
+	// the old clip keep it until they stop, and voices started afterwards with
+	// the new clip get it - the old clip is freed once nothing uses it
+	bool ReplaceClip( std::string strClipName, std::string strHeadFile, std::string strTailFile, size_t uFadeDurationMS );
+
+	// Forget a clip, it's freed once nothing uses it
+	bool UnregisterClip( std::string strClipName );
+
+	// The number of replaced / unregistered clips still in use
+	size_t GetNumRetiredClips() const;
+
+	// Clip memory use - the logical size is what stored clips' samples add up
+	// to, and the physical size is what's allocated for every clip we hold
+	// (retired ones included) once clips with the same audio share buffers
+	size_t GetClipBytesLogical() const;
+	size_t GetClipBytesPhysical() const;
+	size_t GetNumSampleBuffers() const;
+
+	// Peak pyramids are read from (and written to) files in this directory,
+	// named by the hash of their samples. They're built each time if it's empty
+	void SetPeakCacheDir( std::string strDir );
+	std::string GetPeakCacheDir() const;
+
+	// The [min, max] of uNumColumns equal spans of a clip's samples [uBeginSample,
+	// uEndSample), flattened. Comes from the clip's peak pyramid, so it's as quick
+	// for a whole clip as for a few samples. Empty if there's no such clip
+	std::vector<float> GetClipPeaks( std::string strClipName, size_t uBeginSample, size_t uEndSample, size_t uNumColumns ) const;
+
+	// Register many clips at once (i.e a whole session), the vectors are parallel.
+	// Returns 1 for each clip that was registered and 0 for each that wasn't
+	std::vector<int> RegisterClips( std::vector<std::string> vClipNames, std::vector<std::string> vHeadFiles,
+									std::vector<std::string> vTailFiles, std::vector<size_t> vFadeDurationsMS );
+
+	// Get several registered clips at once (all must exist)
+	std::vector<Clip *> GetClips( std::vector<std::string> vClipNames ) const;
+
+	// Open another instance on a device (the default if unnamed) with our audio
+	// spec, which plays our clips in step with us (see GetShard). Shards can't be
+	// added while we're playing, and are ours to free. False if the device won't open
+	bool AddShard( std::string strDeviceName );
+	size_t GetNumShards() const;
+	ClipLauncher * GetShard( size_t uShardIdx ) const;
+
 	// SDL Audio callback, will end up calling fill_audio_impl on a SoundManager instance
 	static void FillAudio( void * pUserData, uint8_t * pStream, int nSamplesDesired );
 
@@ -83,6 +169,7 @@ public:
 		StopVoice,		// Stop an active loop (and destroy it)
 		StopVoices,		// Stop any playing voices (when they finish)
 		OneShot,		// Start a new voice and play once
+		SetMeter,		// Meter a voice (iData) on a meter (uData)
 		//////////////////////////////////////////////////////////
 		// These commands are posted by the audio thread
 		BufCompleted,	// The audio thread has rendered a buffer 
@@ -100,17 +187,75 @@ public:
 		size_t uData{ 0 };					// Used for	size data (i.e sample pos)
 	};
 
+	// A packed run of commands laid out exactly like
+	// Command (i.e the memory behind a ctypes array or
+	// numpy structured array), consumed in a single pass
+	struct CommandBuffer
+	{
+		const Command * pCommands{ nullptr };	// The first command in the buffer
+		size_t uNumCommands{ 0 };				// How many commands follow it
+	};
+
 	// Handle one or more commands
 	bool HandleCommand( Command cmd );
 	bool HandleCommands( std::list<Command> cmd );
+	bool HandleCommandBuffer( CommandBuffer cmdBuf );
 
     // Set this to true to turn on sample pos printing
     void SetSamplePosPrinting(bool bPrint);
 
+	// Render voices on this many threads (the audio thread plus
+	// uNumThreads - 1 workers); 1 renders serially. This must be
+	// called after Init and while not playing
+	bool SetNumRenderThreads( size_t uNumThreads );
+	size_t GetNumRenderThreads() const;
+
+	// Launch latency logging - while on, a voice launched after
+	// StampLaunchClick is stamped when the click was handled, when its
+	// start command was enqueued, when the audio thread applied it and
+	// when the voice first made noise. Off by default
+	void SetLatencyLogging( bool bLogLatency );
+	bool GetLatencyLogging() const;
+	void StampLaunchClick( int iVoiceID );
+
+	// Completed launches (oldest first) flattened into runs of [voice ID, click,
+	// enqueue, apply, sound, apply sample pos, sound sample pos], times in microseconds.
+	// Launches are dropped if too many are in flight or if their start is never
+	// enqueued; clearing empties the completed launches and the dropped count
+	std::vector<double> GetLaunchLatencies();
+	size_t GetNumLaunchesDropped();
+	void ClearLaunchLatencies();
+
+	// Level metering - while on, the audio thread measures the peak and
+	// RMS of each voice and each meter every buffer. Metering bypasses the
+	// VoiceRenderPool (see SetNumRenderThreads): voices are rendered on the
+	// audio thread alone while it's on, so it gives up any speedup from
+	// rendering threads. Off by default
+	void SetMetering( bool bMetering );
+	bool GetMetering() const;
+
+	// Meter voices with others on the same meter, the vectors are parallel
+	// (a negative meter ID meters the voice on its own). This is posted to
+	// the audio thread, so it can be done before the voices are started
+	bool SetVoiceMeters( std::vector<int> vVoiceIDs, std::vector<int> vMeterIDs );
+
+	// The latest levels flattened into [buffers metered, voice count], then runs
+	// of [voice ID, peak, RMS] for each voice and then for each meter. Doesn't lock
+	std::vector<float> GetLevels();
+
 private:
 	// Sort of a dumb typedef
 	using AudioSpecPtr = std::unique_ptr<SDL_AudioSpec>;
 	AudioSpecPtr m_pAudioSpec;				// Audio spec, describes loop format
+	uint32_t m_uAudioDevice;				// The SDL audio device ID we opened (0 if none)
+
+	// Sharding - a primary owns its shards, a shard knows its primary
+	ClipLauncher * m_pPrimary;								// Our primary if we're a shard, otherwise null
+	std::vector<std::unique_ptr<ClipLauncher>> m_vShards;	// Our shards if we're a primary
+	bool m_bAllQuiet;										// Whether the audio thread's said it has no voices since we last started any
+
+	// Opens our audio device, called by Init and AddShard
+	bool openDevice( const SDL_AudioSpec * pAudioSpec, const std::string& strDeviceName );
 
 	// Playback logic
 	bool m_bPlaying;						// Whether or not we are filling buffers of audio
@@ -124,9 +269,67 @@ private:
 	std::list<Command> m_liAudioCmdQueue;	// Audio thread's tasks, only modified by audio thread
 
 	// Clip and voice storage
-	std::map<std::string, Clip> m_mapClips;	// Clip storage, right now the map is a convenience
+	std::map<std::string, std::unique_ptr<Clip>> m_mapClips;	// Clip storage, keyed by name
+	std::map<std::string, std::pair<std::string, std::string>> m_mapClipFiles;	// The head and tail files of each clip above
+	std::list<std::unique_ptr<Clip>> m_liRetiredClips;			// Clips no longer stored but maybe still in use
+	std::unordered_set<const Clip *> m_setClips;				// Every clip above, to check commands against
 	std::list<Voice> m_liVoices;
 
+	// Sample buffers clips share, keyed by a hash of their samples (the clips
+	// own the buffers, these just let us find them while they're alive)
+	std::unordered_multimap<uint64_t, std::weak_ptr<const std::vector<float>>> m_mapSampleBuffers;
+
+	// The peak pyramids of those buffers, which the same clips own
+	std::unordered_map<const std::vector<float> *, std::weak_ptr<const WaveformPeaks>> m_mapPeaks;
+	std::string m_strPeakCacheDir;
+
+	// Clip storage helpers, called on the client thread
+	std::shared_ptr<const std::vector<float>> shareSamples( std::vector<float> vSamples, const uint64_t uHash );
+	std::shared_ptr<const WaveformPeaks> sharePeaks( const std::shared_ptr<const std::vector<float>>& pSamples, const uint64_t uHash );
+	void forgetFreedSamples();
+	std::unique_ptr<Clip> loadClip( std::string strClipName, std::string strHeadFile, std::string strTailFile, size_t uFadeDurationMS );
+	void retireClip( std::unique_ptr<Clip> pClip );
+	void freeRetiredClips();
+	bool acquireCommandClip( const Command& cmd );
+	void releaseCommandClip( const Command& cmd ) const;
+
+	// If we're rendering voices on more than one thread, this does it
+	std::unique_ptr<VoiceRenderPool> m_pRenderPool;
+
+	// Renders and measures voices while we're metering
+	std::atomic<bool> m_bMetering;
+	std::unique_ptr<LevelMeter> m_pLevelMeter;
+
+	// The stamps of a launch, in microseconds since m_tLatencyEpoch (-1 if not yet)
+	struct LaunchTiming
+	{
+		int iVoiceID{ -1 };
+		double dClickUS{ -1 };
+		double dEnqueueUS{ -1 };
+		double dApplyUS{ -1 };
+		double dSoundUS{ -1 };
+		size_t uApplySamplePos{ 0 };
+		size_t uSoundSamplePos{ 0 };
+	};
+
+	// Latency logging - launches in flight and a ring of completed ones. Storage
+	// is reserved up front so the audio thread only ever locks the mutex
+	std::atomic<bool> m_bLogLatency;
+	std::mutex m_muLatency;
+	std::chrono::steady_clock::time_point m_tLatencyEpoch;
+	std::vector<LaunchTiming> m_vLaunchesInFlight;
+	std::vector<LaunchTiming> m_vLaunchLog;
+	size_t m_uNumLaunchesLogged;
+	size_t m_uNumLaunchesDropped;
+
+	// Latency helpers, the first three are called on the
+	// main thread and the last two on the audio thread
+	double getLatencyStampUS() const;
+	void expireLaunchesInFlight( double dNowUS );
+	void stampLaunchEnqueued( const Command& cmd );
+	void stampLaunchApplied( int iVoiceID, bool bLaunched );
+	void stampLaunchesSounded( size_t uBufStartPos, double dBufStartUS );
+
 	// The actual callback function used to fill audio buffers
 	// (called from the static FillAudio function)
 	void fill_audio_impl( uint8_t * pStream, int nBytesToFill );
@@ -138,6 +341,9 @@ private:
 	// Called by from ::Update to get messages from aud thread
 	void getMessagesFromAudThread();
 
+	// Called on the client thread once every instance has gone quiet
+	void dropPublicCommands();
+
     // I'm using this mutex to control who prints to cout
     // so I can debug things between the audio/main threads
     std::mutex m_muPrintSamplePos;
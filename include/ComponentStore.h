@@ -0,0 +1,62 @@
+#pragma once
+
+#include "GL_Util.h"
+#include "quatvec.h"
+
+#include <vector>
+
+/***********************************************
+Component stores - contiguous component data
+
+MatrixUI keeps the per-instance data of the
+drawables and shapes it owns in these arrays
+(one array per member) rather than inside each
+component, so that python can view and write
+whole rows or columns of it without copying.
+
+A component created by MatrixUI is bound to a
+store and an index, and its gets/sets go through
+the store. Unbound components (like primitives)
+keep using their own members.
+
+Note that growing a store can move its arrays,
+so any views of them must be re-acquired after
+components are added. Each store counts the
+times it's added to or reserved (uGeneration),
+so a viewer can tell when to re-acquire even if
+the count of components hasn't changed.
+***********************************************/
+
+struct DrawableStore
+{
+	std::vector<vec4> vColors;			// RGBA color of each drawable
+	std::vector<vec3> vPositions;		// Translation of each drawable
+	std::vector<fquat> vRotations;		// Rotation of each drawable
+	std::vector<vec2> vScales;			// 2D scale of each drawable
+	std::vector<int> vActive;			// Whether or not it gets drawn (int so it views as int32)
+	std::vector<vec2> vPlayback;		// Start sample and length of what it's playing (0 length if nothing)
+	size_t uGeneration = 0;				// Bumped whenever the arrays may have grown or moved
+
+	// Add an instance, returns its index
+	size_t Add( vec4 v4Color, quatvec qvTransform, vec2 v2Scale, bool bActive = true );
+
+	// Reserve storage for uCount instances
+	void Reserve( size_t uCount );
+
+	size_t Size() const;
+};
+
+struct ShapeStore
+{
+	std::vector<vec2> vCenters;			// Center position of each shape
+	std::vector<int> vActive;			// Whether or not the shape is in the mix
+	size_t uGeneration = 0;				// Bumped whenever the arrays may have grown or moved
+
+	// Add an instance, returns its index
+	size_t Add( vec2 v2Center, bool bActive = true );
+
+	// Reserve storage for uCount instances
+	void Reserve( size_t uCount );
+
+	size_t Size() const;
+};
@@ -3,9 +3,11 @@
 #include "GL_Util.h"
 #include "quatvec.h"
 #include "EntComponent.h"
+#include "ComponentStore.h"
 
 #include <map>
 #include <array>
+#include <vector>
 
 class Drawable : public EntComponent
 {
@@ -14,6 +16,10 @@ public:
 	bool Init( std::string strIqmSrcFile, glm::vec4 v4Color, quatvec qvTransform, glm::vec2 v2Scale );
 	bool Init( std::string strName, std::array<glm::vec3, 3> triVerts, glm::vec4 v4Color, quatvec qvTransform, glm::vec2 v2Scale );
 
+	// An indexed triangle mesh, cached by name like the others (so
+	// the verts and indices are ignored if the name's been used)
+	bool Init( std::string strName, const std::vector<glm::vec3>& vVerts, const std::vector<GLuint>& vIndices, glm::vec4 v4Color, quatvec qvTransform, glm::vec2 v2Scale );
+
 	glm::vec4 GetColor() const;
 	glm::vec3 GetPos() const;
 	glm::fquat GetRot() const;
@@ -38,6 +44,12 @@ public:
 
 	void SetColor( glm::vec4 c );
 
+	// The start sample and length (in samples) of whatever this
+	// drawable is showing the progress of; the shader uses these and
+	// the playhead to draw the sweep. A length of 0 draws no sweep
+	glm::vec2 GetPlayback() const;
+	void SetPlayback( float fStartSample, float fNumSamples );
+
 	bool Draw();
 
 	static void SetPosHandle( GLint h );
@@ -53,6 +65,11 @@ public:
 	void SetIsActive( bool b );
 	bool GetIsActive() const;
 
+	// Move our color/transform/scale/active data into a store
+	// (appending it), after which all gets/sets go through it
+	void BindToStore( DrawableStore * pStore );
+	int GetStoreIdx() const;
+
 	static bool pylExpose();
 
 	using VAOData = std::array<GLuint, 2>;
@@ -62,9 +79,14 @@ private:
 	GLuint m_nIdx;
 	glm::vec2 m_v2Scale;
 	glm::vec4 m_v4Color;
+	glm::vec2 m_v2Playback;
 	quatvec m_qvTransform;
 	std::string m_strSrcFile;
 
+	// The store we're bound to (if any) and our index in it
+	DrawableStore * m_pStore;
+	int m_iStoreIdx;
+
 	// Static VAO cache (string to VAO/nIdx)
 	static std::map<std::string, VAOData> s_VAOCache;
 
@@ -0,0 +1,117 @@
+#pragma once
+
+#include <list>
+#include <vector>
+#include <atomic>
+#include <stddef.h>
+#include <stdint.h>
+
+// Forward for voice
+class Voice;
+
+/***********************************************
+LevelMeter class - voice and meter levels
+
+Renders voices for the audio thread while measuring
+the peak and RMS of what each voice adds to the mix
+buffer, and of what every group of voices sharing a
+meter (i.e a row's cells) adds together. Levels are
+measured over every buffer rendered.
+
+Each voice renders into a scratch buffer, which is
+measured as it's summed into its meter's scratch
+buffer (or the mix buffer, if it has no meter or is
+the only voice on it). Meters are measured as they're
+summed into the mix buffer. Voices are grouped by
+meter, so two scratch buffers are all that's needed.
+
+Levels are published through a triple buffer; the
+audio thread fills the back snapshot and swaps it
+with the middle one, and a reader swaps the middle
+one with the front if there's a new one, so neither
+side ever waits on the other or takes a lock. Storage
+is reserved up front, so the audio thread doesn't
+allocate unless there are more voices than that.
+Voices' meters are kept in a fixed size table, so
+setting them never allocates; voices set on a meter
+once it's full are metered on their own.
+***********************************************/
+
+class LevelMeter
+{
+public:
+	// The level of a voice or a meter over one buffer
+	struct Level
+	{
+		int iID{ -1 };			// The voice or meter ID
+		float fPeak{ 0.f };		// The largest absolute sample
+		float fRMS{ 0.f };		// The root mean square of the samples
+	};
+
+	// Levels from one buffer, and the sample pos it was rendered at
+	struct Snapshot
+	{
+		std::vector<Level> vVoices;
+		std::vector<Level> vMeters;
+		size_t uSamplePos{ 0 };
+		size_t uNumBufs{ 0 };	// How many buffers have been metered
+	};
+
+	// Construct with the largest buffer we'll render, how many voices
+	// to reserve room for and how many voices can be given meters
+	LevelMeter( size_t uMaxSamples, size_t uMaxVoices, size_t uMaxVoiceMeters );
+
+	// Render (mix) every voice in liVoices into pMixBuffer, publishing
+	// their levels. Returns false without rendering anything if
+	// uNumSamples is more than we can hold. Called on the audio thread
+	bool RenderVoices( std::list<Voice>& liVoices, float * pMixBuffer, size_t uNumSamples, size_t uSamplePos );
+
+	// Meter a voice along with others on the same meter,
+	// or on its own if iMeterID is negative. Called on the audio thread
+	void SetVoiceMeter( int iVoiceID, int iMeterID );
+
+	// The latest levels published. Called on one client thread
+	const Snapshot& GetLevels();
+
+private:
+	// Scratch buffers for a voice and a meter
+	size_t m_uMaxSamples;
+	std::vector<float> m_vVoiceScratch;
+	std::vector<float> m_vMeterScratch;
+
+	// Each metered voice's meter, in an open addressed table (linear
+	// probing, twice as many slots as the voices it can hold, an empty
+	// slot has a negative voice ID), and the voices we're rendering sorted
+	// by meter (only used on the audio thread)
+	struct VoiceMeter
+	{
+		int iVoiceID;
+		int iMeterID;
+	};
+	std::vector<VoiceMeter> m_vVoiceMeters;
+	size_t m_uNumVoiceMeters;
+	struct MeteredVoice
+	{
+		int iMeterID;
+		size_t uIdx;
+		Voice * pVoice;
+		bool operator<( const MeteredVoice& other ) const;
+	};
+	std::vector<MeteredVoice> m_vMeteredVoices;
+
+	// The triple buffer - the audio thread owns the back snapshot, the
+	// reader owns the front, and the middle holds the index of the other
+	// one (with a fresh bit set if the audio thread published it since)
+	Snapshot m_aSnapshots[3];
+	uint8_t m_uBack;
+	uint8_t m_uFront;
+	std::atomic<uint8_t> m_uMiddle;
+	size_t m_uNumBufs;
+
+	// The slot holding a voice's meter, or the empty one it would go in
+	size_t findVoiceMeter( int iVoiceID ) const;
+
+	// Render one voice into the voice scratch buffer, sum it into
+	// pDest and add its level to the back snapshot, returns the level
+	Level renderVoice( Voice& v, float * pDest, size_t uNumSamples, size_t uSamplePos );
+};
@@ -4,6 +4,7 @@
 #include "Shader.h"
 #include "Drawable.h"
 #include "Shape.h"
+#include "ComponentStore.h"
 #include "Util.h"
 
 #include <SDL.h>
@@ -11,27 +12,65 @@
 #include <vector>
 #include <array>
 #include <unordered_map>
+#include <stdint.h>
 
 class MatrixUI
 {
 public:
 
-	using ColPair = std::pair<Shape *, Shape *>;
-	using ColBank = std::unordered_map < ColPair, bool, pair_hash<ColPair>, pair_hash_eq<ColPair>>;
+	// The collision bank holds every pair of shapes that share a broad-phase
+	// grid cell, mapped to whether or not they actually overlap. Pairs are
+	// shape indices (lower first), since pointers move as the shapes grow
+	using ColPair = std::pair<int, int>;
+	using ColBank = std::unordered_map < ColPair, bool, pair_hash<ColPair>>;
 
 	MatrixUI();
 	~MatrixUI();
 
 	bool InitDisplay( std::string strWindowName, vec4 v4ClearColor, std::map<std::string, int> mapDisplayAttrs );
-	
+
+	// Draw into a framebuffer of our own, nWidth x nHeight, rather than the
+	// window (which can then be hidden). Call after InitDisplay; drawing
+	// offscreen waits for the GL to finish rather than swapping, so Draw's
+	// time is what the frame took to render
+	bool SetOffscreen( int nWidth, int nHeight );
+	bool GetIsOffscreen() const;
+
+	// What the last Draw did: how long it took in milliseconds (including
+	// the swap, and so any vsync wait, when drawing to the window), and
+	// how many draw calls and uniform uploads it made
+	std::vector<float> GetDrawStats() const;
+
+	// Write the last frame drawn offscreen to a BMP file
+	bool SaveFrame( std::string strFile ) const;
+
 	void Draw();
 	void Update();
 
 	void SetQuitFlag( bool bQuit );
 	bool GetQuitFlag() const;
 
+	// The playhead is the only thing uploaded per frame to animate
+	// progress; each drawable's start / length (see Drawable::SetPlayback)
+	// is an attribute, and the shader works out how far along it is
+	void SetPlayhead( size_t uSamplePos );
+	size_t GetPlayhead() const;
+
 	bool GetIsOverlapping( Shape * pA, Shape * pB ) const;
 
+	// Re-bin any shapes that moved or toggled active since the last
+	// call and update their collision bank entries (called by Update)
+	void UpdateCollisionBank();
+
+	// Broad-phase queries; these reflect the last UpdateCollisionBank.
+	// Pairs come back flattened, i.e [a0, b0, a1, b1, ...]
+	std::vector<int> GetOverlappingPairs() const;
+	std::vector<int> GetOverlapsWith( int sIdx ) const;
+	std::vector<int> GetShapesInRect( vec2 v2Min, vec2 v2Max ) const;
+
+	// Size of the uniform grid cells (rebins everything)
+	void SetBroadPhaseCellSize( float fCellSize );
+
 	const Shader * GetShaderPtr() const;
 	const Camera * GetCameraPtr() const;
 	const Drawable * GetDrawable( const size_t drIdx ) const;
@@ -41,15 +80,77 @@ public:
 	int AddDrawableTri( std::string strName, std::array<vec3, 3> triVerts, vec2 T, vec2 S, vec4 C, float theta = 0.f );
 	int AddShape( Shape::EType eType, glm::vec2 v2Pos, std::map<std::string, float> mapDetails );
 
+	// Adds a drawable filling between the [min, max] pairs of vPeaks (i.e from
+	// ClipLauncher::GetClipPeaks) left to right, across a unit square scaled by
+	// S. Meshes are cached by name, so drawables with the same name share one
+	int AddDrawableWaveform( std::string strName, std::vector<float> vPeaks, vec2 T, vec2 S, vec4 C );
+
+	// Creates a circle shape and IQM drawable for every position in one go,
+	// colored by vColors (one per cell, or the last one for the rest). Returns
+	// the index of the first shape and the first drawable (the rest follow)
+	std::vector<int> AddCells( std::string strIqmFile, std::vector<vec2> vPositions, float fRadius, std::vector<vec4> vColors );
+
+	// Reserve storage for this many more shapes and drawables
+	void Reserve( size_t uNumShapes, size_t uNumDrawables );
+
+	// Our drawables and shapes keep their per-instance data in
+	// contiguous stores; these return the arrays so python can
+	// view them without copying (re-acquire after adding more)
+	size_t GetNumDrawables() const;
+	size_t GetNumShapes() const;
+	// Changes whenever the arrays below may have grown or moved
+	size_t GetStoreGeneration() const;
+	float * GetDrawableColorsPtr();
+	float * GetDrawablePositionsPtr();
+	float * GetDrawableRotationsPtr();
+	float * GetDrawableScalesPtr();
+	int * GetDrawableActivePtr();
+	float * GetDrawablePlaybackPtr();
+	float * GetShapeCentersPtr();
+	int * GetShapeActivePtr();
+
 	static bool pylExpose();
 
 private:
 	bool m_bQuitFlag;
+	size_t m_uPlayhead;
 	SDL_GLContext m_GLContext;
 	SDL_Window * m_pWindow;
 	Shader m_Shader;
 	Camera m_Camera;
 	std::vector<Drawable> m_vDrawables;
 	std::vector<Shape> m_vShapes;
+	DrawableStore m_DrawableStore;
+	ShapeStore m_ShapeStore;
 	ColBank m_CollisionBank;
+
+	// The offscreen framebuffer and its attachments, if we have one
+	GLuint m_uFBO;
+	GLuint m_uColorRB;
+	GLuint m_uDepthRB;
+	int m_nOffscreenW;
+	int m_nOffscreenH;
+
+	// What the last Draw did (see GetDrawStats)
+	float m_fDrawMS;
+	size_t m_uDrawCalls;
+	size_t m_uUniformUploads;
+
+	// What the broad-phase knows about each shape
+	struct BroadPhaseEntry
+	{
+		bool bInGrid{ false };				// Whether we're binned (active shapes are)
+		vec2 v2Min{ 0 }, v2Max{ 0 };		// Our bounds when binned
+		std::vector<int64_t> vCellKeys;		// The grid cells we're in
+		std::vector<int> vPartners;			// Shapes we have a bank entry with
+	};
+
+	// Uniform grid of shape indices, keyed by packed cell coords
+	float m_fGridCellSize;
+	std::vector<BroadPhaseEntry> m_vBroadPhase;
+	std::unordered_map<int64_t, std::vector<int>> m_mapGrid;
+
+	void removeFromBroadPhase( int sIdx );
+	void insertIntoBroadPhase( int sIdx );
+	std::vector<int64_t> getCellKeys( vec2 v2Min, vec2 v2Max ) const;
 };
@@ -3,6 +3,7 @@
 #include "quatvec.h"
 #include "Util.h"
 #include "EntComponent.h"
+#include "ComponentStore.h"
 
 #include <glm/mat2x2.hpp>
 #include <glm/vec2.hpp>
@@ -32,6 +33,11 @@ struct Shape : public EntComponent
 	EType eType;		// Primitive type
 	glm::vec2 v2Center;	// Center position
 
+	// If we've been bound to a store, the center
+	// and active flag live there (see GetPosition)
+	ShapeStore * pStore;
+	int iStoreIdx;
+
 	// The big union
 	union
 	{
@@ -51,6 +57,10 @@ struct Shape : public EntComponent
 
 	void SetCenterPos( glm::vec2 v2Pos );
 
+	// Move our center and active flag into a store
+	// (appending them), after which gets/sets go through it
+	void BindToStore( ShapeStore * pNewStore );
+
 	bool IsOverlapping( const_ptr<Shape> pOther ) const;
 	bool IsPointInside( const glm::vec2 v2Point ) const;
 
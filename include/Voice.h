@@ -62,11 +62,21 @@ public:
 	// Possibly copy uSamplesDesired of float sampels into pMixBuffer
 	void RenderData( float * const pMixBuffer, const size_t uSamplesDesired, const size_t uSamplePos );
 
+	// Whether RenderData would add anything to pMixBuffer (if this
+	// is false it can be skipped, since it wouldn't change our state)
+	bool WillRender( const size_t uSamplesDesired, const size_t uSamplePos ) const;
+
 	// Various gets
 	EState GetState() const;
 	EState GetPrevState() const;
 	float GetVolume() const;
 	int GetID() const;
+	Clip const * GetClip() const;
+
+	// The sample pos at which we first made noise since we were
+	// last set pending (SIZE_MAX if we haven't yet). This is set when
+	// the trigger res is hit, and may lie past the buffer being rendered
+	size_t GetFirstSoundPos() const;
 
 	// Set the voice to start/stop at the trigger res
 	void SetStopping( const size_t uTriggerRes );
@@ -75,6 +85,14 @@ public:
 	// Set the volume
 	void SetVolume( const float fVol );
 
+	// Play a different clip from now on. This only works if we aren't
+	// making any noise (stopped, or waiting to start), returns false if not
+	bool SetClip( Clip const * pClip );
+
+	// Give up our ID and stop once any tail we're
+	// playing is done, so a new voice can take our place
+	void Detach();
+
 private:
 	int m_iUniqueID;                // The voice identifier, used to uniquely identify it
 	EState m_eState;				// One of the above, determines where samples come from
@@ -83,6 +101,7 @@ private:
 	size_t m_uTriggerRes;           // When actions like starting and stopping occur
 	size_t m_uStartingPos;          // Cached sample pos of when we last started playing
 	size_t m_uLastTailSampleAdded;  // Cached pos of the last tail sample added
+	size_t m_uFirstSoundPos;        // Sample pos of our first audible sample since we were set pending
 	Clip const * m_pClip;           // Pointer to the clip owning the buffer of audio
 
 	// Internal function to set the state/prevState
@@ -0,0 +1,74 @@
+#pragma once
+
+#include <list>
+#include <vector>
+#include <thread>
+#include <atomic>
+#include <exception>
+#include <stdint.h>
+
+// Forward for voice
+class Voice;
+
+/***********************************************
+VoiceRenderPool class - parallel voice rendering
+
+Owns a handful of worker threads that help the
+audio thread render voices. Every thread gets
+a disjoint group of voices (voice i goes to
+group i % N), renders them into its own scratch
+buffer, and the audio thread sums the scratch
+buffers into the mix buffer once they're done.
+
+The fork / join between the audio thread and the
+workers is done with a pair of atomic counters;
+the audio thread bumps a job counter to fork and
+spins on a done counter to join, so it never
+takes a lock or allocates. Idle workers spin for
+a bit, then yield, then nap in short sleeps.
+
+The voices must not be touched by anyone else
+while RenderVoices runs (which is the case on
+the audio thread, the only one that owns them).
+***********************************************/
+
+class VoiceRenderPool
+{
+public:
+	// Construct with the total number of rendering threads (including
+	// the caller of RenderVoices) and the largest buffer we'll render
+	VoiceRenderPool( size_t uNumThreads, size_t uMaxSamples );
+
+	// Destructor stops and joins the workers
+	~VoiceRenderPool();
+
+	// Number of threads rendering (workers + caller)
+	size_t GetNumThreads() const;
+
+	// Render (mix) every voice in liVoices into pMixBuffer, returns false
+	// without rendering anything if uNumSamples is more than we can hold
+	bool RenderVoices( std::list<Voice>& liVoices, float * pMixBuffer, size_t uNumSamples, size_t uSamplePos );
+
+private:
+	// The current job, written by the caller before forking
+	std::list<Voice> * m_pVoices;
+	size_t m_uNumSamples;
+	size_t m_uSamplePos;
+
+	// Fork / join counters and the quit flag
+	std::atomic<uint32_t> m_uJobCounter;
+	std::atomic<uint32_t> m_uNumDone;
+	std::atomic<bool> m_bQuit;
+
+	// Scratch buffers, error slots and threads (one per worker)
+	size_t m_uMaxSamples;
+	std::vector<std::vector<float>> m_vScratch;
+	std::vector<std::exception_ptr> m_vErrors;
+	std::vector<std::thread> m_vWorkers;
+
+	// Render group uGroup's voices into pBuffer
+	void renderGroup( size_t uGroup, float * pBuffer );
+
+	// What each worker thread runs
+	void workerLoop( size_t uWorkerIdx );
+};
@@ -0,0 +1,69 @@
+#pragma once
+
+#include <string>
+#include <vector>
+#include <memory>
+#include <stddef.h>
+#include <stdint.h>
+
+/***********************************************
+WaveformPeaks class - a min/max peak pyramid
+
+Holds the smallest and largest sample of every
+bucket of a buffer of samples, at several sizes
+of bucket. The finest level's buckets span a few
+samples, and each level above merges pairs of the
+level below's, up to a level with a single bucket.
+
+Waveforms are drawn from the level whose buckets
+are just smaller than the samples each column
+of the drawing spans, so any zoom level only
+looks at a couple of buckets per column and
+never at the samples themselves. The pyramid
+takes about 2 / uBucketSamples of the buffer's
+memory (a thirtieth at the default bucket size).
+
+Pyramids can be written to and read from a cache
+file, which is tagged with a hash of the samples
+it was built from so a stale one isn't used.
+***********************************************/
+
+class WaveformPeaks
+{
+public:
+	// Build the pyramid over uNumSamples of pSamples, the finest level's
+	// buckets spanning uBucketSamples each (which must be at least 1)
+	WaveformPeaks( const float * const pSamples, const size_t uNumSamples, const size_t uBucketSamples = 64 );
+
+	// Read a pyramid from a cache file, returns null if it can't be
+	// read or wasn't built from uNumSamples samples hashing to uHash
+	static std::unique_ptr<WaveformPeaks> Load( std::string strFile, const uint64_t uHash, const size_t uNumSamples );
+
+	// Write the pyramid to a cache file, tagged with the hash of its samples
+	bool Save( std::string strFile, const uint64_t uHash ) const;
+
+	size_t GetNumSamples() const;
+	size_t GetNumLevels() const;
+
+	// The number of buckets in a level, and the samples each one spans
+	size_t GetNumBuckets( const size_t uLevel ) const;
+	size_t GetBucketSamples( const size_t uLevel ) const;
+
+	// The [min, max] pairs of a level's buckets, flattened
+	float const * GetLevel( const size_t uLevel ) const;
+
+	// The [min, max] of uNumColumns equal spans of samples
+	// [uBegin, uEnd), flattened into 2 * uNumColumns floats
+	std::vector<float> GetPeaks( const size_t uBegin, const size_t uEnd, const size_t uNumColumns ) const;
+
+private:
+	WaveformPeaks();
+
+	size_t m_uNumSamples;					// How many samples the pyramid covers
+	size_t m_uBucketSamples;				// How many samples the finest buckets span
+	std::vector<float> m_vMinMax;			// Every level's [min, max] pairs, finest first
+	std::vector<size_t> m_vLevelOffsets;	// Where each level's pairs start, with the end last
+
+	// Work out where each level's pairs start from the sample and bucket counts
+	void layoutLevels();
+};
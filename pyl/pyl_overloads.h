@@ -15,6 +15,7 @@ namespace pyl
 	bool convert( PyObject *, glm::fquat& );
 
 	bool convert( PyObject * pObj, ClipLauncher::Command& cmd );
+	bool convert( PyObject * pObj, ClipLauncher::CommandBuffer& cmdBuf );
 	bool convert( PyObject * pObj, SDL_AudioSpec& spec );
 	bool convert( PyObject * o, quatvec& qv );
 	bool convert( PyObject * o, Shape::EType& e );
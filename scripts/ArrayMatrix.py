@@ -0,0 +1,365 @@
+import ClipLauncher as clCMD
+from Cell import Cell
+from Util import addr_from_capsule
+
+# numpy is imported when the first ArrayMatrix is made, so nothing
+# else needs it installed (see ComponentStore.AsNumpy)
+np = None
+
+# A matrix model for grids too big for an entity per cell. Rather than
+# Cell, Row and Column objects with state graphs, every cell's state code,
+# trigger res, volume, clip and row / column live in numpy arrays, along
+# with each row's active and pending cell. Clicks and triggers are applied
+# to whole rows and columns at once, following the rules the entities do:
+#
+#   - A row plays at most one cell, and has at most one pending. A cell
+#     going pending replaces the row's pending cell and sets the active
+#     one stopping; cancelling it sets the active one playing again
+#   - Pending cells start, and stopping cells stop, when the sample pos
+#     increment takes them past their trigger res (less the pre-trigger).
+#     A cell that starts while its row's old cell is stopping leaves the
+#     old one to stop at its own trigger
+#   - Columns have states of their own, which follow their cells' as a
+#     Column's do. Clicking a playing column stops its cells, clicking a
+#     stopping one resumes them, and clicking a stopped one sets them all
+#     pending. A stopping column with a cell that plays again resumes its
+#     stopping cells and starts its pending ones right away
+#
+# Where the entities leave a case undefined (they raise an invalid state
+# transition) this picks something sensible: stopping a column cancels
+# its pending cells, and resuming a cell cancels its row's switch. These
+# are the only differences StateStress should find when it checks us
+# against the entities (see GM_STRESS_ARRAY in main.py)
+#
+# Advance and the clicks return the cells to start and stop, which is what
+# the GM's setOn and setOff hold, and MakeCommands packs them for the clip launcher.
+# Cells are indexed in the order their rows were added; a cell's voice
+# ID is its index plus the nFirstID given at construction, unless its ID
+# is given when it's added. Rows are dealt out to nShards clip launchers
+# in turn, as GrooveMatrix.AddRow does (see PostCommands)
+class ArrayMatrix:
+    # The cell state codes, same as Cell's
+    nStopped = Cell.State.Stopped.nCode
+    nPending = Cell.State.Pending.nCode
+    nPlaying = Cell.State.Playing.nCode
+    nStopping = Cell.State.Stopping.nCode
+
+    # The clip launcher's Command, as a numpy record (see CommandBuffer)
+    dtCommand = None
+
+    def __init__(self, nPreTrigger, nFirstID = 0, nShards = 1):
+        global np
+        if np is None:
+            import numpy as np
+            ArrayMatrix.dtCommand = np.dtype([('eID', np.intc), ('pClip', np.uintp), ('iData', np.intc),
+                                              ('fData', np.float32), ('uData', np.uintp)], align = True)
+
+        self.nPreTrigger = nPreTrigger
+        self.nFirstID = nFirstID
+        self.nShards = nShards
+
+        # Per cell
+        self.anState = np.zeros(0, np.int8)
+        self.anTriggerRes = np.zeros(0, np.int64)
+        self.afVolume = np.zeros(0, np.float32)
+        self.anClipAddr = np.zeros(0, np.uintp)
+        self.anRow = np.zeros(0, np.int32)
+        self.anCol = np.zeros(0, np.int32)
+        self.anVoiceID = np.zeros(0, np.intc)
+        self.anShard = np.zeros(0, np.int32)
+
+        # Clips to use when sounding cells are next pending (0 if none, see SetClip)
+        self.anNextClipAddr = np.zeros(0, np.uintp)
+        self.anNextTriggerRes = np.zeros(0, np.int64)
+
+        # Per row, -1 means none
+        self.liRowNames = []
+        self.anActive = np.zeros(0, np.int32)
+        self.anPending = np.zeros(0, np.int32)
+
+        # Per column, and each column's cells (rebuilt as rows are added)
+        self.anColState = np.zeros(0, np.int8)
+        self.anColSize = np.zeros(0, np.int64)
+        self.liColCells = []
+
+    # Add rows from a dict of Row.RowData, whose clips must be registered
+    # (the same thing GrooveMatrix.AddRows takes), in one go. The cells'
+    # voice IDs can be given, in order, otherwise they follow their indices
+    def AddRows(self, diRowData, liVoiceIDs = None):
+        nRow0 = len(self.liRowNames)
+        nCell0 = len(self.anState)
+        liClips = [(nRow, nCol, cClip, rowData.fVol0)
+                   for nRow, rowData in enumerate(diRowData.values(), nRow0)
+                   for nCol, cClip in enumerate(rowData.liClipData)]
+        nCells = len(liClips)
+
+        self.anState = np.concatenate((self.anState, np.full(nCells, ArrayMatrix.nStopped, np.int8)))
+        self.anTriggerRes = np.concatenate((self.anTriggerRes, np.fromiter((c.GetNumSamples(False) for _, _, c, _ in liClips), np.int64, nCells)))
+        self.afVolume = np.concatenate((self.afVolume, np.fromiter((f for _, _, _, f in liClips), np.float32, nCells)))
+        self.anClipAddr = np.concatenate((self.anClipAddr, np.fromiter((addr_from_capsule(c.c_ptr) for _, _, c, _ in liClips), np.uintp, nCells)))
+        self.anRow = np.concatenate((self.anRow, np.fromiter((r for r, _, _, _ in liClips), np.int32, nCells)))
+        self.anCol = np.concatenate((self.anCol, np.fromiter((c for _, c, _, _ in liClips), np.int32, nCells)))
+        if liVoiceIDs is None:
+            liVoiceIDs = range(self.nFirstID + nCell0, self.nFirstID + nCell0 + nCells)
+        elif len(liVoiceIDs) != nCells:
+            raise ValueError('Error: Need a voice ID for each cell', len(liVoiceIDs), nCells)
+        self.anVoiceID = np.concatenate((self.anVoiceID, np.fromiter(liVoiceIDs, np.intc, nCells)))
+        self.anShard = np.concatenate((self.anShard, self.anRow[nCell0:] % self.nShards))
+        self.anNextClipAddr = np.concatenate((self.anNextClipAddr, np.zeros(nCells, np.uintp)))
+        self.anNextTriggerRes = np.concatenate((self.anNextTriggerRes, np.zeros(nCells, np.int64)))
+
+        self.liRowNames += list(diRowData.keys())
+        self.anActive = np.concatenate((self.anActive, np.full(len(diRowData), -1, np.int32)))
+        self.anPending = np.concatenate((self.anPending, np.full(len(diRowData), -1, np.int32)))
+
+        nCols = int(self.anCol.max()) + 1 if len(self.anCol) else 0
+        self.liColCells = [np.flatnonzero(self.anCol == nCol) for nCol in range(nCols)]
+        self.anColSize = np.bincount(self.anCol, minlength = nCols)
+        self.anColState = np.concatenate((self.anColState, np.full(nCols - len(self.anColState), ArrayMatrix.nStopped, np.int8)))
+
+    def GetNumCells(self):
+        return len(self.anState)
+
+    def GetNumRows(self):
+        return len(self.liRowNames)
+
+    def GetNumCols(self):
+        return len(self.liColCells)
+
+    # The cell at nCol in row nRow, rows shorter than that have none
+    def GetCell(self, nRow, nCol):
+        aCells = self.liColCells[nCol]
+        i = np.searchsorted(self.anRow[aCells], nRow)
+        if i == len(aCells) or self.anRow[aCells[i]] != nRow:
+            raise IndexError('Error: Row {} has no cell in column {}'.format(nRow, nCol))
+        return int(aCells[i])
+
+    def GetVoiceIDs(self, aCells):
+        return self.anVoiceID[aCells]
+
+    def SetRowVolume(self, nRow, fVolume):
+        self.afVolume[self.anRow == nRow] = fVolume
+
+    # The cells that have a voice (playing or stopping)
+    def GetSoundingCells(self):
+        return np.flatnonzero((self.anState == ArrayMatrix.nPlaying) | (self.anState == ArrayMatrix.nStopping))
+
+    # Give cells a new clip (i.e one that was replaced), as Cell.SetClip does:
+    # sounding cells keep the clip their voice has till they're next pending
+    def SetClip(self, aCells, nClipAddr, nTriggerRes):
+        aCells = np.asarray(aCells, np.intp)
+        aState = self.anState[aCells]
+        bSounding = (aState == ArrayMatrix.nPlaying) | (aState == ArrayMatrix.nStopping)
+        self.anNextClipAddr[aCells[bSounding]] = nClipAddr
+        self.anNextTriggerRes[aCells[bSounding]] = nTriggerRes
+        self.anClipAddr[aCells[~bSounding]] = nClipAddr
+        self.anTriggerRes[aCells[~bSounding]] = nTriggerRes
+
+    # Make cells pending (at most one per row), replacing their
+    # rows' pending cells and setting their active cells stopping
+    def _SetPending(self, aCells):
+        aRows = self.anRow[aCells]
+        aOld = self.anPending[aRows]
+        self.anState[aOld[aOld >= 0]] = ArrayMatrix.nStopped
+        aActive = self.anActive[aRows]
+        aActive = aActive[aActive >= 0]
+        self.anState[aActive[self.anState[aActive] == ArrayMatrix.nPlaying]] = ArrayMatrix.nStopping
+        self.anState[aCells] = ArrayMatrix.nPending
+        self.anPending[aRows] = aCells
+
+        # Cells whose clip was replaced while they played use the new one now
+        aNext = aCells[self.anNextClipAddr[aCells] != 0]
+        self.anClipAddr[aNext] = self.anNextClipAddr[aNext]
+        self.anTriggerRes[aNext] = self.anNextTriggerRes[aNext]
+        self.anNextClipAddr[aNext] = 0
+
+    # Stop pending cells, their rows' active cells play on
+    def _CancelPending(self, aCells):
+        aRows = self.anRow[aCells]
+        self.anState[aCells] = ArrayMatrix.nStopped
+        self.anPending[aRows] = -1
+        aActive = self.anActive[aRows]
+        aActive = aActive[aActive >= 0]
+        self.anState[aActive[self.anState[aActive] == ArrayMatrix.nStopping]] = ArrayMatrix.nPlaying
+
+    # Set stopping cells playing again, cancelling their rows' switches
+    def _Resume(self, aCells):
+        aRows = self.anRow[aCells]
+        aPending = self.anPending[aRows]
+        self.anState[aPending[aPending >= 0]] = ArrayMatrix.nStopped
+        self.anPending[aRows] = -1
+        self.anState[aCells] = ArrayMatrix.nPlaying
+
+    # Start pending cells now, returns the cells to start and any old
+    # active cells that had to be stopped to make way for them (those
+    # still stopping are left to stop at their trigger)
+    def _Start(self, aCells):
+        aRows = self.anRow[aCells]
+        aOld = self.anActive[aRows]
+        aOld = aOld[aOld >= 0]
+        aOld = aOld[self.anState[aOld] == ArrayMatrix.nPlaying]
+        self.anState[aOld] = ArrayMatrix.nStopped
+        self.anState[aCells] = ArrayMatrix.nPlaying
+        self.anActive[aRows] = aCells
+        self.anPending[aRows] = -1
+        return aCells, aOld
+
+    # Set columns playing again, which resumes their stopping
+    # cells and starts their pending ones right away (as Columns do);
+    # returns the cells to start and stop
+    def _ResumeColumns(self, aCols):
+        self.anColState[aCols] = ArrayMatrix.nPlaying
+        bCol = np.zeros(len(self.anColState), bool)
+        bCol[aCols] = True
+        bCell = bCol[self.anCol]
+        self._Resume(np.flatnonzero(bCell & (self.anState == ArrayMatrix.nStopping)))
+        return self._Start(np.flatnonzero(bCell & (self.anState == ArrayMatrix.nPending)))
+
+    # Move columns to the states their cells put them in, the way Columns
+    # advance while the GM solves the state graph; returns the cells
+    # any resuming columns start and stop
+    def _UpdateColumns(self):
+        nCols = len(self.anColState)
+        def count(nState):
+            return np.bincount(self.anCol[self.anState == nState], minlength = nCols)
+        liOn, liOff = [], []
+
+        # A column can move twice (e.g stopping to playing to stopping)
+        for i in range(4):
+            anPending, anPlaying = count(ArrayMatrix.nPending), count(ArrayMatrix.nPlaying)
+            bAllStopped = count(ArrayMatrix.nStopped) == self.anColSize
+            anNew = self.anColState.copy()
+
+            bCol = self.anColState == ArrayMatrix.nStopped
+            anNew[bCol & (anPending > 0)] = ArrayMatrix.nPending
+            bCol = self.anColState == ArrayMatrix.nPending
+            anNew[bCol & bAllStopped] = ArrayMatrix.nStopped
+            anNew[bCol & (anPlaying > 0)] = ArrayMatrix.nPlaying
+            bCol = self.anColState == ArrayMatrix.nPlaying
+            anNew[bCol & (anPending == 0) & (anPlaying == 0)] = ArrayMatrix.nStopping
+            bCol = self.anColState == ArrayMatrix.nStopping
+            anNew[bCol & bAllStopped] = ArrayMatrix.nStopped
+            bResume = bCol & (anPlaying > 0)
+
+            if (anNew == self.anColState).all() and not bResume.any():
+                break
+            self.anColState = anNew
+            aOn, aOff = self._ResumeColumns(np.flatnonzero(bResume))
+            liOn.append(aOn)
+            liOff.append(aOff)
+
+        return ArrayMatrix._Join(liOn), ArrayMatrix._Join(liOff)
+
+    @staticmethod
+    def _Join(liCells):
+        return np.concatenate(liCells) if liCells else np.zeros(0, np.intp)
+
+    # Clicks return the cells to start and stop. A click can start cells
+    # right away, i.e a row with only a pending cell starts it, as does
+    # a column going from stopping to playing
+
+    # Clicking a cell does what clicking a Cell does
+    def ClickCell(self, nCell):
+        aCells = np.array([nCell])
+        nState = self.anState[nCell]
+        if nState == ArrayMatrix.nStopped:
+            self._SetPending(aCells)
+        elif nState == ArrayMatrix.nPending:
+            self._CancelPending(aCells)
+        elif nState == ArrayMatrix.nPlaying:
+            self.anState[nCell] = ArrayMatrix.nStopping
+        else:
+            self._Resume(aCells)
+        return self._UpdateColumns()
+
+    # Clicking a row cancels its switch, or stops or resumes its active cell
+    def ClickRow(self, nRow):
+        nActive, nPending = self.anActive[nRow], self.anPending[nRow]
+        liOn, liOff = [], []
+        if nPending >= 0:
+            if nActive >= 0:
+                self._CancelPending(np.array([nPending]))
+            else:
+                aOn, aOff = self._Start(np.array([nPending]))
+                liOn.append(aOn)
+                liOff.append(aOff)
+        elif nActive >= 0:
+            if self.anState[nActive] == ArrayMatrix.nPlaying:
+                self.anState[nActive] = ArrayMatrix.nStopping
+            else:
+                self._Resume(np.array([nActive]))
+        aOn, aOff = self._UpdateColumns()
+        return ArrayMatrix._Join(liOn + [aOn]), ArrayMatrix._Join(liOff + [aOff])
+
+    # Clicking a column does what clicking a Column does
+    def ClickColumn(self, nCol):
+        aCells = self.liColCells[nCol]
+        aState = self.anState[aCells]
+        nColState = self.anColState[nCol]
+        liOn, liOff = [], []
+        if nColState == ArrayMatrix.nStopped:
+            self.anColState[nCol] = ArrayMatrix.nPending
+            self._SetPending(aCells[aState == ArrayMatrix.nStopped])
+        elif nColState == ArrayMatrix.nPending:
+            self.anColState[nCol] = ArrayMatrix.nStopped
+        elif nColState == ArrayMatrix.nPlaying:
+            self.anColState[nCol] = ArrayMatrix.nStopping
+            self._CancelPending(aCells[aState == ArrayMatrix.nPending])
+            aState = self.anState[aCells]
+            self.anState[aCells[aState == ArrayMatrix.nPlaying]] = ArrayMatrix.nStopping
+        else:
+            aOn, aOff = self._ResumeColumns(np.array([nCol]))
+            liOn.append(aOn)
+            liOff.append(aOff)
+        aOn, aOff = self._UpdateColumns()
+        return ArrayMatrix._Join(liOn + [aOn]), ArrayMatrix._Join(liOff + [aOff])
+
+    # Start every pending cell, which the GM does when the clip launcher
+    # isn't playing yet; returns the cells to start and stop
+    def StartPending(self):
+        aOn, aOff = self._Start(np.flatnonzero(self.anState == ArrayMatrix.nPending))
+        aColOn, aColOff = self._UpdateColumns()
+        return np.concatenate((aOn, aColOn)), np.concatenate((aOff, aColOff))
+
+    # Advance over nInc samples from nCurPos, starting and stopping
+    # the cells whose triggers are hit. Returns the cells to start and
+    # the cells to stop (the GM's setOn and setOff, as cell indices)
+    def Advance(self, nCurPos, nInc):
+        aTrigger = self.anTriggerRes - self.nPreTrigger
+        bHit = (nCurPos < aTrigger) & (aTrigger <= nCurPos + nInc)
+
+        # Stop first, so rows switching cells are free for the new ones
+        aOff = np.flatnonzero(bHit & (self.anState == ArrayMatrix.nStopping))
+        self.anState[aOff] = ArrayMatrix.nStopped
+        aRows = self.anRow[aOff]
+        self.anActive[aRows[self.anActive[aRows] == aOff]] = -1
+
+        aOn, aOld = self._Start(np.flatnonzero(bHit & (self.anState == ArrayMatrix.nPending)))
+        aColOn, aColOff = self._UpdateColumns()
+        return np.concatenate((aOn, aColOn)), np.concatenate((aOff, aOld, aColOff))
+
+    # Pack start, stop and set volume commands, ready for HandleCommandBuffer
+    def MakeCommands(self, aOn, aOff, aVolume = ()):
+        aCells = np.concatenate((aOn, aOff, aVolume)).astype(np.intp)
+        arrCmds = np.zeros(len(aCells), ArrayMatrix.dtCommand)
+        arrCmds['eID'][:len(aOn)] = clCMD.cmdStartVoice
+        arrCmds['eID'][len(aOn):len(aOn) + len(aOff)] = clCMD.cmdStopVoice
+        arrCmds['eID'][len(aOn) + len(aOff):] = clCMD.cmdSetVolume
+        arrCmds['pClip'] = self.anClipAddr[aCells]
+        arrCmds['iData'] = self.GetVoiceIDs(aCells)
+        arrCmds['fData'] = self.afVolume[aCells]
+        arrCmds['uData'] = self.anTriggerRes[aCells]
+        return arrCmds
+
+    # Post the commands to the clip launchers that play the cells' voices,
+    # one packed buffer each (like PostShardedCellCommands); returns False
+    # if there were none
+    def PostCommands(self, liClipLaunchers, aOn, aOff, aVolume = ()):
+        if len(aOn) + len(aOff) + len(aVolume) == 0:
+            return False
+        arrCmds = self.MakeCommands(aOn, aOff, aVolume)
+        if len(liClipLaunchers) == 1:
+            return liClipLaunchers[0].HandleCommandBuffer(arrCmds)
+        anShard = self.anShard[np.concatenate((aOn, aOff, aVolume)).astype(np.intp)]
+        return any([cl.HandleCommandBuffer(arrCmds[anShard == i])
+                    for i, cl in enumerate(liClipLaunchers) if (anShard == i).any()])
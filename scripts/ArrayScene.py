@@ -0,0 +1,130 @@
+import numpy as np
+
+from ArrayMatrix import ArrayMatrix
+from ComponentStore import AsNumpy
+from Util import addr_from_capsule
+from Cell import Cell
+from Row import Row
+from Column import Column
+
+# Drives a scene with an ArrayMatrix rather than its entities' state graphs
+# (see GrooveMatrix.StartArrayMatrix). The entities stay put in their
+# stopped states, and are only used for what they are on screen: clicks
+# on them go to the array model, the cells it starts and stops are posted
+# to the clip launchers with the frame's commands, and their drawables
+# are colored as they would be. Voices keep the cells' IDs, so meters
+# and latency stamps find them
+class ArrayScene:
+    def __init__(self, GM, scene):
+        self.mGM = GM
+        self.mScene = scene
+
+        # Cells are indexed in row order, rows and columns as the scene has them
+        liRows = list(scene.diRows.values())
+        self.liCells = [c for row in liRows for c in row.liCells]
+        self.diIdx = {c : i for i, c in enumerate(self.liCells)}
+        self.diIdx.update({row : i for i, row in enumerate(liRows)})
+        self.diIdx.update({col : i for i, col in enumerate(scene.liCols)})
+
+        self.mArray = ArrayMatrix(GM.GetPreTrigger(), nShards = len(GM.GetClipLaunchers()))
+        self.mArray.AddRows({strName : Row.RowData([c.cClip for c in row.liCells], row.clrOn, row.clrOff, 1.)
+                             for strName, row in scene.diRows.items()}, [c.nID for c in self.liCells])
+        self.mArray.afVolume[:] = [c.fVolume for c in self.liCells]
+
+        # Each cell's drawable and colors, for coloring many at once
+        self.anDrIdx = np.array([c.nDrIdx for c in self.liCells], np.intp)
+        self.afOnColors = np.array([c.mRow.clrOn for c in self.liCells], np.float32).reshape(-1, 4)
+        self.afOffColors = np.array([c.mRow.clrOff for c in self.liCells], np.float32).reshape(-1, 4)
+
+        # Cells to start, stop and send volumes to with the frame's commands
+        self.liOn, self.liOff, self.liVolume = [], [], []
+
+    # Click an entity's array counterpart
+    def Click(self, ent):
+        nIdx = self.diIdx[ent]
+        if isinstance(ent, Cell):
+            aOn, aOff = self.mArray.ClickCell(nIdx)
+        elif isinstance(ent, Row):
+            aOn, aOff = self.mArray.ClickRow(nIdx)
+        elif isinstance(ent, Column):
+            aOn, aOff = self.mArray.ClickColumn(nIdx)
+        else:
+            return
+        self._Add(aOn, aOff)
+
+    # The cells a click on ent would start voices for, see GrooveMatrix._StampClick
+    def GetLaunchedCells(self, ent):
+        if isinstance(ent, Cell) and self.mArray.anState[self.diIdx[ent]] == ArrayMatrix.nStopped:
+            return [ent]
+        if isinstance(ent, Column) and self.mArray.anColState[self.diIdx[ent]] == ArrayMatrix.nStopped:
+            return ent.setCells
+        return []
+
+    def SetVolume(self, cell, fVolume):
+        nIdx = self.diIdx[cell]
+        self.mArray.afVolume[nIdx] = fVolume
+        if self.mArray.anState[nIdx] in (ArrayMatrix.nPlaying, ArrayMatrix.nStopping):
+            self.liVolume.append(nIdx)
+
+    # Give the cells using a clip its replacement (see ArrayMatrix.SetClip)
+    def SetClip(self, strClipName, cClip):
+        aCells = [i for i, c in enumerate(self.liCells) if c.strClipName == strClipName]
+        if len(aCells):
+            self.mArray.SetClip(aCells, addr_from_capsule(cClip.c_ptr), cClip.GetNumSamples(False))
+
+    # Start the pending cells, which is how the GM starts playing;
+    # returns False (posting nothing) if there weren't any
+    def StartPending(self):
+        aOn, aOff = self.mArray.StartPending()
+        if len(aOn) == 0:
+            return False
+        self._Add(aOn, aOff)
+        self.Post()
+        return True
+
+    # Start and stop the cells whose triggers the GM is about to advance over
+    def Advance(self, nCurPos, nInc):
+        self._Add(*self.mArray.Advance(nCurPos, nInc))
+
+    # Post the commands since the last post
+    def Post(self):
+        aOn = np.concatenate(self.liOn) if self.liOn else np.zeros(0, np.intp)
+        aOff = np.concatenate(self.liOff) if self.liOff else np.zeros(0, np.intp)
+        aVolume = np.array(self.liVolume, np.intp)
+        self.liOn, self.liOff, self.liVolume = [], [], []
+        return self.mArray.PostCommands(self.mGM.GetClipLaunchers(), aOn, aOff, aVolume)
+
+    # Stop every voice and go back to all stopped, which is where the entities are
+    def Reset(self):
+        aOff = self.mArray.GetSoundingCells()
+        self.mArray.anState[:] = ArrayMatrix.nStopped
+        self.mArray.anColState[:] = ArrayMatrix.nStopped
+        self.mArray.anActive[:] = -1
+        self.mArray.anPending[:] = -1
+        self.liOn, self.liOff, self.liVolume = [], [aOff], []
+        self._Show(np.zeros(0, np.intp), np.arange(len(self.liCells)))
+        self.Post()
+
+    # Every cell's state code, then every column's, which replays digest
+    def GetStateString(self):
+        return ','.join(str(n) for n in self.mArray.anState) + ';' + ','.join(str(n) for n in self.mArray.anColState)
+
+    def _Add(self, aOn, aOff):
+        self.liOn.append(aOn)
+        self.liOff.append(aOff)
+        self._Show(aOn, aOff)
+
+    # Color cells the way their states do when they start and stop: started
+    # ones are on, sweeping from the sample their voice lines up with
+    # (see Cell.GetTriggerSample), and stopped ones are off
+    def _Show(self, aOn, aOff):
+        mComponentViews = self.mGM.GetComponentViews()
+        arrColors, arrPlayback = AsNumpy(mComponentViews.drColors), AsNumpy(mComponentViews.drPlayback)
+        arrColors[self.anDrIdx[aOff]] = self.afOffColors[aOff]
+        arrPlayback[self.anDrIdx[aOff]] = 0
+
+        anRes = self.mArray.anTriggerRes[aOn]
+        nNewPos = self.mGM.GetCurrentSamplePos() + self.mGM.GetCurrentSamplePosInc()
+        arrColors[self.anDrIdx[aOn]] = self.afOnColors[aOn]
+        arrPlayback[self.anDrIdx[aOn], 0] = anRes * ((nNewPos + anRes - 1) // anRes)
+        arrPlayback[self.anDrIdx[aOn], 1] = anRes
@@ -2,34 +2,91 @@ import StateGraph
 from MatrixEntity import MatrixEntity
 
 import contextlib
-import networkx as nx
 
 import Shape
+from Util import addr_from_capsule
+
+# Rows and Columns own one of these, and their cells keep
+# it up to date as they change state, so that checks like
+# "are any of my cells pending" don't have to scan cells
+class CellStateCounts:
+    def __init__(self):
+        self.liCounts = [0] * Cell.State.nNumCodes
+        self.nCells = 0
+
+    # Move a cell from one state code to another, where
+    # None means the cell is entering or leaving the count
+    def Move(self, nPrev, nNext):
+        if nPrev is None:
+            self.nCells += 1
+        else:
+            self.liCounts[nPrev] -= 1
+        if nNext is None:
+            self.nCells -= 1
+        else:
+            self.liCounts[nNext] += 1
+
+    # How many cells are in the given state
+    def Count(self, stateType):
+        return self.liCounts[stateType.nCode]
+
+    # True if any cells are in any of the given states
+    def Any(self, *liStateTypes):
+        return any(self.liCounts[s.nCode] for s in liStateTypes)
+
+    # True if every cell is in one of the given states
+    # (which, like all(), is the case if there are no cells)
+    def All(self, *liStateTypes):
+        return sum(self.liCounts[s.nCode] for s in liStateTypes) == self.nCells
 
 class Cell(MatrixEntity):
     # Cells are represented by a circle with this radius
     nRadius = 25
 
+    # The model used for every cell's drawable
+    strIqmFile = '../models/circle.iqm'
+
     # Constructor takes GM, row, a clip, and the initial volume
-    def __init__(self, GM, row, cClip, fVolume):
+    # If the UI components were already made in bulk (see
+    # MatrixUI.AddCells) their indices can be passed in
+    def __init__(self, GM, row, cClip, fVolume, nShIdx = -1, nDrIdx = -1):
         # Store cClip ref and volume
         self.cClip = cClip
         self.fVolume = float(fVolume)
         self.mRow = row
+        self.mCol = None
 
-        # Every cell has a trigger resolution
-        # which for now is just its duration
-        self.nTriggerRes = self.cClip.GetNumSamples(False)
+        # Which of the GM's clip launchers plays our voice (see GrooveMatrix.AddRow)
+        self.nShard = 0
+
+        # Clips can be replaced while we play (see SetClip), they're
+        # looked up by name and we wait till we stop to use the new one
+        self.strClipName = self.cClip.GetName()
+        self.cNextClip = None
 
-        # Set up UI components
-        self.nShIdx = GM.cMatrixUI.AddShape(Shape.Circle, [0, 0], {'r' : Cell.nRadius})
-        self.nDrIdx = GM.cMatrixUI.AddDrawableIQM('../models/circle.iqm', [0, 0], 2 * [2*Cell.nRadius], [0, 0, 0, 1], 0. )
+        # Our state's code, which our row and column count
+        # (this gets set when the initial state activates)
+        self.nStateCode = None
+
+        # Cache the clip's address and trigger res
+        self._UseClip(self.cClip)
+
+        # Set up UI components if they weren't provided
+        self.nShIdx = nShIdx
+        if self.nShIdx < 0:
+            self.nShIdx = GM.cMatrixUI.AddShape(Shape.Circle, [0, 0], {'r' : Cell.nRadius})
+        self.nDrIdx = nDrIdx
+        if self.nDrIdx < 0:
+            self.nDrIdx = GM.cMatrixUI.AddDrawableIQM(Cell.strIqmFile, [0, 0], 2 * [2*Cell.nRadius], [0, 0, 0, 1], 0. )
 
         if self.nShIdx < 0:
             raise RuntimeError('Error creating Shape')
         if self.nDrIdx < 0:
             raise RuntimeError('Error creating Drawable')
 
+        # Our waveform thumbnail's drawable, if we're given one (see GrooveMatrix.AddWaveforms)
+        self.nWaveDrIdx = -1
+
         # Create state graph nodes
         pending = Cell.State.Pending(self)
         playing = Cell.State.Playing(self)
@@ -37,7 +94,7 @@ class Cell(MatrixEntity):
         stopped = Cell.State.Stopped(self)
 
         # Create di graph and add states
-        G = nx.DiGraph()
+        G = StateGraph.DiGraph()
         G.add_edge(pending, playing)
         G.add_edge(pending, stopped)
         G.add_edge(stopped, pending)
@@ -54,8 +111,33 @@ class Cell(MatrixEntity):
     # Until I can find a way to get both row and col in constructor
     # Column constructor should call this
     def SetCol(self, col):
-        if isinstance(col, Column):
+        if isinstance(col, Column) and col is not self.mCol:
+            # Move our state from the old column's count to the new one
+            if self.mCol is not None:
+                self.mCol.mCellCounts.Move(self.nStateCode, None)
             self.mCol = col
+            self.mCol.mCellCounts.Move(None, self.nStateCode)
+
+    # Cache the clip's address for packed command buffers, and set
+    # our trigger resolution (which for now is just its duration)
+    def _UseClip(self, cClip):
+        self.cClip = cClip
+        self.nClipAddr = addr_from_capsule(self.cClip.c_ptr)
+        self.nTriggerRes = self.cClip.GetNumSamples(False)
+        self.cNextClip = None
+
+        # If we're waiting on our trigger, it's moved
+        if self.nStateCode in Cell.State.setArmedCodes:
+            self._ArmTrigger()
+
+    # Play a different clip from now on (i.e one that was replaced). Our
+    # voice keeps the clip it's sounding (and stops at its trigger res), so
+    # if we've been playing the new clip is used the next time we're pending
+    def SetClip(self, cClip):
+        if self.nStateCode in (Cell.State.Playing.nCode, Cell.State.Stopping.nCode):
+            self.cNextClip = cClip
+        else:
+            self._UseClip(cClip)
 
     def GetRow(self):
         return self.mRow
@@ -63,18 +145,43 @@ class Cell(MatrixEntity):
     def GetCol(self):
         return self.mCol
 
+    # Called by our states as they activate, keeps
+    # our row and column's cell state counts current
+    def _SetStateCode(self, nCode):
+        nPrev, self.nStateCode = self.nStateCode, nCode
+        for ent in (self.mRow, self.mCol):
+            if ent is not None:
+                ent.mCellCounts.Move(nPrev, nCode)
+        self._ArmTrigger()
+
+    # Keep the GM's trigger index up to date with our state and trigger res
+    def _ArmTrigger(self):
+        if self.nStateCode in Cell.State.setArmedCodes:
+            self.mGM.mTriggerIndex.Arm(self.nID, self.nTriggerRes - self.mGM.GetPreTrigger())
+        else:
+            self.mGM.mTriggerIndex.Disarm(self.nID)
+
     # Get our trigger resolution
     def GetTriggerRes(self):
         return self.nTriggerRes
 
+    # True if the current sample pos increment takes us past our
+    # trigger (less the pre-trigger), which the GM's index knows
     def WillTriggerBeHit(self):
-        nCurPos = self.mGM.GetCurrentSamplePos()
-        nNewPos = nCurPos + self.mGM.GetCurrentSamplePosInc()
-        nTrigger = self.GetTriggerRes() - self.mGM.GetPreTrigger()
-        return nCurPos < nTrigger and nNewPos >= nTrigger
+        return self.mGM.mTriggerIndex.IsHit(self.nID)
 
-    # Cell States
+    # The sample our voice lines up with, which is the
+    # next multiple of our trigger res from where we are
+    def GetTriggerSample(self):
+        nRes = self.GetTriggerRes()
+        nNewPos = self.mGM.GetCurrentSamplePos() + self.mGM.GetCurrentSamplePosInc()
+        return nRes * ((nNewPos + nRes - 1) // nRes)
+
+    # Cell States - each has an integer code (nCode)
+    # that indexes our row and column's state counts
     class State:
+        nNumCodes = 4
+
         class _state(MatrixEntity._state):
             def __init__(self, cell, name):
                 if not(isinstance(cell, Cell)):
@@ -85,16 +192,20 @@ class Cell(MatrixEntity):
         # The stopped cell indicates that this cell's voice is quiet
         # It will go to pending if clicked or if the column is pending
         class Stopped(_state):
+            nCode = 0
+
             def __init__(self, cell):
                 super(type(self), self).__init__(cell, 'Stopped')
 
             @contextlib.contextmanager
             def Activate(self, SG, prevState):
+                self.mCell._SetStateCode(self.nCode)
                 # If we were stopping, stop any voices
                 if isinstance(prevState, Cell.State.Stopping):
                     self.mCell.GetGrooveMatrix().StopCell(self.mCell)
-                # set the color to off
-                self.mCell.GetDrawable().SetColor(self.mCell.mRow.clrOff)
+                # set the color to off and stop showing progress
+                self.mCell.SetColor(self.mCell.mRow.clrOff)
+                self.mCell.SetPlayback(0, 0)
                 yield
 
             # Clicking a stopped cell will make it pending
@@ -109,11 +220,17 @@ class Cell(MatrixEntity):
         # and stopped if clicked. Rows and colums will see a pending cell
         # and advance if necessary
         class Pending(_state):
+            nCode = 1
+
             def __init__(self, cell):
                 super(type(self), self).__init__(cell, 'Pending')
 
             @contextlib.contextmanager
             def Activate(self, SG, prevState):
+                self.mCell._SetStateCode(self.nCode)
+                # If our clip was replaced while we played, start the new one
+                if self.mCell.cNextClip is not None:
+                    self.mCell._UseClip(self.mCell.cNextClip)
                 # The cell should start flashing or something
                 yield
 
@@ -128,20 +245,25 @@ class Cell(MatrixEntity):
 
         # Playing state means this cell's voice is playing
         class Playing(_state):
+            nCode = 2
+
             def __init__(self, cell):
                 super(type(self), self).__init__(cell, 'Playing')
 
             @contextlib.contextmanager
             def Activate(self, SG, prevState):
+                self.mCell._SetStateCode(self.nCode)
                 # If previously pending, we should have been the row's pending cell
                 if isinstance(prevState, Cell.State.Pending):
                     if self.mCell.GetRow().GetPendingCell() is not self.mCell:
                         raise RuntimeError('Weird state transition')
                 # If we weren't already playing, tell GM to play our stuff
+                # and have our drawable sweep along from the trigger sample
                 if not(isinstance(prevState, Cell.State.Stopping)):
                     self.mCell.mGM.StartCell(self.mCell)
+                    self.mCell.SetPlayback(self.mCell.GetTriggerSample(), self.mCell.GetTriggerRes())
                 # set color to on
-                self.mCell.GetDrawable().SetColor(self.mCell.mRow.clrOn)
+                self.mCell.SetColor(self.mCell.mRow.clrOn)
                 yield
 
             # Set to stopping if clicked
@@ -155,11 +277,14 @@ class Cell(MatrixEntity):
                 pass
 
         class Stopping(_state):
+            nCode = 3
+
             def __init__(self, cell):
                 super(type(self), self).__init__(cell, 'Stopping')
 
             @contextlib.contextmanager
             def Activate(self, SG, prevState):
+                self.mCell._SetStateCode(self.nCode)
                 yield
 
             # Revert to playing if stopping clicked
@@ -173,5 +298,8 @@ class Cell(MatrixEntity):
                 if self.mCell.WillTriggerBeHit():
                     return Cell.State.Stopped(self.mCell)
 
+        # The states in which we wait on our trigger (see TriggerIndex)
+        setArmedCodes = {Pending.nCode, Stopping.nCode}
+
 from Row import Row
 from Column import Column
@@ -5,11 +5,10 @@ from Util import Constants
 import Shape
 
 import contextlib
-import networkx as nx
 from collections import namedtuple
 
 from Util import Constants
-from Cell import Cell
+from Cell import Cell, CellStateCounts
 
 class Column(MatrixEntity):
     nTriDim = 50
@@ -42,6 +41,9 @@ class Column(MatrixEntity):
         if self.nDrIdx < 0:
             raise RuntimeError('Error creating Drawable')
 
+        # Our cells keep this count of their states up to date
+        self.mCellCounts = CellStateCounts()
+
         # If a GM instance is making us with cells, they get stored here
         self.setCells = {c for c in setCells if isinstance(c, Cell)}
         for c in self.setCells:
@@ -53,7 +55,7 @@ class Column(MatrixEntity):
         stopping = Column.State.Stopping(self)
 
         # Create di graph and add states
-        G = nx.DiGraph()
+        G = StateGraph.DiGraph()
         G.add_edge(pending, playing)
         G.add_edge(stopped, pending)
         G.add_edge(playing, stopping)
@@ -101,7 +103,7 @@ class Column(MatrixEntity):
 
             def Advance(self):
                 # If any of our cells are pending, then we are pending
-                if any(isinstance(c.GetActiveState(), Cell.State.Pending) for c in self.mCol.setCells):
+                if self.mCol.mCellCounts.Any(Cell.State.Pending):
                     return Column.State.Pending(self.mCol, False)
 
             # When a stopped column is clicked,
@@ -138,10 +140,10 @@ class Column(MatrixEntity):
 
             def Advance(self):
                 # Pending to Playing if any cells are playing
-                if any(isinstance(c.GetActiveState(), Cell.State.Playing) for c in self.mCol.setCells):
+                if self.mCol.mCellCounts.Any(Cell.State.Playing):
                     return Column.State.Playing(self.mCol)
                 # Stopped if all are stopped
-                if all(isinstance(c.GetActiveState(), Cell.State.Stopped) for c in self.mCol.setCells):
+                if self.mCol.mCellCounts.All(Cell.State.Stopped):
                     return Column.State.Stopped(self.mCol)
 
         # The playing state of a column indicates that
@@ -167,8 +169,7 @@ class Column(MatrixEntity):
 
             def Advance(self):
                 # If all are stopped or stopping, return stopping
-                if all(isinstance(c.GetActiveState(), Cell.State.Stopping) or
-                       isinstance(c.GetActiveState(), Cell.State.Stopped) for c in self.mCol.setCells):
+                if self.mCol.mCellCounts.All(Cell.State.Stopping, Cell.State.Stopped):
                     return Column.State.Stopping(self.mCol)
 
         # The stopping state of a column is entered if it is clicked while playing,
@@ -183,16 +184,16 @@ class Column(MatrixEntity):
                 # When a column is set to stopping,
                 # all of its cells should be stopping as well
                 for c in self.mCol.setCells:
-                    if not(isinstance(c.GetActiveState(), Cell.State.Stopped)):
+                    if c.nStateCode != Cell.State.Stopped.nCode:
                         c.SetState(Cell.State.Stopping(c))
                 yield
 
             # A column will advance to stopped if all its cells are stopped,
             # and it will revert to playing if any its cells have been set to playing
             def Advance(self):
-                if all(isinstance(c.GetActiveState(), Cell.State.Stopped) for c in self.mCol.setCells):
+                if self.mCol.mCellCounts.All(Cell.State.Stopped):
                     return Column.State.Stopped(self.mCol)
-                if any(isinstance(c.GetActiveState(), Cell.State.Playing) for c in self.mCol.setCells):
+                if self.mCol.mCellCounts.Any(Cell.State.Playing):
                     return Column.State.Playing(self.mCol)
 
             # If a column is stopping and it gets clicked,
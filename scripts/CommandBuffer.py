@@ -0,0 +1,41 @@
+import ctypes
+
+# Mirrors ClipLauncher::Command, field for field; ctypes
+# pads it the same way the C++ compiler does, so an array
+# of these can be handed to HandleCommandBuffer as is
+# (a numpy record array with this layout works too)
+class Command(ctypes.Structure):
+    _fields_ = [('eID', ctypes.c_int),
+                ('pClip', ctypes.c_void_p),
+                ('iData', ctypes.c_int),
+                ('fData', ctypes.c_float),
+                ('uData', ctypes.c_size_t)]
+
+# Packs cells into a contiguous array of commands - each cell
+# provides its clip address, ID, volume, and trigger res
+def MakeCellCommands(liCellCmds):
+    arrCmds = (Command * len(liCellCmds))()
+    for cmd, (eID, cell) in zip(arrCmds, liCellCmds):
+        cmd.eID = eID
+        cmd.pClip = cell.nClipAddr
+        cmd.iData = cell.nID
+        cmd.fData = cell.fVolume
+        cmd.uData = cell.nTriggerRes
+    return arrCmds
+
+# Post the packed commands to the clip launcher, returns
+# False if there was nothing to post
+def PostCellCommands(cClipLauncher, liCellCmds):
+    if len(liCellCmds) == 0:
+        return False
+    return cClipLauncher.HandleCommandBuffer(MakeCellCommands(liCellCmds))
+
+# Post each cell's commands to the clip launcher that plays its voice
+# (its nShard'th), one packed buffer per clip launcher
+def PostShardedCellCommands(liClipLaunchers, liCellCmds):
+    if len(liClipLaunchers) == 1:
+        return PostCellCommands(liClipLaunchers[0], liCellCmds)
+    liShardCmds = [[] for _ in liClipLaunchers]
+    for eID, cell in liCellCmds:
+        liShardCmds[cell.nShard].append((eID, cell))
+    return any([PostCellCommands(cl, liCmds) for cl, liCmds in zip(liClipLaunchers, liShardCmds)])
@@ -0,0 +1,69 @@
+import ctypes
+
+from Util import addr_from_capsule
+
+# Views of MatrixUI's contiguous component stores. Each view
+# is a ctypes array laid over the C++ memory (indexed by drawable
+# or shape index), so writing to it writes straight to what gets
+# drawn / collided. AsNumpy turns a view into a numpy array, still
+# without copying, for vectorized writes over whole rows or columns
+class ComponentViews:
+    def __init__(self, cMatrixUI):
+        self.cMatrixUI = cMatrixUI
+        self.nGeneration = -1
+        self.Refresh()
+
+    # Adding drawables or shapes, or reserving room for more, can move
+    # the stores without changing their counts, so the views are rebuilt
+    # whenever MatrixUI says the stores have changed
+    def Refresh(self):
+        nGeneration = self.cMatrixUI.GetStoreGeneration()
+        if nGeneration == self.nGeneration:
+            return self
+        self.nGeneration = nGeneration
+
+        nDrawables = self.cMatrixUI.GetNumDrawables()
+        self.drColors = self._view(self.cMatrixUI.GetDrawableColorsPtr, ctypes.c_float * 4, nDrawables)
+        self.drPositions = self._view(self.cMatrixUI.GetDrawablePositionsPtr, ctypes.c_float * 3, nDrawables)
+        self.drRotations = self._view(self.cMatrixUI.GetDrawableRotationsPtr, ctypes.c_float * 4, nDrawables)
+        self.drScales = self._view(self.cMatrixUI.GetDrawableScalesPtr, ctypes.c_float * 2, nDrawables)
+        self.drActive = self._view(self.cMatrixUI.GetDrawableActivePtr, ctypes.c_int, nDrawables)
+        self.drPlayback = self._view(self.cMatrixUI.GetDrawablePlaybackPtr, ctypes.c_float * 2, nDrawables)
+
+        nShapes = self.cMatrixUI.GetNumShapes()
+        self.shCenters = self._view(self.cMatrixUI.GetShapeCentersPtr, ctypes.c_float * 2, nShapes)
+        self.shActive = self._view(self.cMatrixUI.GetShapeActivePtr, ctypes.c_int, nShapes)
+
+        return self
+
+    # Set the color of one drawable (colors are expected in [0, 1])
+    def SetColor(self, nDrIdx, clr):
+        self.drColors[nDrIdx][:] = clr
+
+    # Set the color of several drawables at once
+    def SetColors(self, liDrIdx, clr):
+        arrColors = self.drColors
+        for nDrIdx in liDrIdx:
+            arrColors[nDrIdx][:] = clr
+
+    # Set the start sample and length the shader sweeps over
+    # for a drawable (a length of 0 turns the sweep off)
+    def SetPlayback(self, nDrIdx, nStartSample, nNumSamples):
+        self.drPlayback[nDrIdx][:] = [nStartSample, nNumSamples]
+
+    # Lay a ctypes array of nCount elements over the address fnGetPtr
+    # gives. An empty store has no address (the pointer can't be wrapped
+    # while it's null), so it isn't asked for one
+    @staticmethod
+    def _view(fnGetPtr, elType, nCount):
+        if nCount == 0:
+            return (elType * 0)()
+        addr = addr_from_capsule(fnGetPtr())
+        if addr == 0:
+            return (elType * 0)()
+        return (elType * nCount).from_address(addr)
+
+# Wrap one of the views above in a numpy array (no copy)
+def AsNumpy(view):
+    import numpy
+    return numpy.ctypeslib.as_array(view)
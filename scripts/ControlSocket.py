@@ -0,0 +1,197 @@
+import socket
+import struct
+import time
+
+from OSC import EncodeMessage, DecodePacket
+
+from Cell import Cell
+from Column import Column
+
+# Control messages are OSC packets (a message, or a bundle of them, see
+# OSC) sent over loopback UDP, done in the order they arrive. Launches
+# and stops the entities can't take yet are dropped, and answered with
+# /busy and the message's address and arguments so the sender can send
+# it again (see GrooveMatrix.CanLaunch and CanStopColumn). Rows can be
+# given by index (in the active scene) or by name:
+#
+#   /cell/launch    row col     Launch a cell, like clicking it if it's stopped
+#   /cell/stop      row col     Stop a cell, like clicking it if it's playing
+#   /cell/volume    row col f   Set a cell's volume
+#   /row/stop       row         Stop a row's cells
+#   /row/volume     row f       Set every cell in a row's volume
+#   /column/launch  col         Launch a column, like clicking it if it's stopped
+#   /column/stop    col         Stop a column, like clicking it if it's playing
+#   /ping           n           Answered with /pong n once the frame is done
+
+# A non-blocking UDP socket the GM services once a frame (see Poll). Every
+# message that arrived since the last frame is handled before the frame
+# runs, so a burst of them is solved together and its voice commands go to
+# the clip launcher in the frame's one command buffer
+class ControlSocket:
+    def __init__(self, GM, nPort, strHost = '127.0.0.1', nMaxPerFrame = 4096):
+        self.mGM = GM
+        self.nMaxPerFrame = nMaxPerFrame
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.sock.bind((strHost, nPort))
+        self.sock.setblocking(False)
+
+        # The handler of each address
+        self.diHandlers = {
+            '/cell/launch' : self._CellLaunch,
+            '/cell/stop' : self._CellStop,
+            '/cell/volume' : self._CellVolume,
+            '/row/stop' : self._RowStop,
+            '/row/volume' : self._RowVolume,
+            '/column/launch' : self._ColumnLaunch,
+            '/column/stop' : self._ColumnStop,
+        }
+
+        # The active scene's rows in order, found when first needed each poll
+        self.liRows = None
+
+        # Pings to answer once the frame's done, and some stats
+        self.liPings = []
+        self.nPackets = 0
+        self.nMessages = 0
+        self.nRejected = 0
+        self.nBusy = 0
+        self.nFrames = 0
+        self.nBusyFrames = 0
+        self.nMaxFrameMessages = 0
+        self.fStartTime = time.perf_counter()
+
+    def Close(self):
+        self.sock.close()
+
+    def GetAddress(self):
+        return self.sock.getsockname()
+
+    # Handle whatever's arrived, up to nMaxPerFrame messages (the rest wait)
+    def Poll(self):
+        self.liRows = None
+        nMessages = 0
+        while nMessages < self.nMaxPerFrame:
+            try:
+                data, addr = self.sock.recvfrom(65536)
+            except (BlockingIOError, InterruptedError):
+                break
+            self.nPackets += 1
+            try:
+                liMessages = DecodePacket(data)
+            except (ValueError, IndexError, struct.error, UnicodeDecodeError):
+                self.nRejected += 1
+                continue
+            for strAddress, liArgs in liMessages:
+                nMessages += 1
+                if strAddress == '/ping':
+                    self.liPings.append((addr, liArgs))
+                    continue
+                result = self._Handle(strAddress, liArgs)
+                if result is ControlSocket.Busy:
+                    self._Send(EncodeMessage('/busy', strAddress, *liArgs), addr)
+                elif result == False:
+                    self.nRejected += 1
+
+        self.nFrames += 1
+        self.nMessages += nMessages
+        if nMessages:
+            self.nBusyFrames += 1
+            self.nMaxFrameMessages = max(self.nMaxFrameMessages, nMessages)
+
+    # Called once the frame has posted its commands, answers pings
+    def OnFrameDone(self):
+        for addr, liArgs in self.liPings:
+            self._Send(EncodeMessage('/pong', *liArgs), addr)
+        self.liPings = []
+
+    def _Send(self, data, addr):
+        try:
+            self.sock.sendto(data, addr)
+        except OSError:
+            pass
+
+    # Returned by handlers of messages the entities can't take yet
+    Busy = object()
+
+    def _Handle(self, strAddress, liArgs):
+        fnHandler = self.diHandlers.get(strAddress)
+        if fnHandler is None:
+            return False
+        try:
+            result = fnHandler(*liArgs)
+        except (TypeError, ValueError, IndexError, KeyError):
+            return False
+        return result if result is ControlSocket.Busy else result != False
+
+    # Negative indices are out of range rather than counting from the end
+    @staticmethod
+    def _Index(li, nIdx):
+        if not 0 <= nIdx < len(li):
+            raise IndexError(nIdx)
+        return li[nIdx]
+
+    def _GetRow(self, row):
+        if isinstance(row, str):
+            return self.mGM.diRows[row]
+        if self.liRows is None:
+            self.liRows = list(self.mGM.diRows.values())
+        return ControlSocket._Index(self.liRows, row)
+
+    def _GetCell(self, row, nCol):
+        return ControlSocket._Index(self._GetRow(row).liCells, nCol)
+
+    # Messages the entities can't take yet are counted and answered (see Poll)
+    def _Busy(self):
+        self.nBusy += 1
+        return ControlSocket.Busy
+
+    # Launches and stops click the entity if that does what's asked
+    def _Click(self, ent, tuStates):
+        if isinstance(ent.GetActiveState(), tuStates):
+            self.mGM.ApplyClick(ent)
+
+    def _CellLaunch(self, row, nCol):
+        cell = self._GetCell(row, nCol)
+        if not isinstance(cell.GetActiveState(), Cell.State.Stopped):
+            return
+        if not self.mGM.CanLaunch([cell]):
+            return self._Busy()
+        self.mGM.ApplyClick(cell)
+
+    def _CellStop(self, row, nCol):
+        self._Click(self._GetCell(row, nCol), (Cell.State.Playing,))
+
+    def _CellVolume(self, row, nCol, fVolume):
+        self.mGM.SetCellVolume(self._GetCell(row, nCol), fVolume)
+
+    def _RowStop(self, row):
+        for c in self._GetRow(row).liCells:
+            self._Click(c, (Cell.State.Playing,))
+
+    def _RowVolume(self, row, fVolume):
+        for c in self._GetRow(row).liCells:
+            self.mGM.SetCellVolume(c, fVolume)
+
+    def _ColumnLaunch(self, nCol):
+        col = ControlSocket._Index(self.mGM.liCols, nCol)
+        if not isinstance(col.GetActiveState(), Column.State.Stopped):
+            return
+        if not self.mGM.CanLaunch(col.setCells):
+            return self._Busy()
+        self.mGM.ApplyClick(col)
+
+    def _ColumnStop(self, nCol):
+        col = ControlSocket._Index(self.mGM.liCols, nCol)
+        if not isinstance(col.GetActiveState(), Column.State.Playing):
+            return
+        if not self.mGM.CanStopColumn(col):
+            return self._Busy()
+        self.mGM.ApplyClick(col)
+
+    def GetSummary(self):
+        fElapsed = max(time.perf_counter() - self.fStartTime, 1e-9)
+        return ('Control socket: {} messages in {} packets ({:.1f} / s), {} rejected, {} busy, '
+                '{} of {} frames busy, at most {} messages in a frame').format(
+                    self.nMessages, self.nPackets, self.nMessages / fElapsed, self.nRejected, self.nBusy,
+                    self.nBusyFrames, self.nFrames, self.nMaxFrameMessages)
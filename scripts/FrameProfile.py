@@ -0,0 +1,157 @@
+import json
+import time
+
+# Times the phases of each frame (see GrooveMatrix.Update) into a fixed
+# size ring of the last nSize frames, along with how hard the state graph
+# solver worked. A phase is timed from the previous mark (or the start of
+# the frame) to its own, so marking costs a clock read and an add, and the
+# ring is only allocated once. Summaries and exports are made on demand
+#
+# The phases, in the order they run
+liPhases = ['control', 'replay', 'clip launcher', 'ui', 'draw', 'start',
+            'buffers', 'solve', 'advance', 'commands', 'post', 'housekeeping']
+(nPhaseControl, nPhaseReplay, nPhaseClipLauncher, nPhaseUI, nPhaseDraw, nPhaseStart,
+ nPhaseBuffers, nPhaseSolve, nPhaseAdvance, nPhaseCommands, nPhasePost, nPhaseHousekeeping) = range(len(liPhases))
+
+# Each frame's entry is laid out as its start time, its end time, how many
+# times the graph was solved, the iterations that took (in all and in the
+# longest solve) and the entity updates, then each phase's time and each
+# phase's start (-1 if it didn't run)
+nFrameStart, nFrameEnd, nSolves, nIters, nMaxIters, nUpdates = range(6)
+nPhaseTimes = 6
+nPhaseStarts = nPhaseTimes + len(liPhases)
+liEmptyFrame = [0., 0., 0, 0, 0, 0] + [0.] * len(liPhases) + [-1.] * len(liPhases)
+
+# The nearest rank percentile of sorted values
+def Percentile(liSorted, fPct):
+    return liSorted[min(len(liSorted) - 1, int(fPct * len(liSorted)))]
+
+class FrameProfile:
+    def __init__(self, nSize = 3600, strFile = 'frames.json'):
+        if nSize < 1:
+            raise ValueError('Error: Invalid frame profile size', nSize)
+        self.strFile = strFile
+        self.liRing = [list(liEmptyFrame) for _ in range(nSize)]
+        self.nAdded = 0
+        self.liFrame = self.liRing[0]
+        self.fLast = 0.
+
+    # Start a new entry, overwriting the oldest
+    def BeginFrame(self):
+        self.liFrame = self.liRing[self.nAdded % len(self.liRing)]
+        self.liFrame[:] = liEmptyFrame
+        self.fLast = time.perf_counter()
+        self.liFrame[nFrameStart] = self.fLast
+
+    # The time since the last mark was spent in nPhase
+    def Mark(self, nPhase):
+        fNow = time.perf_counter()
+        liFrame = self.liFrame
+        liFrame[nPhaseTimes + nPhase] += fNow - self.fLast
+        if liFrame[nPhaseStarts + nPhase] < 0:
+            liFrame[nPhaseStarts + nPhase] = self.fLast
+        self.fLast = fNow
+
+    # Called after each solve of the state graph
+    def CountSolve(self, nNumIters, nNumUpdates):
+        liFrame = self.liFrame
+        liFrame[nSolves] += 1
+        liFrame[nIters] += nNumIters
+        liFrame[nMaxIters] = max(liFrame[nMaxIters], nNumIters)
+        liFrame[nUpdates] += nNumUpdates
+
+    def EndFrame(self):
+        self.liFrame[nFrameEnd] = time.perf_counter()
+        self.nAdded += 1
+
+    # How many frames have been overwritten
+    def GetNumDropped(self):
+        return max(0, self.nAdded - len(self.liRing))
+
+    # The finished entries in the ring, oldest first
+    def GetFrames(self):
+        nSize = len(self.liRing)
+        if self.nAdded <= nSize:
+            return self.liRing[:self.nAdded]
+        nOldest = self.nAdded % nSize
+        return self.liRing[nOldest:] + self.liRing[:nOldest]
+
+    # p50 / p99 / max of the frame time, the time between frames,
+    # each phase (over the frames it ran in) and the solver's work
+    def GetSummary(self):
+        liFrames = self.GetFrames()
+        if len(liFrames) == 0:
+            return 'No frames profiled'
+        liLines = ['{} frames profiled ({} dropped)'.format(len(liFrames), self.GetNumDropped())]
+        def fnAddLine(strName, liValues, strFmt, fScale):
+            if len(liValues):
+                liValues = sorted(liValues)
+                liLines.append(('{:>14}: mean ' + strFmt + ', p50 ' + strFmt + ', p99 ' + strFmt + ', max ' + strFmt + ' ({} frames)').format(
+                    strName, fScale * sum(liValues) / len(liValues), fScale * Percentile(liValues, .5),
+                    fScale * Percentile(liValues, .99), fScale * liValues[-1], len(liValues)))
+        fnAddLine('frame', [f[nFrameEnd] - f[nFrameStart] for f in liFrames], '{:7.3f} ms', 1000.)
+        fnAddLine('interval', [b[nFrameStart] - a[nFrameStart] for a, b in zip(liFrames, liFrames[1:])], '{:7.3f} ms', 1000.)
+        for i, strPhase in enumerate(liPhases):
+            fnAddLine(strPhase, [f[nPhaseTimes + i] for f in liFrames if f[nPhaseStarts + i] >= 0], '{:7.3f} ms', 1000.)
+        fnAddLine('solves', [f[nSolves] for f in liFrames], '{:7.1f}', 1)
+        fnAddLine('iterations', [f[nIters] for f in liFrames], '{:7.1f}', 1)
+        fnAddLine('max iterations', [f[nMaxIters] for f in liFrames], '{:7.1f}', 1)
+        fnAddLine('updates', [f[nUpdates] for f in liFrames], '{:7.1f}', 1)
+        return '\n'.join(liLines)
+
+    # One row per frame, times in milliseconds from the first frame's start
+    def WriteCSV(self, strFile):
+        liFrames = self.GetFrames()
+        fOrigin = liFrames[0][nFrameStart] if len(liFrames) else 0.
+        with open(strFile, 'w') as f:
+            f.write(','.join(['frame', 'start', 'total', 'solves', 'iterations', 'max iterations', 'updates'] + liPhases) + '\n')
+            for nFrame, liFrame in enumerate(liFrames, self.GetNumDropped()):
+                liValues = [nFrame, 1000. * (liFrame[nFrameStart] - fOrigin), 1000. * (liFrame[nFrameEnd] - liFrame[nFrameStart]),
+                            liFrame[nSolves], liFrame[nIters], liFrame[nMaxIters], liFrame[nUpdates]]
+                liValues += [1000. * t for t in liFrame[nPhaseTimes:nPhaseStarts]]
+                f.write(','.join(str(v) for v in liValues) + '\n')
+
+    # The Chrome trace event format (chrome://tracing, or Perfetto), each
+    # frame and phase a complete event and the solver's work as counters
+    def WriteChromeTrace(self, strFile):
+        liFrames = self.GetFrames()
+        fOrigin = liFrames[0][nFrameStart] if len(liFrames) else 0.
+        fnMicros = lambda t: 1e6 * (t - fOrigin)
+        liEvents = []
+        for nFrame, liFrame in enumerate(liFrames, self.GetNumDropped()):
+            fStart = liFrame[nFrameStart]
+            liEvents.append({'name' : 'frame', 'ph' : 'X', 'pid' : 0, 'tid' : 0, 'ts' : fnMicros(fStart),
+                             'dur' : 1e6 * (liFrame[nFrameEnd] - fStart), 'args' : {'frame' : nFrame}})
+            for i, strPhase in enumerate(liPhases):
+                if liFrame[nPhaseStarts + i] >= 0:
+                    liEvents.append({'name' : strPhase, 'ph' : 'X', 'pid' : 0, 'tid' : 0,
+                                     'ts' : fnMicros(liFrame[nPhaseStarts + i]), 'dur' : 1e6 * liFrame[nPhaseTimes + i]})
+            liEvents.append({'name' : 'solver', 'ph' : 'C', 'pid' : 0, 'ts' : fnMicros(fStart),
+                             'args' : {'iterations' : liFrame[nIters], 'max iterations' : liFrame[nMaxIters],
+                                       'updates' : liFrame[nUpdates]}})
+        with open(strFile, 'w') as f:
+            json.dump({'traceEvents' : liEvents, 'displayTimeUnit' : 'ms'}, f)
+
+    # Write to a file (ours if none is given), a Chrome trace
+    # if it ends with .json and CSV otherwise, returns the file
+    def Dump(self, strFile = None):
+        strFile = strFile or self.strFile
+        if strFile.lower().endswith('.json'):
+            self.WriteChromeTrace(strFile)
+        else:
+            self.WriteCSV(strFile)
+        return strFile
+
+# A do-nothing profile, used when profiling is off
+class NullFrameProfile:
+    def BeginFrame(self):
+        pass
+
+    def Mark(self, nPhase):
+        pass
+
+    def CountSolve(self, nNumIters, nNumUpdates):
+        pass
+
+    def EndFrame(self):
+        pass
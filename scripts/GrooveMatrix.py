@@ -1,7 +1,7 @@
 # pyl wrapped classes
 from MatrixUI import MatrixUI
 import ClipLauncher as clCMD
-from ClipLauncher import ClipLauncher
+from ClipLauncher import ClipLauncher, Clip
 import Camera
 import Camera
 import Shape
@@ -10,16 +10,30 @@ import Shape
 from Cell import Cell
 from Row import Row
 from Column import Column
+from Scene import Scene
 
 # Input manager... handles input
 from InputManager import InputManager, MouseManager, KeyboardManager, Button
+from InputLog import InputRecorder, InputReplayer
+from LatencyLog import LatencyLog
+from LevelMeter import RowMeters
+from ControlSocket import ControlSocket
+from StateStress import StateStress
+from RenderBench import RenderBench
+import FrameProfile as FP
+from TransitionTrace import g_TransitionTrace
 
 # Some misc stuff
 from Util import Constants, ctype_from_addr
+from CommandBuffer import PostShardedCellCommands
+from ComponentStore import ComponentViews
+from TriggerIndex import TriggerIndex
 
 # for input handling
 import sdl2
 
+import time
+
 class GrooveMatrix:
     # Get refs to c objects, init diRows empty
     def __init__(self, pMatrixUI, pClipLauncher):
@@ -27,23 +41,82 @@ class GrooveMatrix:
         self.cMatrixUI = MatrixUI(pMatrixUI)
         self.cClipLauncher = ClipLauncher(pClipLauncher)
 
+        # Rows' voices are dealt out over the clip launcher and its shards
+        # (see ClipLauncher::AddShard), which it starts and stops together
+        self.liClipLaunchers = [self.cClipLauncher] + [ClipLauncher(self.cClipLauncher.GetShard(i))
+                                                       for i in range(self.cClipLauncher.GetNumShards())]
+
+        # Zero-copy views of the UI's component data
+        self.mComponentViews = ComponentViews(self.cMatrixUI)
+
         # Construct a circle for mouse hit detection
+        # (it's only active, and in the broad-phase, during a click)
         nMouseRad = 3
         self.nHitShapeIdx = self.cMatrixUI.AddShape(Shape.Circle, [0,0], {'r' : nMouseRad})
+        Shape.Shape(self.cMatrixUI.GetShape(self.nHitShapeIdx)).SetIsActive(False)
 
-        # No rows or columns yet
-        self.diRows = {}            # Rows are keyed by name
-        self.liCols = []            # Columsn are in a list - for now
-        self.setEntities = set()    # All entities are here
+        # No rows or columns yet - we look at the active scene's
+        # (see _UseScene), and other scenes wait in diScenes
+        self.diScenes = {}
+        self._UseScene(Scene(None))
+
+        # Scenes being released a few entities per frame,
+        # and the clips to unregister once each one is done
+        self.liReleasing = []
+
+        # Pending and stopping cells, by when their trigger is hit
+        self.mTriggerIndex = TriggerIndex()
 
         # Reset play state
         self.Reset()
 
+        # Frames run so far, and what records or replays input
+        self.nFrame = 0
+        self.mInputRecorder = None
+        self.mInputReplayer = None
+        self.bQuitAfterReplay = False
+
+        # Where we learn how many buffers the clip launcher has completed
+        # (a stress run swaps in its own), and the stress run if there is one
+        self.fnNumBufsCompleted = self.cClipLauncher.GetNumBufsCompleted
+        self.mStateStress = None
+
+        # Draw stats are collected here when benchmarking rendering
+        self.mRenderBench = None
+
+        # State transitions are traced at the sample pos they're solved for
+        g_TransitionTrace.SetClock(lambda : (self.nFrame, self.nCurSamplePos + self.nCurSamplePosInc))
+
+        # Launch latencies get logged here when on
+        self.mLatencyLog = None
+        self.strLatencyCSV = None
+
+        # Row headers show their levels when metering
+        self.mRowMeters = None
+
+        # Cells get waveforms this many columns wide, if any
+        self.nWaveColumns = 0
+
+        # Control messages arrive here when it's open
+        self.mControlSocket = None
+
+        # What drives the active scene when it's an array model (see StartArrayMatrix)
+        self.mArrayScene = None
+
+        # Frame phases are timed into this when profiling
+        self.mFrameProfile = FP.NullFrameProfile()
+
         # construct the keyboard button handler functions
 
         # Quit function
         def fnQuit(btn, keyMgr):
             nonlocal self
+            self.StopRecording()
+            self.StopLatencyLog()
+            self.StopControlSocket()
+            self.StopFrameProfile()
+            if len(self.liClipLaunchers) > 1:
+                print(self.GetShardSummary())
             self.cClipLauncher.SetPlayPause(False)
             self.cMatrixUI.SetQuitFlag(True)
         keyQuit = Button(sdl2.keycode.SDLK_ESCAPE, fnUp = fnQuit)
@@ -54,8 +127,30 @@ class GrooveMatrix:
             self.cClipLauncher.SetPlayPause(not(self.cClipLauncher.GetPlayPause()))
         keyPlayPause = Button(sdl2.keycode.SDLK_SPACE, fnUp = fnPlayPause)
 
+        # The number keys switch to the first nine scenes
+        def fnSwitchScene(btn, keyMgr):
+            nonlocal self
+            liSceneNames = list(self.diScenes.keys())
+            nScene = btn.code - sdl2.keycode.SDLK_1
+            if nScene < len(liSceneNames):
+                self.SwitchScene(liSceneNames[nScene])
+        liSceneKeys = [Button(sdl2.keycode.SDLK_1 + i, fnUp = fnSwitchScene) for i in range(9)]
+
+        # Write out the transition trace
+        def fnDumpTrace(btn, keyMgr):
+            print('Transition trace written to', g_TransitionTrace.Dump())
+        keyDumpTrace = Button(sdl2.keycode.SDLK_t, fnUp = fnDumpTrace)
+
+        # Write out the frame profile, if we're profiling
+        def fnDumpProfile(btn, keyMgr):
+            nonlocal self
+            if isinstance(self.mFrameProfile, FP.FrameProfile):
+                print(self.mFrameProfile.GetSummary())
+                print('Frame profile written to', self.mFrameProfile.Dump())
+        keyDumpProfile = Button(sdl2.keycode.SDLK_p, fnUp = fnDumpProfile)
+
         # Construct the keyboard manager
-        keyMgr = KeyboardManager([keyQuit, keyPlayPause])
+        keyMgr = KeyboardManager([keyQuit, keyPlayPause, keyDumpTrace, keyDumpProfile] + liSceneKeys)
 
         # Create ref to camera for fnLBDown to capture
         cCamera = Camera.Camera(self.cMatrixUI.GetCameraPtr())
@@ -71,10 +166,11 @@ class GrooveMatrix:
             # Move to mouse position and activate
             cMouseCirc.SetCenterPos([mX, mY])
             cMouseCirc.SetIsActive(True)
-            # Look for a collision, handle it if so
-            for ent in self.setEntities:
-                if self.cMatrixUI.GetIsOverlapping(ent.GetShape().c_ptr, cMouseCirc.c_ptr):
-                    ent.OnLButtonUp()
+            # Let the broad-phase find what we hit, handle it if so
+            self.cMatrixUI.UpdateCollisionBank()
+            for nShIdx in self.cMatrixUI.GetOverlapsWith(self.nHitShapeIdx):
+                if nShIdx in self.diShapeEntities:
+                    self._Click(self.diShapeEntities[nShIdx])
                     break
             # Deactivate mouse circ
             cMouseCirc.SetIsActive(False)
@@ -86,11 +182,221 @@ class GrooveMatrix:
 
     def HandleEvent(self, sdlEvent):
         if sdlEvent.type == sdl2.events.SDL_QUIT:
+            self.StopRecording()
+            self.StopLatencyLog()
+            self.StopControlSocket()
+            self.StopFrameProfile()
             self.cClipLauncher.SetPlayPause(False)
             self.cMatrixUI.SetQuitFlag(True)
-        else:
+        # Live input is ignored while a log is replaying
+        elif self.mInputReplayer is None:
             self.mInputManager.HandleEvent(sdlEvent)
 
+    # Record every handled input event to a binary log (see InputLog)
+    def StartRecording(self, strFile):
+        self.StopRecording()
+        fnClock = lambda : (self.nFrame, self.nNumBufsCompleted * self.cClipLauncher.GetBufferSize())
+        self.mInputRecorder = InputRecorder(strFile, fnClock)
+        self.mInputManager.SetRecorder(self.mInputRecorder)
+
+    def StopRecording(self):
+        if self.mInputRecorder is not None:
+            self.mInputManager.SetRecorder(None)
+            self.mInputRecorder.Close()
+            self.mInputRecorder = None
+
+    # Replay a recorded log in place of live input, either at the speed
+    # it was recorded or one recorded frame per Update. When it's done
+    # the frame times and state digest are printed (and we may quit).
+    # Replaying by frame, buffers are counted off the log rather than
+    # the clip launcher, so each event lands on the sample it did when
+    # it was recorded and replays of a log have the same state digest
+    def StartReplay(self, strFile, bRealTime = True, bQuitWhenDone = False):
+        self.mInputReplayer = InputReplayer(strFile, self.mInputManager.HandleEvent, bRealTime)
+        self.bQuitAfterReplay = bQuitWhenDone
+        if bRealTime == False:
+            mReplayer = self.mInputReplayer
+            self.SetBufferClock(lambda : mReplayer.GetSamplesPlayed() // self.cClipLauncher.GetBufferSize())
+
+    def _StopReplay(self):
+        print(self.mInputReplayer.GetSummary())
+        if self.mInputReplayer.bRealTime == False:
+            # Carry on from here with the clip launcher's buffers
+            self.SetBufferClock()
+            self.nNumBufsCompleted = self.fnNumBufsCompleted()
+        self.mInputReplayer = None
+
+    # Log how long it takes clicked cells to be heard (see LatencyLog);
+    # when stopped a summary is printed and maybe written to a CSV file
+    def StartLatencyLog(self, strCSVFile = None):
+        self.StopLatencyLog()
+        self.mLatencyLog = LatencyLog(self.liClipLaunchers)
+        self.strLatencyCSV = strCSVFile
+
+    def StopLatencyLog(self):
+        if self.mLatencyLog is not None:
+            self.mLatencyLog.Close()
+            print(self.mLatencyLog.GetSummary())
+            if self.strLatencyCSV:
+                self.mLatencyLog.WriteCSV(self.strLatencyCSV)
+            self.mLatencyLog = None
+
+    def GetLatencyLog(self):
+        return self.mLatencyLog
+
+    # Take control messages on a loopback UDP port (see ControlSocket)
+    def StartControlSocket(self, nPort, strHost = '127.0.0.1'):
+        if self.mArrayScene is not None:
+            raise RuntimeError('Error: The control socket needs the entities driving the scene')
+        self.StopControlSocket()
+        self.mControlSocket = ControlSocket(self, nPort, strHost)
+
+    def StopControlSocket(self):
+        if self.mControlSocket is not None:
+            self.mControlSocket.Close()
+            print(self.mControlSocket.GetSummary())
+            self.mControlSocket = None
+
+    # Start timing launches of the voices a click on ent will start, which
+    # are those of the cells it sets pending (a stopped cell, or every cell
+    # of a stopped column). Other clicks don't start a voice
+    def _StampClick(self, ent):
+        if self.mLatencyLog is None:
+            return
+        if self.mArrayScene is not None:
+            liCells = self.mArrayScene.GetLaunchedCells(ent)
+        elif isinstance(ent, Cell) and isinstance(ent.GetActiveState(), Cell.State.Stopped):
+            liCells = [ent]
+        elif isinstance(ent, Column) and isinstance(ent.GetActiveState(), Column.State.Stopped):
+            liCells = ent.setCells
+        else:
+            return
+        for c in liCells:
+            self.liClipLaunchers[c.nShard].StampLaunchClick(c.nID)
+
+    # Clicks go to the array model if it's driving the scene
+    def _Click(self, ent):
+        self._StampClick(ent)
+        if self.mArrayScene is None:
+            ent.OnLButtonUp()
+        else:
+            self.mArrayScene.Click(ent)
+
+    # Click an entity from outside of a mouse event (i.e a control message),
+    # solving the graph right away so that the next click sees what it did
+    # (the array model solves as it's clicked)
+    def ApplyClick(self, ent):
+        self._Click(ent)
+        if self.mArrayScene is None:
+            self._SolveStateGraph()
+
+    # Hammer the active scene's state graph with random clicks over
+    # simulated buffers (see StateStress), printing a report and
+    # quitting when it's done
+    def StartStress(self, nRuns = 20, nFrames = 600, nClicks = 4, nMaxBufs = 3, bGuarded = False, strCSVFile = None, bCompareArray = False):
+        if self.mArrayScene is not None:
+            raise RuntimeError('Error: Stress runs need the entities driving the scene')
+        self.mStateStress = StateStress(self, nRuns, nFrames, nClicks, nMaxBufs, bGuarded, strCSVFile, bCompareArray = bCompareArray)
+
+    # Collect draw stats for nFrames frames (see RenderBench), maybe
+    # saving some of them, then print a report and quit
+    def StartRenderBench(self, nFrames = 600, strDumpDir = None, nDumpEvery = 60):
+        self.mRenderBench = RenderBench(self.cMatrixUI, nFrames, strDumpDir, nDumpEvery)
+
+    # Count buffers with fnNumBufsCompleted rather than the clip launcher
+    def SetBufferClock(self, fnNumBufsCompleted = None):
+        self.fnNumBufsCompleted = fnNumBufsCompleted or self.cClipLauncher.GetNumBufsCompleted
+
+    # Time the phases of the last nFrames frames (see FrameProfile);
+    # when stopped a summary is printed and maybe written to a file
+    # (a Chrome trace if it ends with .json, CSV otherwise)
+    def StartFrameProfile(self, nFrames = 3600, strFile = None):
+        self.StopFrameProfile()
+        self.mFrameProfile = FP.FrameProfile(nFrames, strFile or 'frames.json')
+        self.strFrameProfileFile = strFile
+
+    def StopFrameProfile(self):
+        if isinstance(self.mFrameProfile, FP.FrameProfile):
+            print(self.mFrameProfile.GetSummary())
+            if self.strFrameProfileFile:
+                self.mFrameProfile.Dump(self.strFrameProfileFile)
+            self.mFrameProfile = FP.NullFrameProfile()
+
+    def GetFrameProfile(self):
+        return self.mFrameProfile
+
+    # Rows and columns are busy while any of their cells are waiting on a
+    # trigger, and the entities can't always take a click then. True if
+    # none of these cells' rows or columns are busy
+    def IsSettled(self, liCells):
+        for c in liCells:
+            for ent in (c.mRow, c.mCol):
+                if ent is not None and ent.mCellCounts.Any(Cell.State.Pending, Cell.State.Stopping):
+                    return False
+        return True
+
+    # The launches and stops the entities can take, which is all but two: a
+    # cell can't be launched while its row is switching (it has a pending cell
+    # or its playing cell is stopping) or its column is stopping (which would
+    # then set every cell in it playing), and a column can't be stopped while
+    # one of its cells is pending
+    def CanLaunch(self, liCells):
+        for c in liCells:
+            if c.mRow is not None and isinstance(c.mRow.GetActiveState(), Row.State.Switching):
+                return False
+            if c.mCol is not None and isinstance(c.mCol.GetActiveState(), Column.State.Stopping):
+                return False
+        return True
+
+    def CanStopColumn(self, col):
+        return not col.mCellCounts.Any(Cell.State.Pending)
+
+    # Set a cell's volume, which its voice gets with the frame's commands if it's sounding
+    def SetCellVolume(self, cell, fVolume):
+        cell.fVolume = float(fVolume)
+        if self.mArrayScene is not None:
+            self.mArrayScene.SetVolume(cell, cell.fVolume)
+        elif cell.nStateCode in (Cell.State.Playing.nCode, Cell.State.Stopping.nCode):
+            self.setVolume.add(cell)
+
+    # Drive the active scene, and those switched to after it, with an
+    # ArrayMatrix (which needs numpy) rather than the entities' state graphs,
+    # for grids too big for those to keep up with. The scene's voices are
+    # stopped first, and its entities stay stopped while the array model
+    # plays it (see ArrayScene). The control socket and stress runs click
+    # entities by their states, so they can't be used with it
+    def StartArrayMatrix(self):
+        if self.mArrayScene is not None:
+            return
+        if self.mControlSocket is not None or self.mStateStress is not None:
+            raise RuntimeError('Error: The array matrix can\'t run with the control socket or a stress run')
+        from ArrayScene import ArrayScene
+        self.ResetScene()
+        self.mArrayScene = ArrayScene(self, self.mScene)
+
+    # Stop the array model's voices and go back to the entities, all stopped
+    def StopArrayMatrix(self):
+        if self.mArrayScene is not None:
+            self.mArrayScene.Reset()
+            self.mArrayScene = None
+
+    # Light row headers by their cells' levels (see RowMeters)
+    def StartMetering(self, fDecay = 1.5):
+        self.StopMetering()
+        self.mRowMeters = RowMeters(self, fDecay)
+
+    def StopMetering(self):
+        if self.mRowMeters is not None:
+            self.mRowMeters.Close()
+            self.mRowMeters = None
+
+    # A string of every entity's state (or the array model's cells'
+    # and columns' if it's driving the scene), which replays digest
+    def GetStateString(self):
+        if self.mArrayScene is not None:
+            return self.mArrayScene.GetStateString()
+        return ','.join(str(e.GetActiveState()) for e in sorted(self.setEntities, key = lambda e : e.nID))
+
     def StartCell(self, cell):
         self.setOn.add(cell)
 
@@ -109,6 +415,19 @@ class GrooveMatrix:
     def GetClipLauncher(self):
         return self.cClipLauncher
 
+    def GetClipLaunchers(self):
+        return self.liClipLaunchers
+
+    # Each clip launcher's buffer count, which should keep to the primary's
+    def GetShardSummary(self):
+        nNumBufs = self.cClipLauncher.GetNumBufsCompleted()
+        return 'Audio shards: ' + ', '.join('{} buffers ({:+})'.format(cl.GetNumBufsCompleted(), cl.GetNumBufsCompleted() - nNumBufs)
+                                            for cl in self.liClipLaunchers)
+
+    # Returns the component views, refreshed if anything was added
+    def GetComponentViews(self):
+        return self.mComponentViews.Refresh()
+
     def Reset(self):
         # The current sample pos is incremented by
         # the curSamplePos inc, which is a multiple of
@@ -121,30 +440,119 @@ class GrooveMatrix:
         # we wait to be remaining in the current playing
         # cell before we flush any changes to the CL
         self.nPreTrigger = 3 * self.cClipLauncher.GetBufferSize()
+        self._UpdateTriggerWindow()
 
         # Our entities will tell us what to turn on/off,
         # and we clear these sets in Update
         self.setOn = set()
         self.setOff = set()
+        self.setVolume = set()
+
+    # Cells whose triggers lie in the samples we're about to
+    # advance over will be hit, see Cell.WillTriggerBeHit
+    def _UpdateTriggerWindow(self):
+        self.mTriggerIndex.SetWindow(self.nCurSamplePos, self.nCurSamplePos + self.nCurSamplePosInc)
 
     # Update all entities till they don't update no more,
-    # raise an error if some sanity limit is reached
+    # raise an error if some sanity limit is reached. Cells
+    # only advance on their own when their trigger is hit, so
+    # the rest are skipped (they'd all return False). Every
+    # entity is updated each pass, not just those up to the
+    # first that changes, so a pass's cost doesn't depend on
+    # how many changed at once
     def _SolveStateGraph(self):
         nMaxIters = 15
+        nUpdates = 0
         for i in range(nMaxIters):
-            if all(e.Update() == False for e in self.setEntities):
+            setHit = self.mTriggerIndex.setHit
+            liUpdating = [e for e in self.setEntities if e.nID in setHit or not isinstance(e, Cell)]
+            nUpdates += len(liUpdating)
+            liChanged = [e for e in liUpdating if e.Update() != False]
+            if len(liChanged) == 0:
                 break
         else:
             raise RuntimeError('Error: Too many iterations needed to solve state graph!')
+        self.mFrameProfile.CountSolve(i + 1, nUpdates)
+
+    # Run a frame, feeding it any replayed input first
+    def Update(self):
+        # A stress run drives its own frames
+        if self.mStateStress is not None:
+            self.mStateStress.Update(self._UpdateFrame)
+            if self.mStateStress.IsDone():
+                print(self.mStateStress.GetSummary())
+                self.mStateStress = None
+                self.cClipLauncher.SetPlayPause(False)
+                self.cMatrixUI.SetQuitFlag(True)
+            return
+
+        self.mFrameProfile.BeginFrame()
+
+        # Control messages are handled before the frame, so it solves them together
+        if self.mControlSocket is not None:
+            self.mControlSocket.Poll()
+            self.mFrameProfile.Mark(FP.nPhaseControl)
+
+        if self.mInputReplayer is None:
+            self._UpdateFrame()
+        else:
+            fStart = time.perf_counter()
+            self.mInputReplayer.Pump()
+            self.mFrameProfile.Mark(FP.nPhaseReplay)
+            self._UpdateFrame()
+            self.mInputReplayer.OnFrameDone(time.perf_counter() - fStart, self.GetStateString())
+
+            # Report and stop replaying once the log is used up
+            if self.mInputReplayer.IsDone():
+                self._StopReplay()
+                if self.bQuitAfterReplay:
+                    self.StopLatencyLog()
+                    self.cClipLauncher.SetPlayPause(False)
+                    self.cMatrixUI.SetQuitFlag(True)
+
+        # The clip launcher only holds so many launches
+        if self.mLatencyLog is not None:
+            self.mLatencyLog.Pull()
+
+        # Levels are read once a frame
+        if self.mRowMeters is not None:
+            self.mRowMeters.Update(time.perf_counter())
+
+        # The frame's commands are posted, so answer any pings
+        if self.mControlSocket is not None:
+            self.mControlSocket.OnFrameDone()
+
+        # Chip away at any scenes we're done with
+        if len(self.liReleasing):
+            self._ReleaseSome()
+        self.nFrame += 1
+
+        self.mFrameProfile.Mark(FP.nPhaseHousekeeping)
+        self.mFrameProfile.EndFrame()
+
+        # The frame's been drawn, so its draw stats are ready
+        if self.mRenderBench is not None:
+            self.mRenderBench.OnFrameDone()
+            if self.mRenderBench.IsDone():
+                print(self.mRenderBench.GetSummary())
+                self.mRenderBench = None
+                self.StopFrameProfile()
+                self.cClipLauncher.SetPlayPause(False)
+                self.cMatrixUI.SetQuitFlag(True)
 
     # Go through and update drawables,
     # post any messages needed to the clip launcher
-    def Update(self):
+    def _UpdateFrame(self):
         # Update ui, clip launcher
         # (clip launcher locks mutex)
         self.cClipLauncher.Update()
+        self.mFrameProfile.Mark(FP.nPhaseClipLauncher)
         self.cMatrixUI.Update()
+        # The playhead is all the shader needs to animate playing cells
+        self.cMatrixUI.SetPlayhead(self.nCurSamplePos)
+        self.mFrameProfile.Mark(FP.nPhaseUI)
         self.cMatrixUI.Draw()
+        self.mFrameProfile.Mark(FP.nPhaseDraw)
 
         # if the clip launcher hasn't started yet,
         # maybe start it if some cells wants to play
@@ -152,6 +560,13 @@ class GrooveMatrix:
             # reset sample counters
             self.Reset()
 
+            # The array model starts its pending cells itself
+            if self.mArrayScene is not None:
+                if self.mArrayScene.StartPending():
+                    self.cClipLauncher.SetPlayPause(True)
+                self.mFrameProfile.Mark(FP.nPhaseStart)
+                return
+
             # Jostle the graph to let any rows start pending
             self._SolveStateGraph()
 
@@ -164,6 +579,7 @@ class GrooveMatrix:
 
             # Get out if no rows are pending
             if bStartPlaying == False:
+                self.mFrameProfile.Mark(FP.nPhaseStart)
                 return
 
             # After having done that, solve the state graph again to
@@ -177,63 +593,270 @@ class GrooveMatrix:
             # If there is anything to turn on,
             # construct command list
             if len(self.setOn):
-                liCmds = []
-                for c in self.setOn:
-                    liCmds.append((clCMD.cmdStartVoice, c.cClip.c_ptr, c.nID, c.fVolume, c.nTriggerRes))
+                liCmds = [(clCMD.cmdStartVoice, c) for c in self.setOn]
 
                 # Reset our state and sets, post commands, start playback and get out
                 self.Reset()
-                self.cClipLauncher.HandleCommands(liCmds)
+                PostShardedCellCommands(self.liClipLaunchers, liCmds)
                 self.cClipLauncher.SetPlayPause(True)
+                self.mFrameProfile.Mark(FP.nPhaseStart)
                 return
 
         # Determine how many buffers have advanced, calculate increment
-        nCurNumBufs = self.cClipLauncher.GetNumBufsCompleted()
+        nCurNumBufs = self.fnNumBufsCompleted()
         if nCurNumBufs > self.nNumBufsCompleted:
             nNumBufs = nCurNumBufs - self.nNumBufsCompleted
             self.nCurSamplePosInc += nNumBufs * self.cClipLauncher.GetBufferSize()
             self.nNumBufsCompleted = nCurNumBufs
+            self._UpdateTriggerWindow()
+        self.mFrameProfile.Mark(FP.nPhaseBuffers)
 
         # Give entity's a chance to transition before applying the increment
-        self._SolveStateGraph()
+        # (or have the array model start and stop the cells it should)
+        if self.mArrayScene is None:
+            self._SolveStateGraph()
+        else:
+            self.mArrayScene.Advance(self.nCurSamplePos, self.nCurSamplePosInc)
+        self.mFrameProfile.Mark(FP.nPhaseSolve)
 
         # Update sample position and the like, zero increment
         self.nCurSamplePos += self.nCurSamplePosInc
         self.nCurSamplePosInc = 0
         if self.nCurSamplePos >= self.cClipLauncher.GetMaxSampleCount():
             self.nCurSamplePos %= self.cClipLauncher.GetMaxSampleCount()
+        self._UpdateTriggerWindow()
+        self.mFrameProfile.Mark(FP.nPhaseAdvance)
 
         # Construct commands for any changing voices
-        liCmds = []
-        for c in self.setOn:
-            liCmds.append((clCMD.cmdStartVoice, c.cClip.c_ptr, c.nID, c.fVolume, c.nTriggerRes))
-        for c in self.setOff:
-            liCmds.append((clCMD.cmdStopVoice, c.cClip.c_ptr, c.nID, c.fVolume, c.nTriggerRes))
+        liCmds = [(clCMD.cmdStartVoice, c) for c in self.setOn]
+        liCmds += [(clCMD.cmdStopVoice, c) for c in self.setOff]
+        liCmds += [(clCMD.cmdSetVolume, c) for c in self.setVolume]
 
         # Clear these sets
         self.setOn = set()
         self.setOff = set()
-
-        # Post to clip launcher
-        if len(liCmds):
-            self.cClipLauncher.HandleCommands(liCmds)
+        self.setVolume = set()
+        self.mFrameProfile.Mark(FP.nPhaseCommands)
+
+        # Post to clip launcher as one packed buffer
+        PostShardedCellCommands(self.liClipLaunchers, liCmds)
+        if self.mArrayScene is not None:
+            self.mArrayScene.Post()
+        self.mFrameProfile.Mark(FP.nPhasePost)
+
+    # Look at a scene's rows, columns and entities
+    def _UseScene(self, scene):
+        self.mScene = scene
+        self.diRows = scene.diRows
+        self.liCols = scene.liCols
+        self.setEntities = scene.setEntities
+        self.diShapeEntities = scene.diShapeEntities
+
+    def GetScene(self):
+        return self.mScene
+
+    # Build a scene from a dict of RowData (see AddRows), whose clips
+    # must already be registered. Its components are made hidden,
+    # so nothing changes on screen until it's switched to
+    def PreloadScene(self, strName, diRowData):
+        if strName in self.diScenes:
+            raise RuntimeError('Error: Scene already loaded', strName)
+
+        mActiveScene, scene = self.mScene, Scene(strName)
+        self._UseScene(scene)
+        try:
+            self.AddRows(diRowData)
+        finally:
+            self._UseScene(mActiveScene)
+        if self.nWaveColumns > 0:
+            self._AddWaveforms(scene)
+        scene.SetVisible(self.GetComponentViews(), False)
+
+        self.diScenes[strName] = scene
+        return scene
+
+    # Make a preloaded scene the active one. This all happens within a
+    # frame: the old scene's voices are told to stop (at their trigger
+    # res, like a click would) and it's hidden and put back the way it
+    # was built, then the new scene is shown. The sample clock carries on,
+    # and if an array model was driving the old scene one drives the new
+    def SwitchScene(self, strName):
+        scene = self.diScenes[strName]
+        if scene is self.mScene:
+            return
+
+        mComponentViews = self.GetComponentViews()
+        self.mScene.SetVisible(mComponentViews, False)
+        self.ResetScene()
+
+        self._UseScene(scene)
+        scene.SetVisible(mComponentViews, True)
+        if self.mArrayScene is not None:
+            from ArrayScene import ArrayScene
+            self.mArrayScene = ArrayScene(self, scene)
+
+    # Stop the active scene's voices and put its entities back the way they were built
+    def ResetScene(self):
+        if self.mArrayScene is not None:
+            self.mArrayScene.Reset()
+        liCmds = [(clCMD.cmdStopVoice, c) for c in self.mScene.GetSoundingCells()]
+        PostShardedCellCommands(self.liClipLaunchers, liCmds)
+        self.mScene.Reset()
+        self.setOn = set()
+        self.setOff = set()
+        self.setVolume = set()
+
+    # Every scene we hold, the active one included
+    def _GetScenes(self):
+        return set(self.diScenes.values()) | {self.mScene}
+
+    # Let go of a scene that isn't active. Its entities are dropped a few
+    # per frame by Update, so a big scene doesn't cost a frame, and then
+    # any of its clips no other scene uses are unregistered (the clip
+    # launcher frees them once their voices have stopped). The scene's
+    # clips are noted now, since its cells go as it's torn down
+    def ReleaseScene(self, strName):
+        scene = self.diScenes[strName]
+        if scene is self.mScene:
+            raise RuntimeError('Error: Releasing the active scene', strName)
+        del self.diScenes[strName]
+        self.liReleasing.append((scene, {c.strClipName for c in scene.GetCells()}))
+
+    # Tear down up to nMaxEntities entities of released scenes. Their state
+    # coros are closed and they're forgotten; their (hidden) UI components
+    # stay allocated, since MatrixUI has no way of removing components
+    def _ReleaseSome(self, nMaxEntities = 64):
+        while nMaxEntities > 0 and len(self.liReleasing):
+            scene, setClipNames = self.liReleasing[0]
+            while nMaxEntities > 0 and len(scene.setEntities):
+                e = scene.setEntities.pop()
+                e.mSG.Close()
+                if self.mRowMeters is not None and isinstance(e, Row):
+                    self.mRowMeters.RemoveRow(e)
+                nMaxEntities -= 1
+            if len(scene.setEntities) == 0:
+                scene.diRows.clear()
+                scene.liCols.clear()
+                scene.diShapeEntities.clear()
+                self.liReleasing.pop(0)
+                # Scenes may have been loaded with these clips since it was
+                # released, and scenes still being released use theirs
+                # till they're done
+                setClipNames = setClipNames - {c.strClipName for s in self._GetScenes() for c in s.GetCells()}
+                for _, setOther in self.liReleasing:
+                    setClipNames -= setOther
+                for strClipName in setClipNames:
+                    self.cClipLauncher.UnregisterClip(strClipName)
+
+    # Load new audio for a clip, which can be done while playing (see
+    # ClipLauncher::ReplaceClip), and hand it to every cell using the clip.
+    # Playing cells keep the old clip until they next start
+    def ReplaceClip(self, strClipName, strHeadFile, strTailFile, nFadeMS):
+        if self.cClipLauncher.ReplaceClip(strClipName, strHeadFile, strTailFile, nFadeMS) == False:
+            return False
+        cClip = Clip(self.cClipLauncher.GetClip(strClipName))
+        for scene in self._GetScenes():
+            for c in scene.GetCells():
+                if c.strClipName == strClipName:
+                    c.SetClip(cClip)
+        if self.mArrayScene is not None:
+            self.mArrayScene.SetClip(strClipName, cClip)
+        return True
+
+    # Draw a waveform thumbnail nColumns wide over every cell, now and in
+    # scenes preloaded later. Thumbnails come from the clip launcher's peak
+    # pyramids, and cells whose waveforms look the same share a mesh. A
+    # cell keeps its thumbnail if its clip is replaced
+    def AddWaveforms(self, nColumns = 32):
+        if nColumns < 1:
+            raise ValueError('Error: Invalid waveform column count', nColumns)
+        self.nWaveColumns = nColumns
+        for scene in self._GetScenes():
+            self._AddWaveforms(scene)
+
+    def _AddWaveforms(self, scene):
+        liCells = [c for c in scene.GetCells() if c.nWaveDrIdx < 0]
+        self.cMatrixUI.Reserve(0, len(liCells))
+
+        # Drawables for all of the scene's cells are made (and shown
+        # or hidden with it), fetching each clip's peaks once
+        diPeaks = {}
+        nActive = 1 if scene is self.mScene else 0
+        liSize = [1.5 * Cell.nRadius, Cell.nRadius]
+        for c in liCells:
+            if c.strClipName not in diPeaks:
+                liPeaks = self.cClipLauncher.GetClipPeaks(c.strClipName, 0, c.cClip.GetNumSamples(False), self.nWaveColumns)
+                diPeaks[c.strClipName] = ('waveform:{:x}'.format(hash(tuple(liPeaks)) & 0xffffffffffffffff), liPeaks)
+            strMesh, liPeaks = diPeaks[c.strClipName]
+            liPos = list(c.GetDrawable().GetPos())[:2]
+            clr = [.5 * f for f in c.mRow.clrOff[:3]] + [1.]
+            c.nWaveDrIdx = self.cMatrixUI.AddDrawableWaveform(strMesh, liPeaks, liPos, liSize, clr)
+            if c.nWaveDrIdx < 0:
+                raise RuntimeError('Error creating waveform drawable')
+        mComponentViews = self.GetComponentViews()
+        for c in liCells:
+            mComponentViews.drActive[c.nWaveDrIdx] = nActive
 
     # Construct and return C++ camera
     def GetCamera(self):
         return Camera.Camera(self.cMatrixUI.GetCameraPtr())
 
-    # To add a row, provide a name, colors, and list of clips
-    def AddRow(self, strName, rowData):
-        # Determine the y pos of this row
-        nRows = len(self.diRows.keys())
+    # The y pos of the nRow'th row
+    @staticmethod
+    def GetRowPosY(nRow):
         nPosY0 = Constants.nGap + Row.nHeaderH / 2
-        nPosY = nPosY0 + nRows * (Row.nHeaderH + Constants.nGap)
+        return nPosY0 + nRow * (Row.nHeaderH + Constants.nGap)
+
+    # Add several rows at once, i.e a whole session. This
+    # reserves UI storage for every entity before adding,
+    # and creates every row's cell components in one call
+    def AddRows(self, diRowData):
+        if self.mArrayScene is not None and self.mArrayScene.mScene is self.mScene:
+            raise RuntimeError('Error: Adding rows to a scene the array matrix is driving')
+
+        # Each row has a header, each cell a circle, each new column a triangle
+        nCells = sum(len(rd.liClipData) for rd in diRowData.values())
+        nNewCols = max([len(rd.liClipData) for rd in diRowData.values()] + [0])
+        nNewCols = max(0, nNewCols - len(self.liCols))
+        nComponents = len(diRowData) + nCells + nNewCols
+        self.cMatrixUI.Reserve(nComponents, nComponents)
+
+        # Every cell, in row order, with its row's off color
+        liCellPos, liCellClr = [], []
+        for nRow, rowData in enumerate(diRowData.values(), len(self.diRows)):
+            nRowCells = len(rowData.liClipData)
+            liCellPos += Row.GetCellPositions(nRowCells, GrooveMatrix.GetRowPosY(nRow))
+            liCellClr += nRowCells * [rowData.clrOff]
+        nShIdx0, nDrIdx0 = -1, -1
+        if nCells:
+            nShIdx0, nDrIdx0 = self.cMatrixUI.AddCells(Cell.strIqmFile, liCellPos, Cell.nRadius, liCellClr)
+            if nShIdx0 < 0 or nDrIdx0 < 0:
+                raise RuntimeError('Error creating cell components')
+
+        # Hand each row its run of components
+        for strName, rowData in diRowData.items():
+            self.AddRow(strName, rowData, nShIdx0, nDrIdx0)
+            nShIdx0 += len(rowData.liClipData)
+            nDrIdx0 += len(rowData.liClipData)
+
+    # To add a row, provide a name, colors, and list of clips (and
+    # optionally the first of its cells' shapes and drawables, see Row)
+    def AddRow(self, strName, rowData, nShIdx0 = -1, nDrIdx0 = -1):
+        # Determine the y pos of this row
+        nPosY = GrooveMatrix.GetRowPosY(len(self.diRows))
 
         # Construct row and add to dict (Cells constructed by Row)
-        r = Row(self, rowData, nPosY)
+        r = Row(self, rowData, nPosY, nShIdx0, nDrIdx0)
+
+        # Rows are dealt out to the clip launchers in turn
+        r.nShard = len(self.diRows) % len(self.liClipLaunchers)
+        for c in r.liCells:
+            c.nShard = r.nShard
 
         # Store this row keyed by its name
         self.diRows[strName] = r
+        if self.mRowMeters is not None:
+            self.mRowMeters.AddRow(r)
 
         # Get the previous col count and the new one
         nPrevCols = len(self.liCols)
@@ -251,6 +874,7 @@ class GrooveMatrix:
                 self.liCols.append(Column(self, nPosX, {r.liCells[colIdx]}))
 
         # Store all entities together for updating and whatnot
-        self.setEntities.add(r)
-        self.setEntities.update(c for c in r.liCells)
-        self.setEntities.update(c for c in self.liCols)
+        # (only this row's entities and any new columns are new)
+        liNewEntities = [r] + r.liCells + self.liCols[nPrevCols:]
+        self.setEntities.update(liNewEntities)
+        self.diShapeEntities.update({e.nShIdx : e for e in liNewEntities})
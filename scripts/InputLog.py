@@ -0,0 +1,169 @@
+import struct
+import time
+import zlib
+from collections import namedtuple
+
+import sdl2
+import sdl2.events
+
+# Input logs are a short header followed by fixed size little endian
+# records, one per handled SDL event. Each record is stamped with the
+# frame and milliseconds since recording started, and how many samples
+# the GrooveMatrix had played at the time (counted from when playback
+# started, it doesn't wrap like the sample position does)
+strLogMagic = b'GMIL'
+nLogVersion = 2
+_sHeader = struct.Struct('<4sI')
+
+# nFrame, nMS, nSamplePos, nType, nCode, nX, nY, nFlags
+# nCode is the key sym / mouse button, nFlags is the key repeat
+_sRecord = struct.Struct('<IIQIiiii')
+InputRecord = namedtuple('InputRecord', ('nFrame', 'nMS', 'nSamplePos', 'nType', 'nCode', 'nX', 'nY', 'nFlags'))
+
+# The SDL events we know how to pack
+setKeyEvents = {sdl2.events.SDL_KEYDOWN, sdl2.events.SDL_KEYUP}
+setButtonEvents = {sdl2.events.SDL_MOUSEBUTTONDOWN, sdl2.events.SDL_MOUSEBUTTONUP}
+
+# Pull the fields we care about out of an SDL event
+def RecordFromSDL(sdlEvent, nFrame, nMS, nSamplePos):
+    nType = sdlEvent.type
+    nCode, nX, nY, nFlags = 0, 0, 0, 0
+    if nType in setKeyEvents:
+        nCode, nFlags = sdlEvent.key.keysym.sym, sdlEvent.key.repeat
+    elif nType in setButtonEvents:
+        b = sdlEvent.button
+        nCode, nX, nY = b.button, b.x, b.y
+    elif nType == sdl2.events.SDL_MOUSEMOTION:
+        nX, nY = sdlEvent.motion.x, sdlEvent.motion.y
+    elif nType == sdl2.events.SDL_MOUSEWHEEL:
+        nX, nY = sdlEvent.wheel.x, sdlEvent.wheel.y
+    return InputRecord(nFrame, nMS, nSamplePos, nType, nCode, nX, nY, nFlags)
+
+# Rebuild an SDL event from a record, good enough for HandleEvent
+def SDLFromRecord(rec):
+    sdlEvent = sdl2.events.SDL_Event()
+    sdlEvent.type = rec.nType
+    if rec.nType in setKeyEvents:
+        sdlEvent.key.keysym.sym = rec.nCode
+        sdlEvent.key.repeat = rec.nFlags
+        sdlEvent.key.state = sdl2.SDL_PRESSED if rec.nType == sdl2.events.SDL_KEYDOWN else sdl2.SDL_RELEASED
+    elif rec.nType in setButtonEvents:
+        b = sdlEvent.button
+        b.button, b.x, b.y = rec.nCode, rec.nX, rec.nY
+        b.state = sdl2.SDL_PRESSED if rec.nType == sdl2.events.SDL_MOUSEBUTTONDOWN else sdl2.SDL_RELEASED
+    elif rec.nType == sdl2.events.SDL_MOUSEMOTION:
+        sdlEvent.motion.x, sdlEvent.motion.y = rec.nX, rec.nY
+    elif rec.nType == sdl2.events.SDL_MOUSEWHEEL:
+        sdlEvent.wheel.x, sdlEvent.wheel.y = rec.nX, rec.nY
+    return sdlEvent
+
+# Read every record in a log file
+def ReadInputLog(strFile):
+    with open(strFile, 'rb') as f:
+        data = f.read()
+    if len(data) < _sHeader.size:
+        raise RuntimeError('Error: Input log too short', strFile)
+    strMagic, nVersion = _sHeader.unpack_from(data, 0)
+    if strMagic != strLogMagic or nVersion != nLogVersion:
+        raise RuntimeError('Error: Not a version', nLogVersion, 'input log', strFile)
+    nRecordBytes = len(data) - _sHeader.size
+    nRecordBytes -= nRecordBytes % _sRecord.size
+    return [InputRecord(*t) for t in _sRecord.iter_unpack(data[_sHeader.size:_sHeader.size + nRecordBytes])]
+
+# Writes records as events are handled. fnClock is called for
+# each one and should return the current (frame, samples played)
+class InputRecorder:
+    def __init__(self, strFile, fnClock):
+        if not hasattr(fnClock, '__call__'):
+            raise ValueError('Error: Input recorder clock not callable!')
+        self.fnClock = fnClock
+        self.nStartFrame = fnClock()[0]
+        self.fStartTime = time.perf_counter()
+        self.nRecords = 0
+        self.mFile = open(strFile, 'wb')
+        self.mFile.write(_sHeader.pack(strLogMagic, nLogVersion))
+
+    def Record(self, sdlEvent):
+        if self.mFile is None:
+            return
+        nFrame, nSamplePos = self.fnClock()
+        nMS = int(1000 * (time.perf_counter() - self.fStartTime))
+        self.mFile.write(_sRecord.pack(*RecordFromSDL(sdlEvent, nFrame - self.nStartFrame, nMS, nSamplePos)))
+        self.nRecords += 1
+
+    def Close(self):
+        if self.mFile is not None:
+            self.mFile.close()
+            self.mFile = None
+
+# Feeds a recorded log back through some HandleEvent function.
+# Pump is called once per frame; in real time mode records go out
+# once as many milliseconds have passed as when they were recorded,
+# otherwise they go out on the same frame (relative to the start)
+# they were recorded on, which replays as fast as frames are run.
+# Replaying by frame, GetSamplesPlayed says how far playback should
+# have got by the end of the frame, so that every record is handled
+# at the sample it was recorded at (see GrooveMatrix.StartReplay)
+class InputReplayer:
+    def __init__(self, strFile, fnHandleEvent, bRealTime = True):
+        if not hasattr(fnHandleEvent, '__call__'):
+            raise ValueError('Error: Input replayer event handler not callable!')
+        self.liRecords = ReadInputLog(strFile)
+        self.fnHandleEvent = fnHandleEvent
+        self.bRealTime = bRealTime
+        self.nNextRecord = 0
+        self.nFrame = 0
+        self.fStartTime = time.perf_counter()
+
+        # The frame and samples played of the last record
+        # handled, which playback was at the frame before
+        self.nPrevFrame = -1
+        self.nPrevSamples = 0
+
+        # Frame times (seconds) and a running digest of
+        # entity states, for comparing replays of the same log
+        self.liFrameTimes = []
+        self.nStateDigest = 0
+
+    def IsDone(self):
+        return self.nNextRecord >= len(self.liRecords)
+
+    # Dispatch any records that are due
+    def Pump(self):
+        nMS = int(1000 * (time.perf_counter() - self.fStartTime))
+        while not(self.IsDone()):
+            rec = self.liRecords[self.nNextRecord]
+            if (rec.nMS if self.bRealTime else rec.nFrame) > (nMS if self.bRealTime else self.nFrame):
+                break
+            self.fnHandleEvent(SDLFromRecord(rec))
+            self.nPrevFrame, self.nPrevSamples = rec.nFrame - 1, rec.nSamplePos
+            self.nNextRecord += 1
+        self.nFrame += 1
+
+    # Samples played by the end of the frame last pumped. That's the
+    # next record's count on the frame before it's handled, and in
+    # between it's ramped up from the last record's (or kept there
+    # once the records have all been handled)
+    def GetSamplesPlayed(self):
+        if self.IsDone():
+            return self.nPrevSamples
+        rec = self.liRecords[self.nNextRecord]
+        nFrame, nNextFrame = self.nFrame - 1, rec.nFrame - 1
+        if nFrame >= nNextFrame:
+            return rec.nSamplePos
+        return self.nPrevSamples + (rec.nSamplePos - self.nPrevSamples) * (nFrame - self.nPrevFrame) // (nNextFrame - self.nPrevFrame)
+
+    # Called after each frame with how long it took
+    # and a string describing the state of the matrix
+    def OnFrameDone(self, fFrameTime, strState):
+        self.liFrameTimes.append(fFrameTime)
+        self.nStateDigest = zlib.crc32(strState.encode(), self.nStateDigest)
+
+    # Frame time stats (in ms) and the state digest
+    def GetSummary(self):
+        liMS = sorted(1000 * t for t in self.liFrameTimes)
+        if len(liMS) == 0:
+            return 'Replayed 0 frames'
+        fnPct = lambda p: liMS[min(len(liMS) - 1, int(p * len(liMS)))]
+        return 'Replayed {} events over {} frames: mean {:.3f} ms, p50 {:.3f} ms, p95 {:.3f} ms, max {:.3f} ms, state digest {:08x}'.format(
+            self.nNextRecord, len(liMS), sum(liMS) / len(liMS), fnPct(.5), fnPct(.95), liMS[-1], self.nStateDigest)
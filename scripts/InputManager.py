@@ -157,9 +157,22 @@ class InputManager:
     def __init__(self, keyMgr, mouseMgr):
         self.keyMgr = keyMgr
         self.mouseMgr = mouseMgr
+        self.mRecorder = None
 
-    # Handle some sdl2 event
+    # Set an InputLog.InputRecorder to record every event we
+    # handle (set to None to stop recording)
+    def SetRecorder(self, recorder):
+        self.mRecorder = recorder
+
+    # Handle some sdl2 event, returns True if anyone handled it
     def HandleEvent(self, sdlEvent):
+        liMgrs = [m for m in (self.keyMgr, self.mouseMgr) if m is not None]
+        bHandled = any(sdlEvent.type in m.setSDLEventsHandled for m in liMgrs)
+
+        # Record it before anything reacts to it
+        if bHandled and self.mRecorder is not None:
+            self.mRecorder.Record(sdlEvent)
+
         # Give key events to the keyboard manager
         if self.keyMgr is not None:
             self.keyMgr.HandleEvent(sdlEvent)
@@ -167,3 +180,5 @@ class InputManager:
         # And mouse events to the mouse manager (will get motion and button)
         if self.mouseMgr is not None:
             self.mouseMgr.HandleEvent(sdlEvent)
+
+        return bHandled
@@ -0,0 +1,93 @@
+from collections import namedtuple
+
+# ClipLauncher::GetLaunchLatencies flattens each launch into this many
+# values: voice ID, click, enqueue, apply and sound times (microseconds),
+# and the sample positions the launch was applied and sounded at
+nLaunchFields = 7
+
+# One launch broken down by stage, times in milliseconds
+LaunchLatency = namedtuple('LaunchLatency', ('nVoiceID', 'fClickToEnqueueMS', 'fEnqueueToApplyMS',
+                                             'fApplyToSoundMS', 'fTotalMS', 'nApplySamplePos', 'nSoundSamplePos'))
+
+# The stages we summarize, in order
+liStages = ['fClickToEnqueueMS', 'fEnqueueToApplyMS', 'fApplyToSoundMS', 'fTotalMS']
+
+# Turn the flat list from the clip launcher into LaunchLatencies
+def LatenciesFromFlat(liFlat):
+    liRet = []
+    for i in range(0, len(liFlat) - nLaunchFields + 1, nLaunchFields):
+        nID, fClick, fEnqueue, fApply, fSound, nApplyPos, nSoundPos = liFlat[i:i + nLaunchFields]
+        liRet.append(LaunchLatency(int(nID), (fEnqueue - fClick) / 1000., (fApply - fEnqueue) / 1000.,
+                                   (fSound - fApply) / 1000., (fSound - fClick) / 1000., int(nApplyPos), int(nSoundPos)))
+    return liRet
+
+# Bin values into nBins equal bins between their min and max,
+# returns a list of (low, high, count) tuples
+def Histogram(liValues, nBins = 10):
+    if len(liValues) == 0:
+        return []
+    fMin, fMax = min(liValues), max(liValues)
+    fWidth = (fMax - fMin) / nBins if fMax > fMin else 1.
+    liCounts = [0] * nBins
+    for f in liValues:
+        liCounts[min(nBins - 1, int((f - fMin) / fWidth))] += 1
+    return [(fMin + i * fWidth, fMin + (i + 1) * fWidth, n) for i, n in enumerate(liCounts)]
+
+# Keeps every launch the clip launchers (the primary and any shards)
+# have logged. They only hold so many, so Pull should be called often
+class LatencyLog:
+    def __init__(self, liClipLaunchers):
+        self.liClipLaunchers = liClipLaunchers
+        self.liLaunches = []
+        # Launches the clip launchers gave up on (see ClipLauncher.h)
+        self.nDropped = 0
+        for cl in self.liClipLaunchers:
+            cl.ClearLaunchLatencies()
+            cl.SetLatencyLogging(True)
+
+    def Close(self):
+        self.Pull()
+        for cl in self.liClipLaunchers:
+            cl.SetLatencyLogging(False)
+
+    # Take whatever the clip launchers have logged since the last pull
+    def Pull(self):
+        for cl in self.liClipLaunchers:
+            liFlat = cl.GetLaunchLatencies()
+            nDropped = cl.GetNumLaunchesDropped()
+            if len(liFlat) or nDropped:
+                cl.ClearLaunchLatencies()
+                self.liLaunches += LatenciesFromFlat(liFlat)
+                self.nDropped += nDropped
+        return self.liLaunches
+
+    # Launches matching a voice ID and / or a predicate
+    def Query(self, nVoiceID = None, fnFilter = None):
+        return [l for l in self.liLaunches
+                if (nVoiceID is None or l.nVoiceID == nVoiceID)
+                and (fnFilter is None or fnFilter(l))]
+
+    def GetHistogram(self, strStage = 'fTotalMS', nBins = 10):
+        return Histogram([getattr(l, strStage) for l in self.liLaunches], nBins)
+
+    # Per stage stats and a histogram of the total
+    def GetSummary(self, nBins = 10):
+        if len(self.liLaunches) == 0:
+            return 'No launches logged, {} dropped'.format(self.nDropped)
+        liLines = ['{} launches, {} dropped'.format(len(self.liLaunches), self.nDropped)]
+        for strStage in liStages:
+            liMS = sorted(getattr(l, strStage) for l in self.liLaunches)
+            fnPct = lambda p: liMS[min(len(liMS) - 1, int(p * len(liMS)))]
+            liLines.append('{:>18}: mean {:9.3f} ms, p50 {:9.3f} ms, p95 {:9.3f} ms, max {:9.3f} ms'.format(
+                strStage, sum(liMS) / len(liMS), fnPct(.5), fnPct(.95), liMS[-1]))
+        liHist = self.GetHistogram('fTotalMS', nBins)
+        nMaxCount = max(n for _, _, n in liHist)
+        for fLo, fHi, n in liHist:
+            liLines.append('{:9.3f} - {:9.3f} ms {:5} {}'.format(fLo, fHi, n, '#' * int(40 * n / nMaxCount)))
+        return '\n'.join(liLines)
+
+    def WriteCSV(self, strFile):
+        with open(strFile, 'w') as f:
+            f.write(','.join(LaunchLatency._fields) + '\n')
+            for l in self.liLaunches:
+                f.write(','.join(str(v) for v in l) + '\n')
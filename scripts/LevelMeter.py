@@ -0,0 +1,81 @@
+from collections import namedtuple
+
+# ClipLauncher::GetLevels flattens the latest levels into the number of
+# buffers metered and the number of voices, followed by this many values
+# (ID, peak and RMS) for each voice and then for each meter
+nLevelFields = 3
+
+# The level of a voice or meter over the last buffer rendered
+Level = namedtuple('Level', ('nID', 'fPeak', 'fRMS'))
+
+# Turn the flat list from the clip launcher into
+# (buffers metered, voice levels by ID, meter levels by ID)
+def LevelsFromFlat(liFlat):
+    if len(liFlat) < 2:
+        return 0, {}, {}
+    nNumBufs, nNumVoices = int(liFlat[0]), int(liFlat[1])
+    liLevels = [Level(int(liFlat[i]), liFlat[i + 1], liFlat[i + 2])
+                for i in range(2, len(liFlat) - nLevelFields + 1, nLevelFields)]
+    return (nNumBufs, {l.nID : l for l in liLevels[:nNumVoices]},
+                      {l.nID : l for l in liLevels[nNumVoices:]})
+
+# Blend two colors, fAmt of the way from clrA to clrB
+def LerpColor(clrA, clrB, fAmt):
+    return [a + fAmt * (b - a) for a, b in zip(clrA, clrB)]
+
+# Lights each row header between its off and on color by the peak
+# of its cells' voices, which the row's clip launcher (see
+# GrooveMatrix.AddRow) meters with the row's ID as their meter. Levels are read once a frame (without locking);
+# the shown level falls back by fDecay per second, like a VU needle
+class RowMeters:
+    def __init__(self, GM, fDecay = 1.5):
+        self.mGM = GM
+        self.fDecay = fDecay
+        self.diShown = {}       # The level shown on each row, by ID
+        self.liNumBufs = [0] * len(GM.liClipLaunchers)
+        self.fLastTime = None
+        for scene in GM._GetScenes():
+            for row in scene.diRows.values():
+                self.AddRow(row)
+        for cl in self.mGM.liClipLaunchers:
+            cl.SetMetering(True)
+
+    def Close(self):
+        for cl in self.mGM.liClipLaunchers:
+            cl.SetMetering(False)
+        for row in self.mGM.diRows.values():
+            row.SetColor(row.clrOff)
+
+    # Meter a row's cells together, or stop metering them
+    def AddRow(self, row):
+        self._SetMeters(row, row.nID)
+
+    def RemoveRow(self, row):
+        self._SetMeters(row, -1)
+        self.diShown.pop(row.nID, None)
+
+    def _SetMeters(self, row, nMeterID):
+        if len(row.liCells):
+            self.mGM.liClipLaunchers[row.nShard].SetVoiceMeters([c.nID for c in row.liCells], [nMeterID] * len(row.liCells))
+
+    # Color the active scene's row headers with the latest levels
+    def Update(self, fTime):
+        fElapsed = 0. if self.fLastTime is None else fTime - self.fLastTime
+        self.fLastTime = fTime
+
+        # Nothing new from a clip launcher unless it rendered since
+        diMeters = {}
+        for i, cl in enumerate(self.mGM.liClipLaunchers):
+            nNumBufs, _, diShardMeters = LevelsFromFlat(cl.GetLevels())
+            if nNumBufs != self.liNumBufs[i]:
+                diMeters.update(diShardMeters)
+            self.liNumBufs[i] = nNumBufs
+
+        for row in self.mGM.diRows.values():
+            fPrev = self.diShown.get(row.nID, 0.)
+            fLevel = max(fPrev - self.fDecay * fElapsed, 0.)
+            if row.nID in diMeters:
+                fLevel = max(fLevel, min(diMeters[row.nID].fPeak, 1.))
+            if fLevel != fPrev:
+                self.diShown[row.nID] = fLevel
+                row.SetColor(LerpColor(row.clrOff, row.clrOn, fLevel))
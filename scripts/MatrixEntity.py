@@ -61,7 +61,7 @@ class MatrixEntity:
             return self.GetActiveState()
 
         # Construct state graph
-        self.mSG = StateGraph.StateGraph(dG, fnAdvance, s0, True)
+        self.mSG = StateGraph.StateGraph(dG, fnAdvance, s0, True, nEntityID = self.nID)
 
     # State access functions
     def GetActiveState(self):
@@ -76,9 +76,15 @@ class MatrixEntity:
     # Set the state directly, this will
     # fail if the states are not neighbors
     def SetState(self, nextState):
-        if nextState != self.GetActiveState() and nextState is not None:
+        if nextState is not None and nextState != self.GetActiveState():
             self.mSG.SetState(nextState)
 
+    # Put our state graph back in its initial state, as if we were just
+    # constructed (whatever the old state was doing is dropped, not
+    # transitioned out of, so nothing gets posted to the clip launcher)
+    def ResetState(self):
+        self.mSG.Reset()
+
     # Get the collision shape from the matrix UI object
     def GetShape(self):
         if self.nShIdx < 0:
@@ -91,6 +97,20 @@ class MatrixEntity:
             raise RuntimeError('Error: Invalid drawable index for Entity', self.nID)
         return Drawable.Drawable(self.mGM.cMatrixUI.GetDrawable(self.nDrIdx))
 
+    # Set our drawable's color through the shared component store,
+    # which avoids constructing a drawable wrapper for every change
+    def SetColor(self, clr):
+        if self.nDrIdx < 0:
+            raise RuntimeError('Error: Invalid drawable index for Entity', self.nID)
+        self.mGM.GetComponentViews().SetColor(self.nDrIdx, clr)
+
+    # Set the sample range our drawable shows progress through
+    # (the shader animates it off MatrixUI's playhead)
+    def SetPlayback(self, nStartSample, nNumSamples):
+        if self.nDrIdx < 0:
+            raise RuntimeError('Error: Invalid drawable index for Entity', self.nID)
+        self.mGM.GetComponentViews().SetPlayback(self.nDrIdx, nStartSample, nNumSamples)
+
     # This syncs up the C++ components with our ID
     def SetComponentID(self):
         self.GetShape().SetEntID(self.nID)
@@ -0,0 +1,76 @@
+import struct
+
+# Just enough OSC 1.0 for the control socket (see ControlSocket): messages
+# with int32, float32 and string args, and bundles of them (whose time
+# tags are ignored). Everything is big endian and padded to 4 bytes
+strBundleTag = '#bundle'
+
+# Strings are null terminated and padded to a multiple of 4 bytes
+def _PackString(str):
+    b = str.encode('utf-8') + b'\0'
+    return b + b'\0' * (-len(b) % 4)
+
+def _UnpackString(data, nOffset):
+    nEnd = data.index(b'\0', nOffset)
+    return data[nOffset:nEnd].decode('utf-8'), nEnd + 1 + (-(nEnd + 1) % 4)
+
+def EncodeMessage(strAddress, *liArgs):
+    strTags, liPacked = ',', []
+    for arg in liArgs:
+        if isinstance(arg, int):
+            strTags += 'i'
+            liPacked.append(struct.pack('>i', arg))
+        elif isinstance(arg, float):
+            strTags += 'f'
+            liPacked.append(struct.pack('>f', arg))
+        elif isinstance(arg, str):
+            strTags += 's'
+            liPacked.append(_PackString(arg))
+        else:
+            raise ValueError('Error: Unsupported OSC argument', arg)
+    return _PackString(strAddress) + _PackString(strTags) + b''.join(liPacked)
+
+# A bundle of encoded messages, to be done at once
+def EncodeBundle(liMessages):
+    return _PackString(strBundleTag) + struct.pack('>Q', 1) + b''.join(
+        struct.pack('>i', len(m)) + m for m in liMessages)
+
+# Decode a packet into a list of (address, args), bundles are flattened.
+# Nested bundles are walked with a stack rather than by recursing, so a
+# packet nested too deep for the interpreter is just a bad packet
+def DecodePacket(data):
+    liMessages, liStack = [], [data]
+    while liStack:
+        data = liStack.pop()
+        strAddress, nOffset = _UnpackString(data, 0)
+        if strAddress == strBundleTag:
+            liElements = []
+            nOffset += 8
+            while nOffset < len(data):
+                nSize, = struct.unpack_from('>i', data, nOffset)
+                if nSize < 0 or nOffset + 4 + nSize > len(data):
+                    raise ValueError('Error: Bad OSC bundle element size', nSize)
+                liElements.append(data[nOffset + 4:nOffset + 4 + nSize])
+                nOffset += 4 + nSize
+            # Reversed so elements come off the stack in order
+            liStack += reversed(liElements)
+            continue
+        liMessages.append((strAddress, _DecodeArgs(data, nOffset)))
+    return liMessages
+
+def _DecodeArgs(data, nOffset):
+    strTags, nOffset = _UnpackString(data, nOffset) if nOffset < len(data) else (',', nOffset)
+    liArgs = []
+    for chTag in strTags[1:]:
+        if chTag == 'i':
+            liArgs.append(struct.unpack_from('>i', data, nOffset)[0])
+            nOffset += 4
+        elif chTag == 'f':
+            liArgs.append(struct.unpack_from('>f', data, nOffset)[0])
+            nOffset += 4
+        elif chTag == 's':
+            s, nOffset = _UnpackString(data, nOffset)
+            liArgs.append(s)
+        else:
+            raise ValueError('Error: Unsupported OSC type tag', chTag)
+    return liArgs
@@ -0,0 +1,46 @@
+import os
+
+from FrameProfile import Percentile
+
+# MatrixUI::GetDrawStats gives the last frame's draw time (ms),
+# draw calls and uniform uploads
+liDrawStats = ['ms', 'draw calls', 'uniform uploads']
+
+# Collects MatrixUI's draw stats for nFrames frames, which should be drawn
+# offscreen (see MatrixUI::SetOffscreen) so they aren't held to the display's
+# refresh. Every nDumpEvery'th frame can be written to strDumpDir as a BMP,
+# i.e to diff against a known good run (replaying the same input log)
+class RenderBench:
+    def __init__(self, cMatrixUI, nFrames, strDumpDir = None, nDumpEvery = 60):
+        self.cMatrixUI = cMatrixUI
+        self.nFrames = nFrames
+        self.strDumpDir = strDumpDir
+        self.nDumpEvery = max(1, nDumpEvery)
+        self.liStats = []
+        self.nDumped = 0
+        if self.strDumpDir:
+            os.makedirs(self.strDumpDir, exist_ok = True)
+
+    def IsDone(self):
+        return len(self.liStats) >= self.nFrames
+
+    # Called once a frame has been drawn
+    def OnFrameDone(self):
+        nFrame = len(self.liStats)
+        self.liStats.append(tuple(self.cMatrixUI.GetDrawStats()))
+        if self.strDumpDir and nFrame % self.nDumpEvery == 0:
+            if self.cMatrixUI.SaveFrame(os.path.join(self.strDumpDir, 'frame{:06}.bmp'.format(nFrame))):
+                self.nDumped += 1
+
+    def GetSummary(self):
+        if len(self.liStats) == 0:
+            return 'No frames rendered'
+        liLines = ['Rendered {} frames {}'.format(len(self.liStats),
+            'offscreen' if self.cMatrixUI.GetIsOffscreen() else 'to the window (times include the swap)')]
+        for i, strStat in enumerate(liDrawStats):
+            liValues = sorted(s[i] for s in self.liStats)
+            liLines.append('{:>16}: mean {:9.3f}, p50 {:9.3f}, p99 {:9.3f}, max {:9.3f}'.format(
+                strStat, sum(liValues) / len(liValues), Percentile(liValues, .5), Percentile(liValues, .99), liValues[-1]))
+        if self.strDumpDir:
+            liLines.append('{} frames written to {}'.format(self.nDumped, self.strDumpDir))
+        return '\n'.join(liLines)
@@ -5,7 +5,6 @@ from Util import Constants
 import Shape
 
 import contextlib
-import networkx as nx
 from collections import namedtuple
 
 class Row(MatrixEntity):
@@ -16,8 +15,17 @@ class Row(MatrixEntity):
     # Useful when constructing
     RowData = namedtuple('RowData', ('liClipData', 'clrOn', 'clrOff', 'fVol0'))
 
-    # Constructor takes rowData, GM, and y position
-    def __init__(self, GM, rowData, nPosY):
+    # Where a row's cells go
+    @staticmethod
+    def GetCellPositions(nCells, nPosY):
+        nCellPosX = Row.nHeaderW + 2 * Constants.nGap + Cell.nRadius
+        nCellPosDelta = 2 * Cell.nRadius + Constants.nGap
+        return [[nCellPosX + i * nCellPosDelta, nPosY] for i in range(nCells)]
+
+    # Constructor takes rowData, GM, and y position. If the cells' UI
+    # components were already made (i.e for a whole session at once)
+    # the index of the first cell shape and drawable can be passed in
+    def __init__(self, GM, rowData, nPosY, nShIdx0 = -1, nDrIdx0 = -1):
         # Create UI components
         nRowX = Constants.nGap + Row.nHeaderW / 2
         self.nShIdx = GM.cMatrixUI.AddShape(Shape.AABB, [nRowX, nPosY], {'w' : Row.nHeaderW, 'h': Row.nHeaderH})
@@ -31,30 +39,26 @@ class Row(MatrixEntity):
         # Move cells to correct pos, set colors
         self.clrOn = rowData.clrOn
         self.clrOff = rowData.clrOff
-        nCellPosX = Row.nHeaderW + 2 * Constants.nGap + Cell.nRadius
-        nCellPosDelta = 2 * Cell.nRadius + Constants.nGap
-
-        # Construct cells from cClips
-        self.liCells = []
-        for clip in rowData.liClipData:
-            # Construct the cell
-            cell = Cell(GM, self, clip, rowData.fVol0)
-
-            # Determine x pos
-            liCellPos = [nCellPosX, nPosY]
 
-            # Set position for shape
-            cShape = cell.GetShape()
-            cShape.SetCenterPos(liCellPos)
+        # Create every cell's shape and drawable in one call
+        nCells = len(rowData.liClipData)
+        if nCells and (nShIdx0 < 0 or nDrIdx0 < 0):
+            liCellPos = Row.GetCellPositions(nCells, nPosY)
+            nShIdx0, nDrIdx0 = GM.cMatrixUI.AddCells(Cell.strIqmFile, liCellPos, Cell.nRadius, [rowData.clrOff])
+            if nShIdx0 < 0 or nDrIdx0 < 0:
+                raise RuntimeError('Error creating cell components')
 
-            # Set position for drawable
-            cDrawable = cell.GetDrawable()
-            cDrawable.SetPos2D(liCellPos)
+        # Our cells keep this count of their states up to date
+        # (they start counting as soon as they're constructed)
+        self.mCellCounts = CellStateCounts()
 
-            cDrawable.SetColor(rowData.clrOff)
-            nCellPosX += nCellPosDelta
+        # Which of the GM's clip launchers plays our cells (see GrooveMatrix.AddRow)
+        self.nShard = 0
 
-            # Add to our list
+        # Construct cells from cClips
+        self.liCells = []
+        for i, clip in enumerate(rowData.liClipData):
+            cell = Cell(GM, self, clip, rowData.fVol0, nShIdx0 + i, nDrIdx0 + i)
             self.liCells.append(cell)
 
         # Set up play state, active and pending are None
@@ -67,7 +71,7 @@ class Row(MatrixEntity):
         stopped = Row.State.Stopped(self)
 
         # Create di graph and add states
-        G = nx.DiGraph()
+        G = StateGraph.DiGraph()
         G.add_edge(switching, playing)
         G.add_edge(stopped, switching)
         G.add_edge(playing, switching)
@@ -77,16 +81,13 @@ class Row(MatrixEntity):
         # switching states takes the next
         # state into account, we must connect
         # all possible switching states
-        for c1 in self.liCells:
+        liSwitching = [Row.State.Switching(self, c) for c in self.liCells]
+        for s1 in liSwitching:
             # Playing/Stopped can switch to this cell
-            s1 = Row.State.Switching(self, c1)
             G.add_edges_from([(stopped, s1), (s1, stopped)]) 
             G.add_edges_from([(playing, s1), (s1, playing)])
-            # Different switching states can switch to each other
-            for c2 in self.liCells:
-                if c2 is not c1:
-                    s2 = Row.State.Switching(self, c2)
-                    G.add_edges_from([(s1, s2), (s2, s1)])
+        # Different switching states can switch to each other
+        StateGraph.AddClique(G, liSwitching)
 
         # Call base constructor to construct state graph
         super(Row, self).__init__(GM, G, stopped)
@@ -94,6 +95,13 @@ class Row(MatrixEntity):
         # Set Component IDs
         self.SetComponentID()
 
+    # Our cells are reset first, so forget
+    # about them before resetting our graph
+    def ResetState(self):
+        self.mActiveCell = None
+        self.mPendingCell = None
+        super(Row, self).ResetState()
+
     # Get the pending or active cell
     def GetPendingCell(self):
         return self.mPendingCell
@@ -104,6 +112,18 @@ class Row(MatrixEntity):
     def GetAllCells(self):
         return self.liCells
 
+    # Find a pending cell other than exclude, this only
+    # scans our cells if the counts say there is one
+    def FindPendingCell(self, exclude = None):
+        nPending = self.mCellCounts.Count(Cell.State.Pending)
+        if exclude is not None and exclude.nStateCode == Cell.State.Pending.nCode:
+            nPending -= 1
+        if nPending > 0:
+            for c in self.liCells:
+                if c is not exclude and c.nStateCode == Cell.State.Pending.nCode:
+                    return c
+        return None
+
     # Row state and base class, inherits from
     # MatrixEntity state and caches Row ref
     class State:
@@ -139,9 +159,9 @@ class Row(MatrixEntity):
             # A stopped row will switch to any pending cells if they become pending
             # Can there be more than one pending cell? I don't think so...
             def Advance(self):
-                for c in self.mRow.GetAllCells():
-                    if isinstance(c.GetActiveState(), Cell.State.Pending):
-                        return Row.State.Switching(self.mRow, c)
+                c = self.mRow.FindPendingCell()
+                if c is not None:
+                    return Row.State.Switching(self.mRow, c)
 
         # A playing row indicates that it has an active playing cell
         class Playing(_state):
@@ -157,8 +177,12 @@ class Row(MatrixEntity):
                     raise RuntimeError('Error: How did we switch to playing?')
                 # If we were already playing, we'll have an active cell
                 if self.mRow.mActiveCell is not None:
-                    # If it's stopped, that means we've switched to a new active cell
-                    if isinstance(self.mRow.mActiveCell.GetActiveState(), Cell.State.Stopped):
+                    # If it's stopped, that means we've switched to a new active cell,
+                    # as we have if the pending cell started before it got to stop
+                    # (it'll still stop at its own trigger)
+                    if isinstance(self.mRow.mActiveCell.GetActiveState(), Cell.State.Stopped) or (
+                            self.mRow.mPendingCell is not None and
+                            self.mRow.mPendingCell.nStateCode == Cell.State.Playing.nCode):
                         self.mRow.mActiveCell = self.mRow.mPendingCell
                     # If the active cell isn't stopped, we reverted from switching to playing
                     else:
@@ -183,11 +207,11 @@ class Row(MatrixEntity):
             # or to stopping if our active cell is stopping
             def Advance(self):
                 # If any of our cells are pending, switch to that cell
-                for c in self.mRow.GetAllCells():
-                    if isinstance(c.GetActiveState(), Cell.State.Pending):
-                        return Row.State.Switching(self.mRow, c)
+                c = self.mRow.FindPendingCell()
+                if c is not None:
+                    return Row.State.Switching(self.mRow, c)
                 # If none were pending and our active state is stopping, we are stopping
-                if isinstance(self.mRow.mActiveCell.GetActiveState(), Cell.State.Stopping):
+                if self.mRow.mActiveCell.nStateCode == Cell.State.Stopping.nCode:
                     return Row.State.Switching(self.mRow, None)
 
         # The switching state denotes that the row's active cell is
@@ -240,26 +264,25 @@ class Row(MatrixEntity):
                     if self.mRow.mActiveCell is None:
                         raise RuntimeError('Error: Why stop twice?')
                     # If our active cell is stopped, we are stopped
-                    if isinstance(self.mRow.mActiveCell.GetActiveState(), Cell.State.Stopped):
+                    if self.mRow.mActiveCell.nStateCode == Cell.State.Stopped.nCode:
                         return Row.State.Stopped(self.mRow)
                     # If it's playing again, then we are playing
-                    if isinstance(self.mRow.mActiveCell.GetActiveState(), Cell.State.Playing):
+                    if self.mRow.mActiveCell.nStateCode == Cell.State.Playing.nCode:
                         return Row.State.Playing(self.mRow)
                 # We are switching to another cell
                 else:
                     # If we have a new pending cell, return a new switching state
-                    for c in self.mRow.liCells:
-                        if c is not self.mNextCell:
-                            if isinstance(c.GetActiveState(), Cell.State.Pending):
-                                return Row.State.Switching(self.mRow, c)
+                    c = self.mRow.FindPendingCell(self.mNextCell)
+                    if c is not None:
+                        return Row.State.Switching(self.mRow, c)
                     # If the next cell starts playing, return playing
-                    if isinstance(self.mNextCell.GetActiveState(), Cell.State.Playing):
+                    if self.mNextCell.nStateCode == Cell.State.Playing.nCode:
                         return Row.State.Playing(self.mRow)
                     # If it went to stopped, revert to either stopped or playing
-                    if isinstance(self.mNextCell.GetActiveState(), Cell.State.Stopped):
+                    if self.mNextCell.nStateCode == Cell.State.Stopped.nCode:
                         if self.mRow.mActiveCell is None:
                             return Row.State.Stopped(self.mRow)
                         else:
                             return Row.State.Playing(self.mRow)
 
-from Cell import Cell
+from Cell import Cell, CellStateCounts
@@ -0,0 +1,35 @@
+from Cell import Cell
+
+# A scene is a whole matrix - its rows, columns and every entity
+# in them. The GM builds scenes ahead of time, with their components
+# hidden, so that switching to one just swaps what the GM looks at
+class Scene:
+    def __init__(self, strName):
+        self.strName = strName
+        self.diRows = {}            # Rows are keyed by name
+        self.liCols = []            # Columns in a list
+        self.setEntities = set()    # All of our entities
+        self.diShapeEntities = {}   # Entities keyed by shape index
+
+    # Show or hide our drawables, and make our shapes
+    # clickable or not (hidden shapes leave the broad-phase)
+    def SetVisible(self, mComponentViews, bVisible):
+        nActive = 1 if bVisible else 0
+        for e in self.setEntities:
+            mComponentViews.drActive[e.nDrIdx] = nActive
+            mComponentViews.shActive[e.nShIdx] = nActive
+            if isinstance(e, Cell) and e.nWaveDrIdx >= 0:
+                mComponentViews.drActive[e.nWaveDrIdx] = nActive
+
+    def GetCells(self):
+        return [e for e in self.setEntities if isinstance(e, Cell)]
+
+    # The cells whose voices are sounding (or will be)
+    def GetSoundingCells(self):
+        return [c for c in self.GetCells() if c.nStateCode in (Cell.State.Playing.nCode, Cell.State.Stopping.nCode)]
+
+    # Put every entity back in its initial state. Cells go
+    # first, since rows and columns count their cells' states
+    def Reset(self):
+        for e in sorted(self.setEntities, key = lambda e : not isinstance(e, Cell)):
+            e.ResetState()
@@ -0,0 +1,95 @@
+import json
+import random
+from collections import namedtuple
+
+from ClipLauncher import Clip
+from Row import Row
+
+# Session files are JSON, listing rows of clips:
+#
+# {
+#     "version" : 1,
+#     "soundDir" : "../sounds/",    (where clip files are, relative to the scripts)
+#     "fadeMS" : 5,                 (default fade length)
+#     "volume" : 0.5,               (default row volume)
+#     "rows" : [
+#         { "name" : "Bass", "clrOn" : [r,g,b,a], "clrOff" : [r,g,b,a], "volume" : 0.5,
+#           "clips" : ["Bass", {"name" : "Bass2", "head" : "b2.wav", "tail" : "b2t.wav", "fadeMS" : 10}] },
+#         ...
+#     ]
+# }
+#
+# A clip can be just a name, in which case its files are soundDir/name_Head.wav
+# and soundDir/name_Tail.wav. Rows without colors get random ones, and
+# anything else left out gets the session's default
+nSessionVersion = 1
+
+# A clip's RegisterClip args and a row of them, before registration
+ClipData = namedtuple('ClipData', ('strName', 'strHeadFile', 'strTailFile', 'nFadeMS'))
+SessionRow = namedtuple('SessionRow', ('strName', 'liClipData', 'clrOn', 'clrOff', 'fVol0'))
+
+# Makes a random (on, off) color pair
+def MakeRndColor():
+    clrOn = [random.uniform(0.5, 0.9) for i in range(4)]
+    clrOff = [c/2 for c in clrOn]
+    return (clrOn, clrOff)
+
+# Parse a session dict into a list of SessionRows in one pass
+def SessionFromDict(diSession):
+    if diSession.get('version', nSessionVersion) != nSessionVersion:
+        raise RuntimeError('Error: Unknown session version', diSession.get('version'))
+
+    strSoundDir = diSession.get('soundDir', '../sounds/')
+    nFadeMS = int(diSession.get('fadeMS', 5))
+    fVolume = float(diSession.get('volume', .5))
+
+    liRows = []
+    for diRow in diSession['rows']:
+        liClipData = []
+        for clip in diRow.get('clips', []):
+            if isinstance(clip, str):
+                liClipData.append(ClipData(clip, strSoundDir + clip + '_Head.wav', strSoundDir + clip + '_Tail.wav', nFadeMS))
+            else:
+                strName = clip['name']
+                liClipData.append(ClipData(strName,
+                                           strSoundDir + clip.get('head', strName + '_Head.wav'),
+                                           strSoundDir + clip.get('tail', strName + '_Tail.wav'),
+                                           int(clip.get('fadeMS', nFadeMS))))
+        clrOn, clrOff = MakeRndColor()
+        liRows.append(SessionRow(diRow['name'], liClipData,
+                                 diRow.get('clrOn', clrOn), diRow.get('clrOff', clrOff),
+                                 float(diRow.get('volume', fVolume))))
+    return liRows
+
+def LoadSession(strFile):
+    with open(strFile, 'r') as f:
+        return SessionFromDict(json.load(f))
+
+# Write rows back out in the session format (clips are written in full)
+def SaveSession(strFile, liRows, strSoundDir = ''):
+    diSession = {'version' : nSessionVersion, 'soundDir' : strSoundDir, 'rows' : [
+        {'name' : r.strName, 'clrOn' : list(r.clrOn), 'clrOff' : list(r.clrOff), 'volume' : r.fVol0,
+         'clips' : [{'name' : c.strName, 'head' : c.strHeadFile, 'tail' : c.strTailFile, 'fadeMS' : c.nFadeMS}
+                    for c in r.liClipData]} for r in liRows]}
+    with open(strFile, 'w') as f:
+        json.dump(diSession, f, separators = (',', ':'))
+
+# Register every clip in the session with one call to the clip launcher,
+# returns the rows as a dict of Row.RowData (what GrooveMatrix.AddRows wants)
+# with clips that couldn't be registered (and then empty rows) left out
+def RegisterSession(cClipLauncher, liRows):
+    liAllClips = [c for r in liRows for c in r.liClipData]
+    if len(liAllClips) == 0:
+        return {}
+    liRegistered = cClipLauncher.RegisterClips(*(list(l) for l in zip(*liAllClips)))
+
+    # Get the clips that made it, also in one call
+    liNames = [c.strName for c, bReg in zip(liAllClips, liRegistered) if bReg]
+    diClips = {strName : Clip(pClip) for strName, pClip in zip(liNames, cClipLauncher.GetClips(liNames))}
+
+    diRowClips = {}
+    for r in liRows:
+        liClips = [diClips[c.strName] for c in r.liClipData if c.strName in diClips]
+        if len(liClips):
+            diRowClips[r.strName] = Row.RowData(liClips, r.clrOn, r.clrOff, r.fVol0)
+    return diRowClips
@@ -0,0 +1,100 @@
+import builtins
+import sys
+import time
+
+# Times where startup goes - named phases (i.e clip loading) and
+# every module imported while the profile is running. Import times
+# are "self" times, i.e a module's time minus its own imports'
+class StartupProfile:
+    def __init__(self):
+        self.fStartTime = time.perf_counter()
+        self.liPhases = []
+        self.liNotes = []
+        self.diImportTimes = {}
+        self._fnImport = None
+        self._liImportStack = []
+
+    # Start timing imports by wrapping __import__
+    def Start(self):
+        if self._fnImport is not None:
+            return
+        self._fnImport = builtins.__import__
+        fnImport = self._fnImport
+
+        def fnTimedImport(name, *args, **kwargs):
+            nonlocal self
+            # Modules already imported cost next to nothing
+            if name in sys.modules:
+                return fnImport(name, *args, **kwargs)
+            self._liImportStack.append(0.)
+            fStart = time.perf_counter()
+            try:
+                return fnImport(name, *args, **kwargs)
+            finally:
+                fTotal = time.perf_counter() - fStart
+                fChildren = self._liImportStack.pop()
+                self.diImportTimes[name] = self.diImportTimes.get(name, 0.) + fTotal - fChildren
+                if len(self._liImportStack):
+                    self._liImportStack[-1] += fTotal
+
+        builtins.__import__ = fnTimedImport
+
+    def Stop(self):
+        if self._fnImport is not None:
+            builtins.__import__ = self._fnImport
+            self._fnImport = None
+
+    # Context manager timing one phase of startup
+    class _phase:
+        def __init__(self, profile, strName):
+            self.profile = profile
+            self.strName = strName
+        def __enter__(self):
+            self.fStart = time.perf_counter()
+        def __exit__(self, *args):
+            self.profile.liPhases.append((self.strName, time.perf_counter() - self.fStart))
+
+    def Phase(self, strName):
+        return StartupProfile._phase(self, strName)
+
+    # Anything else worth reporting (i.e how much memory clips take)
+    def Note(self, strName, strNote):
+        self.liNotes.append((strName, strNote))
+
+    # Phase times, then the slowest imports
+    def GetReport(self, nImports = 15):
+        liLines = ['Startup took {:.1f} ms'.format(1000 * (time.perf_counter() - self.fStartTime))]
+        for strName, fTime in self.liPhases:
+            liLines.append('{:>24}: {:8.1f} ms'.format(strName, 1000 * fTime))
+        for strName, strNote in self.liNotes:
+            liLines.append('{:>24}: {}'.format(strName, strNote))
+        liImports = sorted(self.diImportTimes.items(), key = lambda kv : kv[1], reverse = True)
+        if len(liImports):
+            liLines.append('Slowest imports ({:.1f} ms in {} modules):'.format(
+                1000 * sum(self.diImportTimes.values()), len(liImports)))
+            for strName, fTime in liImports[:nImports]:
+                liLines.append('{:>24}: {:8.1f} ms'.format(strName, 1000 * fTime))
+        return '\n'.join(liLines)
+
+# A do-nothing profile, used when profiling is off
+class NullProfile:
+    class _phase:
+        def __enter__(self):
+            pass
+        def __exit__(self, *args):
+            pass
+
+    def Start(self):
+        pass
+
+    def Stop(self):
+        pass
+
+    def Phase(self, strName):
+        return NullProfile._phase()
+
+    def Note(self, strName, strNote):
+        pass
+
+    def GetReport(self, nImports = 15):
+        return ''
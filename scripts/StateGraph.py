@@ -1,7 +1,54 @@
-import networkx as nx
 import abc
+import os
 import random
 import contextlib
+import itertools
+
+from TransitionTrace import g_TransitionTrace, nTraceVerbose
+
+# A directed graph of states, which is all the entities need. Nodes
+# are kept in insertion order, and neighbors are the successors
+# of a node (same as a networkx DiGraph, which takes a while to import)
+class DiGraph:
+    def __init__(self):
+        self._succ = {}
+        self._cliques = {}
+
+    def add_edge(self, u, v):
+        self._succ.setdefault(u, {})[v] = None
+        self._succ.setdefault(v, {})
+
+    def add_edges_from(self, liEdges):
+        for u, v in liEdges:
+            self.add_edge(u, v)
+
+    # Every node in liNodes can go to every other one; rather
+    # than storing n^2 edges we keep the list and walk it
+    def add_clique(self, liNodes):
+        liNodes = list(liNodes)
+        for n in liNodes:
+            self._succ.setdefault(n, {})
+            self._cliques.setdefault(n, []).append(liNodes)
+
+    def neighbors(self, n):
+        if n not in self._cliques:
+            return iter(self._succ[n])
+        return itertools.chain(self._succ[n], (m for liNodes in self._cliques[n] for m in liNodes if m != n))
+
+    def nodes(self):
+        return list(self._succ.keys())
+
+# If networkx is wanted (i.e to analyze or draw the
+# graphs) set GM_USE_NETWORKX and we'll use its DiGraph
+if os.environ.get('GM_USE_NETWORKX'):
+    from networkx import DiGraph
+
+# Connect every node in liNodes to every other one
+def AddClique(G, liNodes):
+    if hasattr(G, 'add_clique'):
+        G.add_clique(liNodes)
+    else:
+        G.add_edges_from((u, v) for u in liNodes for v in liNodes if u != v)
 
 # Generic state class, must have a
 # context management function and a name
@@ -35,31 +82,12 @@ class StateGraph:
         self._fnAdvance = fnAdvance
         self._mNextStateOverride = None
 
-        # A coroutine that manages active state contexts
-        def stateCoro(self):
-            prevState = None
-            if self.activeState is None:
-                nextState = self._fnAdvance(self)
-            else:
-                nextState = self.activeState
-
-            while True:
-                self.activeState = nextState
-                with self.activeState.Activate(self, prevState):
-                    while nextState is self.activeState:
-                        yield self.activeState
-                        if self._mNextStateOverride is not None:
-                            nextState = self._mNextStateOverride
-                            self._mNextStateOverride = None
-                        else:
-                            nextState = self._fnAdvance(self)
-                    if nextState not in self.G.neighbors(self.activeState):
-                        raise RuntimeError('Error: Invalid state transition!', self.activeState, nextState)
-                    print(self.activeState, nextState)
-                prevState = self.activeState
-
-        # Declare coro, do not prime (?)
-        self._stateCoro = stateCoro(self)
+        # Who we are in the transition trace, pass nEntityID to set
+        self.nEntityID = -1
+
+        # The state coro manages active state contexts
+        self._initialState = initialState
+        self._stateCoro = self._runStates()
         if bPrime:
             self.AdvanceState()
 
@@ -68,12 +96,40 @@ class StateGraph:
             for k, v in kwargs.items():
                 setattr(self, k, v)
 
+    # A coroutine that manages active state contexts
+    def _runStates(self):
+        prevState = None
+        if self.activeState is None:
+            nextState = self._fnAdvance(self)
+        else:
+            nextState = self.activeState
+
+        while True:
+            self.activeState = nextState
+            with self.activeState.Activate(self, prevState):
+                while nextState is self.activeState:
+                    yield self.activeState
+                    if self._mNextStateOverride is not None:
+                        nextState = self._mNextStateOverride
+                        self._mNextStateOverride = None
+                    else:
+                        nextState = self._fnAdvance(self)
+                # Traced before it's checked, so an invalid
+                # transition is the last thing in the trace
+                if g_TransitionTrace.nLevel:
+                    g_TransitionTrace.Add(self.nEntityID, self.activeState, nextState)
+                if nextState not in self.G.neighbors(self.activeState):
+                    raise RuntimeError('Error: Invalid state transition!', self.activeState, nextState)
+            prevState = self.activeState
+
     # Returns the current active state
     def GetActiveState(self):
         return self.activeState
 
     def SetState(self, nextState):
         if nextState not in self.G.neighbors(self.activeState):
+            if g_TransitionTrace.nLevel:
+                g_TransitionTrace.Add(self.nEntityID, self.activeState, nextState)
             raise RuntimeError('Error: Invalid state transition!', self.activeState, nextState)
         self._mNextStateOverride = nextState
         next(self._stateCoro)
@@ -92,3 +148,20 @@ class StateGraph:
     # Just returns states in a container
     def GetAllStates(self):
         return self.G.nodes()
+
+    # Shut down the state coro, exiting the active state's context
+    def Close(self):
+        self._stateCoro.close()
+
+    # Go back to the initial state. The state coro is closed, which
+    # exits the active state's context without transitioning anywhere,
+    # and a new one is started that activates the initial state again
+    def Reset(self, bPrime = True):
+        if g_TransitionTrace.nLevel >= nTraceVerbose and self.activeState is not None:
+            g_TransitionTrace.Add(self.nEntityID, self.activeState, self._initialState)
+        self.Close()
+        self.activeState = self._initialState
+        self._mNextStateOverride = None
+        self._stateCoro = self._runStates()
+        if bPrime:
+            self.AdvanceState()
@@ -0,0 +1,275 @@
+import os
+import random
+import time
+import traceback
+
+from Cell import Cell
+from Row import Row
+from Column import Column
+from Session import MakeRndColor
+import FrameProfile as FP
+from TransitionTrace import g_TransitionTrace, nTraceTransitions
+
+# How a stress frame clicks, and how likely each way is. Idle frames let
+# pending and stopping cells reach their triggers, toggles click the same
+# entity several times in one frame and the rest click at random
+liPatterns = [('idle', .3), ('cells', .35), ('toggle', .15), ('columns', .1), ('rows', .1)]
+
+# How many failed runs get their transition trace written out
+nMaxTraceDumps = 5
+
+# A synthetic matrix of nRows rows of nCols cells, made by dealing out
+# the clips of the rows in diRowClips (see Session.RegisterSession)
+def MakeStressRows(diRowClips, nRows, nCols):
+    liClips = [c for rowData in diRowClips.values() for c in rowData.liClipData]
+    if len(liClips) == 0:
+        raise RuntimeError('Error: No clips to build a stress matrix from')
+    diRows = {}
+    for r in range(nRows):
+        clrOn, clrOff = MakeRndColor()
+        liRowClips = [liClips[(r * nCols + c) % len(liClips)] for c in range(nCols)]
+        diRows['stress{}'.format(r)] = Row.RowData(liRowClips, clrOn, clrOff, .5)
+    return diRows
+
+# The nearest rank percentile of values
+def Percentile(liValues, fPct):
+    return FP.Percentile(sorted(liValues), fPct)
+
+# Runs the active scene through nRuns seeded runs of nFrames frames each.
+# Every frame clicks some entities (the way the mouse does, without solving
+# in between), then advances a simulated clock by 0 to nMaxBufs buffers, so
+# clicks land anywhere relative to buffer boundaries and triggers. Guarded
+# runs click the way the control socket does instead, only clicking what's
+# settled and solving after each click, which keeps clear of the clicks the
+# entities can't take and so measures long runs rather than finding those. Solver
+# iterations, transitions and wall time are recorded for every frame. Any
+# error (i.e an invalid transition) ends its run; it's recorded (and the run's transitions written out)
+# and the matrix reset for the next run. With bCompareArray, an ArrayMatrix
+# (which needs numpy) is given the same clicks and buffers, and the cell
+# states of the two are compared every frame; a run's first mismatch is
+# recorded, and the array model sits out the rest of the run. Only guarded
+# runs can be compared, since the array model solves after every click
+class StateStress:
+    # Each frame's record
+    liFields = ['run', 'frame', 'pattern', 'clicks', 'buffers', 'ms', 'solves',
+                'iterations', 'max iterations', 'updates', 'transitions', 'error']
+
+    def __init__(self, GM, nRuns, nFrames, nClicks, nMaxBufs, bGuarded = False, strCSVFile = None, fBudget = .015, bCompareArray = False):
+        self.mGM = GM
+        self.nRuns = nRuns
+        self.nFrames = nFrames
+        self.nClicks = nClicks
+        self.nMaxBufs = nMaxBufs
+        self.bGuarded = bGuarded
+        self.strCSVFile = strCSVFile
+        self.fBudget = fBudget
+        self.bCompareArray = bCompareArray
+        if bCompareArray and not bGuarded:
+            raise ValueError('Error: The array model can only be checked on guarded runs')
+
+        # Everything clickable in the active scene
+        self.liCells = GM.GetScene().GetCells()
+        self.liRows = list(GM.diRows.values())
+        self.liCols = list(GM.liCols)
+        if len(self.liCells) == 0:
+            raise RuntimeError('Error: Nothing to stress')
+
+        # Frames are timed with a profile of our own, and transitions traced
+        self.mPrevProfile = GM.GetFrameProfile()
+        self.nPrevTraceLevel = g_TransitionTrace.nLevel
+        g_TransitionTrace.SetLevel(max(self.nPrevTraceLevel, nTraceTransitions))
+
+        # The simulated count of completed buffers
+        self.nNumBufs = 0
+        GM.SetBufferClock(lambda : self.nNumBufs)
+
+        # The array model's cells are in row order, and its columns in
+        # the order Columns were made; these are its indices for ours
+        liArrayCells = [c for row in GM.diRows.values() for c in row.liCells]
+        self.diArrayIdx = {c : i for i, c in enumerate(liArrayCells)}
+        self.diArrayIdx.update({row : i for i, row in enumerate(GM.diRows.values())})
+        self.diArrayIdx.update({col : i for i, col in enumerate(GM.liCols)})
+        self.liArrayCells = liArrayCells
+        self.mArray = None
+        self.liMismatches = []
+        self.nCompared = 0
+
+        self.liRecords = []
+        self.liErrors = []
+        self.nSkipped = 0
+        self.nRun = -1
+        self._StartRun()
+
+    def IsDone(self):
+        return self.nRun >= self.nRuns
+
+    # Run as many frames as fit in our budget, so the window stays responsive
+    def Update(self, fnFrame):
+        fStart = time.perf_counter()
+        while not self.IsDone() and time.perf_counter() - fStart < self.fBudget:
+            self._RunFrame(fnFrame)
+
+    # Put the matrix back the way it was built and seed the next run
+    def _StartRun(self):
+        self.mGM.ResetScene()
+        self.mGM.cClipLauncher.SetPlayPause(False)
+        self.mGM.Reset()
+        g_TransitionTrace.Clear()
+        self.nRun += 1
+        self.nFrame = 0
+        self.mProfile = FP.FrameProfile(self.nFrames)
+        self.mGM.mFrameProfile = self.mProfile
+        self.rng = random.Random(self.nRun)
+        if self.IsDone():
+            self._Finish()
+        elif self.bCompareArray:
+            self.mArray = self._MakeArrayMatrix()
+
+    # An array model of the active scene, all stopped
+    def _MakeArrayMatrix(self):
+        from ArrayMatrix import ArrayMatrix
+        mArray = ArrayMatrix(self.mGM.GetPreTrigger())
+        mArray.AddRows({strName : Row.RowData([c.cClip for c in row.liCells], row.clrOn, row.clrOff, 1.)
+                        for strName, row in self.mGM.diRows.items()})
+        return mArray
+
+    def _Finish(self):
+        self.mGM.SetBufferClock(None)
+        self.mGM.mFrameProfile = self.mPrevProfile
+        g_TransitionTrace.SetLevel(self.nPrevTraceLevel)
+        if self.strCSVFile:
+            with open(self.strCSVFile, 'w') as f:
+                f.write(','.join(StateStress.liFields) + '\n')
+                for rec in self.liRecords:
+                    f.write(','.join(str(v) for v in rec) + '\n')
+
+    # Pick this frame's clicks
+    def _PickClicks(self):
+        rng = self.rng
+        fPick = rng.random() * sum(w for _, w in liPatterns)
+        for strPattern, fWeight in liPatterns:
+            fPick -= fWeight
+            if fPick < 0:
+                break
+        if strPattern == 'cells':
+            return strPattern, [rng.choice(self.liCells) for _ in range(self.nClicks)]
+        if strPattern == 'toggle':
+            ent = rng.choice(self.liCells + self.liRows + self.liCols)
+            return strPattern, [ent] * rng.randint(2, max(2, self.nClicks))
+        if strPattern == 'columns' and len(self.liCols):
+            return strPattern, [rng.choice(self.liCols) for _ in range(self.nClicks)]
+        if strPattern == 'rows' and len(self.liRows):
+            return strPattern, [rng.choice(self.liRows) for _ in range(self.nClicks)]
+        return 'idle', []
+
+    def _Click(self, ent):
+        if not self.bGuarded:
+            ent.OnLButtonUp()
+        elif self.mGM.IsSettled([ent] if isinstance(ent, Cell) else ent.liCells if isinstance(ent, Row) else ent.setCells):
+            self.mGM.ApplyClick(ent)
+        else:
+            self.nSkipped += 1
+            return
+        if self.mArray is not None:
+            nIdx = self.diArrayIdx[ent]
+            if isinstance(ent, Cell):
+                self.mArray.ClickCell(nIdx)
+            elif isinstance(ent, Row):
+                self.mArray.ClickRow(nIdx)
+            elif isinstance(ent, Column):
+                self.mArray.ClickColumn(nIdx)
+
+    # Move the array model over what the frame just did, and see if its
+    # cells are where ours are; a mismatch is recorded and ends the check
+    def _CompareArray(self, bWasPlaying, nPos, nInc):
+        if bWasPlaying:
+            self.mArray.Advance(nPos, nInc)
+        else:
+            self.mArray.StartPending()
+        self.nCompared += 1
+        for c, nState in zip(self.liArrayCells, self.mArray.anState):
+            if c.nStateCode != nState:
+                self.liMismatches.append((self.nRun, self.nFrame, c.nID, c.nStateCode, int(nState)))
+                self.mArray = None
+                return
+
+    def _RunFrame(self, fnFrame):
+        strPattern, liClicks = self._PickClicks()
+        nBufs = self.rng.randint(0, self.nMaxBufs)
+        nTransitions = g_TransitionTrace.nAdded
+
+        self.mProfile.BeginFrame()
+        strError = ''
+        try:
+            for ent in liClicks:
+                self._Click(ent)
+            # The clock only runs while the clip launcher's playing
+            bWasPlaying = self.mGM.cClipLauncher.GetPlayPause()
+            if bWasPlaying:
+                self.nNumBufs += nBufs
+            else:
+                self.nNumBufs = 0
+            nPos = self.mGM.GetCurrentSamplePos()
+            nInc = (self.nNumBufs - self.mGM.nNumBufsCompleted) * self.mGM.cClipLauncher.GetBufferSize()
+            fnFrame()
+            if self.mArray is not None:
+                self._CompareArray(bWasPlaying, nPos, nInc)
+        except Exception as e:
+            # Keep what and where, without commas so it can go in the CSV
+            fs = traceback.extract_tb(e.__traceback__)[-1]
+            strError = '{}: {} ({}:{})'.format(type(e).__name__, ' '.join(str(a) for a in e.args),
+                                               os.path.basename(fs.filename), fs.lineno).replace(',', ';')
+        self.mProfile.EndFrame()
+
+        liFrame = self.mProfile.liFrame
+        self.liRecords.append((self.nRun, self.nFrame, strPattern, len(liClicks), nBufs,
+                               1000. * (liFrame[FP.nFrameEnd] - liFrame[FP.nFrameStart]), liFrame[FP.nSolves],
+                               liFrame[FP.nIters], liFrame[FP.nMaxIters], liFrame[FP.nUpdates],
+                               g_TransitionTrace.nAdded - nTransitions, strError))
+        self.nFrame += 1
+
+        if strError:
+            strTrace = None
+            if len(self.liErrors) < nMaxTraceDumps:
+                strTrace = g_TransitionTrace.Dump('stress_run{}.csv'.format(self.nRun))
+            self.liErrors.append((self.nRun, self.nFrame - 1, strError, strTrace))
+            self._StartRun()
+        elif self.nFrame >= self.nFrames:
+            self._StartRun()
+
+    def GetSummary(self):
+        liLines = ['State stress: {} {} runs of up to {} frames, {} cells in {} rows and {} columns, {} clicks a frame'.format(
+            self.nRuns, 'guarded' if self.bGuarded else 'raw', self.nFrames, len(self.liCells), len(self.liRows), len(self.liCols), self.nClicks)]
+        if len(self.liRecords) == 0:
+            return '\n'.join(liLines)
+        liLines.append('{} frames run, {} runs failed{}'.format(len(self.liRecords), len(self.liErrors),
+            ', {} clicks skipped as unsettled'.format(self.nSkipped) if self.bGuarded else ''))
+        if self.bCompareArray:
+            liLines.append('Array model checked over {} frames, {} runs mismatched{}'.format(self.nCompared, len(self.liMismatches),
+                ' - first in run {} at frame {}: cell {} is {} but {} in the array'.format(*self.liMismatches[0]) if self.liMismatches else ''))
+
+        # Distributions over every frame
+        for strField, strFmt in (('ms', '{:8.3f}'), ('iterations', '{:8.1f}'), ('max iterations', '{:8.1f}'),
+                                 ('updates', '{:8.1f}'), ('transitions', '{:8.1f}')):
+            nIdx = StateStress.liFields.index(strField)
+            liValues = [rec[nIdx] for rec in self.liRecords]
+            liLines.append(('{:>15}: mean ' + strFmt + ', p50 ' + strFmt + ', p99 ' + strFmt + ', max ' + strFmt).format(
+                strField, sum(liValues) / len(liValues), Percentile(liValues, .5), Percentile(liValues, .99), max(liValues)))
+
+        # How close the longest solves came to the limit
+        nIdx = StateStress.liFields.index('max iterations')
+        diCounts = {}
+        for rec in self.liRecords:
+            diCounts[rec[nIdx]] = diCounts.get(rec[nIdx], 0) + 1
+        liLines.append('Frames by longest solve: ' + ', '.join(
+            '{} iterations: {}'.format(n, diCounts[n]) for n in sorted(diCounts)))
+
+        # Errors grouped by what and where, with the first run that hit each
+        diErrors = {}
+        for nRun, nFrame, strError, strTrace in self.liErrors:
+            diErrors.setdefault(strError, []).append((nRun, nFrame, strTrace))
+        for strError, liHits in sorted(diErrors.items(), key = lambda kv : -len(kv[1])):
+            nRun, nFrame, strTrace = liHits[0]
+            liLines.append('{:5} x {} - first in run {} at frame {}{}'.format(
+                len(liHits), strError, nRun, nFrame, ', trace in ' + strTrace if strTrace else ''))
+        return '\n'.join(liLines)
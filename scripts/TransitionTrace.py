@@ -0,0 +1,78 @@
+from collections import namedtuple
+
+# State graphs report their transitions here rather than printing them.
+# Entries go in a fixed size ring (the oldest are overwritten), so tracing
+# never allocates or touches stdout while the matrix runs; the ring is
+# written out on demand, or when an error escapes a frame
+#
+# Levels are cumulative, checking the level is all that's done when off
+nTraceOff = 0
+nTraceTransitions = 1   # Every state change
+nTraceVerbose = 2       # Also state graph resets (i.e scene switches)
+
+# One transition, stamped with the frame and sample pos it happened at
+TraceEntry = namedtuple('TraceEntry', ('nEntityID', 'strFrom', 'strTo', 'nFrame', 'nSamplePos'))
+
+class TransitionTrace:
+    def __init__(self, nSize = 4096, nLevel = nTraceOff, strFile = 'transitions.csv'):
+        self.nLevel = nLevel
+        self.strFile = strFile
+        self.fnClock = lambda : (0, 0)
+        self.Resize(nSize)
+
+    def SetLevel(self, nLevel):
+        self.nLevel = nLevel
+
+    # fnClock should return the current (frame, sample pos)
+    def SetClock(self, fnClock):
+        if not hasattr(fnClock, '__call__'):
+            raise ValueError('Error: Trace clock not callable!')
+        self.fnClock = fnClock
+
+    # Make a new (empty) ring holding nSize entries
+    def Resize(self, nSize):
+        if nSize < 1:
+            raise ValueError('Error: Invalid trace size', nSize)
+        self.liRing = [None] * nSize
+        self.nAdded = 0
+
+    def Clear(self):
+        self.Resize(len(self.liRing))
+
+    # Callers check the level first, so this only runs when it's wanted
+    def Add(self, nEntityID, fromState, toState):
+        nFrame, nSamplePos = self.fnClock()
+        self.liRing[self.nAdded % len(self.liRing)] = (nEntityID, fromState.name, toState.name, nFrame, nSamplePos)
+        self.nAdded += 1
+
+    # How many entries have been overwritten
+    def GetNumDropped(self):
+        return max(0, self.nAdded - len(self.liRing))
+
+    # The entries in the ring, oldest first
+    def GetEntries(self):
+        nSize = len(self.liRing)
+        if self.nAdded <= nSize:
+            liEntries = self.liRing[:self.nAdded]
+        else:
+            nOldest = self.nAdded % nSize
+            liEntries = self.liRing[nOldest:] + self.liRing[:nOldest]
+        return [TraceEntry(*t) for t in liEntries]
+
+    # Write the entries to a CSV file (ours if none is given), returns the file
+    def Dump(self, strFile = None):
+        strFile = strFile or self.strFile
+        with open(strFile, 'w') as f:
+            f.write(','.join(TraceEntry._fields) + '\n')
+            for e in self.GetEntries():
+                f.write(','.join(str(v) for v in e) + '\n')
+        return strFile
+
+    # Called when an error escapes a frame, dumps if we were tracing
+    def DumpOnError(self):
+        if self.nLevel > nTraceOff and self.nAdded > 0:
+            print('Transition trace ({} entries, {} dropped) written to'.format(
+                min(self.nAdded, len(self.liRing)), self.GetNumDropped()), self.Dump())
+
+# The trace every state graph reports to
+g_TransitionTrace = TransitionTrace()
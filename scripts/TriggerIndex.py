@@ -0,0 +1,46 @@
+import bisect
+import sys
+
+# The GM keeps one of these for its armed (pending or stopping) cells,
+# sorted by the sample pos at which their triggers are hit. Whenever the
+# GM's window (the samples a frame advances over) changes, the cells
+# whose triggers lie in it are found with two bisects, so a cell checking
+# its trigger is a set lookup, and frames only pay for triggers that fire
+class TriggerIndex:
+    def __init__(self):
+        self.liKeys = []        # Sorted (nTriggerPos, nID) of armed cells
+        self.diKeys = {}        # Each armed cell's key, by ID
+        self.setHit = set()     # IDs of cells whose trigger is in the window
+        self.nWindowBegin = 0
+        self.nWindowEnd = 0
+
+    # Arm a cell (or move its trigger), it's hit if the window
+    # goes past nTriggerPos, i.e nWindowBegin < nTriggerPos <= nWindowEnd
+    def Arm(self, nID, nTriggerPos):
+        self.Disarm(nID)
+        key = (nTriggerPos, nID)
+        bisect.insort(self.liKeys, key)
+        self.diKeys[nID] = key
+        if self.nWindowBegin < nTriggerPos <= self.nWindowEnd:
+            self.setHit.add(nID)
+
+    def Disarm(self, nID):
+        key = self.diKeys.pop(nID, None)
+        if key is not None:
+            del self.liKeys[bisect.bisect_left(self.liKeys, key)]
+            self.setHit.discard(nID)
+
+    # Move the window, finding the triggers now in it
+    def SetWindow(self, nBegin, nEnd):
+        if nBegin == self.nWindowBegin and nEnd == self.nWindowEnd:
+            return
+        self.nWindowBegin, self.nWindowEnd = nBegin, nEnd
+        nLo = bisect.bisect_right(self.liKeys, (nBegin, sys.maxsize))
+        nHi = bisect.bisect_right(self.liKeys, (nEnd, sys.maxsize))
+        self.setHit = {nID for _, nID in self.liKeys[nLo:nHi]}
+
+    def IsHit(self, nID):
+        return nID in self.setHit
+
+    def GetNumArmed(self):
+        return len(self.liKeys)
@@ -2,13 +2,21 @@
 class Constants:
     nGap = 10
 
-# Used to construct ctypes sdl2 object
-# from pointer to object in C++
+# Used to get the address of the C++ object
+# held by a pyl capsule (i.e an object's c_ptr)
 import ctypes
-def ctype_from_addr(capsule, type):
+def addr_from_capsule(capsule):
     ctypes.pythonapi.PyCapsule_GetPointer.restype = ctypes.c_void_p
     ctypes.pythonapi.PyCapsule_GetPointer.argtypes = [ctypes.py_object, ctypes.c_char_p]
     addr = ctypes.pythonapi.PyCapsule_GetPointer(capsule, None)
+    if addr is None:
+        return 0
+    return addr
+
+# Used to construct ctypes sdl2 object
+# from pointer to object in C++
+def ctype_from_addr(capsule, type):
+    addr = addr_from_capsule(capsule)
     if (addr != 0):
         return type.from_address(addr)
     raise RuntimeError('Error constructing ctype object, invalid capsule address')
@@ -1,24 +1,38 @@
-# Used for debugging
-# secret@localhost:5678
-import ptvsd
-ptvsd.enable_attach(secret = None)
-#ptvsd.wait_for_attach(30)
-
-import sdl2
-import ctypes
-from collections import namedtuple
-
-import Camera
-import Shader
-import Drawable
-from MatrixUI import MatrixUI
-from ClipLauncher import ClipLauncher, Clip
+import os
 
-from Util import Constants, ctype_from_addr
-from GrooveMatrix import Row, Cell, GrooveMatrix, Column
-import InputManager
+# Startup can be profiled (set GM_PROFILE_STARTUP), which
+# times each phase of Initialize and every module imported
+from StartupProfile import StartupProfile, NullProfile
+g_StartupProfile = StartupProfile() if os.environ.get('GM_PROFILE_STARTUP') else NullProfile()
+g_StartupProfile.Start()
 
-import random
+# Used for debugging, only attached if GM_DEBUG_ATTACH is set
+# (and GM_DEBUG_WAIT waits that many seconds for it)
+# secret@localhost:5678
+if os.environ.get('GM_DEBUG_ATTACH'):
+    with g_StartupProfile.Phase('debugger'):
+        import ptvsd
+        ptvsd.enable_attach(secret = None)
+        if os.environ.get('GM_DEBUG_WAIT'):
+            ptvsd.wait_for_attach(float(os.environ['GM_DEBUG_WAIT']))
+
+with g_StartupProfile.Phase('imports'):
+    import sdl2
+    import ctypes
+    from collections import namedtuple
+
+    import Camera
+    import Shader
+    import Drawable
+    from MatrixUI import MatrixUI
+    from ClipLauncher import ClipLauncher, Clip
+
+    from Util import Constants, ctype_from_addr
+    from GrooveMatrix import Row, Cell, GrooveMatrix, Column
+    import InputManager
+    from Session import LoadSession, RegisterSession
+    from TransitionTrace import g_TransitionTrace
+    from StateStress import MakeStressRows
 
 # global groove matrix instance
 g_GrooveMatrix = None
@@ -29,123 +43,202 @@ def Initialize(pMatrixUI, pClipLauncher):
     cMatrixUI = MatrixUI(pMatrixUI)
     cClipLauncher = ClipLauncher(pClipLauncher)
 
-    # Init audio
-    audioSpec = sdl2.SDL_AudioSpec(44100, sdl2.AUDIO_F32, 1, 4096)
-    if cClipLauncher.Init(ctypes.addressof(audioSpec)) == False:
-        return False
-
-    # Dumb function ot make on off colors
-    def makeColor(ix):
-        dif=.4
-        clrOn = [.5 - dif if i==ix else 0 for i in range(3)]+[1]
-        clrOff = [.5 + dif if i==ix else 0 for i in range(3)]+[1]
-        return (clrOn, clrOff)
-
-    # Like above but makes a random color
-    def makeRndColor():
-        clrOn = [0. for i in range(4)]
-        for i in range(len(clrOn)):
-            clrOn[i] = random.uniform(0.5, 0.9)
-        clrOff = [c/2 for c in clrOn]
-        return (clrOn, clrOff)
-
-    # Declare all clips (clip creation args as tuples)
-    # formatClipTup sets up args for RegisterClip
-    def formatClipTup(strName,  nFadeMS = 5):
-        strCD = '../sounds/'
-        return (strName, strCD+strName+'_Head.wav', strCD+strName+'_Tail.wav', nFadeMS )
-    #diRowClips = {  'Drums' :       Row.RowData(liClipData = [formatClipTup('drum1_'), formatClipTup('drum2_')],
-    #                                            clrOff = makeColor(0)[0],
-    #                                            clrOn = makeColor(0)[1]),
-    #                'Bass' :        Row.RowData(liClipData = [formatClipTup('bass1_')],
-    #                                            clrOff = makeColor(1)[0],
-    #                                            clrOn =  makeColor(1)[1]),
-    #                'Sustain' :     Row.RowData(liClipData = [formatClipTup('sus1_')],
-    #                                            clrOff =  makeColor(2)[0],
-    #                                            clrOn =  makeColor(2)[1])}
-
-    diRowClips = dict()
-    for strRow, fVol0 in [('Bass', .5), ('Drums', .5), ('Chords', .5), ('Lead', .4)]:
-        clr = makeRndColor()
-        diRowClips[strRow] = Row.RowData([formatClipTup(strRow)], clr[0], clr[1], fVol0)
-                                          
-    #diRowClips = {
-    #    'Drums' :   [formatClipTup('drum_gr_'+str(i) for i in range(3)],
-    #    'Bass' :    [formatClipTup('bass_gr_1')],
-    #    'FastArp' : [formatClipTup('fastarp_'+str(i) for i in range(3)],
-    #    'SlowArp' : [formatClipTup('fastarp_'+str(i) for i in range(3)],
-    #    'DelayArp' :[formatClipTup('delayarp_'+str(i) for i in range(2))],
-    #    'HardArp' : [formatClipTup('hardarp_1')],
-    #    'Batman' :  [formatClipTup('batman_1')],
-    #    'Air' :     [formatClipTup('air_1')],
-    #    'Horu' :    [formatClipTup('horu_1')],
-    #    'Nice' :    [formatClipTup('nice_1')],
-    #    'Guitar' :  [formatClipTup('guitar_'+str(i) for i in range(6))
-    #    formatClipTup('nice_1')],
-    #}
-
-    # Transform each rowname / tup pair into a rowname / cClip pair
-    for rowName in diRowClips.keys():
-        # Try and get a cClip
-        liClips = []
-        liClipData = diRowClips[rowName].liClipData
-        for ix in range(len(liClipData)):
-            # If we can register the clip
-            tupClip = liClipData[ix]
-            if cClipLauncher.RegisterClip(*tupClip):
-                liClipData[ix] = Clip(cClipLauncher.GetClip(tupClip[0]))
-
-    # Remove any empty rows
-    diRowClips = {k : v for k, v in diRowClips.items() if len(v.liClipData)}
-
-    # The window width and height are a function of the cells we'll have
-    nCols = max(len(rd.liClipData) for rd in diRowClips.values())
+    # Init audio. Rows can be dealt out over GM_AUDIO_SHARDS clip
+    # launchers, each on its own audio device (and audio thread), which
+    # can be named in GM_AUDIO_DEVICES (comma separated, the first is
+    # the primary's; the rest get the default). With no sound card,
+    # SDL_AUDIODRIVER=dummy runs them in real time, and with
+    # SDL_AUDIODRIVER=disk each device name is the file it writes to
+    with g_StartupProfile.Phase('audio init'):
+        nShards = int(os.environ.get('GM_AUDIO_SHARDS', 1))
+        liDevices = os.environ.get('GM_AUDIO_DEVICES', '').split(',')
+        liDevices += [''] * (nShards - len(liDevices))
+        audioSpec = sdl2.SDL_AudioSpec(44100, sdl2.AUDIO_F32, 1, 4096)
+        if cClipLauncher.Init(ctypes.addressof(audioSpec), liDevices[0]) == False:
+            return False
+        for strDevice in liDevices[1:nShards]:
+            if cClipLauncher.AddShard(strDevice) == False:
+                return False
+        liClipLaunchers = [cClipLauncher] + [ClipLauncher(cClipLauncher.GetShard(i)) for i in range(cClipLauncher.GetNumShards())]
+
+        # Voices are rendered on the audio thread alone by default;
+        # dense sessions can spread them over GM_RENDER_THREADS cores
+        # (that many for each clip launcher, the audio thread included)
+        nRenderThreads = int(os.environ.get('GM_RENDER_THREADS', 1))
+        for cl in liClipLaunchers:
+            if cl.SetNumRenderThreads(nRenderThreads) == False:
+                return False
+
+    # Load the sessions (a comma separated list in GM_SESSIONS, or just
+    # GM_SESSION, or the default one) and register every clip in them up
+    # front, leaving out any that fail and empty rows. Each session
+    # becomes a scene, named after its file, switched with the number keys
+    strSessions = os.environ.get('GM_SESSIONS', os.environ.get('GM_SESSION', '../sessions/default.json'))
+    with g_StartupProfile.Phase('session parse'):
+        liSessions = [(os.path.splitext(os.path.basename(f))[0], LoadSession(f)) for f in strSessions.split(',')]
+    # Peak pyramids for waveforms can be cached in GM_PEAK_CACHE
+    # rather than built as clips load, GM_WAVEFORMS draws them
+    # in cells (and can give how many columns wide they are)
+    if 'GM_PEAK_CACHE' in os.environ:
+        cClipLauncher.SetPeakCacheDir(os.environ['GM_PEAK_CACHE'])
+    with g_StartupProfile.Phase('clip load'):
+        liScenes = [(strName, RegisterSession(cClipLauncher, liRows)) for strName, liRows in liSessions]
+    liScenes = [(strName, diRowClips) for strName, diRowClips in liScenes if len(diRowClips)]
+    if len(liScenes) == 0:
+        raise RuntimeError('Error: No clips in session could be loaded')
+
+    # Clips with the same audio share their samples
+    g_StartupProfile.Note('clip memory', '{:.2f} MB logical, {:.2f} MB physical in {} buffers'.format(
+        cClipLauncher.GetClipBytesLogical() / 2**20, cClipLauncher.GetClipBytesPhysical() / 2**20, cClipLauncher.GetNumSampleBuffers()))
+
+    # The window width and height are a function of the cells
+    # we'll have, and it has to fit the biggest scene
+    nCols = max(len(rd.liClipData) for _, diRowClips in liScenes for rd in diRowClips.values())
+    nRows = max(len(diRowClips) for _, diRowClips in liScenes)
     nWindowWidth = 2 * Constants.nGap + Row.nHeaderW + nCols * (Constants.nGap + 2 * Cell.nRadius)
-    nWindowHeight = 2 * Constants.nGap + Column.nTriDim + len(diRowClips.keys()) * (Row.nHeaderH + Constants.nGap)
-
-    # init the UI display
-    if cMatrixUI.InitDisplay('SimpleRB1', [.1,.1,.1,1.],{
-        'posX' : sdl2.video.SDL_WINDOWPOS_UNDEFINED,
-        'posY' : sdl2.video.SDL_WINDOWPOS_UNDEFINED,
-        'width' : nWindowWidth,
-        'height' : nWindowHeight,
-        'flags' : sdl2.video.SDL_WINDOW_OPENGL | sdl2.video.SDL_WINDOW_SHOWN,
-        'glMajor' : 3,
-        'glMinor' : 0,
-        'doubleBuf' : 1,
-        'vsync' : 1
-        }) == False:
-        raise RuntimeError('Error initializing UI')
-
-    # Set up shader
-    cShader = Shader.Shader(cMatrixUI.GetShaderPtr())
-    if cShader.Init('../shaders/simple.vert', '../shaders/simple.frag', True) == False:
-        raise RuntimeError('Error initializing Shader')
-
-    # Set up camera such that screen/world dims are same, as above
-    Camera.SetCamMatHandle(cShader.GetHandle('u_PMV'))
-    cCamera = Camera.Camera(cMatrixUI.GetCameraPtr())
-    cCamera.InitOrtho(nWindowWidth, nWindowHeight, 0, nWindowWidth, 0, nWindowHeight)
-
-    # Set up static drawable handles
-    Drawable.SetPosHandle(cShader.GetHandle('a_Pos'))
-    Drawable.SetColorHandle(cShader.GetHandle('u_Color'))
+    nWindowHeight = 2 * Constants.nGap + Column.nTriDim + nRows * (Row.nHeaderH + Constants.nGap)
+
+    # Rendering can be benchmarked offscreen (see RenderBench), drawing
+    # GM_OFFSCREEN frames into a framebuffer behind a hidden window and
+    # then quitting. With no display, SDL_VIDEODRIVER=offscreen (or Xvfb)
+    # and LIBGL_ALWAYS_SOFTWARE=1 render with Mesa's llvmpipe. Every
+    # GM_OFFSCREEN_DUMP_EVERY'th frame can be saved to GM_OFFSCREEN_DUMP
+    bOffscreen = 'GM_OFFSCREEN' in os.environ
+
+    # Window and GL setup
+    with g_StartupProfile.Phase('window/GL init'):
+        # init the UI display
+        if cMatrixUI.InitDisplay('SimpleRB1', [.1,.1,.1,1.],{
+            'posX' : sdl2.video.SDL_WINDOWPOS_UNDEFINED,
+            'posY' : sdl2.video.SDL_WINDOWPOS_UNDEFINED,
+            'width' : nWindowWidth,
+            'height' : nWindowHeight,
+            'flags' : sdl2.video.SDL_WINDOW_OPENGL | (sdl2.video.SDL_WINDOW_HIDDEN if bOffscreen else sdl2.video.SDL_WINDOW_SHOWN),
+            'glMajor' : 3,
+            'glMinor' : 0,
+            'doubleBuf' : 1,
+            'vsync' : 0 if bOffscreen else 1
+            }) == False:
+            raise RuntimeError('Error initializing UI')
+        if bOffscreen and cMatrixUI.SetOffscreen(nWindowWidth, nWindowHeight) == False:
+            raise RuntimeError('Error initializing offscreen rendering')
+
+        # Set up shader
+        cShader = Shader.Shader(cMatrixUI.GetShaderPtr())
+        if cShader.Init('../shaders/simple.vert', '../shaders/simple.frag', True) == False:
+            raise RuntimeError('Error initializing Shader')
+
+        # Set up camera such that screen/world dims are same, as above
+        Camera.SetCamMatHandle(cShader.GetHandle('u_PMV'))
+        cCamera = Camera.Camera(cMatrixUI.GetCameraPtr())
+        cCamera.InitOrtho(nWindowWidth, nWindowHeight, 0, nWindowWidth, 0, nWindowHeight)
+
+        # Set up static drawable handles
+        Drawable.SetPosHandle(cShader.GetHandle('a_Pos'))
+        Drawable.SetColorHandle(cShader.GetHandle('u_Color'))
 
     # Construct Groove Matrix
     global g_GrooveMatrix
-    g_GrooveMatrix = GrooveMatrix(pMatrixUI, pClipLauncher)
-
-    # Add rows to groove Matrix
-    for rowName, rowData in diRowClips.items():
-        g_GrooveMatrix.AddRow(rowName, rowData)
+    with g_StartupProfile.Phase('matrix build'):
+        g_GrooveMatrix = GrooveMatrix(pMatrixUI, pClipLauncher)
+
+        # Build every scene now, so switching is instant, and show the first
+        for strName, diRowClips in liScenes:
+            g_GrooveMatrix.PreloadScene(strName, diRowClips)
+        g_GrooveMatrix.SwitchScene(liScenes[0][0])
+        if 'GM_WAVEFORMS' in os.environ:
+            g_GrooveMatrix.AddWaveforms(int(os.environ['GM_WAVEFORMS'] or 32))
+
+    # The scenes can be played by an array model of their cells rather than
+    # by their entities' state graphs, for big grids (see StartArrayMatrix,
+    # this needs numpy and can't be used with GM_CONTROL_PORT or GM_STRESS)
+    if 'GM_ARRAY_MATRIX' in os.environ:
+        g_GrooveMatrix.StartArrayMatrix()
+
+    # Launch latencies can be logged, the summary is printed
+    # at quit and the launches written to this file if it's given
+    if 'GM_LATENCY_LOG' in os.environ:
+        g_GrooveMatrix.StartLatencyLog(os.environ['GM_LATENCY_LOG'] or None)
+
+    # Row headers can light up with their levels (GM_METER
+    # can give how fast they fall back, per second)
+    if 'GM_METER' in os.environ:
+        g_GrooveMatrix.StartMetering(float(os.environ['GM_METER'] or 1.5))
+
+    # A sequencer can drive the matrix with OSC messages sent to
+    # this port on loopback (see ControlSocket for the addresses)
+    if 'GM_CONTROL_PORT' in os.environ:
+        g_GrooveMatrix.StartControlSocket(int(os.environ['GM_CONTROL_PORT']))
+
+    # Frame phases can be timed into a ring of the last GM_FRAME_PROFILE
+    # frames (3600 if empty), summarized at quit or when P is pressed and
+    # written to GM_FRAME_PROFILE_FILE (Chrome trace if .json, else CSV)
+    if 'GM_FRAME_PROFILE' in os.environ:
+        g_GrooveMatrix.StartFrameProfile(int(os.environ['GM_FRAME_PROFILE'] or 3600),
+                                         os.environ.get('GM_FRAME_PROFILE_FILE'))
+
+    # State transitions can be traced (GM_TRACE is the level, see TransitionTrace)
+    # into a ring of GM_TRACE_SIZE entries, written to GM_TRACE_FILE
+    # when T is pressed or an error escapes
+    if 'GM_TRACE_SIZE' in os.environ:
+        g_TransitionTrace.Resize(int(os.environ['GM_TRACE_SIZE']))
+    if 'GM_TRACE_FILE' in os.environ:
+        g_TransitionTrace.strFile = os.environ['GM_TRACE_FILE']
+    g_TransitionTrace.SetLevel(int(os.environ.get('GM_TRACE', 0)))
+
+    # Input can be recorded to or replayed from a log
+    # (set GM_REPLAY_FAST to replay a frame at a time,
+    # and GM_REPLAY_QUIT to quit once the replay is done)
+    if 'GM_RECORD_INPUT' in os.environ:
+        g_GrooveMatrix.StartRecording(os.environ['GM_RECORD_INPUT'])
+    if 'GM_REPLAY_INPUT' in os.environ:
+        g_GrooveMatrix.StartReplay(os.environ['GM_REPLAY_INPUT'],
+                                   bRealTime = 'GM_REPLAY_FAST' not in os.environ,
+                                   bQuitWhenDone = 'GM_REPLAY_QUIT' in os.environ)
+
+    if bOffscreen:
+        g_GrooveMatrix.StartRenderBench(int(os.environ['GM_OFFSCREEN'] or 600), os.environ.get('GM_OFFSCREEN_DUMP'),
+                                        int(os.environ.get('GM_OFFSCREEN_DUMP_EVERY', 60)))
+
+    # The state graph can be stress tested (see StateStress) instead of
+    # played, on the session or on a GM_STRESS=<rows>x<cols> matrix of its
+    # clips, with GM_STRESS_RUNS seeded runs of GM_STRESS_FRAMES frames,
+    # GM_STRESS_CLICKS clicks a frame and up to GM_STRESS_BUFS buffers
+    # a frame (set GM_STRESS_GUARDED to only click what's settled, and then
+    # GM_STRESS_ARRAY to check ArrayMatrix against it, which needs numpy).
+    # The report is printed at the end (and each frame written to
+    # GM_STRESS_FILE), then we quit
+    if 'GM_STRESS' in os.environ:
+        if os.environ['GM_STRESS']:
+            nRows, nCols = (int(n) for n in os.environ['GM_STRESS'].lower().split('x'))
+            g_GrooveMatrix.PreloadScene('stress', MakeStressRows(liScenes[0][1], nRows, nCols))
+            g_GrooveMatrix.SwitchScene('stress')
+        g_GrooveMatrix.StartStress(int(os.environ.get('GM_STRESS_RUNS', 20)), int(os.environ.get('GM_STRESS_FRAMES', 600)),
+                                   int(os.environ.get('GM_STRESS_CLICKS', 4)), int(os.environ.get('GM_STRESS_BUFS', 3)),
+                                   'GM_STRESS_GUARDED' in os.environ, os.environ.get('GM_STRESS_FILE'),
+                                   bCompareArray = 'GM_STRESS_ARRAY' in os.environ)
+
+    # Startup's over, report if profiling
+    g_StartupProfile.Stop()
+    strReport = g_StartupProfile.GetReport()
+    if strReport:
+        print(strReport)
 
     return True
 
 def HandleEvent(pSdlEvent):
     global g_GrooveMatrix
     sdlEvent = ctype_from_addr(pSdlEvent, sdl2.events.SDL_Event)
-    g_GrooveMatrix.HandleEvent(sdlEvent)
+    try:
+        g_GrooveMatrix.HandleEvent(sdlEvent)
+    except:
+        g_TransitionTrace.DumpOnError()
+        raise
 
 def Update():
     global g_GrooveMatrix
-    g_GrooveMatrix.Update()
+    try:
+        g_GrooveMatrix.Update()
+    except:
+        g_TransitionTrace.DumpOnError()
+        raise
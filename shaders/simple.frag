@@ -2,6 +2,17 @@
 
 uniform vec4 u_Color;
 
+varying vec2 v_Pos;
+varying float v_Progress;
+
 void main(){
 	gl_FragColor = u_Color;
+
+	// Lighten the part of the shape the playhead has swept
+	// through, clockwise from 12 o'clock around the origin
+	if (v_Progress >= 0.0){
+		float fAngle = fract(atan(v_Pos.x, v_Pos.y) / 6.2831853 + 1.0);
+		if (fAngle <= v_Progress)
+			gl_FragColor.rgb = mix(u_Color.rgb, vec3(1.0), 0.35);
+	}
 }
\ No newline at end of file
@@ -2,8 +2,24 @@
 
 uniform mat4 u_PMV;
 
+// Current sample position of the clip launcher
+uniform float u_Playhead;
+
 attribute vec3 a_Pos;
 
+// Start sample and length of what this drawable is playing
+// (set once per drawable, a length of 0 means nothing)
+attribute vec2 a_Playback;
+
+// Model space position and how far along we are in [0, 1]
+varying vec2 v_Pos;
+varying float v_Progress;
+
 void main(){
+	v_Pos = a_Pos.xy;
+	v_Progress = -1.0;
+	if (a_Playback.y > 0.0)
+		v_Progress = mod(u_Playhead - a_Playback.x, a_Playback.y) / a_Playback.y;
+
 	gl_Position = u_PMV * vec4(a_Pos, 1.0);	
 }
\ No newline at end of file
@@ -2,13 +2,31 @@
 #include "Util.h"
 
 #include <algorithm>
+#include <cstring>
+#include <stdexcept>
 
 // Default constructor tries to init to a sane state
 Clip::Clip() :
 	m_uSamplesInHead( 0 ),
-	m_uFadeSamples( 0 )
+	m_uSamplesInTail( 0 ),
+	m_uFadeSamples( 0 ),
+	m_uTailFadeBegin( 0 ),
+	m_iRefCount( 0 )
 {}
 
+// Copy the head and tail into one buffer, which nobody else shares
+static Clip::SampleBufferPtr makeSampleBuffer( const float * const pHeadBuffer, const size_t uSamplesInHeadBuffer,
+											   const float * const pTailBuffer, const size_t uSamplesInTailBuffer )
+{
+	if ( pHeadBuffer == nullptr || uSamplesInHeadBuffer == 0 )
+		return nullptr;
+
+	auto pSamples = std::make_shared<Clip::SampleBuffer>( pHeadBuffer, pHeadBuffer + uSamplesInHeadBuffer );
+	if ( pTailBuffer != nullptr )
+		pSamples->insert( pSamples->end(), pTailBuffer, pTailBuffer + uSamplesInTailBuffer );
+	return pSamples;
+}
+
 // More interesting
 Clip::Clip( const std::string strName,				// The friendly name of the loop
 			const float * const pHeadBuffer,		// The head buffer
@@ -16,48 +34,50 @@ Clip::Clip( const std::string strName,				// The friendly name of the loop
 			const float * const pTailBuffer,		// The tail buffer
 			const size_t uSamplesInTailBuffer,		// and its sample count
 			const size_t uFadeDuration ) :			// The fade duration
+	Clip( strName, makeSampleBuffer( pHeadBuffer, uSamplesInHeadBuffer, pTailBuffer, uSamplesInTailBuffer ), uSamplesInHeadBuffer, uFadeDuration )
+{}
+
+Clip::Clip( const std::string strName, SampleBufferPtr pSamples, const size_t uSamplesInHead, const size_t uFadeSamples ) :
 	Clip()
 {
-	// Don't assign any members unless there's a head buffer
-	if ( pHeadBuffer != nullptr && uSamplesInHeadBuffer > 0 )
+	// Don't assign any members unless there's a head
+	if ( pSamples != nullptr && uSamplesInHead > 0 && pSamples->size() >= uSamplesInHead )
 	{
-		// If the pointers are good, assign the members
+		// If the buffer is good, assign the members
 		m_strName = strName;
-		m_uSamplesInHead = uSamplesInHeadBuffer;
-		m_uFadeSamples = uFadeDuration;
+		m_uSamplesInHead = uSamplesInHead;
+		m_uFadeSamples = uFadeSamples;
+		m_pSamples = std::move( pSamples );
 
-		// Copy the head buffer into the vector	
-		m_vAudioBuffer.resize( m_uSamplesInHead );
-		memcpy( m_vAudioBuffer.data(), pHeadBuffer, sizeof( float ) * m_uSamplesInHead );
+		// The tail must end when or before the fade-out starts
+		const size_t uFadeBegin = m_uSamplesInHead - std::min( m_uFadeSamples, m_uSamplesInHead );
+		m_uSamplesInTail = std::min( uFadeBegin, m_pSamples->size() - m_uSamplesInHead );
 
-		// If there's a tail
-		if ( uSamplesInTailBuffer > 0 && pTailBuffer != nullptr )
+		// The tail fade to zero duration is either ours or the duration of the tail itself
+		// (in which case the entire tail is fading to zero)
+		const size_t uTailFadeSamples = std::min( m_uFadeSamples, m_uSamplesInTail );
+		m_uTailFadeBegin = m_uSamplesInHead + m_uSamplesInTail - uTailFadeSamples;
+
+		// Build the fade envelopes now, so voices only have to look them up
+		const float * const pAudioData = m_pSamples->data();
+		const size_t uHeadFadeSamples = m_uSamplesInHead - uFadeBegin;
+		m_vFadeRamp.resize( uHeadFadeSamples );
+		m_vFadeIn.resize( uHeadFadeSamples );
+		m_vFadeOut.resize( uHeadFadeSamples );
+		for ( size_t uFadeIdx = 0; uFadeIdx < uHeadFadeSamples; uFadeIdx++ )
 		{
-			// The tail must end when or before the fade-out starts
-			const size_t uFadeBegin = m_uSamplesInHead - m_uFadeSamples;
-			const size_t uTailSampleCount = std::min( uFadeBegin, uSamplesInTailBuffer );
-
-			// Copy its samples into the vector
-			m_vAudioBuffer.resize( m_vAudioBuffer.size() + uTailSampleCount );
-			memcpy( &m_vAudioBuffer[m_uSamplesInHead], pTailBuffer, sizeof( float ) * uTailSampleCount );
-
-			// The tail fade to zero duration is either ours or the duration of the tail itself
-			// (in which case the entire tail is fading to zero)
-			const size_t uTailFadeSamples = std::min( m_uFadeSamples, uTailSampleCount );
-			const size_t uTailFadeBegin = uTailSampleCount - uTailFadeSamples;
-
-			// Bake in the tail's fade to zero by interpolating it along the fade (to zero)
-			for ( size_t uTailIdx = uTailFadeBegin; uTailIdx < uTailSampleCount; uTailIdx++ )
-			{
-				const size_t uTailIdxInBuf = m_uSamplesInHead + uTailIdx;
-				m_vAudioBuffer[uTailIdxInBuf] = remap( (float) uTailIdx,
-													   (float) uTailFadeBegin, (float) uTailSampleCount,
-													   m_vAudioBuffer[uTailIdxInBuf], 0.f );
-			}
+			const float fGain = remap<float>( (float) uFadeIdx, 0.f, (float) m_uFadeSamples, 0.f, 1.f );
+			m_vFadeRamp[uFadeIdx] = fGain;
+			m_vFadeIn[uFadeIdx] = fGain * pAudioData[uFadeIdx];
+			m_vFadeOut[uFadeIdx] = ( 1.f - fGain ) * pAudioData[uFadeBegin + uFadeIdx];
 		}
 
-		// Shrink audio buffer, it won't be resized
-		m_vAudioBuffer.shrink_to_fit();
+		m_vTailFadeOut.resize( uTailFadeSamples );
+		for ( size_t uFadeIdx = 0; uFadeIdx < uTailFadeSamples; uFadeIdx++ )
+		{
+			const float fGain = remap<float>( (float) uFadeIdx, 0.f, (float) uTailFadeSamples, 1.f, 0.f );
+			m_vTailFadeOut[uFadeIdx] = fGain * pAudioData[m_uTailFadeBegin + uFadeIdx];
+		}
 	}
 	else
 		throw std::runtime_error( "Error: Attempting to initialize clip with invalid/missing data!" );
@@ -71,7 +91,7 @@ std::string Clip::GetName() const
 size_t Clip::GetNumSamples( bool bTail /*= false*/ ) const
 {
 	if ( bTail )
-		return m_vAudioBuffer.size();
+		return m_uSamplesInHead + m_uSamplesInTail;
 	return m_uSamplesInHead;
 }
 
@@ -82,5 +102,60 @@ size_t Clip::GetNumFadeSamples() const
 
 float const * Clip::GetAudioData() const
 {
-	return m_vAudioBuffer.empty() ? nullptr : m_vAudioBuffer.data();
-}
\ No newline at end of file
+	return m_pSamples ? m_pSamples->data() : nullptr;
+}
+
+Clip::SampleBufferPtr Clip::GetSampleBuffer() const
+{
+	return m_pSamples;
+}
+
+Clip::PeaksPtr Clip::GetPeaks() const
+{
+	return m_pPeaks;
+}
+
+void Clip::SetPeaks( PeaksPtr pPeaks )
+{
+	m_pPeaks = std::move( pPeaks );
+}
+
+size_t Clip::GetTailFadeBegin() const
+{
+	return m_uTailFadeBegin;
+}
+
+float const * Clip::GetFadeInSamples() const
+{
+	return m_vFadeIn.data();
+}
+
+float const * Clip::GetFadeOutSamples() const
+{
+	return m_vFadeOut.data();
+}
+
+float const * Clip::GetFadeRamp() const
+{
+	return m_vFadeRamp.data();
+}
+
+float const * Clip::GetTailFadeSamples() const
+{
+	return m_vTailFadeOut.data();
+}
+
+void Clip::AddRef() const
+{
+	m_iRefCount++;
+}
+
+void Clip::Release() const
+{
+	m_iRefCount--;
+}
+
+int Clip::GetRefCount() const
+{
+	return m_iRefCount;
+}
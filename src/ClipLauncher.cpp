@@ -1,6 +1,9 @@
 #include "ClipLauncher.h"
 #include "Clip.h"
 #include "Voice.h"
+#include "VoiceRenderPool.h"
+#include "LevelMeter.h"
+#include "WaveformPeaks.h"
 #include "Util.h"
 
 #include <SDL.h>
@@ -8,7 +11,20 @@
 #include <algorithm>
 #include <iostream>
 #include <iomanip>
+#include <sstream>
 #include <chrono>
+#include <cstring>
+#include <stdexcept>
+
+// How many completed launches the latency log holds,
+// and how many launches can be in flight at once
+static const size_t g_uMaxLaunchLog = 1024;
+static const size_t g_uMaxLaunchesInFlight = 256;
+
+// How many voices the level meter reserves room for, and how many
+// can be put on meters (every cell of every scene, see RowMeters)
+static const size_t g_uMaxMeteredVoices = 1024;
+static const size_t g_uMaxVoiceMeters = 1 << 16;
 
 // Helper to check validity of audio specs
 bool operator==( const SDL_AudioSpec& a, const SDL_AudioSpec& b )
@@ -23,20 +39,47 @@ bool operator!=( const SDL_AudioSpec& a, const SDL_AudioSpec& b )
 	return !(a == b);
 }
 
+// 64 bit FNV-1a hash of a buffer of samples' bytes
+static uint64_t hashSamples( const std::vector<float>& vSamples )
+{
+	uint64_t uHash = 14695981039346656037ull;
+	const uint8_t * pBytes = (const uint8_t *) vSamples.data();
+	for ( size_t uByteIdx = 0; uByteIdx < vSamples.size() * sizeof( float ); uByteIdx++ )
+	{
+		uHash ^= pBytes[uByteIdx];
+		uHash *= 1099511628211ull;
+	}
+	return uHash;
+}
+
 ClipLauncher::ClipLauncher() :
+	m_uAudioDevice( 0 ),
+	m_pPrimary( nullptr ),
+	m_bAllQuiet( false ),
 	m_bPlaying( false ),
 	m_uMaxSampleCount( 0 ),
 	m_uNumBufsCompleted( 0 ),
-	m_uSamplePos( 0 )
+	m_uSamplePos( 0 ),
+	m_bMetering( false ),
+	m_bLogLatency( false ),
+	m_tLatencyEpoch( std::chrono::steady_clock::now() ),
+	m_uNumLaunchesLogged( 0 ),
+	m_uNumLaunchesDropped( 0 )
 {}
 
 // Initialize the sound manager's audio spec
-bool ClipLauncher::Init( SDL_AudioSpec * pAudioSpec )
+bool ClipLauncher::Init( SDL_AudioSpec * pAudioSpec, std::string strDeviceName )
 {
-	// Get out if invalid
-	if ( pAudioSpec == nullptr )
+	// Get out if invalid, or if we're a shard (our primary inits us)
+	if ( pAudioSpec == nullptr || m_pPrimary != nullptr )
 		return false;
 
+	return openDevice( pAudioSpec, strDeviceName );
+}
+
+// Open an audio device with the spec, which has to be mono float
+bool ClipLauncher::openDevice( const SDL_AudioSpec * pAudioSpec, const std::string& strDeviceName )
+{
 	// For now we're only doing mono float
 	if ( pAudioSpec->format != AUDIO_F32 || pAudioSpec->channels != 1 )
 		return false;
@@ -46,9 +89,11 @@ bool ClipLauncher::Init( SDL_AudioSpec * pAudioSpec )
 	m_pAudioSpec->callback = (SDL_AudioCallback) ClipLauncher::FillAudio;
 	m_pAudioSpec->userdata = this;
 
-	// Try and open the audio spec and check its validity
+	// Try and open a device with the audio spec and check its validity
+	// (it starts paused, and we each get our own audio thread)
 	SDL_AudioSpec received{ 0 };
-	if ( SDL_OpenAudio( m_pAudioSpec.get(), &received ) != 0 )
+	m_uAudioDevice = SDL_OpenAudioDevice( strDeviceName.empty() ? nullptr : strDeviceName.c_str(), 0, m_pAudioSpec.get(), &received, 0 );
+	if ( m_uAudioDevice == 0 )
 	{
 		std::cout << "Error initializing SDL Audio" << std::endl;
 		std::cout << SDL_GetError() << std::endl;
@@ -60,45 +105,84 @@ bool ClipLauncher::Init( SDL_AudioSpec * pAudioSpec )
 	{
 		// if bad, reset, close audio, return false
 		m_pAudioSpec.reset();
-		SDL_CloseAudio();
+		SDL_CloseAudioDevice( m_uAudioDevice );
+		m_uAudioDevice = 0;
 		return false;
 	}
 
 	// We don't start off as playing
 	m_bPlaying = false;
 
+	// The level meter needs to know how big buffers get
+	m_pLevelMeter.reset( new LevelMeter( m_pAudioSpec->samples * m_pAudioSpec->channels, g_uMaxMeteredVoices, g_uMaxVoiceMeters ) );
+
 	return true;
 }
 
 ClipLauncher::~ClipLauncher()
 {
-	if ( m_pAudioSpec && this == m_pAudioSpec->userdata )
+	// Our shards' voices use our clips, so they go first
+	m_vShards.clear();
+
+	if ( m_uAudioDevice != 0 )
 	{
-		SDL_CloseAudio();
+		SDL_CloseAudioDevice( m_uAudioDevice );
 	}
 }
 
-// Register a clip with the SoundManager so it can be recalled later as a voice. A clip can contain a
-// head file, tail file, and a sample count for the fade (fade up from zero, fade out to next loop, etc.) 
-bool ClipLauncher::RegisterClip( std::string strClipName, std::string strHeadFile, std::string strTailFile, size_t uFadeDurationMS )
+bool ClipLauncher::AddShard( std::string strDeviceName )
 {
-	// We need to know what format the streaming code expects in order to load
-	// that kind of data, so if this isn't ready then get out
-	if ( m_pAudioSpec == nullptr || m_pAudioSpec->userdata != this )
+	// Shards need our spec, and don't get shards of their own
+	if ( m_pAudioSpec == nullptr || m_pAudioSpec->userdata != this || m_pPrimary != nullptr )
+	{
+		std::cerr << "Error: Attempting to add a shard to an uninitialized ClipLauncher or a shard!" << std::endl;
 		return false;
+	}
 
-	// Because the audio thread walks the map we're about to add something to, we
-	// don't allow registering clips while the audio is playing
+	// Shards start with us, so we can't be playing
 	if ( m_bPlaying )
 	{
-		std::cerr << "Error: Attempting to register clip " << strClipName << " with playing SoundManager!" << std::endl;
+		std::cerr << "Error: Attempting to add a shard to a playing ClipLauncher!" << std::endl;
 		return false;
 	}
 
-	// If we already have this clip stored, return true
-	// (I should make a way of unregistering, or allowing overwrites)
-	if ( m_mapClips.find( strClipName ) != m_mapClips.end() )
-		return true;
+	std::unique_ptr<ClipLauncher> pShard( new ClipLauncher() );
+	pShard->m_pPrimary = this;
+	if ( pShard->openDevice( m_pAudioSpec.get(), strDeviceName ) == false )
+		return false;
+
+	// Shards wrap their sample pos around ours (see loadClip)
+	pShard->m_uMaxSampleCount = m_uMaxSampleCount;
+	m_vShards.push_back( std::move( pShard ) );
+	return true;
+}
+
+size_t ClipLauncher::GetNumShards() const
+{
+	return m_vShards.size();
+}
+
+ClipLauncher * ClipLauncher::GetShard( size_t uShardIdx ) const
+{
+	return uShardIdx < m_vShards.size() ? m_vShards[uShardIdx].get() : nullptr;
+}
+
+// Load a clip's head and tail files (which must match our audio spec, though a mismatched tail
+// is just left out). Returns null if the clip couldn't be loaded. While we're playing, clips can't
+// be longer than the max sample count, because the audio thread wraps its sample pos around it
+std::unique_ptr<Clip> ClipLauncher::loadClip( std::string strClipName, std::string strHeadFile, std::string strTailFile, size_t uFadeDurationMS )
+{
+	// We need to know what format the streaming code expects in order to load
+	// that kind of data, so if this isn't ready then get out
+	if ( m_pAudioSpec == nullptr || m_pAudioSpec->userdata != this )
+		return nullptr;
+
+	// Shards play their primary's clips
+	if ( m_pPrimary != nullptr )
+	{
+		std::cerr << "Error: Clip " << strClipName << " must be loaded by the primary ClipLauncher, not a shard!" << std::endl;
+		return nullptr;
+	}
 
 	// This will get filled in if we load successfully
 	float * pSoundBuffer( nullptr );	// Buffer of head samples
@@ -108,41 +192,325 @@ bool ClipLauncher::RegisterClip( std::string strClipName, std::string strHeadFil
 
 	// Load the head file, check against our spec
 	SDL_AudioSpec wavSpec{ 0 };
-	if ( SDL_LoadWAV( strHeadFile.c_str(), &wavSpec, (Uint8 **) &pSoundBuffer, &uNumBytesInHead ) )
+	if ( SDL_LoadWAV( strHeadFile.c_str(), &wavSpec, (Uint8 **) &pSoundBuffer, &uNumBytesInHead ) == nullptr )
+		return nullptr;
+
+	std::unique_ptr<Clip> pClip;
+	const size_t uNumSamplesInHead = uNumBytesInHead / sizeof( float );
+	if ( wavSpec != *m_pAudioSpec )
+		std::cerr << "Error: Clip " << strClipName << " doesn't match our audio spec!" << std::endl;
+	else if ( m_bPlaying && uNumSamplesInHead > m_uMaxSampleCount )
+		std::cerr << "Error: Clip " << strClipName << " is longer than the max sample count, and we're playing!" << std::endl;
+	else
 	{
-		if ( wavSpec == *m_pAudioSpec )
+		// Load the tail file, check against our spec
+		if ( SDL_LoadWAV( strTailFile.c_str(), &wavSpec, (Uint8 **) &pTailBuffer, &uNumBytesInTail ) )
 		{
-			// Load the tail file, check against our spec
-			if ( SDL_LoadWAV( strTailFile.c_str(), &wavSpec, (Uint8 **) &pTailBuffer, &uNumBytesInTail ) )
+			if ( wavSpec != *m_pAudioSpec )
 			{
-				if ( wavSpec != *m_pAudioSpec )
-				{
-					// It's ok if this fails, just free and zero these guys
-					if ( pTailBuffer)
-						SDL_FreeWAV( (Uint8 *) pTailBuffer );
-					pTailBuffer = nullptr;
-					uNumBytesInTail = 0;
-				}
+				// It's ok if this fails, just free and zero these guys
+				if ( pTailBuffer)
+					SDL_FreeWAV( (Uint8 *) pTailBuffer );
+				pTailBuffer = nullptr;
+				uNumBytesInTail = 0;
 			}
+		}
+
+		// Copy the head and tail into one buffer, and share it (and its
+		// peaks) if some other clip has the same samples, then construct the clip
+		std::vector<float> vSamples( pSoundBuffer, pSoundBuffer + uNumSamplesInHead );
+		if ( pTailBuffer )
+			vSamples.insert( vSamples.end(), pTailBuffer, pTailBuffer + uNumBytesInTail / sizeof( float ) );
+		const uint64_t uHash = hashSamples( vSamples );
+		auto pSamples = shareSamples( std::move( vSamples ), uHash );
+		const size_t uFadeDurationSamples = (size_t) (uFadeDurationMS *(m_pAudioSpec->freq / 1000.f));
+		pClip.reset( new Clip( strClipName, pSamples, uNumSamplesInHead, uFadeDurationSamples ) );
+		pClip->SetPeaks( sharePeaks( pSamples, uHash ) );
+		m_uMaxSampleCount = std::max( m_uMaxSampleCount, uNumSamplesInHead );
+		for ( auto& pShard : m_vShards )
+			pShard->m_uMaxSampleCount = m_uMaxSampleCount;
+	}
 
-			// Construct the clip
-			const size_t uNumSamplesInHead = uNumBytesInHead / sizeof( float );
-			const size_t uNumSamplesInTail = uNumBytesInTail / sizeof( float );
-			const size_t uFadeDurationSamples = (size_t) (uFadeDurationMS *(m_pAudioSpec->freq / 1000.f));
-			m_uMaxSampleCount = std::max( m_uMaxSampleCount, uNumSamplesInHead );
-			m_mapClips[strClipName] = Clip( strClipName, pSoundBuffer, uNumSamplesInHead, pTailBuffer, uNumSamplesInTail, uFadeDurationSamples );
+	// The clip has its own copy of the samples
+	if ( pSoundBuffer )
+		SDL_FreeWAV( (Uint8 *) pSoundBuffer );
+	if ( pTailBuffer )
+		SDL_FreeWAV( (Uint8 *) pTailBuffer );
+
+	return pClip;
+}
+
+// Register a clip with the SoundManager so it can be recalled later as a voice. A clip can contain a
+// head file, tail file, and a sample count for the fade (fade up from zero, fade out to next loop, etc.) 
+bool ClipLauncher::RegisterClip( std::string strClipName, std::string strHeadFile, std::string strTailFile, size_t uFadeDurationMS )
+{
+	// If we already have this clip stored, return true - unless it
+	// was loaded from other files, in which case the name is taken
+	// (use ReplaceClip to load new audio for it)
+	if ( m_mapClips.find( strClipName ) != m_mapClips.end() )
+	{
+		if ( m_mapClipFiles[strClipName] == std::make_pair( strHeadFile, strTailFile ) )
 			return true;
+		std::cerr << "Error: Clip " << strClipName << " is already registered with other files than " << strHeadFile << ", " << strTailFile << "!" << std::endl;
+		return false;
+	}
+
+	std::unique_ptr<Clip> pClip = loadClip( strClipName, strHeadFile, strTailFile, uFadeDurationMS );
+	if ( pClip == nullptr )
+		return false;
+
+	m_setClips.insert( pClip.get() );
+	m_mapClips[strClipName] = std::move( pClip );
+	m_mapClipFiles[strClipName] = std::make_pair( strHeadFile, strTailFile );
+	return true;
+}
+
+bool ClipLauncher::ReplaceClip( std::string strClipName, std::string strHeadFile, std::string strTailFile, size_t uFadeDurationMS )
+{
+	// Load the new clip before touching the old one,
+	// so the old one stays put if this fails
+	std::unique_ptr<Clip> pClip = loadClip( strClipName, strHeadFile, strTailFile, uFadeDurationMS );
+	if ( pClip == nullptr )
+		return false;
+
+	m_setClips.insert( pClip.get() );
+	std::unique_ptr<Clip>& pStoredClip = m_mapClips[strClipName];
+	if ( pStoredClip )
+		retireClip( std::move( pStoredClip ) );
+	pStoredClip = std::move( pClip );
+	m_mapClipFiles[strClipName] = std::make_pair( strHeadFile, strTailFile );
+	return true;
+}
+
+bool ClipLauncher::UnregisterClip( std::string strClipName )
+{
+	auto itClip = m_mapClips.find( strClipName );
+	if ( itClip == m_mapClips.end() )
+		return false;
+
+	retireClip( std::move( itClip->second ) );
+	m_mapClips.erase( itClip );
+	m_mapClipFiles.erase( strClipName );
+	return true;
+}
+
+size_t ClipLauncher::GetNumRetiredClips() const
+{
+	return m_liRetiredClips.size();
+}
+
+// Find a live buffer with the same samples as vSamples (which hash
+// to uHash), or store vSamples as a new one. Hash collisions are
+// settled by comparing the samples
+std::shared_ptr<const std::vector<float>> ClipLauncher::shareSamples( std::vector<float> vSamples, const uint64_t uHash )
+{
+	auto itRange = m_mapSampleBuffers.equal_range( uHash );
+	for ( auto itBuf = itRange.first; itBuf != itRange.second; )
+	{
+		auto pSamples = itBuf->second.lock();
+		if ( pSamples == nullptr )
+		{
+			// Forget buffers whose clips are all gone
+			itBuf = m_mapSampleBuffers.erase( itBuf );
+			continue;
 		}
+		if ( *pSamples == vSamples )
+			return pSamples;
+		++itBuf;
+	}
+
+	vSamples.shrink_to_fit();
+	auto pSamples = std::make_shared<const std::vector<float>>( std::move( vSamples ) );
+	m_mapSampleBuffers.emplace( uHash, pSamples );
+	return pSamples;
+}
+
+// The peak pyramid of a sample buffer - the one its other clips have if it's
+// shared, otherwise it's read from the cache or built (and then cached)
+std::shared_ptr<const WaveformPeaks> ClipLauncher::sharePeaks( const std::shared_ptr<const std::vector<float>>& pSamples, const uint64_t uHash )
+{
+	// A buffer and its peaks are freed along with the last clip using
+	// them, so a live entry can't be for some older buffer at this address
+	std::weak_ptr<const WaveformPeaks>& wpPeaks = m_mapPeaks[pSamples.get()];
+	if ( auto pPeaks = wpPeaks.lock() )
+		return pPeaks;
+
+	std::shared_ptr<const WaveformPeaks> pPeaks;
+	std::string strCacheFile;
+	if ( m_strPeakCacheDir.empty() == false )
+	{
+		std::stringstream ss;
+		ss << m_strPeakCacheDir << "/" << std::hex << std::setw( 16 ) << std::setfill( '0' ) << uHash << ".peaks";
+		strCacheFile = ss.str();
+		pPeaks = WaveformPeaks::Load( strCacheFile, uHash, pSamples->size() );
+	}
+
+	if ( pPeaks == nullptr )
+	{
+		auto pBuiltPeaks = std::make_shared<const WaveformPeaks>( pSamples->data(), pSamples->size() );
+		if ( strCacheFile.empty() == false )
+			pBuiltPeaks->Save( strCacheFile, uHash );
+		pPeaks = std::move( pBuiltPeaks );
+	}
+
+	wpPeaks = pPeaks;
+	return pPeaks;
+}
+
+// Drop the entries of sample buffers (and their peaks) whose clips have all been freed
+void ClipLauncher::forgetFreedSamples()
+{
+	for ( auto itBuf = m_mapSampleBuffers.begin(); itBuf != m_mapSampleBuffers.end(); )
+	{
+		if ( itBuf->second.expired() )
+			itBuf = m_mapSampleBuffers.erase( itBuf );
 		else
+			++itBuf;
+	}
+	for ( auto itPeaks = m_mapPeaks.begin(); itPeaks != m_mapPeaks.end(); )
+	{
+		if ( itPeaks->second.expired() )
+			itPeaks = m_mapPeaks.erase( itPeaks );
+		else
+			++itPeaks;
+	}
+}
+
+size_t ClipLauncher::GetClipBytesLogical() const
+{
+	size_t uNumBytes( 0 );
+	for ( auto& itClip : m_mapClips )
+		uNumBytes += sizeof( float ) * itClip.second->GetNumSamples( true );
+	return uNumBytes;
+}
+
+size_t ClipLauncher::GetClipBytesPhysical() const
+{
+	size_t uNumBytes( 0 );
+	for ( auto& itBuf : m_mapSampleBuffers )
+		if ( auto pSamples = itBuf.second.lock() )
+			uNumBytes += sizeof( float ) * pSamples->capacity();
+	return uNumBytes;
+}
+
+size_t ClipLauncher::GetNumSampleBuffers() const
+{
+	return std::count_if( m_mapSampleBuffers.begin(), m_mapSampleBuffers.end(),
+						  [] ( const std::pair<const uint64_t, std::weak_ptr<const std::vector<float>>>& prBuf ) { return prBuf.second.expired() == false; } );
+}
+
+void ClipLauncher::SetPeakCacheDir( std::string strDir )
+{
+	m_strPeakCacheDir = strDir;
+}
+
+std::string ClipLauncher::GetPeakCacheDir() const
+{
+	return m_strPeakCacheDir;
+}
+
+std::vector<float> ClipLauncher::GetClipPeaks( std::string strClipName, size_t uBeginSample, size_t uEndSample, size_t uNumColumns ) const
+{
+	auto itClip = m_mapClips.find( strClipName );
+	if ( itClip == m_mapClips.end() || itClip->second->GetPeaks() == nullptr )
+		return {};
+
+	return itClip->second->GetPeaks()->GetPeaks( uBeginSample, uEndSample, uNumColumns );
+}
+
+// Voices and queued commands may still be using the clip,
+// so hold on to it until they're done (see freeRetiredClips)
+void ClipLauncher::retireClip( std::unique_ptr<Clip> pClip )
+{
+	if ( pClip->GetRefCount() == 0 )
+	{
+		m_setClips.erase( pClip.get() );
+		pClip.reset();
+		forgetFreedSamples();
+	}
+	else
+		m_liRetiredClips.push_back( std::move( pClip ) );
+}
+
+// Called by Update, the audio thread only ever releases references
+// to clips, so once a retired clip's count hits zero it stays there
+void ClipLauncher::freeRetiredClips()
+{
+	bool bFreedAny = false;
+	for ( auto itClip = m_liRetiredClips.begin(); itClip != m_liRetiredClips.end(); )
+	{
+		if ( (*itClip)->GetRefCount() == 0 )
 		{
-			// If we got an invalid audio spec but were able to load the data,
-			// we have to free the buffer before getting out (or we leak)
-			if ( pSoundBuffer )
-				SDL_FreeWAV( (Uint8 *) pSoundBuffer );
+			m_setClips.erase( itClip->get() );
+			itClip = m_liRetiredClips.erase( itClip );
+			bFreedAny = true;
 		}
+		else
+			++itClip;
+	}
+
+	if ( bFreedAny )
+		forgetFreedSamples();
+}
+
+// Commands that start voices hold a reference to their clip until the
+// audio thread handles them (the voice then takes it over). Commands with
+// a clip we don't know of (i.e one that's been freed) are refused. Shards
+// check against their primary's clips
+bool ClipLauncher::acquireCommandClip( const Command& cmd )
+{
+	if ( cmd.eID != ECommandID::StartVoice && cmd.eID != ECommandID::OneShot )
+		return true;
+
+	const ClipLauncher * pClipOwner = m_pPrimary ? m_pPrimary : this;
+	if ( pClipOwner->m_setClips.count( cmd.pClip ) == 0 )
+	{
+		std::cerr << "Error: Command for voice " << cmd.iData << " has an unknown clip!" << std::endl;
+		return false;
+	}
+
+	// We won't be quiet once the audio thread gets this
+	m_bAllQuiet = false;
+	cmd.pClip->AddRef();
+	return true;
+}
+
+void ClipLauncher::releaseCommandClip( const Command& cmd ) const
+{
+	if ( (cmd.eID == ECommandID::StartVoice || cmd.eID == ECommandID::OneShot) && cmd.pClip )
+		cmd.pClip->Release();
+}
+
+// Register every clip in one call, rather than one call per clip
+std::vector<int> ClipLauncher::RegisterClips( std::vector<std::string> vClipNames, std::vector<std::string> vHeadFiles,
+											  std::vector<std::string> vTailFiles, std::vector<size_t> vFadeDurationsMS )
+{
+	std::vector<int> vRegistered( vClipNames.size(), 0 );
+	if ( vHeadFiles.size() != vClipNames.size() || vTailFiles.size() != vClipNames.size() || vFadeDurationsMS.size() != vClipNames.size() )
+	{
+		std::cerr << "Error: Mismatched clip data given to RegisterClips!" << std::endl;
+		return vRegistered;
+	}
+
+	for ( size_t uClipIdx = 0; uClipIdx < vClipNames.size(); uClipIdx++ )
+		vRegistered[uClipIdx] = RegisterClip( vClipNames[uClipIdx], vHeadFiles[uClipIdx], vTailFiles[uClipIdx], vFadeDurationsMS[uClipIdx] ) ? 1 : 0;
+
+	return vRegistered;
+}
+
+std::vector<Clip *> ClipLauncher::GetClips( std::vector<std::string> vClipNames ) const
+{
+	std::vector<Clip *> vClips;
+	vClips.reserve( vClipNames.size() );
+	for ( const std::string& strClipName : vClipNames )
+	{
+		Clip * pClip = GetClip( strClipName );
+		if ( pClip == nullptr )
+			throw std::runtime_error( "Error: Getting unregistered clip " + strClipName );
+		vClips.push_back( pClip );
 	}
 
-	return false;
+	return vClips;
 }
 
 // Called by main thread, locks mutex
@@ -164,10 +532,12 @@ void ClipLauncher::getMessagesFromAudThread()
             m_uNumBufsCompleted += tFront.uData;
         }
 
-        if ( std::any_of( m_liPublicCmdQueue.begin(), m_liPublicCmdQueue.end(), [] ( const Command& cmd ) { return cmd.eID == ECommandID::AllQuiet; } ) )
+        // Remember if the audio thread ran out of voices (see Update)
+        auto itQuiet = std::remove_if( m_liPublicCmdQueue.begin(), m_liPublicCmdQueue.end(), [] ( const Command& cmd ) { return cmd.eID == ECommandID::AllQuiet; } );
+        if ( itQuiet != m_liPublicCmdQueue.end() )
         {
-            m_liPublicCmdQueue.clear();
-            SetPlayPause( false );
+            m_liPublicCmdQueue.erase( itQuiet, m_liPublicCmdQueue.end() );
+            m_bAllQuiet = true;
         }
     }
 
@@ -179,12 +549,37 @@ void ClipLauncher::getMessagesFromAudThread()
     }
 }
 
+// Called on the client thread, forgets whatever's queued for the audio thread
+void ClipLauncher::dropPublicCommands()
+{
+	std::lock_guard<std::mutex> lg( m_muAudioMutex );
+	for ( const Command& cmd : m_liPublicCmdQueue )
+		releaseCommandClip( cmd );
+	m_liPublicCmdQueue.clear();
+}
+
 // Called by client thread
 void ClipLauncher::Update()
 {
-	// Just see if the audio thread has 
-	// left any tasks for us to deal with 
+	// Just see if the audio threads have
+	// left any tasks for us to deal with
 	getMessagesFromAudThread();
+	for ( auto& pShard : m_vShards )
+		pShard->getMessagesFromAudThread();
+
+	// Once every audio thread has run out of voices we stop
+	// playing, and anything queued since is dropped
+	if ( m_bPlaying && m_bAllQuiet && std::all_of( m_vShards.begin(), m_vShards.end(), [] ( const std::unique_ptr<ClipLauncher>& pShard ) { return pShard->m_bAllQuiet; } ) )
+	{
+		dropPublicCommands();
+		for ( auto& pShard : m_vShards )
+			pShard->dropPublicCommands();
+		SetPlayPause( false );
+	}
+
+	// Free any retired clips nobody's using
+	if ( m_liRetiredClips.empty() == false )
+		freeRetiredClips();
 }
 
 bool ClipLauncher::HandleCommand( Command cmd )
@@ -195,6 +590,12 @@ bool ClipLauncher::HandleCommand( Command cmd )
 	if ( cmd.eID == ECommandID::StartVoice && m_bPlaying == false )
 		cmd.uData = 0;
 
+	if ( acquireCommandClip( cmd ) == false )
+		return false;
+
+	if ( m_bLogLatency )
+		stampLaunchEnqueued( cmd );
+
 	std::lock_guard<std::mutex> lg( m_muAudioMutex );
 	m_liPublicCmdQueue.push_back( cmd );
 
@@ -213,24 +614,83 @@ bool ClipLauncher::HandleCommands( std::list<Command> liCommands )
 		if ( cmd.eID == ECommandID::StartVoice && m_bPlaying == false )
 			cmd.uData = 0;
 
+	// Leave out any commands with bad clips
+	liCommands.remove_if( [this] ( const Command& cmd ) { return acquireCommandClip( cmd ) == false; } );
+	if ( liCommands.empty() )
+		return false;
+
+	if ( m_bLogLatency )
+		for ( const Command& cmd : liCommands )
+			stampLaunchEnqueued( cmd );
+
 	std::lock_guard<std::mutex> lg( m_muAudioMutex );
 	m_liPublicCmdQueue.splice( m_liPublicCmdQueue.end(), liCommands );
 
 	return true;
 }
 
+// Like above, but reads straight out of a packed command buffer
+// so clients don't pay for converting each command (locks mutex once)
+bool ClipLauncher::HandleCommandBuffer( CommandBuffer cmdBuf )
+{
+	if ( cmdBuf.pCommands == nullptr || cmdBuf.uNumCommands == 0 )
+		return false;
+
+	// Only the commands that are queued are stamped (before the audio
+	// thread can see them, m_muLatency is only ever taken innermost),
+	// and like HandleCommands we return whether there were any
+	const bool bLogLatency = m_bLogLatency;
+	bool bQueued = false;
+	std::lock_guard<std::mutex> lg( m_muAudioMutex );
+	for ( size_t uCmdIdx = 0; uCmdIdx < cmdBuf.uNumCommands; uCmdIdx++ )
+	{
+		Command cmd = cmdBuf.pCommands[uCmdIdx];
+		if ( cmd.eID == ECommandID::None )
+			continue;
+
+		// Same as HandleCommands, trigger res is 0 if we aren't playing
+		if ( cmd.eID == ECommandID::StartVoice && m_bPlaying == false )
+			cmd.uData = 0;
+
+		if ( acquireCommandClip( cmd ) == false )
+			continue;
+
+		if ( bLogLatency )
+			stampLaunchEnqueued( cmd );
+		m_liPublicCmdQueue.push_back( cmd );
+		bQueued = true;
+	}
+
+	return bQueued;
+}
+
 void ClipLauncher::SetPlayPause( bool bPlayPause )
 {
 	// This gets set if Init is successful
 	if ( m_pAudioSpec->userdata == this )
 	{
+		// Our shards' devices are locked along with ours, so none of
+		// the audio threads run until every one of them is set
+		SDL_LockAudioDevice( m_uAudioDevice );
+		for ( auto& pShard : m_vShards )
+			SDL_LockAudioDevice( pShard->m_uAudioDevice );
+
 		// Toggle audio playback (and bool)
 		m_bPlaying = bPlayPause;
+		SDL_PauseAudioDevice( m_uAudioDevice, m_bPlaying ? 0 : 1 );
 
-		if ( m_bPlaying )
-			SDL_PauseAudio( 0 );
-		else
-			SDL_PauseAudio( 1 );
+		// Starting shards pick up where we are
+		for ( auto& pShard : m_vShards )
+		{
+			pShard->m_bPlaying = bPlayPause;
+			if ( pShard->m_bPlaying )
+				pShard->m_uSamplePos = m_uSamplePos;
+			SDL_PauseAudioDevice( pShard->m_uAudioDevice, pShard->m_bPlaying ? 0 : 1 );
+		}
+
+		for ( auto& pShard : m_vShards )
+			SDL_UnlockAudioDevice( pShard->m_uAudioDevice );
+		SDL_UnlockAudioDevice( m_uAudioDevice );
 	}
 }
 
@@ -263,7 +723,7 @@ size_t ClipLauncher::GetNumSamplesInClip( std::string strClipName, bool bTail /*
 {
 	auto it = m_mapClips.find( strClipName );
 	if ( it != m_mapClips.end() )
-		return it->second.GetNumSamples( bTail );
+		return it->second->GetNumSamples( bTail );
 	return 0;
 }
 
@@ -276,7 +736,7 @@ Clip * ClipLauncher::GetClip( std::string strClipName ) const
 {
 	auto itClip = m_mapClips.find( strClipName );
 	if ( itClip != m_mapClips.end() )
-		return (Clip *) &itClip->second;
+		return itClip->second.get();
 	return nullptr;
 }
 
@@ -302,6 +762,11 @@ void ClipLauncher::fill_audio_impl( uint8_t * pStream, int nBytesToFill )
 	// Silence no matter what
 	memset( pStream, 0, nBytesToFill );
 
+	// If we're logging latency, launches that sound in this
+	// buffer are treated as if it started playing right now
+	const bool bLogLatency = m_bLogLatency;
+	const double dBufStartUS = bLogLatency ? getLatencyStampUS() : 0.;
+
 	// Get tasks from public thread and handle them
 	// Also let them know a buffer is about to complete
 	Command cmdBufCompleted;
@@ -309,20 +774,35 @@ void ClipLauncher::fill_audio_impl( uint8_t * pStream, int nBytesToFill )
 	cmdBufCompleted.uData = 1;
 	getMessagesFromMainThread( { cmdBufCompleted } );
 
-	// Nothing to do
-	if ( m_liVoices.empty() )
-		return;
-
 	// The number of float samples we want
 	const size_t uNumSamplesDesired = nBytesToFill / sizeof( float );
+	const bool bMetering = m_bMetering;
+
+	// Nothing to render (but let the meters know it's quiet). The
+	// sample pos still advances, so shards keep time while they're quiet
+	if ( m_liVoices.empty() )
+	{
+		if ( bMetering )
+			m_pLevelMeter->RenderVoices( m_liVoices, (float *) pStream, uNumSamplesDesired, m_uSamplePos );
+	}
+	// Fill audio data for each loop, measuring levels or on several threads if we can
+	else if ( bMetering && m_pLevelMeter->RenderVoices( m_liVoices, (float *) pStream, uNumSamplesDesired, m_uSamplePos ) )
+	{
+		// The level meter rendered them
+	}
+	else if ( m_pRenderPool == nullptr || m_pRenderPool->RenderVoices( m_liVoices, (float *) pStream, uNumSamplesDesired, m_uSamplePos ) == false )
+	{
+		for ( Voice& v : m_liVoices )
+			v.RenderData( (float *) pStream, uNumSamplesDesired, m_uSamplePos );
+	}
 
-	// Fill audio data for each loop
-	for ( Voice& v : m_liVoices )
-		v.RenderData( (float *) pStream, uNumSamplesDesired, m_uSamplePos );
+	// See if any launches we're waiting on made noise
+	if ( bLogLatency )
+		stampLaunchesSounded( m_uSamplePos, dBufStartUS );
 
 	// Update sample counter, reset if we went over
 	m_uSamplePos += uNumSamplesDesired;
-	if ( m_uSamplePos > m_uMaxSampleCount )
+	if ( m_uMaxSampleCount && m_uSamplePos > m_uMaxSampleCount )
 	{
 		// Just do a mod
 		m_uSamplePos %= m_uMaxSampleCount;
@@ -368,8 +848,15 @@ void ClipLauncher::getMessagesFromMainThread( std::list<Command> liCommandsToPos
 		m_liPublicCmdQueue = std::move( liCommandsToPost );
 	}
 
-	// Remove any voices that have stopped playing
-	m_liVoices.remove_if( [] ( const Voice& v ) { return v.GetState() == Voice::EState::Stopped; } );
+	// Remove any voices that have stopped playing, letting go of their clips
+	m_liVoices.remove_if( [] ( const Voice& v )
+	{
+		if ( v.GetState() != Voice::EState::Stopped )
+			return false;
+		if ( v.GetClip() )
+			v.GetClip()->Release();
+		return true;
+	} );
 
 	// Handle each task in m_liAudioCmdQueue
 	for ( Command cmd : m_liAudioCmdQueue )
@@ -399,12 +886,38 @@ void ClipLauncher::getMessagesFromMainThread( std::list<Command> liCommandsToPos
 			case ECommandID::StartVoice:
 			case ECommandID::OneShot:
 				// If it isn't already there, construct the voice
+				// (which takes over the command's clip reference)
 				if ( itVoice == m_liVoices.end() )
-					m_liVoices.emplace_back( cmd );
-				// Otherwise try set the voice to pending, which 
-				// will either queue to play or leave it alone
+					itVoice = m_liVoices.emplace( m_liVoices.end(), cmd );
 				else
-					itVoice->SetPending( cmd.uData, cmd.eID == ECommandID::StartVoice );
+				{
+					// If the clip's been replaced since the voice last played, give the
+					// voice the new one if it's quiet. If it's playing its tail, let it
+					// finish on its own and start a new voice (playing voices keep theirs)
+					Clip const * pOldClip = itVoice->GetClip();
+					const Voice::EState eState = itVoice->GetState();
+					if ( pOldClip != cmd.pClip && itVoice->SetClip( cmd.pClip ) )
+					{
+						pOldClip->Release();
+						itVoice->SetPending( cmd.uData, cmd.eID == ECommandID::StartVoice );
+					}
+					else if ( pOldClip != cmd.pClip && ( eState == Voice::EState::Tail || eState == Voice::EState::TailPending || eState == Voice::EState::TailOneShot ) )
+					{
+						itVoice->Detach();
+						itVoice = m_liVoices.emplace( m_liVoices.end(), cmd );
+					}
+					// Otherwise try set the voice to pending, which 
+					// will either queue to play or leave it alone
+					else
+					{
+						itVoice->SetPending( cmd.uData, cmd.eID == ECommandID::StartVoice );
+						releaseCommandClip( cmd );
+					}
+				}
+
+				// A voice that's already sounding wasn't really launched
+				if ( m_bLogLatency )
+					stampLaunchApplied( cmd.iData, itVoice->GetFirstSoundPos() == SIZE_MAX );
 				break;
 
 			// Stop a specific playing voice
@@ -419,6 +932,11 @@ void ClipLauncher::getMessagesFromMainThread( std::list<Command> liCommandsToPos
 					itVoice->SetVolume( cmd.fData );
 				break;
 
+			// Meter a voice, whether or not it's playing yet
+			case ECommandID::SetMeter:
+				m_pLevelMeter->SetVoiceMeter( cmd.iData, (int) cmd.uData );
+				break;
+
 			// That's all we handle here
 			default:
 				break;
@@ -439,6 +957,269 @@ void ClipLauncher::getMessagesFromMainThread( std::list<Command> liCommandsToPos
 	}
 }
 
+bool ClipLauncher::SetNumRenderThreads( size_t uNumThreads )
+{
+	// We need the spec to know how big buffers get
+	if ( m_pAudioSpec == nullptr || m_pAudioSpec->userdata != this )
+		return false;
+
+	// The audio thread uses the pool, so don't swap it out from under it
+	if ( m_bPlaying )
+	{
+		std::cerr << "Error: Attempting to change render threads of playing ClipLauncher!" << std::endl;
+		return false;
+	}
+
+	// One thread is just the audio thread
+	if ( uNumThreads <= 1 )
+		m_pRenderPool.reset();
+	else
+		m_pRenderPool.reset( new VoiceRenderPool( uNumThreads, m_pAudioSpec->samples * m_pAudioSpec->channels ) );
+
+	return true;
+}
+
+size_t ClipLauncher::GetNumRenderThreads() const
+{
+	return m_pRenderPool ? m_pRenderPool->GetNumThreads() : 1;
+}
+
+void ClipLauncher::SetLatencyLogging( bool bLogLatency )
+{
+	// Reserve everything now, the audio thread won't, and
+	// forget launches left over from the last time we logged
+	{
+		std::lock_guard<std::mutex> lg( m_muLatency );
+		m_vLaunchesInFlight.reserve( g_uMaxLaunchesInFlight );
+		m_vLaunchLog.reserve( g_uMaxLaunchLog );
+		if ( bLogLatency )
+			m_vLaunchesInFlight.clear();
+	}
+
+	m_bLogLatency = bLogLatency;
+}
+
+bool ClipLauncher::GetLatencyLogging() const
+{
+	return m_bLogLatency;
+}
+
+double ClipLauncher::getLatencyStampUS() const
+{
+	return std::chrono::duration<double, std::micro>( std::chrono::steady_clock::now() - m_tLatencyEpoch ).count();
+}
+
+// Called when a click is handled, starts a launch for the voice
+void ClipLauncher::StampLaunchClick( int iVoiceID )
+{
+	if ( m_bLogLatency == false )
+		return;
+
+	LaunchTiming launch;
+	launch.iVoiceID = iVoiceID;
+	launch.dClickUS = getLatencyStampUS();
+
+	// Clicking again restarts the launch
+	std::lock_guard<std::mutex> lg( m_muLatency );
+	expireLaunchesInFlight( launch.dClickUS );
+	auto itLaunch = std::find_if( m_vLaunchesInFlight.begin(), m_vLaunchesInFlight.end(), [iVoiceID] ( const LaunchTiming& l ) { return l.iVoiceID == iVoiceID; } );
+	if ( itLaunch != m_vLaunchesInFlight.end() )
+		*itLaunch = launch;
+	else if ( m_vLaunchesInFlight.size() < g_uMaxLaunchesInFlight )
+		m_vLaunchesInFlight.push_back( launch );
+	else
+		m_uNumLaunchesDropped++;
+}
+
+// Drops launches whose start was never enqueued (the cell was clicked
+// again or its row moved on before it started). A cell starts at its
+// trigger, which is at most its clip's length away, so anything waiting
+// for twice the longest clip is given up on. Called with m_muLatency held
+void ClipLauncher::expireLaunchesInFlight( double dNowUS )
+{
+	if ( m_pAudioSpec->freq <= 0 )
+		return;
+
+	const double dTimeoutUS = 2e6 * (double) m_uMaxSampleCount / m_pAudioSpec->freq;
+	for ( size_t uIdx = 0; uIdx < m_vLaunchesInFlight.size(); )
+	{
+		LaunchTiming& launch = m_vLaunchesInFlight[uIdx];
+		if ( launch.dEnqueueUS < 0 && dNowUS - launch.dClickUS > dTimeoutUS )
+		{
+			std::swap( launch, m_vLaunchesInFlight.back() );
+			m_vLaunchesInFlight.pop_back();
+			m_uNumLaunchesDropped++;
+			continue;
+		}
+		uIdx++;
+	}
+}
+
+// Called by the client thread as commands are handled
+void ClipLauncher::stampLaunchEnqueued( const Command& cmd )
+{
+	const bool bStart = cmd.eID == ECommandID::StartVoice || cmd.eID == ECommandID::OneShot;
+	if ( bStart == false && cmd.eID != ECommandID::StopVoice )
+		return;
+
+	std::lock_guard<std::mutex> lg( m_muLatency );
+	auto itLaunch = std::find_if( m_vLaunchesInFlight.begin(), m_vLaunchesInFlight.end(), [&cmd] ( const LaunchTiming& l ) { return l.iVoiceID == cmd.iData; } );
+	if ( itLaunch == m_vLaunchesInFlight.end() )
+		return;
+
+	// Stopping the voice abandons the launch, otherwise stamp the first start
+	if ( bStart == false )
+		m_vLaunchesInFlight.erase( itLaunch );
+	else if ( itLaunch->dEnqueueUS < 0 )
+		itLaunch->dEnqueueUS = getLatencyStampUS();
+}
+
+// Called by the audio thread once it's handled a start command
+void ClipLauncher::stampLaunchApplied( int iVoiceID, bool bLaunched )
+{
+	std::lock_guard<std::mutex> lg( m_muLatency );
+	for ( size_t uIdx = 0; uIdx < m_vLaunchesInFlight.size(); uIdx++ )
+	{
+		LaunchTiming& launch = m_vLaunchesInFlight[uIdx];
+		if ( launch.iVoiceID != iVoiceID || launch.dEnqueueUS < 0 || launch.dApplyUS >= 0 )
+			continue;
+
+		// Drop launches of voices that were already sounding (swap and pop, no frees)
+		if ( bLaunched == false )
+		{
+			std::swap( launch, m_vLaunchesInFlight.back() );
+			m_vLaunchesInFlight.pop_back();
+		}
+		else
+		{
+			launch.dApplyUS = getLatencyStampUS();
+			launch.uApplySamplePos = m_uSamplePos;
+		}
+		return;
+	}
+}
+
+// Called by the audio thread after rendering the buffer starting at uBufStartPos,
+// moves launches whose voices made noise into the log
+void ClipLauncher::stampLaunchesSounded( size_t uBufStartPos, double dBufStartUS )
+{
+	std::lock_guard<std::mutex> lg( m_muLatency );
+	for ( size_t uIdx = 0; uIdx < m_vLaunchesInFlight.size(); )
+	{
+		LaunchTiming& launch = m_vLaunchesInFlight[uIdx];
+		if ( launch.dApplyUS >= 0 )
+		{
+			auto itVoice = std::find_if( m_liVoices.begin(), m_liVoices.end(), [&launch] ( const Voice& v ) { return v.GetID() == launch.iVoiceID; } );
+			if ( itVoice != m_liVoices.end() && itVoice->GetFirstSoundPos() != SIZE_MAX )
+			{
+				// Convert the sample offset into this buffer to time
+				launch.uSoundSamplePos = itVoice->GetFirstSoundPos();
+				launch.dSoundUS = dBufStartUS + 1e6 * ( (double) launch.uSoundSamplePos - (double) uBufStartPos ) / m_pAudioSpec->freq;
+
+				// Log it, overwriting the oldest once the ring is full
+				if ( m_vLaunchLog.size() < g_uMaxLaunchLog )
+					m_vLaunchLog.push_back( launch );
+				else
+					m_vLaunchLog[m_uNumLaunchesLogged % g_uMaxLaunchLog] = launch;
+				m_uNumLaunchesLogged++;
+
+				std::swap( launch, m_vLaunchesInFlight.back() );
+				m_vLaunchesInFlight.pop_back();
+				continue;
+			}
+		}
+		uIdx++;
+	}
+}
+
+std::vector<double> ClipLauncher::GetLaunchLatencies()
+{
+	std::lock_guard<std::mutex> lg( m_muLatency );
+
+	// Once the ring has wrapped, the oldest is the next one overwritten
+	std::vector<double> vRet;
+	vRet.reserve( 7 * m_vLaunchLog.size() );
+	const size_t uFirst = m_vLaunchLog.size() < g_uMaxLaunchLog ? 0 : m_uNumLaunchesLogged % g_uMaxLaunchLog;
+	for ( size_t uIdx = 0; uIdx < m_vLaunchLog.size(); uIdx++ )
+	{
+		const LaunchTiming& launch = m_vLaunchLog[( uFirst + uIdx ) % m_vLaunchLog.size()];
+		vRet.insert( vRet.end(), { (double) launch.iVoiceID, launch.dClickUS, launch.dEnqueueUS, launch.dApplyUS,
+			launch.dSoundUS, (double) launch.uApplySamplePos, (double) launch.uSoundSamplePos } );
+	}
+
+	return vRet;
+}
+
+size_t ClipLauncher::GetNumLaunchesDropped()
+{
+	std::lock_guard<std::mutex> lg( m_muLatency );
+	return m_uNumLaunchesDropped;
+}
+
+// Launches still in flight are left to finish
+void ClipLauncher::ClearLaunchLatencies()
+{
+	std::lock_guard<std::mutex> lg( m_muLatency );
+	m_vLaunchLog.clear();
+	m_uNumLaunchesLogged = 0;
+	m_uNumLaunchesDropped = 0;
+}
+
+void ClipLauncher::SetMetering( bool bMetering )
+{
+	// We need the spec to know how big buffers get
+	if ( m_pLevelMeter == nullptr )
+	{
+		std::cerr << "Error: Attempting to meter levels of uninitialized ClipLauncher!" << std::endl;
+		return;
+	}
+
+	m_bMetering = bMetering;
+}
+
+bool ClipLauncher::GetMetering() const
+{
+	return m_bMetering;
+}
+
+bool ClipLauncher::SetVoiceMeters( std::vector<int> vVoiceIDs, std::vector<int> vMeterIDs )
+{
+	if ( vVoiceIDs.size() != vMeterIDs.size() )
+	{
+		std::cerr << "Error: Mismatched meter data given to SetVoiceMeters!" << std::endl;
+		return false;
+	}
+
+	// Negative meter IDs wrap around, the audio thread casts them back
+	std::list<Command> liCommands;
+	for ( size_t uIdx = 0; uIdx < vVoiceIDs.size(); uIdx++ )
+	{
+		Command cmd;
+		cmd.eID = ECommandID::SetMeter;
+		cmd.iData = vVoiceIDs[uIdx];
+		cmd.uData = (size_t) vMeterIDs[uIdx];
+		liCommands.push_back( cmd );
+	}
+
+	return HandleCommands( liCommands );
+}
+
+std::vector<float> ClipLauncher::GetLevels()
+{
+	std::vector<float> vRet;
+	if ( m_pLevelMeter == nullptr )
+		return vRet;
+
+	const LevelMeter::Snapshot& snapshot = m_pLevelMeter->GetLevels();
+	vRet.reserve( 2 + 3 * ( snapshot.vVoices.size() + snapshot.vMeters.size() ) );
+	vRet.insert( vRet.end(), { (float) snapshot.uNumBufs, (float) snapshot.vVoices.size() } );
+	for ( const std::vector<LevelMeter::Level> * pLevels : { &snapshot.vVoices, &snapshot.vMeters } )
+		for ( const LevelMeter::Level& level : *pLevels )
+			vRet.insert( vRet.end(), { (float) level.iID, level.fPeak, level.fRMS } );
+
+	return vRet;
+}
+
 void ClipLauncher::SetSamplePosPrinting(bool bPrint){
     std::lock_guard<std::mutex> lg(m_muPrintSamplePos);
     m_bPrintSamplePos = bPrint;
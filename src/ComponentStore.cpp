@@ -0,0 +1,49 @@
+#include "ComponentStore.h"
+
+size_t DrawableStore::Add( vec4 v4Color, quatvec qvTransform, vec2 v2Scale, bool bActive /*= true*/ )
+{
+	vColors.push_back( v4Color );
+	vPositions.push_back( qvTransform.vec );
+	vRotations.push_back( qvTransform.quat );
+	vScales.push_back( v2Scale );
+	vActive.push_back( bActive ? 1 : 0 );
+	vPlayback.push_back( vec2( 0 ) );
+	++uGeneration;
+	return Size() - 1;
+}
+
+void DrawableStore::Reserve( size_t uCount )
+{
+	vColors.reserve( uCount );
+	vPositions.reserve( uCount );
+	vRotations.reserve( uCount );
+	vScales.reserve( uCount );
+	vActive.reserve( uCount );
+	vPlayback.reserve( uCount );
+	++uGeneration;
+}
+
+size_t DrawableStore::Size() const
+{
+	return vColors.size();
+}
+
+size_t ShapeStore::Add( vec2 v2Center, bool bActive /*= true*/ )
+{
+	vCenters.push_back( v2Center );
+	vActive.push_back( bActive ? 1 : 0 );
+	++uGeneration;
+	return Size() - 1;
+}
+
+void ShapeStore::Reserve( size_t uCount )
+{
+	vCenters.reserve( uCount );
+	vActive.reserve( uCount );
+	++uGeneration;
+}
+
+size_t ShapeStore::Size() const
+{
+	return vCenters.size();
+}
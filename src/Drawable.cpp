@@ -3,6 +3,7 @@
 
 #include <string>
 #include <vector>
+#include <algorithm>
 
 // Static var declarations
 /*static*/ GLint Drawable::s_PosHandle;
@@ -16,7 +17,10 @@ Drawable::Drawable() :
 	m_nIdx( 0 ),
 	m_v2Scale( 1 ),
 	m_v4Color( 1 ),
-	m_qvTransform( quatvec::Type::TRT )
+	m_v2Playback( 0 ),
+	m_qvTransform( quatvec::Type::TRT ),
+	m_pStore( nullptr ),
+	m_iStoreIdx( -1 )
 {}
 
 // Function for getting data into a Vertex Buffer Object
@@ -30,6 +34,11 @@ void fillVBO( GLuint buf, GLint handle, void * ptr, GLsizeiptr numBytes, GLuint
 }
 
 bool Drawable::Init( std::string strName, std::array<glm::vec3, 3> triVerts, glm::vec4 v4Color, quatvec qvTransform, glm::vec2 v2Scale)
+{
+	return Init( strName, std::vector<glm::vec3>( triVerts.begin(), triVerts.end() ), { 0, 1, 2 }, v4Color, qvTransform, v2Scale );
+}
+
+bool Drawable::Init( std::string strName, const std::vector<glm::vec3>& vVerts, const std::vector<GLuint>& vIndices, glm::vec4 v4Color, quatvec qvTransform, glm::vec2 v2Scale )
 {
 	if ( Drawable::s_PosHandle < 0 )
 	{
@@ -44,7 +53,7 @@ bool Drawable::Init( std::string strName, std::array<glm::vec3, 3> triVerts, glm
 		try
 		{
 			// We'll be creating an indexed array of VBOs
-			GLuint VAO( 0 ), nIdx( 3 );
+			GLuint VAO( 0 ), nIdx( (GLuint) vIndices.size() );
 
 			// Create vertex array object
 			glGenVertexArrays( 1, &VAO );
@@ -68,12 +77,11 @@ bool Drawable::Init( std::string strName, std::array<glm::vec3, 3> triVerts, glm
 
 			// If successful, bind position attr and upload data
 			GLuint bufIdx( 0 );
-			fillVBO( vboBuf[bufIdx++], s_PosHandle, triVerts.data(), 3 * sizeof( glm::vec3 ), 3, GL_FLOAT );
+			fillVBO( vboBuf[bufIdx++], s_PosHandle, (void *) vVerts.data(), vVerts.size() * sizeof( glm::vec3 ), 3, GL_FLOAT );
 
 			// Same for indices
-			GLuint indices[] = { 0, 1, 2 };
 			glBindBuffer( GL_ELEMENT_ARRAY_BUFFER, vboBuf[bufIdx] );
-			glBufferData( GL_ELEMENT_ARRAY_BUFFER, 3 * sizeof( GLuint ), &indices[0], GL_STATIC_DRAW );
+			glBufferData( GL_ELEMENT_ARRAY_BUFFER, vIndices.size() * sizeof( GLuint ), vIndices.data(), GL_STATIC_DRAW );
 
 			// Unbind VAO and cache data
 			glBindVertexArray( 0 );
@@ -102,14 +110,36 @@ bool Drawable::Init( std::string strName, std::array<glm::vec3, 3> triVerts, glm
 
 void Drawable::SetIsActive( bool b )
 {
-	m_bActive = b;
+	if ( m_pStore )
+		m_pStore->vActive[m_iStoreIdx] = b ? 1 : 0;
+	else
+		m_bActive = b;
 }
 
 bool Drawable::GetIsActive() const
 {
+	if ( m_pStore )
+		return m_pStore->vActive[m_iStoreIdx] != 0;
 	return m_bActive;
 }
 
+void Drawable::BindToStore( DrawableStore * pStore )
+{
+	if ( pStore == nullptr || pStore == m_pStore )
+		return;
+
+	// Take our current values with us
+	size_t uIdx = pStore->Add( GetColor(), GetTransform(), m_pStore ? m_pStore->vScales[m_iStoreIdx] : m_v2Scale, GetIsActive() );
+	pStore->vPlayback[uIdx] = GetPlayback();
+	m_pStore = pStore;
+	m_iStoreIdx = (int) uIdx;
+}
+
+int Drawable::GetStoreIdx() const
+{
+	return m_iStoreIdx;
+}
+
 bool Drawable::Init( std::string strIqmSrcFile, glm::vec4 v4Color, quatvec qvTransform, glm::vec2 v2Scale )
 {
 	if ( Drawable::s_PosHandle < 0 )
@@ -189,87 +219,131 @@ bool Drawable::Init( std::string strIqmSrcFile, glm::vec4 v4Color, quatvec qvTra
 
 vec4 Drawable::GetColor() const
 {
+	if ( m_pStore )
+		return m_pStore->vColors[m_iStoreIdx];
 	return m_v4Color;
 }
 
 vec3 Drawable::GetPos() const
 {
+	if ( m_pStore )
+		return m_pStore->vPositions[m_iStoreIdx];
 	return m_qvTransform.vec;
 }
 
 fquat Drawable::GetRot() const
 {
+	if ( m_pStore )
+		return m_pStore->vRotations[m_iStoreIdx];
 	return m_qvTransform.quat;
 }
 
 quatvec Drawable::GetTransform() const
 {
-	return m_qvTransform;
+	// The type isn't stored, it's always ours
+	return quatvec( GetPos(), GetRot(), m_qvTransform.eType );
 }
 
 mat4 Drawable::GetMV() const
 {
-	return m_qvTransform.ToMat4() * glm::scale( vec3( m_v2Scale, 1.f ) );
+	vec2 v2Scale = m_pStore ? m_pStore->vScales[m_iStoreIdx] : m_v2Scale;
+	return GetTransform().ToMat4() * glm::scale( vec3( v2Scale, 1.f ) );
 }
 
 void Drawable::SetPos3D( vec3 t )
 {
-	m_qvTransform.vec = t;
+	if ( m_pStore )
+		m_pStore->vPositions[m_iStoreIdx] = t;
+	else
+		m_qvTransform.vec = t;
 }
 
 void Drawable::Translate3D( vec3 t )
 {
-	m_qvTransform.vec += t;
+	SetPos3D( GetPos() + t );
 }
 
 void Drawable::SetPos2D( vec2 t )
 {
-	m_qvTransform.vec = vec3( t, 0 );
+	SetPos3D( vec3( t, 0 ) );
 }
 
 void Drawable::Translate2D( vec2 t )
 {
-	m_qvTransform.vec += vec3( t, 0 );
+	Translate3D( vec3( t, 0 ) );
 }
 
 void Drawable::SetRot( fquat q )
 {
-	m_qvTransform.quat = q;
+	if ( m_pStore )
+		m_pStore->vRotations[m_iStoreIdx] = q;
+	else
+		m_qvTransform.quat = q;
 }
 
 void Drawable::Rotate( fquat q )
 {
-	m_qvTransform.quat *= q;
+	SetRot( GetRot() * q );
 }
 
 void Drawable::SetTransform( quatvec qv )
 {
-	m_qvTransform = qv;
+	m_qvTransform.eType = qv.eType;
+	SetPos3D( qv.vec );
+	SetRot( qv.quat );
 }
 
 void Drawable::Transform( quatvec qv )
 {
-	m_qvTransform *= qv;
+	quatvec qvCur = GetTransform();
+	qvCur *= qv;
+	SetTransform( qvCur );
 }
 
 void Drawable::Scale( vec2 s )
 {
-	m_v2Scale *= s;
+	if ( m_pStore )
+		m_pStore->vScales[m_iStoreIdx] *= s;
+	else
+		m_v2Scale *= s;
 }
 
 void Drawable::Scale( float s )
 {
-	m_v2Scale *= s;
+	Scale( vec2( s ) );
 }
 
 void Drawable::SetScale( vec2 s )
 {
-	m_v2Scale = s;
+	if ( m_pStore )
+		m_pStore->vScales[m_iStoreIdx] = s;
+	else
+		m_v2Scale = s;
 }
 
 void Drawable::SetColor( vec4 c )
 {
-	m_v4Color = glm::clamp( c, vec4( 0 ), vec4( 1 ) );
+	c = glm::clamp( c, vec4( 0 ), vec4( 1 ) );
+	if ( m_pStore )
+		m_pStore->vColors[m_iStoreIdx] = c;
+	else
+		m_v4Color = c;
+}
+
+vec2 Drawable::GetPlayback() const
+{
+	if ( m_pStore )
+		return m_pStore->vPlayback[m_iStoreIdx];
+	return m_v2Playback;
+}
+
+void Drawable::SetPlayback( float fStartSample, float fNumSamples )
+{
+	vec2 v2Playback( fStartSample, std::max( fNumSamples, 0.f ) );
+	if ( m_pStore )
+		m_pStore->vPlayback[m_iStoreIdx] = v2Playback;
+	else
+		m_v2Playback = v2Playback;
 }
 
 bool Drawable::Draw()
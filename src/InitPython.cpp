@@ -4,6 +4,8 @@
 
 #include <pyliaison.h>
 
+#include <cstring>
+
 namespace pyl
 {
 	template<typename eType>
@@ -40,6 +42,53 @@ namespace pyl
 		}
 		return false;
 	}
+	// Any object exposing a contiguous buffer of records with the
+	// Command fields, in order (a CommandBuffer.Command ctypes array
+	// or a numpy array of ArrayMatrix.dtCommand). Only the field names
+	// are checked, the item size has to match for the layout
+	static bool isCommandFormat( const char * pFormat )
+	{
+		if ( pFormat == nullptr || std::strncmp( pFormat, "T{", 2 ) != 0 )
+			return false;
+
+		for ( const char * pField : { ":eID:", ":pClip:", ":iData:", ":fData:", ":uData:" } )
+		{
+			pFormat = std::strstr( pFormat, pField );
+			if ( pFormat == nullptr )
+				return false;
+			pFormat += std::strlen( pField );
+		}
+
+		return true;
+	}
+	bool convert( PyObject * pObj, ClipLauncher::CommandBuffer& cmdBuf )
+	{
+		if ( pObj == nullptr || PyObject_CheckBuffer( pObj ) == 0 )
+			return false;
+
+		Py_buffer view{ 0 };
+		if ( PyObject_GetBuffer( pObj, &view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT ) != 0 )
+		{
+			PyErr_Clear();
+			return false;
+		}
+
+		// The items had better be commands
+		bool bValid = (isCommandFormat( view.format ) && view.itemsize == sizeof( ClipLauncher::Command ) && view.len % view.itemsize == 0);
+		if ( bValid )
+		{
+			cmdBuf.pCommands = (const ClipLauncher::Command *) view.buf;
+			cmdBuf.uNumCommands = view.len / view.itemsize;
+		}
+		else
+			std::cerr << "Error: Command buffer items are not Command records!" << std::endl;
+
+		// The argument tuple keeps the exporting object (and its memory)
+		// alive for the duration of the call, so we can release the view now
+		PyBuffer_Release( &view );
+
+		return bValid;
+	}
 	bool convert( PyObject * pObj, SDL_AudioSpec& spec )
 	{
 		SDL_AudioSpec * pSpec = nullptr;
@@ -152,7 +201,10 @@ namespace pyl
 
 	AddClassToMod( pModDef, ClipLauncher );
 
-	AddMemFnToMod( pModDef, ClipLauncher, Init, bool, SDL_AudioSpec * );
+	AddMemFnToMod( pModDef, ClipLauncher, Init, bool, SDL_AudioSpec *, std::string );
+	AddMemFnToMod( pModDef, ClipLauncher, AddShard, bool, std::string );
+	AddMemFnToMod( pModDef, ClipLauncher, GetNumShards, size_t );
+	AddMemFnToMod( pModDef, ClipLauncher, GetShard, ClipLauncher *, size_t );
 	AddMemFnToMod( pModDef, ClipLauncher, Update, void );
 	AddMemFnToMod( pModDef, ClipLauncher, GetPlayPause, bool );
 	AddMemFnToMod( pModDef, ClipLauncher, SetPlayPause, void, bool );
@@ -164,8 +216,32 @@ namespace pyl
 	AddMemFnToMod( pModDef, ClipLauncher, GetAudioSpecPtr, SDL_AudioSpec * );
 	AddMemFnToMod( pModDef, ClipLauncher, RegisterClip, bool, std::string, std::string, std::string, size_t );
 	AddMemFnToMod( pModDef, ClipLauncher, GetClip, Clip *, std::string );
+	AddMemFnToMod( pModDef, ClipLauncher, RegisterClips, std::vector<int>, std::vector<std::string>, std::vector<std::string>, std::vector<std::string>, std::vector<size_t> );
+	AddMemFnToMod( pModDef, ClipLauncher, GetClips, std::vector<Clip *>, std::vector<std::string> );
+	AddMemFnToMod( pModDef, ClipLauncher, ReplaceClip, bool, std::string, std::string, std::string, size_t );
+	AddMemFnToMod( pModDef, ClipLauncher, UnregisterClip, bool, std::string );
+	AddMemFnToMod( pModDef, ClipLauncher, GetNumRetiredClips, size_t );
+	AddMemFnToMod( pModDef, ClipLauncher, GetClipBytesLogical, size_t );
+	AddMemFnToMod( pModDef, ClipLauncher, GetClipBytesPhysical, size_t );
+	AddMemFnToMod( pModDef, ClipLauncher, GetNumSampleBuffers, size_t );
+	AddMemFnToMod( pModDef, ClipLauncher, SetPeakCacheDir, void, std::string );
+	AddMemFnToMod( pModDef, ClipLauncher, GetPeakCacheDir, std::string );
+	AddMemFnToMod( pModDef, ClipLauncher, GetClipPeaks, std::vector<float>, std::string, size_t, size_t, size_t );
 	AddMemFnToMod( pModDef, ClipLauncher, HandleCommand, bool, Command );
 	AddMemFnToMod( pModDef, ClipLauncher, HandleCommands, bool, std::list<Command> );
+	AddMemFnToMod( pModDef, ClipLauncher, HandleCommandBuffer, bool, CommandBuffer );
+	AddMemFnToMod( pModDef, ClipLauncher, SetNumRenderThreads, bool, size_t );
+	AddMemFnToMod( pModDef, ClipLauncher, GetNumRenderThreads, size_t );
+	AddMemFnToMod( pModDef, ClipLauncher, SetLatencyLogging, void, bool );
+	AddMemFnToMod( pModDef, ClipLauncher, GetLatencyLogging, bool );
+	AddMemFnToMod( pModDef, ClipLauncher, StampLaunchClick, void, int );
+	AddMemFnToMod( pModDef, ClipLauncher, GetLaunchLatencies, std::vector<double> );
+	AddMemFnToMod( pModDef, ClipLauncher, GetNumLaunchesDropped, size_t );
+	AddMemFnToMod( pModDef, ClipLauncher, ClearLaunchLatencies, void );
+	AddMemFnToMod( pModDef, ClipLauncher, SetMetering, void, bool );
+	AddMemFnToMod( pModDef, ClipLauncher, GetMetering, bool );
+	AddMemFnToMod( pModDef, ClipLauncher, SetVoiceMeters, bool, std::vector<int>, std::vector<int> );
+	AddMemFnToMod( pModDef, ClipLauncher, GetLevels, std::vector<float> );
 
 	pModDef->SetCustomModuleInit( [] ( pyl::Object obModule )
 	{
@@ -175,6 +251,7 @@ namespace pyl
 		obModule.set_attr( "cmdStopVoice", ClipLauncher::ECommandID::StopVoice );
 		obModule.set_attr( "cmdStopVoices", ClipLauncher::ECommandID::StopVoices );
 		obModule.set_attr( "cmdOneShot", ClipLauncher::ECommandID::OneShot );
+		obModule.set_attr( "cmdSetMeter", ClipLauncher::ECommandID::SetMeter );
 	} );
 
 	// Also add the clip class
@@ -193,6 +270,10 @@ namespace pyl
 	AddClassToMod( pModDef, MatrixUI );
 
 	AddMemFnToMod( pModDef, MatrixUI, InitDisplay, bool, std::string, vec4, std::map<std::string, int> );
+	AddMemFnToMod( pModDef, MatrixUI, SetOffscreen, bool, int, int );
+	AddMemFnToMod( pModDef, MatrixUI, GetIsOffscreen, bool );
+	AddMemFnToMod( pModDef, MatrixUI, GetDrawStats, std::vector<float> );
+	AddMemFnToMod( pModDef, MatrixUI, SaveFrame, bool, std::string );
 	AddMemFnToMod( pModDef, MatrixUI, GetShaderPtr, const Shader * );
 	AddMemFnToMod( pModDef, MatrixUI, GetCameraPtr, const Camera * );
 	AddMemFnToMod( pModDef, MatrixUI, GetDrawable, const Drawable *, const size_t );
@@ -200,9 +281,30 @@ namespace pyl
 	AddMemFnToMod( pModDef, MatrixUI, AddDrawableTri, int, std::string, std::array<vec3, 3>, vec2, vec2, vec4, float );
 	AddMemFnToMod( pModDef, MatrixUI, AddDrawableIQM, int, std::string, vec2, vec2, vec4, float );
 	AddMemFnToMod( pModDef, MatrixUI, AddShape, int, Shape::EType, glm::vec2, std::map<std::string, float> );
+	AddMemFnToMod( pModDef, MatrixUI, AddDrawableWaveform, int, std::string, std::vector<float>, vec2, vec2, vec4 );
+	AddMemFnToMod( pModDef, MatrixUI, AddCells, std::vector<int>, std::string, std::vector<vec2>, float, std::vector<vec4> );
+	AddMemFnToMod( pModDef, MatrixUI, Reserve, void, size_t, size_t );
+	AddMemFnToMod( pModDef, MatrixUI, GetNumDrawables, size_t );
+	AddMemFnToMod( pModDef, MatrixUI, GetNumShapes, size_t );
+	AddMemFnToMod( pModDef, MatrixUI, GetStoreGeneration, size_t );
+	AddMemFnToMod( pModDef, MatrixUI, GetDrawableColorsPtr, float * );
+	AddMemFnToMod( pModDef, MatrixUI, GetDrawablePositionsPtr, float * );
+	AddMemFnToMod( pModDef, MatrixUI, GetDrawableRotationsPtr, float * );
+	AddMemFnToMod( pModDef, MatrixUI, GetDrawableScalesPtr, float * );
+	AddMemFnToMod( pModDef, MatrixUI, GetDrawableActivePtr, int * );
+	AddMemFnToMod( pModDef, MatrixUI, GetDrawablePlaybackPtr, float * );
+	AddMemFnToMod( pModDef, MatrixUI, GetShapeCentersPtr, float * );
+	AddMemFnToMod( pModDef, MatrixUI, GetShapeActivePtr, int * );
 	AddMemFnToMod( pModDef, MatrixUI, GetQuitFlag, bool );
 	AddMemFnToMod( pModDef, MatrixUI, SetQuitFlag, void, bool );
+	AddMemFnToMod( pModDef, MatrixUI, SetPlayhead, void, size_t );
+	AddMemFnToMod( pModDef, MatrixUI, GetPlayhead, size_t );
 	AddMemFnToMod( pModDef, MatrixUI, GetIsOverlapping, bool, Shape *, Shape * );
+	AddMemFnToMod( pModDef, MatrixUI, UpdateCollisionBank, void );
+	AddMemFnToMod( pModDef, MatrixUI, GetOverlappingPairs, std::vector<int> );
+	AddMemFnToMod( pModDef, MatrixUI, GetOverlapsWith, std::vector<int>, int );
+	AddMemFnToMod( pModDef, MatrixUI, GetShapesInRect, std::vector<int>, vec2, vec2 );
+	AddMemFnToMod( pModDef, MatrixUI, SetBroadPhaseCellSize, void, float );
 	AddMemFnToMod( pModDef, MatrixUI, Update, void );
 	AddMemFnToMod( pModDef, MatrixUI, Draw, void );
 
@@ -254,6 +356,8 @@ namespace pyl
 	AddMemFnToMod( pModDef, Drawable, GetPos, vec3 );
 	AddMemFnToMod( pModDef, Drawable, SetTransform, void, quatvec );
 	AddMemFnToMod( pModDef, Drawable, SetColor, void, glm::vec4 );
+	AddMemFnToMod( pModDef, Drawable, SetPlayback, void, float, float );
+	AddMemFnToMod( pModDef, Drawable, GetPlayback, vec2 );
 	AddMemFnToMod( pModDef, Drawable, GetIsActive, bool );
 	AddMemFnToMod( pModDef, Drawable, SetIsActive, void, bool );
 
@@ -0,0 +1,222 @@
+#include "LevelMeter.h"
+#include "Voice.h"
+
+#include <algorithm>
+#include <cmath>
+
+// Set in the middle snapshot index when it holds levels the reader hasn't seen
+static const uint8_t g_uFreshBit = 4;
+
+// Sum uNumSamples of pSource into pDest, returns their level and leaves
+// pSource zeroed (ready for the next voice). The peak and sum of squares
+// are kept in several lanes, so the compiler can vectorize both loops
+static LevelMeter::Level mixAndMeasure( float * pSource, float * pDest, size_t uNumSamples )
+{
+	for ( size_t uIdx = 0; uIdx < uNumSamples; uIdx++ )
+		pDest[uIdx] += pSource[uIdx];
+
+	const size_t uNumLanes = 8;
+	float afPeak[uNumLanes] = { 0.f }, afSumSq[uNumLanes] = { 0.f };
+	size_t uIdx = 0;
+	for ( ; uIdx + uNumLanes <= uNumSamples; uIdx += uNumLanes )
+	{
+		for ( size_t uLane = 0; uLane < uNumLanes; uLane++ )
+		{
+			const float fSample = pSource[uIdx + uLane];
+			afPeak[uLane] = std::max( afPeak[uLane], std::fabs( fSample ) );
+			afSumSq[uLane] += fSample * fSample;
+			pSource[uIdx + uLane] = 0.f;
+		}
+	}
+	for ( ; uIdx < uNumSamples; uIdx++ )
+	{
+		afPeak[0] = std::max( afPeak[0], std::fabs( pSource[uIdx] ) );
+		afSumSq[0] += pSource[uIdx] * pSource[uIdx];
+		pSource[uIdx] = 0.f;
+	}
+
+	LevelMeter::Level level;
+	float fSumSq = 0.f;
+	for ( size_t uLane = 0; uLane < uNumLanes; uLane++ )
+	{
+		level.fPeak = std::max( level.fPeak, afPeak[uLane] );
+		fSumSq += afSumSq[uLane];
+	}
+	level.fRMS = uNumSamples ? std::sqrt( fSumSq / uNumSamples ) : 0.f;
+	return level;
+}
+
+// Where a voice ID's probe for its slot starts (consecutive IDs get different slots)
+static size_t homeSlot( int iVoiceID, size_t uMask )
+{
+	return ( (uint32_t) iVoiceID * 2654435761u ) & uMask;
+}
+
+bool LevelMeter::MeteredVoice::operator<( const MeteredVoice& other ) const
+{
+	return iMeterID < other.iMeterID || ( iMeterID == other.iMeterID && uIdx < other.uIdx );
+}
+
+LevelMeter::LevelMeter( size_t uMaxSamples, size_t uMaxVoices, size_t uMaxVoiceMeters ) :
+	m_uMaxSamples( uMaxSamples ),
+	m_vVoiceScratch( uMaxSamples, 0.f ),
+	m_vMeterScratch( uMaxSamples, 0.f ),
+	m_uNumVoiceMeters( 0 ),
+	m_uBack( 0 ),
+	m_uFront( 1 ),
+	m_uMiddle( 2 ),
+	m_uNumBufs( 0 )
+{
+	// Reserve everything now, the audio thread won't (the
+	// voice meter table is a power of two, at most half full)
+	size_t uNumSlots = 2;
+	while ( uNumSlots < 2 * uMaxVoiceMeters )
+		uNumSlots *= 2;
+	m_vVoiceMeters.assign( uNumSlots, { -1, -1 } );
+	m_vMeteredVoices.reserve( uMaxVoices );
+	for ( Snapshot& snapshot : m_aSnapshots )
+	{
+		snapshot.vVoices.reserve( uMaxVoices );
+		snapshot.vMeters.reserve( uMaxVoices );
+	}
+}
+
+size_t LevelMeter::findVoiceMeter( int iVoiceID ) const
+{
+	const size_t uMask = m_vVoiceMeters.size() - 1;
+	size_t uSlot = homeSlot( iVoiceID, uMask );
+	while ( m_vVoiceMeters[uSlot].iVoiceID >= 0 && m_vVoiceMeters[uSlot].iVoiceID != iVoiceID )
+		uSlot = ( uSlot + 1 ) & uMask;
+	return uSlot;
+}
+
+void LevelMeter::SetVoiceMeter( int iVoiceID, int iMeterID )
+{
+	if ( iVoiceID < 0 )
+		return;
+
+	const size_t uSlot = findVoiceMeter( iVoiceID );
+	if ( iMeterID >= 0 )
+	{
+		// A new voice is left on its own if the table's full
+		if ( m_vVoiceMeters[uSlot].iVoiceID < 0 )
+		{
+			if ( 2 * m_uNumVoiceMeters == m_vVoiceMeters.size() )
+				return;
+			m_vVoiceMeters[uSlot].iVoiceID = iVoiceID;
+			m_uNumVoiceMeters++;
+		}
+		m_vVoiceMeters[uSlot].iMeterID = iMeterID;
+		return;
+	}
+
+	if ( m_vVoiceMeters[uSlot].iVoiceID < 0 )
+		return;
+
+	// Empty the voice's slot, moving back any voices after it that probed
+	// past it (those whose home slot isn't between the hole and them)
+	const size_t uMask = m_vVoiceMeters.size() - 1;
+	size_t uHole = uSlot;
+	for ( size_t uNext = ( uHole + 1 ) & uMask; m_vVoiceMeters[uNext].iVoiceID >= 0; uNext = ( uNext + 1 ) & uMask )
+	{
+		const size_t uHome = homeSlot( m_vVoiceMeters[uNext].iVoiceID, uMask );
+		if ( ( ( uNext - uHome ) & uMask ) >= ( ( uNext - uHole ) & uMask ) )
+		{
+			m_vVoiceMeters[uHole] = m_vVoiceMeters[uNext];
+			uHole = uNext;
+		}
+	}
+	m_vVoiceMeters[uHole] = { -1, -1 };
+	m_uNumVoiceMeters--;
+}
+
+LevelMeter::Level LevelMeter::renderVoice( Voice& v, float * pDest, size_t uNumSamples, size_t uSamplePos )
+{
+	// Silent voices are skipped, the scratch buffer is kept zeroed for the rest
+	Level level;
+	if ( v.WillRender( uNumSamples, uSamplePos ) )
+	{
+		float * pScratch = m_vVoiceScratch.data();
+		v.RenderData( pScratch, uNumSamples, uSamplePos );
+		level = mixAndMeasure( pScratch, pDest, uNumSamples );
+	}
+
+	// Detached voices have given up their ID, so there's no one to tell
+	level.iID = v.GetID();
+	if ( level.iID >= 0 )
+		m_aSnapshots[m_uBack].vVoices.push_back( level );
+
+	return level;
+}
+
+bool LevelMeter::RenderVoices( std::list<Voice>& liVoices, float * pMixBuffer, size_t uNumSamples, size_t uSamplePos )
+{
+	if ( pMixBuffer == nullptr || uNumSamples > m_uMaxSamples )
+		return false;
+
+	Snapshot& snapshot = m_aSnapshots[m_uBack];
+	snapshot.vVoices.clear();
+	snapshot.vMeters.clear();
+
+	// Voices without a meter go straight into the mix
+	// buffer, the rest are put aside and sorted by meter
+	m_vMeteredVoices.clear();
+	size_t uVoiceIdx = 0;
+	for ( Voice& v : liVoices )
+	{
+		const VoiceMeter& vm = m_vVoiceMeters[findVoiceMeter( v.GetID() )];
+		if ( vm.iVoiceID < 0 )
+			renderVoice( v, pMixBuffer, uNumSamples, uSamplePos );
+		else
+			m_vMeteredVoices.push_back( { vm.iMeterID, uVoiceIdx, &v } );
+		uVoiceIdx++;
+	}
+	std::sort( m_vMeteredVoices.begin(), m_vMeteredVoices.end() );
+
+	// Render each meter's voices
+	for ( auto itBegin = m_vMeteredVoices.begin(); itBegin != m_vMeteredVoices.end(); )
+	{
+		const int iMeterID = itBegin->iMeterID;
+		auto itEnd = std::find_if( itBegin, m_vMeteredVoices.end(), [iMeterID] ( const MeteredVoice& mv ) { return mv.iMeterID != iMeterID; } );
+
+		// A meter with one voice making noise (or none) has that voice's level
+		Level level;
+		auto fnWillRender = [uNumSamples, uSamplePos] ( const MeteredVoice& mv ) { return mv.pVoice->WillRender( uNumSamples, uSamplePos ); };
+		if ( std::count_if( itBegin, itEnd, fnWillRender ) <= 1 )
+		{
+			for ( auto it = itBegin; it != itEnd; ++it )
+			{
+				const Level voiceLevel = renderVoice( *it->pVoice, pMixBuffer, uNumSamples, uSamplePos );
+				level.fPeak = std::max( level.fPeak, voiceLevel.fPeak );
+				level.fRMS = std::max( level.fRMS, voiceLevel.fRMS );
+			}
+		}
+		else
+		{
+			float * pScratch = m_vMeterScratch.data();
+			for ( auto it = itBegin; it != itEnd; ++it )
+				renderVoice( *it->pVoice, pScratch, uNumSamples, uSamplePos );
+			level = mixAndMeasure( pScratch, pMixBuffer, uNumSamples );
+		}
+
+		level.iID = iMeterID;
+		snapshot.vMeters.push_back( level );
+		itBegin = itEnd;
+	}
+
+	// Publish the snapshot by swapping it with the middle one
+	snapshot.uSamplePos = uSamplePos;
+	snapshot.uNumBufs = ++m_uNumBufs;
+	m_uBack = m_uMiddle.exchange( m_uBack | g_uFreshBit, std::memory_order_acq_rel ) & ~g_uFreshBit;
+
+	return true;
+}
+
+const LevelMeter::Snapshot& LevelMeter::GetLevels()
+{
+	// Take the middle snapshot if it's newer than ours
+	if ( m_uMiddle.load( std::memory_order_relaxed ) & g_uFreshBit )
+		m_uFront = m_uMiddle.exchange( m_uFront, std::memory_order_acq_rel ) & ~g_uFreshBit;
+
+	return m_aSnapshots[m_uFront];
+}
@@ -3,17 +3,38 @@
 
 #include <glm/gtc/type_ptr.hpp>
 #include <algorithm>
+#include <chrono>
+#include <cmath>
+#include <cstring>
 
 
 MatrixUI::MatrixUI() :
 	m_bQuitFlag( false ),
+	m_uPlayhead( 0 ),
 	m_GLContext( nullptr ),
-	m_pWindow( nullptr )
+	m_pWindow( nullptr ),
+	m_uFBO( 0 ),
+	m_uColorRB( 0 ),
+	m_uDepthRB( 0 ),
+	m_nOffscreenW( 0 ),
+	m_nOffscreenH( 0 ),
+	m_fDrawMS( 0.f ),
+	m_uDrawCalls( 0 ),
+	m_uUniformUploads( 0 ),
+	m_fGridCellSize( 64.f )
 {
 }
 
 MatrixUI::~MatrixUI()
 {
+	// The framebuffer goes with the context, so free it first
+	if ( m_uFBO )
+	{
+		glDeleteFramebuffers( 1, &m_uFBO );
+		glDeleteRenderbuffers( 1, &m_uColorRB );
+		glDeleteRenderbuffers( 1, &m_uDepthRB );
+		m_uFBO = 0;
+	}
 	if ( m_pWindow )
 	{
 		SDL_DestroyWindow( m_pWindow );
@@ -28,6 +49,10 @@ MatrixUI::~MatrixUI()
 
 void MatrixUI::Draw()
 {
+	auto tStart = std::chrono::high_resolution_clock::now();
+	m_uDrawCalls = 0;
+	m_uUniformUploads = 0;
+
 	// Clear the screen
 	glClear( GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT );
 
@@ -37,8 +62,13 @@ void MatrixUI::Draw()
 	// Get the camera mat as well as some handles
 	GLuint pmvHandle = m_Shader.GetHandle( "u_PMV" );
 	GLuint clrHandle = m_Shader.GetHandle( "u_Color" );
+	GLuint playbackHandle = m_Shader.GetHandle( "a_Playback" );
 	mat4 P = m_Camera.GetCameraMat();
 
+	// Upload the playhead once, the shader does the rest
+	glUniform1f( m_Shader.GetHandle( "u_Playhead" ), (float) m_uPlayhead );
+	m_uUniformUploads++;
+
 	// Draw every Drawable
 	for ( Drawable& dr : m_vDrawables )
 	{
@@ -49,16 +79,124 @@ void MatrixUI::Draw()
 		vec4 c = dr.GetColor();
 		glUniformMatrix4fv( pmvHandle, 1, GL_FALSE, glm::value_ptr( PMV ) );
 		glUniform4fv( clrHandle, 1, glm::value_ptr( c ) );
+		glVertexAttrib2fv( playbackHandle, glm::value_ptr( dr.GetPlayback() ) );
 		dr.Draw();
+		m_uUniformUploads += 2;
+		m_uDrawCalls++;
 	}
 
-	// Swap window
-	SDL_GL_SwapWindow( m_pWindow );
+	// Swap window, or wait for the frame if it's offscreen
+	if ( m_uFBO )
+		glFinish();
+	else
+		SDL_GL_SwapWindow( m_pWindow );
+
+	m_fDrawMS = std::chrono::duration<float, std::milli>( std::chrono::high_resolution_clock::now() - tStart ).count();
 }
 
-void MatrixUI::Update()
+bool MatrixUI::SetOffscreen( int nWidth, int nHeight )
+{
+	if ( m_GLContext == nullptr )
+	{
+		std::cerr << "Error: Display must be initialized before going offscreen!" << std::endl;
+		return false;
+	}
+	if ( m_uFBO )
+	{
+		std::cerr << "Error: MatrixUI is already offscreen!" << std::endl;
+		return false;
+	}
+	if ( nWidth <= 0 || nHeight <= 0 )
+	{
+		std::cerr << "Error: Invalid offscreen size " << nWidth << " x " << nHeight << std::endl;
+		return false;
+	}
+
+	// A color and depth renderbuffer are all we need, nothing samples them
+	glGenFramebuffers( 1, &m_uFBO );
+	glBindFramebuffer( GL_FRAMEBUFFER, m_uFBO );
+
+	glGenRenderbuffers( 1, &m_uColorRB );
+	glBindRenderbuffer( GL_RENDERBUFFER, m_uColorRB );
+	glRenderbufferStorage( GL_RENDERBUFFER, GL_RGBA8, nWidth, nHeight );
+	glFramebufferRenderbuffer( GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, m_uColorRB );
+
+	glGenRenderbuffers( 1, &m_uDepthRB );
+	glBindRenderbuffer( GL_RENDERBUFFER, m_uDepthRB );
+	glRenderbufferStorage( GL_RENDERBUFFER, GL_DEPTH_COMPONENT24, nWidth, nHeight );
+	glFramebufferRenderbuffer( GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_RENDERBUFFER, m_uDepthRB );
+	glBindRenderbuffer( GL_RENDERBUFFER, 0 );
+
+	if ( glCheckFramebufferStatus( GL_FRAMEBUFFER ) != GL_FRAMEBUFFER_COMPLETE )
+	{
+		std::cerr << "Error: Offscreen framebuffer is incomplete!" << std::endl;
+		glBindFramebuffer( GL_FRAMEBUFFER, 0 );
+		glDeleteFramebuffers( 1, &m_uFBO );
+		glDeleteRenderbuffers( 1, &m_uColorRB );
+		glDeleteRenderbuffers( 1, &m_uDepthRB );
+		m_uFBO = m_uColorRB = m_uDepthRB = 0;
+		return false;
+	}
+
+	// Nothing else binds a framebuffer, so it stays bound
+	glViewport( 0, 0, nWidth, nHeight );
+	m_nOffscreenW = nWidth;
+	m_nOffscreenH = nHeight;
+
+	return true;
+}
+
+bool MatrixUI::GetIsOffscreen() const
 {
+	return m_uFBO != 0;
+}
 
+std::vector<float> MatrixUI::GetDrawStats() const
+{
+	return { m_fDrawMS, (float) m_uDrawCalls, (float) m_uUniformUploads };
+}
+
+bool MatrixUI::SaveFrame( std::string strFile ) const
+{
+	if ( m_uFBO == 0 )
+	{
+		std::cerr << "Error: Only offscreen frames can be saved!" << std::endl;
+		return false;
+	}
+
+	// Read the frame back, GL rows go bottom up and BMP rows top down
+	const size_t uPitch = 4 * m_nOffscreenW;
+	std::vector<uint8_t> vPixels( uPitch * m_nOffscreenH ), vFlipped( vPixels.size() );
+	glPixelStorei( GL_PACK_ALIGNMENT, 1 );
+	glReadPixels( 0, 0, m_nOffscreenW, m_nOffscreenH, GL_RGBA, GL_UNSIGNED_BYTE, vPixels.data() );
+	for ( int nRow = 0; nRow < m_nOffscreenH; nRow++ )
+		memcpy( &vFlipped[nRow * uPitch], &vPixels[( m_nOffscreenH - 1 - nRow ) * uPitch], uPitch );
+
+	// The bytes are R, G, B, A in memory whatever the endianness
+#if SDL_BYTEORDER == SDL_BIG_ENDIAN
+	const Uint32 uRMask = 0xff000000, uGMask = 0x00ff0000, uBMask = 0x0000ff00, uAMask = 0x000000ff;
+#else
+	const Uint32 uRMask = 0x000000ff, uGMask = 0x0000ff00, uBMask = 0x00ff0000, uAMask = 0xff000000;
+#endif
+	SDL_Surface * pSurface = SDL_CreateRGBSurfaceFrom( vFlipped.data(), m_nOffscreenW, m_nOffscreenH, 32, (int) uPitch,
+													   uRMask, uGMask, uBMask, uAMask );
+	if ( pSurface == nullptr )
+	{
+		std::cerr << "Error: Unable to make a surface for " << strFile << ": " << SDL_GetError() << std::endl;
+		return false;
+	}
+
+	const bool bSaved = SDL_SaveBMP( pSurface, strFile.c_str() ) == 0;
+	if ( bSaved == false )
+		std::cerr << "Error: Unable to save frame to " << strFile << ": " << SDL_GetError() << std::endl;
+	SDL_FreeSurface( pSurface );
+
+	return bSaved;
+}
+
+void MatrixUI::Update()
+{
+	UpdateCollisionBank();
 }
 
 // Add a drawable from an IQM file
@@ -69,8 +207,9 @@ int MatrixUI::AddDrawableIQM( std::string strIqmFile, vec2 T, vec2 S, vec4 C, fl
 	{
 		// Assume rotation about z for now
 		fquat qRot( cos( theta / 2 ), vec3( 0, 0, sin( theta / 2 ) ) );
-		if (D.Init(strIqmFile, C, quatvec(vec3(T, 0), qRot, quatvec::Type::TR), S)) 
+		if (D.Init(strIqmFile, C, quatvec(vec3(T, 0), qRot, quatvec::Type::TR), S))
 		{
+			D.BindToStore( &m_DrawableStore );
 			m_vDrawables.push_back(D);
 			return (int)(m_vDrawables.size() - 1);
 		}
@@ -94,6 +233,7 @@ int MatrixUI::AddDrawableTri( std::string strName, std::array<vec3, 3> triVerts,
 		fquat qRot( cos( theta / 2 ), vec3( 0, 0, sin( theta / 2 ) ) );
 		if (D.Init(strName, triVerts, C, quatvec(vec3(T, 0), qRot, quatvec::Type::TR), S))
 		{
+			D.BindToStore( &m_DrawableStore );
 			m_vDrawables.push_back(D);
 			return (int)(m_vDrawables.size() - 1);
 		}
@@ -106,6 +246,51 @@ int MatrixUI::AddDrawableTri( std::string strName, std::array<vec3, 3> triVerts,
 	return -1;
 }
 
+// Add a drawable from a waveform's peaks
+int MatrixUI::AddDrawableWaveform( std::string strName, std::vector<float> vPeaks, vec2 T, vec2 S, vec4 C )
+{
+	// Every column is a vertex at its min and one at its
+	// max, and neighboring columns are joined by a quad
+	const size_t uNumColumns = vPeaks.size() / 2;
+	if ( uNumColumns == 0 )
+		return -1;
+	if ( uNumColumns == 1 )
+		vPeaks.insert( vPeaks.end(), vPeaks.begin(), vPeaks.begin() + 2 );
+
+	std::vector<vec3> vVerts;
+	std::vector<GLuint> vIndices;
+	const size_t uNumVerts = std::max<size_t>( uNumColumns, 2 );
+	for ( size_t uColumn = 0; uColumn < uNumVerts; uColumn++ )
+	{
+		const float fX = (float) uColumn / ( uNumVerts - 1 ) - 0.5f;
+		vVerts.emplace_back( fX, 0.5f * clamp( vPeaks[2 * uColumn], -1.f, 1.f ), 0.f );
+		vVerts.emplace_back( fX, 0.5f * clamp( vPeaks[2 * uColumn + 1], -1.f, 1.f ), 0.f );
+		if ( uColumn > 0 )
+		{
+			const GLuint uIdx = (GLuint) ( 2 * uColumn );
+			vIndices.insert( vIndices.end(), { uIdx - 2, uIdx - 1, uIdx, uIdx - 1, uIdx + 1, uIdx } );
+		}
+	}
+
+	Drawable D;
+	try
+	{
+		fquat qRot( 1, vec3( 0 ) );
+		if ( D.Init( strName, vVerts, vIndices, C, quatvec( vec3( T, 0 ), qRot, quatvec::Type::TR ), S ) )
+		{
+			D.BindToStore( &m_DrawableStore );
+			m_vDrawables.push_back( D );
+			return (int) ( m_vDrawables.size() - 1 );
+		}
+	}
+	catch ( std::runtime_error e )
+	{
+		std::cout << e.what() << std::endl;
+	}
+
+	return -1;
+}
+
 int MatrixUI::AddShape( Shape::EType eType, glm::vec2 v2Pos, std::map<std::string, float> mapDetails )
 {
 	using EType = Shape::EType;
@@ -139,6 +324,7 @@ int MatrixUI::AddShape( Shape::EType eType, glm::vec2 v2Pos, std::map<std::strin
 				return -1;
 		}
 
+		sb.BindToStore( &m_ShapeStore );
 		m_vShapes.push_back( sb );
 		return m_vShapes.size() - 1;
 	}
@@ -151,6 +337,58 @@ int MatrixUI::AddShape( Shape::EType eType, glm::vec2 v2Pos, std::map<std::strin
 	return -1;
 }
 
+std::vector<int> MatrixUI::AddCells( std::string strIqmFile, std::vector<vec2> vPositions, float fRadius, std::vector<vec4> vColors )
+{
+	std::vector<int> vRet{ -1, -1 };
+	if ( vPositions.empty() || vColors.empty() )
+		return vRet;
+
+	// Init one drawable from the file (this hits the VAO cache
+	// at most once), every cell's drawable is a copy of it
+	Drawable drTemplate;
+	try
+	{
+		quatvec qvIdentity( vec3( 0 ), fquat( 1, 0, 0, 0 ), quatvec::Type::TR );
+		if ( drTemplate.Init( strIqmFile, vColors.front(), qvIdentity, vec2( 2 * fRadius ) ) == false )
+			return vRet;
+	}
+	catch ( std::runtime_error e )
+	{
+		std::cout << e.what() << std::endl;
+		return vRet;
+	}
+
+	// Reserve once for all of them
+	const size_t uNumCells = vPositions.size();
+	Reserve( uNumCells, uNumCells );
+
+	vRet = { (int) m_vShapes.size(), (int) m_vDrawables.size() };
+	for ( size_t uCellIdx = 0; uCellIdx < uNumCells; uCellIdx++ )
+	{
+		const vec2 v2Pos = vPositions[uCellIdx];
+
+		Shape sh = Circle::Create( v2Pos, fRadius );
+		sh.BindToStore( &m_ShapeStore );
+		m_vShapes.push_back( sh );
+
+		Drawable dr = drTemplate;
+		dr.SetPos2D( v2Pos );
+		dr.SetColor( vColors[std::min( uCellIdx, vColors.size() - 1 )] );
+		dr.BindToStore( &m_DrawableStore );
+		m_vDrawables.push_back( dr );
+	}
+
+	return vRet;
+}
+
+void MatrixUI::Reserve( size_t uNumShapes, size_t uNumDrawables )
+{
+	m_vShapes.reserve( m_vShapes.size() + uNumShapes );
+	m_ShapeStore.Reserve( m_ShapeStore.Size() + uNumShapes );
+	m_vDrawables.reserve( m_vDrawables.size() + uNumDrawables );
+	m_DrawableStore.Reserve( m_DrawableStore.Size() + uNumDrawables );
+}
+
 const Shader * MatrixUI::GetShaderPtr() const
 {
 	return &m_Shader;
@@ -179,6 +417,61 @@ const Shape * MatrixUI::GetShape( const size_t sbIdx ) const
 	return nullptr;
 }
 
+size_t MatrixUI::GetNumDrawables() const
+{
+	return m_vDrawables.size();
+}
+
+size_t MatrixUI::GetNumShapes() const
+{
+	return m_vShapes.size();
+}
+
+size_t MatrixUI::GetStoreGeneration() const
+{
+	return m_DrawableStore.uGeneration + m_ShapeStore.uGeneration;
+}
+
+float * MatrixUI::GetDrawableColorsPtr()
+{
+	return m_DrawableStore.vColors.empty() ? nullptr : &m_DrawableStore.vColors[0][0];
+}
+
+float * MatrixUI::GetDrawablePositionsPtr()
+{
+	return m_DrawableStore.vPositions.empty() ? nullptr : &m_DrawableStore.vPositions[0][0];
+}
+
+float * MatrixUI::GetDrawableRotationsPtr()
+{
+	return m_DrawableStore.vRotations.empty() ? nullptr : &m_DrawableStore.vRotations[0][0];
+}
+
+float * MatrixUI::GetDrawableScalesPtr()
+{
+	return m_DrawableStore.vScales.empty() ? nullptr : &m_DrawableStore.vScales[0][0];
+}
+
+int * MatrixUI::GetDrawableActivePtr()
+{
+	return m_DrawableStore.vActive.empty() ? nullptr : m_DrawableStore.vActive.data();
+}
+
+float * MatrixUI::GetDrawablePlaybackPtr()
+{
+	return m_DrawableStore.vPlayback.empty() ? nullptr : &m_DrawableStore.vPlayback[0][0];
+}
+
+float * MatrixUI::GetShapeCentersPtr()
+{
+	return m_ShapeStore.vCenters.empty() ? nullptr : &m_ShapeStore.vCenters[0][0];
+}
+
+int * MatrixUI::GetShapeActivePtr()
+{
+	return m_ShapeStore.vActive.empty() ? nullptr : m_ShapeStore.vActive.data();
+}
+
 void MatrixUI::SetQuitFlag( bool bQuit )
 {
 	m_bQuitFlag = bQuit;
@@ -189,6 +482,16 @@ bool MatrixUI::GetQuitFlag() const
 	return m_bQuitFlag;
 }
 
+void MatrixUI::SetPlayhead( size_t uSamplePos )
+{
+	m_uPlayhead = uSamplePos;
+}
+
+size_t MatrixUI::GetPlayhead() const
+{
+	return m_uPlayhead;
+}
+
 bool MatrixUI::InitDisplay( std::string strWindowName, vec4 v4ClearColor, std::map<std::string, int> mapDisplayAttrs )
 {
 	SDL_Window * pWindow = nullptr;
@@ -259,3 +562,209 @@ bool MatrixUI::GetIsOverlapping( Shape * pA, Shape * pB ) const
 		return pA->IsOverlapping( pB );
     return false;
 }
+
+// Get the world space bounds of a shape
+static void getShapeBounds( const Shape& sh, vec2& v2Min, vec2& v2Max )
+{
+	switch ( sh.GetType() )
+	{
+		case Shape::EType::Circle:
+		{
+			const vec2 v2R( ((const_ptr<Circle>) &sh)->Radius() );
+			v2Min = sh.GetPosition() - v2R;
+			v2Max = sh.GetPosition() + v2R;
+			break;
+		}
+		case Shape::EType::AABB:
+		{
+			const_ptr<AABB> pBox = (const_ptr<AABB>) &sh;
+			v2Min = vec2( pBox->Left(), pBox->Bottom() );
+			v2Max = vec2( pBox->Right(), pBox->Top() );
+			break;
+		}
+		case Shape::EType::Triangle:
+		{
+			const_ptr<Triangle> pTri = (const_ptr<Triangle>) &sh;
+			v2Min = vec2( pTri->Left(), pTri->Bottom() );
+			v2Max = vec2( pTri->Right(), pTri->Top() );
+			break;
+		}
+		default:
+			v2Min = v2Max = sh.GetPosition();
+			break;
+	}
+}
+
+// Make the pair lower index first so (a, b) and (b, a) are the same key
+static MatrixUI::ColPair makeColPair( int a, int b )
+{
+	return a < b ? MatrixUI::ColPair( a, b ) : MatrixUI::ColPair( b, a );
+}
+
+std::vector<int64_t> MatrixUI::getCellKeys( vec2 v2Min, vec2 v2Max ) const
+{
+	const int x0 = (int) std::floor( v2Min.x / m_fGridCellSize );
+	const int y0 = (int) std::floor( v2Min.y / m_fGridCellSize );
+	const int x1 = (int) std::floor( v2Max.x / m_fGridCellSize );
+	const int y1 = (int) std::floor( v2Max.y / m_fGridCellSize );
+
+	std::vector<int64_t> vCellKeys;
+	vCellKeys.reserve( (x1 - x0 + 1) * (y1 - y0 + 1) );
+	for ( int x = x0; x <= x1; x++ )
+		for ( int y = y0; y <= y1; y++ )
+			vCellKeys.push_back( ((int64_t) x << 32) | (uint32_t) y );
+
+	return vCellKeys;
+}
+
+// Pull a shape out of its grid cells, and erase its bank entries
+void MatrixUI::removeFromBroadPhase( int sIdx )
+{
+	BroadPhaseEntry& bpe = m_vBroadPhase[sIdx];
+
+	for ( int64_t key : bpe.vCellKeys )
+	{
+		auto itCell = m_mapGrid.find( key );
+		if ( itCell == m_mapGrid.end() )
+			continue;
+
+		std::vector<int>& vCell = itCell->second;
+		vCell.erase( std::remove( vCell.begin(), vCell.end(), sIdx ), vCell.end() );
+		if ( vCell.empty() )
+			m_mapGrid.erase( itCell );
+	}
+
+	for ( int iPartner : bpe.vPartners )
+	{
+		m_CollisionBank.erase( makeColPair( sIdx, iPartner ) );
+		std::vector<int>& vOther = m_vBroadPhase[iPartner].vPartners;
+		vOther.erase( std::remove( vOther.begin(), vOther.end(), sIdx ), vOther.end() );
+	}
+
+	bpe.vCellKeys.clear();
+	bpe.vPartners.clear();
+	bpe.bInGrid = false;
+}
+
+// Bin a shape and give it a bank entry with everything sharing a cell
+void MatrixUI::insertIntoBroadPhase( int sIdx )
+{
+	BroadPhaseEntry& bpe = m_vBroadPhase[sIdx];
+	Shape * pShape = &m_vShapes[sIdx];
+
+	getShapeBounds( *pShape, bpe.v2Min, bpe.v2Max );
+	bpe.vCellKeys = getCellKeys( bpe.v2Min, bpe.v2Max );
+	bpe.bInGrid = true;
+
+	for ( int64_t key : bpe.vCellKeys )
+	{
+		std::vector<int>& vCell = m_mapGrid[key];
+		for ( int iOther : vCell )
+		{
+			// Shapes sharing several cells only get tested once
+			ColPair pair = makeColPair( sIdx, iOther );
+			if ( m_CollisionBank.find( pair ) != m_CollisionBank.end() )
+				continue;
+
+			m_CollisionBank[pair] = pShape->IsOverlapping( &m_vShapes[iOther] );
+			bpe.vPartners.push_back( iOther );
+			m_vBroadPhase[iOther].vPartners.push_back( sIdx );
+		}
+		vCell.push_back( sIdx );
+	}
+}
+
+void MatrixUI::UpdateCollisionBank()
+{
+	// New shapes start out unbinned
+	if ( m_vBroadPhase.size() < m_vShapes.size() )
+		m_vBroadPhase.resize( m_vShapes.size() );
+
+	// Only shapes whose bounds changed (they moved, or were resized
+	// or rotated) or that toggled active get re-binned, pairs of
+	// shapes that stayed put keep their bank entries
+	for ( int sIdx = 0; sIdx < (int) m_vShapes.size(); sIdx++ )
+	{
+		const Shape& sh = m_vShapes[sIdx];
+		const BroadPhaseEntry& bpe = m_vBroadPhase[sIdx];
+		const bool bActive = sh.GetIsActive();
+
+		if ( bActive == bpe.bInGrid )
+		{
+			if ( bActive == false )
+				continue;
+
+			vec2 v2Min, v2Max;
+			getShapeBounds( sh, v2Min, v2Max );
+			if ( v2Min == bpe.v2Min && v2Max == bpe.v2Max )
+				continue;
+		}
+
+		if ( bpe.bInGrid )
+			removeFromBroadPhase( sIdx );
+		if ( bActive )
+			insertIntoBroadPhase( sIdx );
+	}
+}
+
+std::vector<int> MatrixUI::GetOverlappingPairs() const
+{
+	std::vector<int> vRet;
+	for ( auto& itPair : m_CollisionBank )
+	{
+		if ( itPair.second )
+		{
+			vRet.push_back( itPair.first.first );
+			vRet.push_back( itPair.first.second );
+		}
+	}
+
+	return vRet;
+}
+
+std::vector<int> MatrixUI::GetOverlapsWith( int sIdx ) const
+{
+	std::vector<int> vRet;
+	if ( sIdx < 0 || sIdx >= (int) m_vBroadPhase.size() )
+		return vRet;
+
+	for ( int iPartner : m_vBroadPhase[sIdx].vPartners )
+	{
+		auto itPair = m_CollisionBank.find( makeColPair( sIdx, iPartner ) );
+		if ( itPair != m_CollisionBank.end() && itPair->second )
+			vRet.push_back( iPartner );
+	}
+
+	return vRet;
+}
+
+// Useful for lasso selection - every binned shape overlapping the rect
+std::vector<int> MatrixUI::GetShapesInRect( vec2 v2Min, vec2 v2Max ) const
+{
+	std::vector<int> vRet;
+	Shape shRect = AABB::Create( (v2Min + v2Max) / 2.f, glm::abs( v2Max - v2Min ) / 2.f );
+	for ( int64_t key : getCellKeys( glm::min( v2Min, v2Max ), glm::max( v2Min, v2Max ) ) )
+	{
+		auto itCell = m_mapGrid.find( key );
+		if ( itCell == m_mapGrid.end() )
+			continue;
+
+		for ( int sIdx : itCell->second )
+			if ( std::find( vRet.begin(), vRet.end(), sIdx ) == vRet.end() && shRect.IsOverlapping( &m_vShapes[sIdx] ) )
+				vRet.push_back( sIdx );
+	}
+
+	return vRet;
+}
+
+void MatrixUI::SetBroadPhaseCellSize( float fCellSize )
+{
+	if ( fCellSize <= 0.f || fCellSize == m_fGridCellSize )
+		return;
+
+	// Clear everything out, next update re-bins it all
+	m_fGridCellSize = fCellSize;
+	m_mapGrid.clear();
+	m_CollisionBank.clear();
+	m_vBroadPhase.clear();
+}
@@ -71,6 +71,11 @@ bool Shader::Init( std::string strVertSrc, std::string strFragSrc, bool fromDisk
 	m_Program = glCreateProgram();
 	glAttachShader( m_Program, m_hVertShader );
 	glAttachShader( m_Program, m_hFragShader );
+
+	// Keep the position attribute at 0 - constant attributes
+	// (like a_Playback) can't go there on every driver
+	glBindAttribLocation( m_Program, 0, "a_Pos" );
+
 	glLinkProgram( m_Program );
 	if ( !check( m_Program, GL_LINK_STATUS ) )
 	{
@@ -79,7 +84,8 @@ bool Shader::Init( std::string strVertSrc, std::string strFragSrc, bool fromDisk
 		return false;
 	}
 
-	// Get all uniform and attribute handles now
+	// Get all uniform and attribute handles now, which are
+	// their locations (not their index in the active list)
 	ScopedBind sBind = ScopeBind();
 
 	GLint nUniforms( 0 ), nAttributes( 0 );
@@ -96,14 +102,14 @@ bool Shader::Init( std::string strVertSrc, std::string strFragSrc, bool fromDisk
 	{
 		memset( szNameBuf, 0, sizeof( szNameBuf ) );
 		glGetActiveUniform( m_Program, i, uMaxNumChars, &uLen, &iSize, &eType, szNameBuf );
-		m_mapHandles[szNameBuf] = i;
+		m_mapHandles[szNameBuf] = glGetUniformLocation( m_Program, szNameBuf );
 	}
 
 	for ( int i = 0; i < nAttributes; i++ )
 	{
 		memset( szNameBuf, 0, sizeof( szNameBuf ) );
 		glGetActiveAttrib( m_Program, i, uMaxNumChars, &uLen, &iSize, &eType, szNameBuf );
-		m_mapHandles[szNameBuf] = i;
+		m_mapHandles[szNameBuf] = glGetAttribLocation( m_Program, szNameBuf );
 	}
 
 	return true;
@@ -8,24 +8,33 @@
 
 Shape::Shape() :
 	bActive( false ),
-	eType( EType::None )
+	eType( EType::None ),
+	pStore( nullptr ),
+	iStoreIdx( -1 )
 {
 }
 
 Shape::Shape( glm::vec2 v2C ) :
 	bActive( false ),
 	eType( EType::None ),
-	v2Center( v2C )
+	v2Center( v2C ),
+	pStore( nullptr ),
+	iStoreIdx( -1 )
 {
 }
 
 void Shape::SetCenterPos( glm::vec2 v2Pos )
 {
-	v2Center = v2Pos;
+	if ( pStore )
+		pStore->vCenters[iStoreIdx] = v2Pos;
+	else
+		v2Center = v2Pos;
 }
 
 vec2 Shape::GetPosition() const
 {
+	if ( pStore )
+		return pStore->vCenters[iStoreIdx];
 	return v2Center;
 }
 
@@ -36,14 +45,30 @@ Shape::EType Shape::GetType() const
 
 void Shape::SetIsActive( bool b )
 {
-	bActive = b;
+	if ( pStore )
+		pStore->vActive[iStoreIdx] = b ? 1 : 0;
+	else
+		bActive = b;
 }
 
 bool Shape::GetIsActive() const
 {
+	if ( pStore )
+		return pStore->vActive[iStoreIdx] != 0;
 	return bActive;
 }
 
+void Shape::BindToStore( ShapeStore * pNewStore )
+{
+	if ( pNewStore == nullptr || pNewStore == pStore )
+		return;
+
+	// Take our current center and active flag with us
+	size_t uIdx = pNewStore->Add( GetPosition(), GetIsActive() );
+	pStore = pNewStore;
+	iStoreIdx = (int) uIdx;
+}
+
 /*static*/ vec2 Shape::perp( const vec2& v )
 {
 	return vec2( -v.y, v.x );
@@ -163,7 +188,7 @@ float Circle::Radius() const
 
 bool TestOverlap( const_ptr<Circle> pA, const_ptr<Circle> pB )
 {
-	float fDist2 = glm::distance2( pA->v2Center, pB->v2Center );
+	float fDist2 = glm::distance2( pA->GetPosition(), pB->GetPosition() );
 	float fTotalRadius = pA->Radius() + pB->Radius();
 	return fDist2 <= powf( fTotalRadius, 2 );
 }
@@ -172,16 +197,16 @@ bool TestOverlap( const_ptr<Circle> pA, const_ptr<Circle> pB )
 
 bool TestOverlap( const_ptr<Circle> pCirc, const_ptr<AABB> pAABB )
 {
-	vec2 ptClosest = pAABB->Clamp( pCirc->v2Center );
-	return glm::distance2( ptClosest, pCirc->v2Center ) <= powf( pCirc->Radius(), 2 );
+	vec2 ptClosest = pAABB->Clamp( pCirc->GetPosition() );
+	return glm::distance2( ptClosest, pCirc->GetPosition() ) <= powf( pCirc->Radius(), 2 );
 }
 
 ////////////////////////////////////////////////////////////////////////////
 
 bool TestOverlap( const_ptr<Circle> pCirc, const_ptr<Triangle> pTri )
 {
-	vec2 p = ClosestPtToTriangle( pTri->v2A + pTri->v2Center, pTri->v2B + pTri->v2Center, pTri->v2C + pTri->v2Center, pCirc->v2Center );
-	float f1 = glm::distance2( pCirc->v2Center, p );
+	vec2 p = ClosestPtToTriangle( pTri->v2A + pTri->GetPosition(), pTri->v2B + pTri->GetPosition(), pTri->v2C + pTri->GetPosition(), pCirc->GetPosition() );
+	float f1 = glm::distance2( pCirc->GetPosition(), p );
 	return f1 <= powf( pCirc->fRadius, 2 );
 }
 
@@ -189,34 +214,34 @@ bool TestOverlap( const_ptr<Circle> pCirc, const_ptr<Triangle> pTri )
 
 bool IsPointInside( vec2 p, Circle * pCirc )
 {
-	return glm::length2( pCirc->v2Center - p ) < powf( pCirc->fRadius, 2 );
+	return glm::length2( pCirc->GetPosition() - p ) < powf( pCirc->fRadius, 2 );
 }
 
 ////////////////////////////////////////////////////////////////////////////
 
 float Triangle::Left() const
 {
-	return std::min( { v2A.x, v2B.x, v2C.x } ) + v2Center.x;
+	return std::min( { v2A.x, v2B.x, v2C.x } ) + GetPosition().x;
 }
 
 float Triangle::Right() const
 {
-	return std::max( { v2A.x, v2B.x, v2C.x } ) + v2Center.x;
+	return std::max( { v2A.x, v2B.x, v2C.x } ) + GetPosition().x;
 }
 
 float Triangle::Bottom() const
 {
-	return std::min( { v2A.y, v2B.y, v2C.y } ) + v2Center.y;
+	return std::min( { v2A.y, v2B.y, v2C.y } ) + GetPosition().y;
 }
 
 float Triangle::Top() const
 {
-	return std::max( { v2A.y, v2B.y, v2C.y } ) + v2Center.y;
+	return std::max( { v2A.y, v2B.y, v2C.y } ) + GetPosition().y;
 }
 
 std::array<glm::vec2, 3> Triangle::Verts() const
 {
-	return {{ v2A + v2Center, v2B + v2Center, v2C + v2Center }};
+	return {{ v2A + GetPosition(), v2B + GetPosition(), v2C + GetPosition() }};
 }
 
 std::array<glm::vec2, 3> Triangle::Edges() const
@@ -238,22 +263,22 @@ float AABB::Height() const
 
 float AABB::Left() const
 {
-	return v2Center.x - v2HalfDim.x;
+	return GetPosition().x - v2HalfDim.x;
 }
 
 float AABB::Right() const
 {
-	return v2Center.x + v2HalfDim.x;
+	return GetPosition().x + v2HalfDim.x;
 }
 
 float AABB::Top() const
 {
-	return v2Center.y + v2HalfDim.y;
+	return GetPosition().y + v2HalfDim.y;
 }
 
 float AABB::Bottom() const
 {
-	return v2Center.y - v2HalfDim.y;
+	return GetPosition().y - v2HalfDim.y;
 }
 
 glm::vec2 AABB::HalfDim() const
@@ -263,7 +288,7 @@ glm::vec2 AABB::HalfDim() const
 
 glm::vec2 AABB::Clamp( const glm::vec2 p ) const
 {
-	return glm::clamp( p, v2Center - v2HalfDim, v2Center + v2HalfDim );
+	return glm::clamp( p, GetPosition() - v2HalfDim, GetPosition() + v2HalfDim );
 }
 
 ////////////////////////////////////////////////////////////////////////////
@@ -316,15 +341,15 @@ glm::vec2 AABB::GetFaceNormalFromPoint( const glm::vec2 p ) const
 
 bool TestPoint( const_ptr<Circle> pCirc, const vec2 v2Point )
 {
-	return glm::length2( pCirc->v2Center - v2Point ) < powf( pCirc->fRadius, 2 );
+	return glm::length2( pCirc->GetPosition() - v2Point ) < powf( pCirc->fRadius, 2 );
 }
 
 ////////////////////////////////////////////////////////////////////////////
 
 bool TestPoint( const_ptr<AABB> pAABB, const vec2 v2Point )
 {
-	bool bX = fabs( v2Point.x - pAABB->v2Center.x ) < pAABB->v2HalfDim.x;
-	bool bY = fabs( v2Point.y - pAABB->v2Center.y ) < pAABB->v2HalfDim.y;
+	bool bX = fabs( v2Point.x - pAABB->GetPosition().x ) < pAABB->v2HalfDim.x;
+	bool bY = fabs( v2Point.y - pAABB->GetPosition().y ) < pAABB->v2HalfDim.y;
 	return bX && bY;
 }
 
@@ -362,7 +387,7 @@ bool TestOverlap( const_ptr<AABB> pAABB, const_ptr<Triangle> pTri )
 	// If that didn't work, make box center the origin
 	std::array<vec2, 3> av2Verts = pTri->Verts();
 	for ( vec2& v : av2Verts )
-		v -= pAABB->v2Center;
+		v -= pAABB->GetPosition();
 
 	// Walk the face edges
 	for ( const vec2& e : pTri->Edges() )
@@ -397,14 +422,14 @@ glm::vec2 AABB::GetVert( int idx ) const
 	switch ( (idx + 4) % 4 )			// |   |
 	{									// 2---1
 		case 0:
-			return v2Center + v2HalfDim;
+			return GetPosition() + v2HalfDim;
 		case 1:
-			return v2Center + vec2( v2HalfDim.x, -v2HalfDim.y );
+			return GetPosition() + vec2( v2HalfDim.x, -v2HalfDim.y );
 		case 2:
-			return v2Center - v2HalfDim;
+			return GetPosition() - v2HalfDim;
 		case 3:
 		default:
-			return v2Center + vec2( -v2HalfDim.x, v2HalfDim.y );
+			return GetPosition() + vec2( -v2HalfDim.x, v2HalfDim.y );
 	}
 }
 
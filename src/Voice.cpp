@@ -3,6 +3,8 @@
 #include "Util.h"
 
 #include <algorithm>
+#include <climits>
+#include <stdexcept>
 
 
 // Initializing constructor
@@ -14,6 +16,7 @@ Voice::Voice() :
 	m_uTriggerRes( 0 ),
 	m_uStartingPos( 0 ),
 	m_uLastTailSampleAdded( UINT_MAX ),
+	m_uFirstSoundPos( SIZE_MAX ),
 	m_pClip( nullptr )
 {
 }
@@ -76,6 +79,42 @@ int Voice::GetID() const
 	return m_iUniqueID;
 }
 
+Clip const * Voice::GetClip() const
+{
+	return m_pClip;
+}
+
+size_t Voice::GetFirstSoundPos() const
+{
+	return m_uFirstSoundPos;
+}
+
+bool Voice::WillRender( const size_t uSamplesDesired, const size_t uSamplePos ) const
+{
+	// The same early out RenderData takes
+	if ( m_eState == EState::Stopped || m_pClip == nullptr || m_fVolume <= 0.f )
+		return false;
+
+	// Voices waiting to start (without a tail to play) are silent until the trigger res
+	if ( m_eState == EState::Pending || m_eState == EState::OneShot )
+	{
+		const size_t uPosAlongTrigger = m_uTriggerRes ? uSamplePos % m_uTriggerRes : 0;
+		return m_uTriggerRes - uPosAlongTrigger < uSamplesDesired;
+	}
+
+	return true;
+}
+
+// The first head sample that isn't silent once faded in
+static size_t getFirstAudibleSample( const float * const pAudioData, const size_t uSamplesInHead, const size_t uFadeSamples )
+{
+	// The fade up from zero makes sample 0 silent
+	size_t uHeadIdx = uFadeSamples ? 1 : 0;
+	while ( uHeadIdx < uSamplesInHead && pAudioData[uHeadIdx] == 0.f )
+		uHeadIdx++;
+	return uHeadIdx;
+}
+
 // Handle the transition to stopping appropriately
 void Voice::SetStopping( const size_t uTriggerRes )
 {
@@ -158,6 +197,7 @@ void Voice::SetPending( const size_t uTriggerRes, bool bLoop /*= false*/ )
 	setState( eNextState );
 	m_uTriggerRes = uTriggerRes;
 	m_uStartingPos = 0;
+	m_uFirstSoundPos = SIZE_MAX;
 }
 
 void Voice::SetVolume( float fVol )
@@ -165,6 +205,51 @@ void Voice::SetVolume( float fVol )
 	m_fVolume = std::max( 0.f, std::min( fVol, 1.f ) );
 }
 
+bool Voice::SetClip( Clip const * pClip )
+{
+	if ( pClip == nullptr )
+		return false;
+
+	switch ( m_eState )
+	{
+		// We haven't touched the clip's samples yet, so it's safe to swap
+		case EState::Stopped:
+		case EState::Pending:
+		case EState::OneShot:
+			m_pClip = pClip;
+			m_uFirstSoundPos = SIZE_MAX;
+			return true;
+		default:
+			return false;
+	}
+}
+
+void Voice::Detach()
+{
+	m_iUniqueID = -1;
+
+	switch ( m_eState )
+	{
+		// If we were waiting on the tail to start again, just finish the tail
+		case EState::TailPending:
+		case EState::TailOneShot:
+			setState( EState::Tail );
+			break;
+		// If we hadn't started, we never will
+		case EState::Pending:
+		case EState::OneShot:
+			setState( EState::Stopped );
+			break;
+		// Nobody can stop us once we're detached, so stop at our trigger res
+		case EState::Starting:
+		case EState::Looping:
+			setState( EState::Stopping );
+			break;
+		default:
+			break;
+	}
+}
+
 // Update prevState and assign state
 void Voice::setState( EState eNextState )
 {
@@ -185,7 +270,12 @@ void Voice::RenderData( float * const pMixBuffer, const size_t uSamplesDesired,
 	const size_t uSamplesInTail = uTotalSampleCount - uSamplesInHead;
 	const size_t uFadeSamples = m_pClip->GetNumFadeSamples();
 	const size_t uFadeBegin = uSamplesInHead - uFadeSamples;
+	const size_t uTailFadeBegin = m_pClip->GetTailFadeBegin();
 	const float * const pAudioData = m_pClip->GetAudioData();
+	const float * const pFadeIn = m_pClip->GetFadeInSamples();
+	const float * const pFadeOut = m_pClip->GetFadeOutSamples();
+	const float * const pFadeRamp = m_pClip->GetFadeRamp();
+	const float * const pTailFadeOut = m_pClip->GetTailFadeSamples();
 
 	// Just another early out check
 	if ( uSamplesInHead == 0 || pAudioData == nullptr )
@@ -274,6 +364,9 @@ void Voice::RenderData( float * const pMixBuffer, const size_t uSamplesDesired,
 					// Set the starting position to the current sample idx
 					m_uStartingPos = (uCurrentSamplePos + uSamplesLeftTillTrigger) % uSamplesInHead;
 
+					// Note when our head will first be heard
+					m_uFirstSoundPos = uCurrentSamplePos + uSamplesLeftTillTrigger + getFirstAudibleSample( pAudioData, uSamplesInHead, uFadeSamples );
+
 					// If we're still in a tail state, there's an overlap
 					bTailHeadOverlap = (m_eState == EState::TailOneShot || m_eState == EState::TailPending);
 
@@ -317,10 +410,7 @@ void Voice::RenderData( float * const pMixBuffer, const size_t uSamplesDesired,
 					// Fade up from zero (this is the only loop of it's kind, so just do it here
 					const size_t uLastFadeFromZero = std::min( uTentativeLastSample, uFadeSamples );
 					for ( ; uFirstHeadSample < uLastFadeFromZero; uFirstHeadSample++ )
-					{
-						float fSampleVal = m_fVolume * pAudioData[uFirstHeadSample];
-						pMixBuffer[uSamplesAdded++] += remap<float>( (float) uFirstHeadSample, 0.f, (float) uFadeSamples, 0.f, fSampleVal );
-					}
+						pMixBuffer[uSamplesAdded++] += m_fVolume * pFadeIn[uFirstHeadSample];
 
 					// If there's still more to fade, continue to get it out of the way
 					if ( uTentativeLastSample < uFadeSamples )
@@ -436,22 +526,27 @@ void Voice::RenderData( float * const pMixBuffer, const size_t uSamplesDesired,
 			pMixBuffer[uSamplesAdded++] += fSampleVal;
 		}
 
-		// Fade out to target sample, starting at last added above
-		for ( size_t uFadeIdx = uLastHeadSample; uFadeIdx < uLastFadeoutToBegin; uFadeIdx++ )
+		// Fade out to target sample, starting at last added above (or where
+		// we are, if this buffer began partway through the fade)
+		for ( size_t uFadeIdx = std::max( uFirstHeadSample, uLastHeadSample ); uFadeIdx < uLastFadeoutToBegin; uFadeIdx++ )
 		{
-			// Fade the current sample to the target val, mix it in
-			float fSampleVal = m_fVolume * pAudioData[uFadeIdx];
-			float fFadedVal = remap( (float) uFadeIdx, (float) uFadeBegin, (float) uSamplesInHead, fSampleVal, fTargetVal );;
-			pMixBuffer[uSamplesAdded++] += fFadedVal;
+			// Mix in the faded out sample and fade in the target val
+			const size_t uEnvIdx = uFadeIdx - uFadeBegin;
+			pMixBuffer[uSamplesAdded++] += m_fVolume * pFadeOut[uEnvIdx] + fTargetVal * pFadeRamp[uEnvIdx];
 		}
 
-		// Add the tail samples
-		for ( size_t uTailIdx = uFirstTailSample; uTailIdx < uLastTailSample; uTailIdx++ )
+		// Add the tail samples, up to where the tail fades to zero
+		const size_t uLastUnfadedTailSample = std::min( uLastTailSample, uTailFadeBegin );
+		for ( size_t uTailIdx = uFirstTailSample; uTailIdx < uLastUnfadedTailSample; uTailIdx++ )
 		{
 			float fSampleVal = m_fVolume * pAudioData[uTailIdx];
 			*pFirstTailMixSample++ += fSampleVal;
 		}
 
+		// Mix in the rest from the clip's faded out copy
+		for ( size_t uTailIdx = std::max( uFirstTailSample, uLastUnfadedTailSample ); uTailIdx < uLastTailSample; uTailIdx++ )
+			*pFirstTailMixSample++ += m_fVolume * pTailFadeOut[uTailIdx - uTailFadeBegin];
+
 		// Update state
 		if ( eNextState != m_eState )
 			setState( eNextState );
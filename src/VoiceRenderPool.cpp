@@ -0,0 +1,145 @@
+#include "VoiceRenderPool.h"
+#include "Voice.h"
+
+#include <algorithm>
+#include <chrono>
+
+VoiceRenderPool::VoiceRenderPool( size_t uNumThreads, size_t uMaxSamples ) :
+	m_pVoices( nullptr ),
+	m_uNumSamples( 0 ),
+	m_uSamplePos( 0 ),
+	m_uJobCounter( 0 ),
+	m_uNumDone( 0 ),
+	m_bQuit( false ),
+	m_uMaxSamples( uMaxSamples )
+{
+	// The caller renders too, so we need one fewer workers
+	const size_t uNumWorkers = std::max<size_t>( uNumThreads, 1 ) - 1;
+
+	// Allocate everything up front, the audio thread won't
+	m_vScratch.resize( uNumWorkers, std::vector<float>( m_uMaxSamples, 0.f ) );
+	m_vErrors.resize( uNumWorkers );
+
+	m_vWorkers.reserve( uNumWorkers );
+	for ( size_t uWorkerIdx = 0; uWorkerIdx < uNumWorkers; uWorkerIdx++ )
+		m_vWorkers.emplace_back( &VoiceRenderPool::workerLoop, this, uWorkerIdx );
+}
+
+VoiceRenderPool::~VoiceRenderPool()
+{
+	m_bQuit.store( true );
+	for ( std::thread& t : m_vWorkers )
+		t.join();
+}
+
+size_t VoiceRenderPool::GetNumThreads() const
+{
+	return m_vWorkers.size() + 1;
+}
+
+bool VoiceRenderPool::RenderVoices( std::list<Voice>& liVoices, float * pMixBuffer, size_t uNumSamples, size_t uSamplePos )
+{
+	if ( pMixBuffer == nullptr || uNumSamples > m_uMaxSamples )
+		return false;
+
+	// Without workers this is just the serial loop
+	const uint32_t uNumWorkers = (uint32_t) m_vWorkers.size();
+	if ( uNumWorkers == 0 )
+	{
+		renderGroup( 0, pMixBuffer );
+		return true;
+	}
+
+	// Describe the job, then fork by bumping the job counter (the release
+	// makes the job visible to workers who see the new count)
+	m_pVoices = &liVoices;
+	m_uNumSamples = uNumSamples;
+	m_uSamplePos = uSamplePos;
+	m_uNumDone.store( 0, std::memory_order_relaxed );
+	m_uJobCounter.fetch_add( 1, std::memory_order_release );
+
+	// Render our own group straight into the mix buffer, but
+	// hold on to any error until the workers are done as well
+	std::exception_ptr pError;
+	try
+	{
+		renderGroup( 0, pMixBuffer );
+	}
+	catch ( ... )
+	{
+		pError = std::current_exception();
+	}
+
+	// Join - the workers are busy rendering, so spin
+	while ( m_uNumDone.load( std::memory_order_acquire ) != uNumWorkers )
+		std::this_thread::yield();
+
+	// Sum the worker buffers into the mix buffer
+	for ( size_t uWorkerIdx = 0; uWorkerIdx < uNumWorkers; uWorkerIdx++ )
+	{
+		const float * pScratch = m_vScratch[uWorkerIdx].data();
+		for ( size_t uIdx = 0; uIdx < uNumSamples; uIdx++ )
+			pMixBuffer[uIdx] += pScratch[uIdx];
+
+		if ( pError == nullptr && m_vErrors[uWorkerIdx] != nullptr )
+			pError = m_vErrors[uWorkerIdx];
+		m_vErrors[uWorkerIdx] = nullptr;
+	}
+
+	// Rethrow whatever went wrong as if we'd rendered serially
+	if ( pError != nullptr )
+		std::rethrow_exception( pError );
+
+	return true;
+}
+
+void VoiceRenderPool::renderGroup( size_t uGroup, float * pBuffer )
+{
+	const size_t uNumGroups = GetNumThreads();
+
+	size_t uVoiceIdx = 0;
+	for ( Voice& v : *m_pVoices )
+	{
+		if ( uVoiceIdx++ % uNumGroups == uGroup )
+			v.RenderData( pBuffer, m_uNumSamples, m_uSamplePos );
+	}
+}
+
+void VoiceRenderPool::workerLoop( size_t uWorkerIdx )
+{
+	// Worker i renders group i + 1 (the caller renders group 0)
+	const size_t uGroup = uWorkerIdx + 1;
+	float * pScratch = m_vScratch[uWorkerIdx].data();
+
+	uint32_t uLastJob = 0;
+	while ( true )
+	{
+		// Wait for the job counter to move, backing off the longer we wait
+		uint32_t uJob = 0;
+		for ( size_t uSpins = 0; ( uJob = m_uJobCounter.load( std::memory_order_acquire ) ) == uLastJob; uSpins++ )
+		{
+			if ( m_bQuit.load( std::memory_order_relaxed ) )
+				return;
+
+			if ( uSpins > ( 1 << 16 ) )
+				std::this_thread::sleep_for( std::chrono::microseconds( 100 ) );
+			else if ( uSpins > ( 1 << 10 ) )
+				std::this_thread::yield();
+		}
+		uLastJob = uJob;
+
+		// Render our voices into a zeroed scratch buffer
+		std::fill( pScratch, pScratch + m_uNumSamples, 0.f );
+		try
+		{
+			renderGroup( uGroup, pScratch );
+		}
+		catch ( ... )
+		{
+			m_vErrors[uWorkerIdx] = std::current_exception();
+		}
+
+		// Let the caller know we're done
+		m_uNumDone.fetch_add( 1, std::memory_order_release );
+	}
+}
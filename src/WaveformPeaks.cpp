@@ -0,0 +1,195 @@
+#include "WaveformPeaks.h"
+
+#include <algorithm>
+#include <fstream>
+#include <iostream>
+#include <stdexcept>
+
+// Cache files start with this and a version, then the sample hash, the
+// sample count, the finest bucket size and the number of [min, max] pairs
+static const uint32_t g_uCacheMagic = 0x4B504D47;	// "GMPK"
+static const uint32_t g_uCacheVersion = 1;
+
+WaveformPeaks::WaveformPeaks() :
+	m_uNumSamples( 0 ),
+	m_uBucketSamples( 0 )
+{}
+
+WaveformPeaks::WaveformPeaks( const float * const pSamples, const size_t uNumSamples, const size_t uBucketSamples /*= 64*/ ) :
+	WaveformPeaks()
+{
+	if ( ( pSamples == nullptr && uNumSamples > 0 ) || uBucketSamples == 0 )
+		throw std::runtime_error( "Error: Attempting to build waveform peaks from invalid data!" );
+
+	m_uNumSamples = uNumSamples;
+	m_uBucketSamples = uBucketSamples;
+	layoutLevels();
+	m_vMinMax.resize( 2 * m_vLevelOffsets.back() );
+
+	// The finest level comes straight from the samples
+	for ( size_t uBucket = 0; uBucket < GetNumBuckets( 0 ); uBucket++ )
+	{
+		const size_t uBegin = uBucket * m_uBucketSamples;
+		const size_t uEnd = std::min( uBegin + m_uBucketSamples, m_uNumSamples );
+		auto prMinMax = std::minmax_element( pSamples + uBegin, pSamples + uEnd );
+		m_vMinMax[2 * uBucket] = *prMinMax.first;
+		m_vMinMax[2 * uBucket + 1] = *prMinMax.second;
+	}
+
+	// And each level above from the one below
+	for ( size_t uLevel = 1; uLevel < GetNumLevels(); uLevel++ )
+	{
+		const float * pBelow = GetLevel( uLevel - 1 );
+		float * pLevel = &m_vMinMax[2 * m_vLevelOffsets[uLevel]];
+		const size_t uNumBelow = GetNumBuckets( uLevel - 1 );
+		for ( size_t uBucket = 0; uBucket < GetNumBuckets( uLevel ); uBucket++ )
+		{
+			// The last bucket may only have one below it
+			const size_t uLeft = 2 * uBucket, uRight = std::min( uLeft + 1, uNumBelow - 1 );
+			pLevel[2 * uBucket] = std::min( pBelow[2 * uLeft], pBelow[2 * uRight] );
+			pLevel[2 * uBucket + 1] = std::max( pBelow[2 * uLeft + 1], pBelow[2 * uRight + 1] );
+		}
+	}
+}
+
+// Work out where each level starts, halving the bucket count
+// (rounding up) from the finest level until there's one bucket
+void WaveformPeaks::layoutLevels()
+{
+	m_vLevelOffsets.assign( 1, 0 );
+	size_t uNumBuckets = ( m_uNumSamples + m_uBucketSamples - 1 ) / m_uBucketSamples;
+	while ( uNumBuckets > 0 )
+	{
+		m_vLevelOffsets.push_back( m_vLevelOffsets.back() + uNumBuckets );
+		uNumBuckets = uNumBuckets > 1 ? ( uNumBuckets + 1 ) / 2 : 0;
+	}
+}
+
+/*static*/ std::unique_ptr<WaveformPeaks> WaveformPeaks::Load( std::string strFile, const uint64_t uHash, const size_t uNumSamples )
+{
+	std::ifstream inFile( strFile, std::ios::binary );
+	if ( inFile.is_open() == false )
+		return nullptr;
+
+	uint32_t uMagic( 0 ), uVersion( 0 );
+	uint64_t uFileHash( 0 ), uFileSamples( 0 ), uBucketSamples( 0 ), uNumPairs( 0 );
+	inFile.read( (char *) &uMagic, sizeof( uMagic ) );
+	inFile.read( (char *) &uVersion, sizeof( uVersion ) );
+	inFile.read( (char *) &uFileHash, sizeof( uFileHash ) );
+	inFile.read( (char *) &uFileSamples, sizeof( uFileSamples ) );
+	inFile.read( (char *) &uBucketSamples, sizeof( uBucketSamples ) );
+	inFile.read( (char *) &uNumPairs, sizeof( uNumPairs ) );
+	if ( !inFile || uMagic != g_uCacheMagic || uVersion != g_uCacheVersion )
+		return nullptr;
+
+	// A cache for other samples is just out of date
+	if ( uFileHash != uHash || uFileSamples != uNumSamples || uBucketSamples == 0 )
+		return nullptr;
+
+	std::unique_ptr<WaveformPeaks> pPeaks( new WaveformPeaks() );
+	pPeaks->m_uNumSamples = uNumSamples;
+	pPeaks->m_uBucketSamples = (size_t) uBucketSamples;
+	pPeaks->layoutLevels();
+	if ( pPeaks->m_vLevelOffsets.back() != uNumPairs )
+	{
+		std::cerr << "Error: Waveform peak cache " << strFile << " is malformed!" << std::endl;
+		return nullptr;
+	}
+
+	pPeaks->m_vMinMax.resize( 2 * uNumPairs );
+	inFile.read( (char *) pPeaks->m_vMinMax.data(), pPeaks->m_vMinMax.size() * sizeof( float ) );
+	if ( !inFile )
+	{
+		std::cerr << "Error: Waveform peak cache " << strFile << " is truncated!" << std::endl;
+		return nullptr;
+	}
+
+	return pPeaks;
+}
+
+bool WaveformPeaks::Save( std::string strFile, const uint64_t uHash ) const
+{
+	std::ofstream outFile( strFile, std::ios::binary | std::ios::trunc );
+	if ( outFile.is_open() == false )
+	{
+		std::cerr << "Error: Unable to write waveform peak cache " << strFile << std::endl;
+		return false;
+	}
+
+	const uint64_t uNumSamples = m_uNumSamples, uBucketSamples = m_uBucketSamples, uNumPairs = m_vLevelOffsets.back();
+	outFile.write( (const char *) &g_uCacheMagic, sizeof( g_uCacheMagic ) );
+	outFile.write( (const char *) &g_uCacheVersion, sizeof( g_uCacheVersion ) );
+	outFile.write( (const char *) &uHash, sizeof( uHash ) );
+	outFile.write( (const char *) &uNumSamples, sizeof( uNumSamples ) );
+	outFile.write( (const char *) &uBucketSamples, sizeof( uBucketSamples ) );
+	outFile.write( (const char *) &uNumPairs, sizeof( uNumPairs ) );
+	outFile.write( (const char *) m_vMinMax.data(), m_vMinMax.size() * sizeof( float ) );
+
+	return (bool) outFile;
+}
+
+size_t WaveformPeaks::GetNumSamples() const
+{
+	return m_uNumSamples;
+}
+
+size_t WaveformPeaks::GetNumLevels() const
+{
+	return m_vLevelOffsets.size() - 1;
+}
+
+size_t WaveformPeaks::GetNumBuckets( const size_t uLevel ) const
+{
+	if ( uLevel >= GetNumLevels() )
+		return 0;
+	return m_vLevelOffsets[uLevel + 1] - m_vLevelOffsets[uLevel];
+}
+
+size_t WaveformPeaks::GetBucketSamples( const size_t uLevel ) const
+{
+	return m_uBucketSamples << uLevel;
+}
+
+float const * WaveformPeaks::GetLevel( const size_t uLevel ) const
+{
+	if ( uLevel >= GetNumLevels() )
+		return nullptr;
+	return &m_vMinMax[2 * m_vLevelOffsets[uLevel]];
+}
+
+std::vector<float> WaveformPeaks::GetPeaks( const size_t uBegin, const size_t uEnd, const size_t uNumColumns ) const
+{
+	std::vector<float> vPeaks( 2 * uNumColumns, 0.f );
+	const size_t uClampedEnd = std::min( uEnd, m_uNumSamples );
+	if ( uNumColumns == 0 || uBegin >= uClampedEnd )
+		return vPeaks;
+
+	// Use the coarsest level whose buckets fit in a column
+	const double dColumnSamples = double( uClampedEnd - uBegin ) / uNumColumns;
+	size_t uLevel = 0;
+	while ( uLevel + 1 < GetNumLevels() && GetBucketSamples( uLevel + 1 ) <= dColumnSamples )
+		uLevel++;
+
+	// Columns are rounded out to whole buckets, so a peak may
+	// come from up to a bucket (less than a column) either side
+	const float * pLevel = GetLevel( uLevel );
+	const size_t uBucketSamples = GetBucketSamples( uLevel );
+	for ( size_t uColumn = 0; uColumn < uNumColumns; uColumn++ )
+	{
+		const size_t uColBegin = uBegin + (size_t) ( uColumn * dColumnSamples );
+		const size_t uColEnd = std::max( uBegin + (size_t) ( ( uColumn + 1 ) * dColumnSamples ), uColBegin + 1 );
+		const size_t uFirst = uColBegin / uBucketSamples;
+		const size_t uLast = std::min( uColEnd - 1, uClampedEnd - 1 ) / uBucketSamples;
+
+		float fMin = pLevel[2 * uFirst], fMax = pLevel[2 * uFirst + 1];
+		for ( size_t uBucket = uFirst + 1; uBucket <= uLast; uBucket++ )
+		{
+			fMin = std::min( fMin, pLevel[2 * uBucket] );
+			fMax = std::max( fMax, pLevel[2 * uBucket + 1] );
+		}
+		vPeaks[2 * uColumn] = fMin;
+		vPeaks[2 * uColumn + 1] = fMax;
+	}
+
+	return vPeaks;
+}